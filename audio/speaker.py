@@ -1,36 +1,225 @@
-import ctypes
-import json
-import os
-
-# Obtén el directorio actual donde se encuentra el script
-current_dir = os.path.dirname(os.path.abspath(__file__))
-
-# Define la ruta a la DLL dentro de la subcarpeta 'lib'
-dll_path = os.path.join(current_dir, '..', 'lib', 'nvdaControllerClient64.dll')  # Ajusta según el nombre y la ubicación de tu DLL
-
-# Carga la DLL de NVDA Controller
-nvda_dll = ctypes.CDLL(dll_path)
-
-# Define el tipo de argumento y el tipo de retorno para la función en la DLL
-nvda_dll.nvdaController_speakText.argtypes = [ctypes.c_wchar_p]
-nvda_dll.nvdaController_speakText.restype = None
-
-def alert(message, interrupt=False):
-    if voice_output_enabled():
-        speak_text(message)
-
-def speak_text(text):
-    # Llama a la función de la DLL para que NVDA lea el texto
-    nvda_dll.nvdaController_speakText(text)
-
-def voice_output_enabled():
-    documents_dir = os.path.expanduser("~/Documents")
-    app_data_dir = os.path.join(documents_dir, "ml_player_data")
-    config_file = os.path.join(app_data_dir, "config.json")
-    try:
-        with open(config_file, 'r') as file:
-            config = json.load(file)
-            return config.get('voice_output_enabled', False)
-    except FileNotFoundError:
-        return False
-
+import ctypes
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# Obtén el directorio actual donde se encuentra el script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Define la ruta a la DLL dentro de la subcarpeta 'lib'
+dll_path = os.path.join(current_dir, '..', 'lib', 'nvdaControllerClient64.dll')  # Ajusta según el nombre y la ubicación de tu DLL
+
+# Archivo de configuración compartido con ml_player
+config_file = os.path.join(os.path.expanduser("~/Documents"), "ml_player_data", "config.json")
+
+# Configuración leída por última vez y fecha de modificación del archivo en ese momento
+_config_lock = threading.Lock()
+_config_mtime = None
+_config = {}
+
+logger = logging.getLogger(__name__)
+
+class NvdaBackend:
+    """
+    Habla a través de NVDA usando la DLL de NVDA Controller
+    """
+
+    def __init__(self, path=dll_path):
+        # Carga la DLL de NVDA Controller
+        self.dll = ctypes.CDLL(path)
+        # Define el tipo de argumento y el tipo de retorno para las funciones en la DLL
+        self.dll.nvdaController_speakText.argtypes = [ctypes.c_wchar_p]
+        self.dll.nvdaController_speakText.restype = None
+        self.dll.nvdaController_cancelSpeech.argtypes = []
+        self.dll.nvdaController_cancelSpeech.restype = None
+
+    def speak(self, text):
+        # Llama a la función de la DLL para que NVDA lea el texto
+        self.dll.nvdaController_speakText(text)
+
+    def cancel(self):
+        # Interrumpe lo que NVDA esté leyendo
+        self.dll.nvdaController_cancelSpeech()
+
+class LogBackend:
+    """
+    Escribe los mensajes en el registro en lugar de leerlos. Sirve para pruebas y para sistemas sin NVDA.
+    """
+
+    def __init__(self, log=None):
+        self.log = log or logger
+        self.spoken = []
+
+    def speak(self, text):
+        self.spoken.append(text)
+        self.log.info("speak: %s", text)
+
+    def cancel(self):
+        self.log.info("cancel")
+
+class NullBackend:
+    """
+    Descarta los mensajes
+    """
+
+    def speak(self, text):
+        pass
+
+    def cancel(self):
+        pass
+
+def default_backend():
+    # En Windows usamos NVDA si la DLL está disponible; en otros sistemas no se habla
+    if sys.platform == "win32" and os.path.exists(dll_path):
+        try:
+            return NvdaBackend()
+        except OSError:
+            logger.exception("No se pudo cargar la DLL de NVDA")
+    return NullBackend()
+
+class SpeechQueue:
+    """
+    Cola de voz atendida por un hilo en segundo plano.
+    Los mensajes con la misma categoría se sustituyen mientras esperan, así una ráfaga de mensajes de progreso sólo lee el último.
+    """
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.busy = False
+        self.spoken = 0
+        self.coalesced = 0
+
+    @property
+    def backend(self):
+        # El backend se crea al primer uso, para no cargar la DLL al importar el módulo
+        if self._backend is None:
+            self._backend = default_backend()
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend):
+        self._backend = backend
+
+    def put(self, message, interrupt=False, category=None):
+        with self.condition:
+            if interrupt:
+                # Descartamos lo pendiente e interrumpimos lo que se esté leyendo
+                self.coalesced += len(self.pending)
+                self.pending.clear()
+            elif category is not None:
+                # Sustituimos el mensaje pendiente de la misma categoría
+                for index, (pending_category, _, _) in enumerate(self.pending):
+                    if pending_category == category:
+                        del self.pending[index]
+                        self.coalesced += 1
+                        break
+            self.pending.append((category, message, interrupt))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name="speech-queue", daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def _loop(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.busy = False
+                    self.condition.notify_all()
+                    self.condition.wait()
+                category, message, interrupt = self.pending.popleft()
+                self.busy = True
+            try:
+                if interrupt:
+                    self.backend.cancel()
+                self.backend.speak(message)
+                self.spoken += 1
+            except Exception:
+                logger.exception("Error al leer el mensaje")
+
+    def flush(self, timeout=None):
+        # Espera a que se lean todos los mensajes pendientes. Devuelve False si se agotó el tiempo.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.pending or self.busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+# Cola compartida por toda la aplicación
+speech_queue = SpeechQueue()
+
+def set_backend(backend):
+    # Permite sustituir NVDA por otro backend, por ejemplo LogBackend en pruebas
+    speech_queue.backend = backend
+
+def alert(message, interrupt=False, category=None):
+    if voice_output_enabled():
+        speech_queue.put(message, interrupt, category)
+
+def speak_text(text):
+    # Lee el texto de inmediato en el hilo actual, sin pasar por la cola
+    speech_queue.backend.speak(text)
+
+def load_config():
+    # Lee la configuración sólo si el archivo cambió desde la última lectura
+    global _config_mtime, _config
+    try:
+        mtime = os.stat(config_file).st_mtime_ns
+    except OSError:
+        mtime = None
+    with _config_lock:
+        if mtime != _config_mtime:
+            _config_mtime = mtime
+            _config = {}
+            if mtime is not None:
+                try:
+                    with open(config_file, 'r') as file:
+                        _config = json.load(file)
+                except (OSError, ValueError):
+                    _config = {}
+        return _config
+
+def voice_output_enabled():
+    return load_config().get('voice_output_enabled', False)
+
+# Signos que marcan el final de una oración
+SENTENCE_ENDINGS = ".!?…\n"
+
+class SentenceSpeaker:
+    """
+    Acumula texto que llega por fragmentos y lo lee con alert en cuanto se completa cada oración.
+    """
+
+    def __init__(self, speak=None):
+        self.speak = speak or alert
+        self.buffer = ""
+
+    def feed(self, text):
+        # Añadimos el fragmento y leemos todas las oraciones completas
+        self.buffer += text
+        last_end = -1
+        for index, char in enumerate(self.buffer):
+            # Consideramos fin de oración un salto de línea, o un signo seguido de un espacio
+            if char == "\n" or (char in SENTENCE_ENDINGS and index + 1 < len(self.buffer) and self.buffer[index + 1].isspace()):
+                last_end = index
+        if last_end >= 0:
+            sentences = self.buffer[:last_end + 1].strip()
+            self.buffer = self.buffer[last_end + 1:]
+            if sentences:
+                self.speak(sentences)
+
+    def flush(self):
+        # Leemos lo que quede pendiente al terminar la respuesta
+        rest = self.buffer.strip()
+        self.buffer = ""
+        if rest:
+            self.speak(rest)
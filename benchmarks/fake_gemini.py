@@ -0,0 +1,360 @@
+"""
+Servicio de Gemini falso para los benchmarks: imita el cliente de google.genai sin red ni cuota.
+Permite configurar el ancho de banda de subida, la duración del procesamiento, la latencia de la generación, la transmisión por fragmentos, la tasa de errores y un límite de solicitudes por minuto.
+Sólo implementa lo que usa el motor: files.upload, files.get, files.delete, files.list, caches.create, caches.update, caches.delete, models.generate_content y models.generate_content_stream.
+"""
+
+# Importaciones
+
+import os
+import json
+import time
+import random
+import threading
+import itertools
+from collections import deque
+
+class FakeAPIError(Exception):
+	"""
+	Error con el mismo aspecto que los de google.genai: código HTTP y estado
+	"""
+
+	def __init__(self, code, status, message=""):
+		super().__init__(f"{code} {status}. {message}".strip())
+		self.code = code
+		self.status = status
+
+class FakeState:
+	"""
+	Estado de un archivo remoto
+	"""
+
+	def __init__(self, name):
+		self.name = name
+
+class FakeFile:
+	"""
+	Archivo remoto falso
+	"""
+
+	def __init__(self, name, size_bytes, mime_type, ready_at, display_name=None):
+		self.name = name
+		self.display_name = display_name
+		self.uri = f"https://fake.invalid/{name}"
+		self.size_bytes = size_bytes
+		self.mime_type = mime_type
+		self.expiration_time = None
+		self.create_time = time.time()
+		self.ready_at = ready_at
+		self.state = FakeState("PROCESSING")
+
+class FakeUsage:
+	"""
+	Uso de tokens de una respuesta
+	"""
+
+	def __init__(self, prompt_tokens, output_tokens, cached_tokens=None):
+		self.prompt_token_count = prompt_tokens
+		self.candidates_token_count = output_tokens
+		self.cached_content_token_count = cached_tokens
+		self.total_token_count = prompt_tokens + output_tokens
+
+class FakeResponse:
+	"""
+	Respuesta o fragmento de respuesta
+	"""
+
+	def __init__(self, text, usage=None):
+		self.text = text
+		self.usage_metadata = usage
+
+class FakePart:
+	"""
+	Parte de contenido con los bytes de una imagen, en lugar de google.genai.types.Part
+	"""
+
+	def __init__(self, data, mime_type):
+		self.data = data
+		self.mime_type = mime_type
+
+class FakeCachedContent:
+	"""
+	Caché de contexto falsa con los tokens de su contenido
+	"""
+
+	def __init__(self, name, tokens, expires_at):
+		self.name = name
+		self.usage_metadata = FakeUsage(tokens, 0)
+		self.tokens = tokens
+		self.expires_at = expires_at
+
+class FakeConfig:
+	"""
+	Parámetros del servicio falso. Los tiempos están en segundos y el ancho de banda en bytes por segundo.
+	"""
+
+	def __init__(self, bandwidth=50 * 1024 * 1024, processing_seconds=2.0, processing_per_mb=0.01, generation_latency=0.5, generation_jitter=0.2, prefill_per_1k=0.0, file_tokens_per_mb=0, stream_chunks=20, error_rate=0.0, rpm=None, rate_window=60.0, output_tokens=300, model_latency=None, model_errors=None, tail_rate=0.0, tail_latency=0.0, seed=None):
+		self.bandwidth = bandwidth
+		self.processing_seconds = processing_seconds
+		self.processing_per_mb = processing_per_mb
+		self.generation_latency = generation_latency
+		self.generation_jitter = generation_jitter
+		# Segundos de más por cada 1000 tokens de entrada que no vienen de una caché de contexto
+		self.prefill_per_1k = prefill_per_1k
+		# Tokens de entrada de los archivos subidos por MB; con 0 cuentan como una imagen
+		self.file_tokens_per_mb = file_tokens_per_mb
+		self.stream_chunks = stream_chunks
+		self.error_rate = error_rate
+		self.rpm = rpm
+		# Ventana en la que se cuenta el límite: con 1 segundo se admiten rpm / 60 solicitudes por segundo
+		self.rate_window = rate_window
+		self.output_tokens = output_tokens
+		# Latencia de generación y tasa de errores 503 propias de cada modelo; los demás usan generation_latency y error_rate
+		self.model_latency = model_latency or {}
+		self.model_errors = model_errors or {}
+		# Fracción de generaciones que se atascan y segundos que se suman a esas
+		self.tail_rate = tail_rate
+		self.tail_latency = tail_latency
+		self.seed = seed
+
+	def to_dict(self):
+		return dict(self.__dict__)
+
+class _Service:
+	"""
+	Estado compartido del servicio: archivos, enlace de subida, límite de solicitudes y contadores
+	"""
+
+	def __init__(self, config):
+		self.config = config
+		self.random = random.Random(config.seed)
+		self.lock = threading.Lock()
+		self.files = {}
+		self.caches = {}
+		self.counter = itertools.count(1)
+		# Momento en que el enlace de subida queda libre: las subidas simultáneas se reparten el ancho de banda
+		self.link_free = 0.0
+		self.requests = deque()
+		self.counters = {"uploads": 0, "gets": 0, "deletes": 0, "caches": 0, "generations": 0, "input_tokens": 0, "cached_tokens": 0, "rate_limited": 0, "errors": 0, "bytes_uploaded": 0}
+
+	def count(self, name, value=1):
+		with self.lock:
+			self.counters[name] += value
+
+	def admit(self, model=None):
+		"""
+		Aplica el límite de solicitudes por minuto y la tasa de errores aleatorios, la del modelo si tiene una propia
+		"""
+		with self.lock:
+			if self.config.rpm:
+				now = time.monotonic()
+				window = self.config.rate_window
+				while self.requests and now - self.requests[0] > window:
+					self.requests.popleft()
+				if len(self.requests) >= self.config.rpm * window / 60:
+					self.counters["rate_limited"] += 1
+					raise FakeAPIError(429, "RESOURCE_EXHAUSTED", "Límite de solicitudes del servicio falso.")
+				self.requests.append(now)
+			error_rate = self.config.model_errors.get(model, self.config.error_rate)
+			if error_rate and self.random.random() < error_rate:
+				self.counters["errors"] += 1
+				raise FakeAPIError(503, "UNAVAILABLE", "Error aleatorio del servicio falso.")
+
+	def file_tokens(self, remote):
+		"""
+		Tokens de entrada de un archivo subido
+		"""
+		if not self.config.file_tokens_per_mb:
+			return 258
+		return max(258, int(remote.size_bytes / (1024 * 1024) * self.config.file_tokens_per_mb))
+
+	def input_tokens(self, contents, config):
+		"""
+		Devuelve los tokens de entrada de una solicitud y cuántos de ellos vienen de una caché de contexto
+		"""
+		tokens = 0
+		for part in contents:
+			if isinstance(part, FakeFile):
+				tokens += self.file_tokens(part)
+			elif isinstance(part, FakePart):
+				tokens += 258
+			else:
+				tokens += len(str(part)) // 4
+		cached = 0
+		name = config.get("cached_content") if isinstance(config, dict) else None
+		if name:
+			with self.lock:
+				cached_content = self.caches.get(name)
+			if cached_content is None or time.monotonic() >= cached_content.expires_at:
+				raise FakeAPIError(403, "PERMISSION_DENIED", f"CachedContent not found: {name}")
+			cached = cached_content.tokens
+		with self.lock:
+			self.counters["input_tokens"] += tokens + cached
+			self.counters["cached_tokens"] += cached
+		return tokens + cached, cached
+
+	def prefill(self, tokens, cached):
+		"""
+		Tiempo de lectura de la entrada: los tokens de la caché ya están procesados
+		"""
+		return (tokens - cached) / 1000 * self.config.prefill_per_1k
+
+class FakeFiles:
+	"""
+	Imitación de client.files
+	"""
+
+	def __init__(self, service):
+		self.service = service
+
+	def upload(self, file, config=None):
+		service = self.service
+		service.admit()
+		size = os.path.getsize(file)
+		# Reservamos el enlace el tiempo que tarda la transferencia y esperamos a que termine
+		with service.lock:
+			start = max(time.monotonic(), service.link_free)
+			service.link_free = start + size / service.config.bandwidth
+			done = service.link_free
+		time.sleep(max(0.0, done - time.monotonic()))
+
+		processing = service.config.processing_seconds + size / (1024 * 1024) * service.config.processing_per_mb
+		with service.lock:
+			name = f"files/fake-{next(service.counter)}"
+			display_name = config.get("display_name") if isinstance(config, dict) else None
+			remote = FakeFile(name, size, "application/octet-stream", time.monotonic() + processing, display_name)
+			service.files[name] = remote
+			service.counters["uploads"] += 1
+			service.counters["bytes_uploaded"] += size
+		return remote
+
+	def get(self, name):
+		service = self.service
+		service.count("gets")
+		with service.lock:
+			remote = service.files.get(name)
+		if remote is None:
+			raise FakeAPIError(404, "NOT_FOUND", name)
+		if remote.state.name == "PROCESSING" and time.monotonic() >= remote.ready_at:
+			remote.state = FakeState("ACTIVE")
+		return remote
+
+	def delete(self, name, config=None):
+		service = self.service
+		service.count("deletes")
+		with service.lock:
+			service.files.pop(name, None)
+
+	def list(self, config=None):
+		with self.service.lock:
+			return list(self.service.files.values())
+
+def parse_ttl(ttl):
+	"""
+	Convierte un tiempo de vida como "600s" a segundos
+	"""
+	return float(str(ttl).rstrip("s"))
+
+class FakeCaches:
+	"""
+	Imitación de client.caches
+	"""
+
+	def __init__(self, service):
+		self.service = service
+
+	def create(self, model, config):
+		service = self.service
+		service.admit()
+		tokens, cached = service.input_tokens(config["contents"], None)
+		# Crear la caché lee el contenido completo una vez
+		time.sleep(service.prefill(tokens, cached))
+		with service.lock:
+			name = f"cachedContents/fake-{next(service.counter)}"
+			cached_content = FakeCachedContent(name, tokens, time.monotonic() + parse_ttl(config.get("ttl", "3600s")))
+			service.caches[name] = cached_content
+			service.counters["caches"] += 1
+		return cached_content
+
+	def update(self, name, config):
+		service = self.service
+		with service.lock:
+			cached_content = service.caches.get(name)
+			if cached_content is None:
+				raise FakeAPIError(404, "NOT_FOUND", name)
+			cached_content.expires_at = time.monotonic() + parse_ttl(config["ttl"])
+		return cached_content
+
+	def delete(self, name, config=None):
+		with self.service.lock:
+			self.service.caches.pop(name, None)
+
+class FakeModels:
+	"""
+	Imitación de client.models
+	"""
+
+	def __init__(self, service):
+		self.service = service
+
+	def _latency(self, model=None):
+		config = self.service.config
+		with self.service.lock:
+			latency = config.model_latency.get(model, config.generation_latency) + self.service.random.uniform(-config.generation_jitter, config.generation_jitter)
+			if config.tail_rate and self.service.random.random() < config.tail_rate:
+				latency += config.tail_latency
+			return max(0.0, latency)
+
+	def _text(self, model, contents):
+		return f"Descripción falsa generada por {model} para {len(contents)} partes. " * 4
+
+	def generate_content(self, model, contents, config=None):
+		service = self.service
+		service.admit(model)
+		images = sum(1 for part in contents if isinstance(part, FakePart))
+		tokens, cached = service.input_tokens(contents, config)
+		# Una respuesta por imagen alarga la generación
+		time.sleep(self._latency(model) * max(1, images) ** 0.5 + service.prefill(tokens, cached))
+		service.count("generations")
+		if isinstance(config, dict) and config.get("response_mime_type") == "application/json":
+			# Respuesta estructurada con una descripción por imagen, como la pide el modo por lotes
+			text = json.dumps([{"index": index, "description": self._text(model, contents)} for index in range(1, images + 1)], ensure_ascii=False)
+			return FakeResponse(text, FakeUsage(258 * images, service.config.output_tokens * images))
+		return FakeResponse(self._text(model, contents), FakeUsage(tokens, service.config.output_tokens, cached))
+
+	def generate_content_stream(self, model, contents, config=None):
+		service = self.service
+		service.admit(model)
+		service.count("generations")
+		tokens, cached = service.input_tokens(contents, config)
+		chunks = max(1, service.config.stream_chunks)
+		text = self._text(model, contents)
+		step = max(1, len(text) // chunks)
+		pieces = [text[index:index + step] for index in range(0, len(text), step)]
+		# La latencia total se reparte: la mitad hasta el primer fragmento y el resto entre los demás
+		latency = self._latency(model)
+		time.sleep(latency / 2 + service.prefill(tokens, cached))
+		for index, piece in enumerate(pieces):
+			if index:
+				time.sleep(latency / 2 / len(pieces))
+			usage = FakeUsage(tokens, service.config.output_tokens, cached) if index == len(pieces) - 1 else None
+			yield FakeResponse(piece, usage)
+
+class FakeClient:
+	"""
+	Cliente de Gemini falso, con la misma forma que google.genai.Client
+	"""
+
+	def __init__(self, config=None):
+		self.config = config or FakeConfig()
+		self.service = _Service(self.config)
+		self.files = FakeFiles(self.service)
+		self.models = FakeModels(self.service)
+		self.caches = FakeCaches(self.service)
+
+	def stats(self):
+		"""
+		Devuelve los contadores del servicio
+		"""
+		with self.service.lock:
+			return dict(self.service.counters)
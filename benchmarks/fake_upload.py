@@ -0,0 +1,175 @@
+"""
+Servidor falso del protocolo de subida reanudable de Gemini, para probar ResumableUploader sin red.
+Atiende los comandos start, upload, upload, finalize, finalize y query sobre http.server, en un hilo propio y en un puerto libre de localhost.
+Se le puede pedir que corte la conexión al llegar a cierto byte, después de guardar lo recibido hasta ahí, como haría una red que se cae en medio de un bloque.
+"""
+
+# Importaciones
+
+import json
+import threading
+import itertools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Ruta donde se inician las sesiones, la misma que usa el cargador
+UPLOAD_PATH = "/upload/v1beta/files"
+# Prefijo de las direcciones de cada sesión
+SESSION_PATH = "/upload/session/"
+
+class FakeUploadSession:
+	"""
+	Sesión de subida: bytes recibidos y estado
+	"""
+
+	def __init__(self, name, size, mime_type, display_name):
+		self.name = name
+		self.size = size
+		self.mime_type = mime_type
+		self.display_name = display_name
+		self.data = bytearray()
+		self.final = False
+
+	def resource(self):
+		"""
+		Devuelve el recurso de archivo que el servidor entrega al finalizar
+		"""
+		return {"name": self.name, "display_name": self.display_name, "mime_type": self.mime_type, "size_bytes": str(len(self.data)), "uri": f"https://fake.invalid/{self.name}", "state": "ACTIVE"}
+
+class _Handler(BaseHTTPRequestHandler):
+	"""
+	Atiende las peticiones del cargador; todo el estado está en el servidor
+	"""
+
+	def log_message(self, format, *args):
+		pass
+
+	def _reply(self, code, headers=None, body=b""):
+		self.send_response(code)
+		for key, value in (headers or {}).items():
+			self.send_header(key, value)
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_POST(self):
+		length = int(self.headers.get("Content-Length") or 0)
+		body = self.rfile.read(length) if length else b""
+		command = (self.headers.get("X-Goog-Upload-Command") or "").replace(" ", "")
+		server = self.server.fake
+		with server.lock:
+			server.requests.append((command, self.path, self.headers.get("X-Goog-Upload-Offset"), len(body)))
+		if self.headers.get("x-goog-api-key") != server.api_key:
+			self._reply(401)
+		elif self.path == UPLOAD_PATH and command == "start":
+			self._start(server, body)
+		elif self.path.startswith(SESSION_PATH):
+			session = server.sessions.get(self.path[len(SESSION_PATH):])
+			if session is None:
+				self._reply(404)
+			elif command == "query":
+				# Como el servicio real, una sesión ya finalizada responde con el recurso de archivo
+				body = json.dumps({"file": session.resource()}).encode("utf-8") if session.final else b""
+				self._reply(200, {"X-Goog-Upload-Status": "final" if session.final else "active", "X-Goog-Upload-Size-Received": str(len(session.data))}, body)
+			elif command in ("upload", "upload,finalize", "finalize"):
+				self._upload(server, session, body, command != "upload")
+			else:
+				self._reply(400)
+		else:
+			self._reply(404)
+
+	def _start(self, server, body):
+		try:
+			display_name = json.loads(body.decode("utf-8"))["file"]["display_name"]
+		except (ValueError, KeyError, TypeError):
+			display_name = None
+		with server.lock:
+			number = next(server.counter)
+			session = FakeUploadSession(f"files/fake-{number}", int(self.headers.get("X-Goog-Upload-Header-Content-Length") or 0), self.headers.get("X-Goog-Upload-Header-Content-Type"), display_name)
+			server.sessions[str(number)] = session
+			server.starts += 1
+		self._reply(200, {"X-Goog-Upload-URL": server.url + SESSION_PATH + str(number), "X-Goog-Upload-Status": "active"})
+
+	def _upload(self, server, session, body, finalize):
+		offset = int(self.headers.get("X-Goog-Upload-Offset") or -1)
+		with server.lock:
+			# Como el servicio real, un bloque que no empieza donde terminó lo recibido se rechaza
+			if session.final or offset != len(session.data):
+				cut = None
+				rejected = True
+			else:
+				rejected = False
+				cut = server.interrupt_at.pop(0) if server.interrupt_at and offset < server.interrupt_at[0] < offset + len(body) else None
+				session.data += body if cut is None else body[:cut - offset]
+				session.final = finalize and cut is None and len(session.data) == session.size
+		if rejected:
+			self._reply(400)
+		elif cut is not None:
+			# Cortamos la conexión sin responder, después de guardar parte del bloque
+			self.close_connection = True
+			self.connection.close()
+		elif finalize and not session.final:
+			self._reply(400)
+		else:
+			headers = {"X-Goog-Upload-Status": "final" if session.final else "active"}
+			body = json.dumps({"file": session.resource()}).encode("utf-8") if session.final else b""
+			self._reply(200, headers, body)
+
+class FakeUploadServer:
+	"""
+	Servidor de subida reanudable falso. Se usa como contexto: al entrar empieza a atender y al salir se detiene.
+	interrupt_at es una lista de posiciones en bytes; al llegar a cada una se corta la conexión en medio del bloque.
+	"""
+
+	def __init__(self, api_key="fake-key", interrupt_at=None):
+		self.api_key = api_key
+		self.interrupt_at = sorted(interrupt_at or [])
+		self.lock = threading.Lock()
+		self.counter = itertools.count(1)
+		self.sessions = {}
+		# Peticiones recibidas: (comando, ruta, desplazamiento, bytes del cuerpo)
+		self.requests = []
+		self.starts = 0
+		self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+		self.httpd.daemon_threads = True
+		self.httpd.fake = self
+		self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+		self.thread = None
+
+	def start(self):
+		self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.httpd.shutdown()
+		self.httpd.server_close()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.stop()
+
+	def forget(self):
+		"""
+		Olvida todas las sesiones, como si hubieran caducado en el servidor
+		"""
+		with self.lock:
+			self.sessions.clear()
+
+	def uploads(self, command="upload"):
+		"""
+		Devuelve los desplazamientos de las peticiones de subida recibidas, en orden
+		"""
+		with self.lock:
+			return [int(offset) for name, _, offset, _ in self.requests if name.startswith(command)]
+
+	def received(self, name):
+		"""
+		Devuelve los bytes recibidos del archivo remoto name
+		"""
+		with self.lock:
+			for session in self.sessions.values():
+				if session.name == name:
+					return bytes(session.data)
+		return None
@@ -0,0 +1,65 @@
+"""
+Compara el tiempo total de describir un video largo con una sola llamada y por fragmentos en paralelo.
+Usa la API real de Gemini, así que consume cuota. Las respuestas no se guardan en caché para que la comparación sea justa.
+Ejemplo:
+	python benchmarks/long_video.py grabacion.mp4 --segment-seconds 300 --segment-workers 4
+"""
+
+# Importaciones
+
+import os
+import sys
+import json
+import time
+import argparse
+
+# Permitimos ejecutar el script desde cualquier carpeta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine.api_key import ApiKeyManager
+from engine.describer import DescriptionEngine, DEFAULT_MODEL, create_client
+from engine.segments import VideoSegmenter, SEGMENT_SECONDS, SEGMENT_WORKERS
+
+def measure(engine, path, prompt):
+	"""
+	Describe el archivo y devuelve el tiempo total y los datos del resultado
+	"""
+	start = time.perf_counter()
+	result = engine.describe_result(path, prompt)
+	data = result.to_dict()
+	data.pop("text", None)
+	data["wall_clock"] = round(time.perf_counter() - start, 3)
+	return data
+
+def main(argv=None):
+	"""
+	Punto de entrada del benchmark
+	"""
+	parser = argparse.ArgumentParser(description="Compara la descripción de un video largo con una sola llamada y por fragmentos.")
+	parser.add_argument("path", help="Video a describir.")
+	parser.add_argument("-p", "--prompt", default=None, help="Instrucciones para Gemini.")
+	parser.add_argument("-m", "--model", default=DEFAULT_MODEL, help="Modelo de Gemini a utilizar.")
+	parser.add_argument("--segment-seconds", type=float, default=SEGMENT_SECONDS, help="Duración en segundos de cada fragmento.")
+	parser.add_argument("--segment-workers", type=int, default=SEGMENT_WORKERS, help="Fragmentos que se describen a la vez.")
+	args = parser.parse_args(argv)
+
+	api_key = ApiKeyManager.get_api_key()
+	if not api_key:
+		print("API Key no configurada.", file=sys.stderr)
+		return 2
+	client = create_client(api_key)
+
+	single = DescriptionEngine(client, model=args.model)
+	# Con min_duration 0 se divide el video aunque sea corto
+	segmenter = VideoSegmenter(args.segment_seconds, 0, args.segment_workers)
+	segmented = DescriptionEngine(client, model=args.model, segmenter=segmenter)
+
+	report = {
+		"single": measure(single, args.path, args.prompt),
+		"segments": measure(segmented, args.path, args.prompt),
+	}
+	print(json.dumps(report, indent=2, ensure_ascii=False))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
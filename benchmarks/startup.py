@@ -0,0 +1,98 @@
+"""
+Mide el tiempo de inicio del programa: cuánto tarda en importar cada módulo pesado y en mostrarse la ventana.
+Cada medición se hace en un proceso nuevo, para que no influyan los módulos ya cargados.
+Ejemplo:
+	python benchmarks/startup.py --runs 5 --output startup.json
+"""
+
+# Importaciones
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+# Carpeta raíz del proyecto
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos cuyo tiempo de importación interesa vigilar
+MODULES = ["wx", "cv2", "google.genai", "pyperclip", "audio.speaker", "engine.describer", "gem"]
+
+# Programa que se ejecuta en el proceso hijo: crea la ventana y escribe la hora del primer pintado
+WINDOW_SCRIPT = """
+import time, wx
+import gem
+app = wx.App(False)
+frame = gem.GeminiUploaderApp()
+def on_paint(event):
+	event.Skip()
+	print(time.time(), flush=True)
+	wx.CallAfter(app.ExitMainLoop)
+frame.Bind(wx.EVT_PAINT, on_paint)
+frame.Show()
+app.MainLoop()
+"""
+
+def time_import(module):
+	"""
+	Devuelve los segundos que tarda en importarse module en un proceso nuevo, o None si no está instalado
+	"""
+	code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+	process = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+	if process.returncode != 0:
+		return None
+	return float(process.stdout.strip().splitlines()[-1])
+
+def time_to_window():
+	"""
+	Devuelve los segundos desde que se lanza el proceso hasta el primer pintado de la ventana, o None si no se pudo medir
+	"""
+	start = time.time()
+	process = subprocess.run([sys.executable, "-c", WINDOW_SCRIPT], cwd=ROOT, capture_output=True, text=True)
+	if process.returncode != 0 or not process.stdout.strip():
+		return None
+	return float(process.stdout.strip().splitlines()[-1]) - start
+
+def summarize(values):
+	"""
+	Resume una lista de mediciones en mediana, mínimo y máximo
+	"""
+	values = [value for value in values if value is not None]
+	if not values:
+		return None
+	return {
+		"median": round(statistics.median(values), 4),
+		"min": round(min(values), 4),
+		"max": round(max(values), 4),
+		"runs": len(values),
+	}
+
+def main(argv=None):
+	"""
+	Punto de entrada del benchmark
+	"""
+	parser = argparse.ArgumentParser(description="Mide el tiempo de importación de los módulos y el tiempo hasta mostrar la ventana.")
+	parser.add_argument("--runs", type=int, default=3, help="Cantidad de repeticiones de cada medición.")
+	parser.add_argument("--no-window", action="store_true", help="No medir el tiempo hasta mostrar la ventana.")
+	parser.add_argument("--output", default=None, help="Archivo JSON de salida. Si no se indica, se escribe en la salida estándar.")
+	args = parser.parse_args(argv)
+
+	report = {"python": sys.version.split()[0], "imports": {}}
+	for module in MODULES:
+		report["imports"][module] = summarize([time_import(module) for _ in range(args.runs)])
+	if not args.no_window:
+		report["time_to_window"] = summarize([time_to_window() for _ in range(args.runs)])
+
+	text = json.dumps(report, indent=2)
+	if args.output:
+		with open(args.output, 'w', encoding='utf-8') as file:
+			file.write(text)
+	else:
+		print(text)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,606 @@
+"""
+Benchmarks del motor de descripción contra el servicio de Gemini falso, sin red ni cuota.
+Cada escenario se ejecuta en un proceso nuevo, para que la memoria máxima medida sea sólo la suya.
+Escenarios:
+	single_image: la misma imagen descrita varias veces seguidas, enviada dentro de la solicitud.
+	large_video: un video grande subido por la API de archivos, con procesamiento y respuesta por fragmentos.
+	batch_images: un lote de 1000 imágenes descritas en paralelo.
+	grouped_images: las mismas 1000 imágenes agrupadas de a 10 por solicitud.
+	rate_limited: un lote con límite de solicitudes por minuto y errores aleatorios, que el planificador debe absorber.
+	follow_up_questions: varias preguntas sobre el mismo video, enviando el video cada vez y en una sesión con caché de contexto.
+	speculative_upload: la espera desde el envío hasta la respuesta de un video, con y sin subida anticipada mientras se escribe el prompt.
+	model_routing: un lote de imágenes con un modelo principal caído, que debe pasar al de respaldo, y otro con respuestas atascadas de vez en cuando, con y sin solicitudes duplicadas.
+	near_duplicates: grupos de imágenes casi iguales (la misma imagen guardada otra vez y con algo de ruido), descritas sin y con el índice de casi iguales.
+	cancellation: el tiempo desde que se cancela un envío hasta que su hilo queda libre, cancelando durante la subida, el procesamiento y la generación, y los archivos remotos que quedan después.
+El resultado es un JSON con el rendimiento, los percentiles de latencia y la memoria máxima de cada escenario. Con --compare se muestran las diferencias con una ejecución anterior.
+Ejemplo:
+	python benchmarks/suite.py --output resultado.json
+	python benchmarks/suite.py --scenario batch_images --compare resultado.json
+"""
+
+# Importaciones
+
+import os
+import sys
+import json
+import random
+import time
+import zlib
+import struct
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+
+# Permitimos ejecutar el script desde cualquier carpeta
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_gemini import FakeClient, FakeConfig, FakePart
+from engine.metrics import Metrics, percentile
+from engine.scheduler import RequestScheduler
+from engine.session import FileSession
+from engine.prefetch import PrefetchedFile
+from engine.cancel import CancelToken, JobCancelled
+from engine.lifecycle import FileLifecycle
+from engine.routing import ModelRouter
+from engine.similarity import SimilarityIndex
+from engine.batching import ImageBatcher
+from engine.describer import DescriptionEngine, DescriptionResult
+
+SCENARIOS = ("single_image", "large_video", "batch_images", "grouped_images", "rate_limited", "follow_up_questions", "speculative_upload", "model_routing", "near_duplicates", "cancellation")
+
+def write_png(path, width, height, seed=0):
+	"""
+	Escribe una imagen PNG válida con un degradado, sin depender de OpenCV
+	"""
+	rows = []
+	for y in range(height):
+		row = bytearray([0])
+		for x in range(width):
+			row += bytes(((x + seed) % 256, (y + seed) % 256, (x + y + seed) % 256))
+		rows.append(bytes(row))
+	_write_png_rows(path, width, height, rows)
+
+def write_blocks_png(path, seed, noise=0, level=6, size=64, blocks=8):
+	"""
+	Escribe una imagen PNG de bloques grises al azar según seed. Con noise se alteran ese número de píxeles, y level cambia la compresión sin cambiar los píxeles.
+	Dos semillas distintas dan imágenes bien distintas, y la misma semilla con otro level o con poco ruido, una casi igual.
+	"""
+	generator = random.Random(seed)
+	grid = [[generator.randrange(256) for _ in range(blocks)] for _ in range(blocks)]
+	cell = size // blocks
+	pixels = [[grid[y // cell][x // cell] for x in range(size)] for y in range(size)]
+	generator = random.Random(seed * 7919 + noise)
+	for _ in range(noise):
+		x, y = generator.randrange(size), generator.randrange(size)
+		pixels[y][x] = generator.randrange(256)
+	rows = []
+	for line in pixels:
+		row = bytearray([0])
+		for value in line:
+			row += bytes((value, value, value))
+		rows.append(bytes(row))
+	_write_png_rows(path, size, size, rows, level)
+
+def _write_png_rows(path, width, height, rows, level=6):
+	"""
+	Escribe las filas ya filtradas de una imagen RGB como PNG
+	"""
+	raw = zlib.compress(b"".join(rows), level)
+
+	def chunk(kind, data):
+		return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+	with open(path, 'wb') as file:
+		file.write(b"\x89PNG\r\n\x1a\n")
+		file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+		file.write(chunk(b"IDAT", raw))
+		file.write(chunk(b"IEND", b""))
+
+def write_sparse(path, size):
+	"""
+	Crea un archivo del tamaño indicado sin escribir sus bytes uno a uno
+	"""
+	with open(path, 'wb') as file:
+		file.truncate(size)
+
+def peak_rss_mb():
+	"""
+	Devuelve la memoria máxima del proceso en MB, o None si no se puede medir en este sistema
+	"""
+	try:
+		import resource
+	except ImportError:
+		resource = None
+	if resource is not None:
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		# Linux informa en KB y macOS en bytes
+		return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+	try:
+		import psutil
+		return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+	except (ImportError, AttributeError):
+		return None
+
+def build_engine(client, **kwargs):
+	"""
+	Crea el motor sin caché ni registro, para que cada archivo recorra todas las etapas
+	"""
+	engine = DescriptionEngine(client, metrics=Metrics(), **kwargs)
+	# Las imágenes enviadas directamente no necesitan la biblioteca de Gemini
+	engine.make_part = FakePart
+	return engine
+
+def run_scenario(name, folder, args):
+	"""
+	Ejecuta un escenario y devuelve su resultado
+	"""
+	if name == "follow_up_questions":
+		return run_session_scenario(folder, args)
+	if name == "speculative_upload":
+		return run_prefetch_scenario(folder, args)
+	if name == "cancellation":
+		return run_cancel_scenario(folder, args)
+	if name == "model_routing":
+		return run_routing_scenario(folder, args)
+	if name == "near_duplicates":
+		return run_dedup_scenario(folder, args)
+	stream = False
+	scheduler = None
+	batcher = None
+	workers = args.workers
+	if name == "single_image":
+		config = FakeConfig(generation_latency=0.3, seed=1)
+		path = os.path.join(folder, "image.png")
+		write_png(path, 640, 480)
+		paths = [path] * args.repeat
+		workers = 1
+	elif name == "large_video":
+		config = FakeConfig(bandwidth=args.bandwidth_mb * 1024 * 1024, processing_seconds=3.0, generation_latency=2.0, stream_chunks=40, seed=2)
+		path = os.path.join(folder, "video.mp4")
+		write_sparse(path, int(args.video_mb * 1024 * 1024))
+		paths = [path]
+		stream = True
+	elif name in ("batch_images", "grouped_images"):
+		config = FakeConfig(generation_latency=0.2, generation_jitter=0.1, seed=3)
+		if name == "grouped_images":
+			batcher = ImageBatcher(args.group_size)
+		paths = []
+		for index in range(args.images):
+			path = os.path.join(folder, f"image_{index:05d}.png")
+			write_png(path, 64, 48, seed=index)
+			paths.append(path)
+	else:
+		# El límite se aplica por segundo, para que el escenario dure segundos y no minutos
+		config = FakeConfig(generation_latency=0.1, generation_jitter=0.05, error_rate=0.02, rpm=args.rpm, rate_window=1.0, seed=4)
+		paths = []
+		for index in range(args.rate_limited_images):
+			path = os.path.join(folder, f"image_{index:05d}.png")
+			write_png(path, 64, 48, seed=index)
+			paths.append(path)
+		# El planificador mantiene un ritmo parejo justo por debajo del límite y reintenta lo que falle
+		scheduler = RequestScheduler(rpm=args.rpm * 0.95, base_delay=0.2, burst=1 / 60)
+		workers = args.workers * 2
+
+	client = FakeClient(config)
+	engine = build_engine(client, workers=workers, scheduler=scheduler, batcher=batcher)
+
+	start = time.perf_counter()
+	if len(paths) == 1 or workers == 1:
+		results = [engine.describe_result(path) if not stream else describe_stream(engine, path) for path in paths]
+	else:
+		results = list(engine.run(paths))
+	wall = time.perf_counter() - start
+
+	latencies = sorted(result.elapsed for result in results if result.ok)
+	ttfts = sorted(result.ttft for result in results if result.ttft is not None)
+	report = {
+		"files": len(results),
+		"errors": sum(1 for result in results if not result.ok),
+		"wall_clock": round(wall, 3),
+		"throughput": round(len(results) / wall, 3) if wall else None,
+		"latency": {
+			"p50": round(percentile(latencies, 0.5), 4),
+			"p95": round(percentile(latencies, 0.95), 4),
+			"p99": round(percentile(latencies, 0.99), 4),
+		},
+		"peak_rss_mb": peak_rss_mb(),
+		"fake_service": client.stats(),
+		"config": config.to_dict(),
+		"stages": engine.metrics.to_dict()["stages"],
+	}
+	if ttfts:
+		report["ttft_p50"] = round(percentile(ttfts, 0.5), 4)
+	if scheduler is not None:
+		report["scheduler"] = scheduler.stats()
+	if batcher is not None:
+		report["batching"] = batcher.stats()
+	return report
+
+def run_session_scenario(folder, args):
+	"""
+	Hace las mismas preguntas sobre un video de dos formas: enviando el video con cada pregunta y dentro de una sesión
+	"""
+	path = os.path.join(folder, "video.mp4")
+	write_sparse(path, 50 * 1024 * 1024)
+	prompts = [f"Pregunta {index} sobre el video." for index in range(1, args.questions + 1)]
+
+	def config():
+		return FakeConfig(bandwidth=args.bandwidth_mb * 1024 * 1024, processing_seconds=3.0, generation_latency=1.0, generation_jitter=0.1, prefill_per_1k=0.02, file_tokens_per_mb=600, seed=5)
+
+	# Sin sesión, cada pregunta sube el video y envía todos sus tokens
+	client = FakeClient(config())
+	engine = build_engine(client, workers=1)
+	baseline = [engine.describe(path, prompt) for prompt in prompts]
+	baseline_client = client.stats()
+
+	client = FakeClient(config())
+	engine = build_engine(client, workers=1)
+	session = FileSession(engine, path)
+	start = time.perf_counter()
+	results = [session.ask(prompt) for prompt in prompts]
+	wall = time.perf_counter() - start
+	session.close()
+
+	def input_tokens(result):
+		usage = result.extra.get("usage") or {}
+		return (usage.get("prompt_tokens") or 0) - (usage.get("cached_tokens") or 0)
+
+	return {
+		"files": len(results),
+		"errors": sum(1 for result in results if not result.ok),
+		"wall_clock": round(wall, 3),
+		"throughput": round(len(results) / wall, 3) if wall else None,
+		"latency": {
+			"p50": round(percentile(sorted(result.elapsed for result in results), 0.5), 4),
+			"p95": round(percentile(sorted(result.elapsed for result in results), 0.95), 4),
+			"p99": round(percentile(sorted(result.elapsed for result in results), 0.99), 4),
+		},
+		"peak_rss_mb": peak_rss_mb(),
+		"session": session.stats(),
+		"questions": [result.extra["session"] for result in results],
+		"baseline": {
+			"wall_clock": round(sum(result.elapsed for result in baseline), 3),
+			"follow_up_latency": round(sum(result.elapsed for result in baseline[1:]) / max(1, len(baseline) - 1), 3),
+			"follow_up_billed_input_tokens": round(sum(input_tokens(result) for result in baseline[1:]) / max(1, len(baseline) - 1)),
+			"fake_service": baseline_client,
+		},
+		"fake_service": client.stats(),
+	}
+
+def run_prefetch_scenario(folder, args):
+	"""
+	Simula a alguien que selecciona un video, tarda unos segundos en escribir el prompt y lo envía.
+	Mide la espera desde el envío hasta la respuesta sin subida anticipada y con ella.
+	"""
+	path = os.path.join(folder, "video.mp4")
+	write_sparse(path, 50 * 1024 * 1024)
+
+	def config():
+		return FakeConfig(bandwidth=args.bandwidth_mb * 1024 * 1024, processing_seconds=3.0, generation_latency=1.0, generation_jitter=0.1, seed=6)
+
+	waits = {"send_to_answer": [], "send_to_answer_prefetched": []}
+	for repeat in range(args.prefetch_repeat):
+		# Sin subida anticipada: todo empieza al enviar
+		engine = build_engine(FakeClient(config()), workers=1)
+		time.sleep(args.think_seconds)
+		start = time.perf_counter()
+		engine.describe(path)
+		waits["send_to_answer"].append(time.perf_counter() - start)
+
+		# Con subida anticipada: la subida y el procesamiento avanzan mientras se escribe el prompt
+		engine = build_engine(FakeClient(config()), workers=1)
+		prefetched = PrefetchedFile(engine, path)
+		time.sleep(args.think_seconds)
+		start = time.perf_counter()
+		engine.describe(path, prefetched=prefetched)
+		waits["send_to_answer_prefetched"].append(time.perf_counter() - start)
+
+	latencies = sorted(waits["send_to_answer_prefetched"])
+	return {
+		"files": len(latencies),
+		"errors": 0,
+		"wall_clock": round(sum(latencies), 3),
+		"throughput": None,
+		"latency": {
+			"p50": round(percentile(latencies, 0.5), 4),
+			"p95": round(percentile(latencies, 0.95), 4),
+			"p99": round(percentile(latencies, 0.99), 4),
+		},
+		"peak_rss_mb": peak_rss_mb(),
+		"think_seconds": args.think_seconds,
+		"send_to_answer": {name: round(sum(values) / len(values), 3) for name, values in waits.items()},
+	}
+
+def run_routing_scenario(folder, args):
+	"""
+	Describe las mismas imágenes con el modelo principal caído, sin enrutador y con él, y con respuestas atascadas, sin duplicar y duplicando las solicitudes lentas
+	"""
+	paths = []
+	for index in range(args.routing_images):
+		path = os.path.join(folder, f"image_{index:05d}.png")
+		write_png(path, 64, 48, seed=index)
+		paths.append(path)
+	main, fallback = ModelRouter().chain[:2]
+
+	# El modelo principal responde siempre con 503: sin enrutador todo falla, con él se pasa al de respaldo
+	outage = FakeConfig(generation_latency=0.2, generation_jitter=0.05, model_errors={main: 1.0}, seed=8)
+	results = list(build_engine(FakeClient(outage), workers=args.workers).run(paths))
+	errors_without_router = sum(1 for result in results if not result.ok)
+	router = ModelRouter(policy="quality")
+	engine = build_engine(FakeClient(outage), workers=args.workers, router=router)
+	results = list(engine.run(paths))
+	outage_report = {
+		"errors_without_router": errors_without_router,
+		"errors_with_router": sum(1 for result in results if not result.ok),
+		"answered_by": {model: sum(1 for result in results if result.model == model) for model in (main, fallback)},
+		"models": router.stats(),
+	}
+
+	# Una de cada veinte respuestas se atasca tres segundos
+	def tail():
+		return FakeConfig(generation_latency=0.3, generation_jitter=0.05, tail_rate=0.05, tail_latency=3.0, seed=9)
+
+	runs = {}
+	for hedge in (False, True):
+		router = ModelRouter(policy="quality", hedge=hedge)
+		client = FakeClient(tail())
+		engine = build_engine(client, workers=args.workers, router=router)
+		start = time.perf_counter()
+		results = list(engine.run(paths))
+		wall = time.perf_counter() - start
+		latencies = sorted(result.elapsed for result in results if result.ok)
+		runs["hedged" if hedge else "plain"] = {
+			"errors": sum(1 for result in results if not result.ok),
+			"wall_clock": round(wall, 3),
+			"throughput": round(len(results) / wall, 3) if wall else None,
+			"latency": {
+				"p50": round(percentile(latencies, 0.5), 4),
+				"p95": round(percentile(latencies, 0.95), 4),
+				"p99": round(percentile(latencies, 0.99), 4),
+			},
+			"generations": client.stats()["generations"],
+			"models": router.stats(),
+		}
+
+	hedged = runs["hedged"]
+	return {
+		"files": len(paths),
+		"errors": outage_report["errors_with_router"] + hedged["errors"],
+		"wall_clock": hedged["wall_clock"],
+		"throughput": hedged["throughput"],
+		"latency": hedged["latency"],
+		"peak_rss_mb": peak_rss_mb(),
+		"outage": outage_report,
+		"tail": runs,
+	}
+
+def run_dedup_scenario(folder, args):
+	"""
+	Describe grupos de imágenes casi iguales sin y con el índice de casi iguales, y cuenta las llamadas evitadas y las descripciones reutilizadas de otro grupo
+	"""
+	paths = []
+	for group in range(args.dedup_groups):
+		seed = group + 1
+		# El original, la misma imagen guardada con otra compresión (otro SHA-256) y dos copias con ruido
+		for index, (noise, level) in enumerate(((0, 6), (0, 1), (20, 6), (60, 9))):
+			path = os.path.join(folder, f"group_{group:05d}_{index}.png")
+			write_blocks_png(path, seed, noise, level)
+			paths.append(path)
+
+	config = FakeConfig(generation_latency=0.2, generation_jitter=0.05, seed=10)
+	client = FakeClient(config)
+	start = time.perf_counter()
+	results = list(build_engine(client, workers=args.workers).run(paths))
+	plain = {"errors": sum(1 for result in results if not result.ok), "wall_clock": round(time.perf_counter() - start, 3), "generations": client.stats()["generations"]}
+
+	index = SimilarityIndex(os.path.join(folder, "similar.sqlite3"))
+	client = FakeClient(config)
+	engine = build_engine(client, workers=args.workers, similar=index)
+	start = time.perf_counter()
+	results = list(engine.run(paths))
+	wall = time.perf_counter() - start
+	latencies = sorted(result.elapsed for result in results if result.ok)
+	reused = [result for result in results if "near_duplicate" in result.extra]
+	# Una descripción reutilizada de otro grupo sería un falso positivo
+	wrong = sum(1 for result in reused if os.path.basename(result.extra["near_duplicate"]["path"])[:11] != os.path.basename(result.path)[:11])
+	fingerprint = engine.metrics.to_dict()["stages"].get("fingerprint", {})
+	index.close()
+	return {
+		"files": len(paths),
+		"errors": sum(1 for result in results if not result.ok),
+		"wall_clock": round(wall, 3),
+		"throughput": round(len(results) / wall, 3) if wall else None,
+		"latency": {
+			"p50": round(percentile(latencies, 0.5), 4),
+			"p95": round(percentile(latencies, 0.95), 4),
+			"p99": round(percentile(latencies, 0.99), 4),
+		},
+		"peak_rss_mb": peak_rss_mb(),
+		"without_index": plain,
+		"generations": client.stats()["generations"],
+		"calls_avoided": plain["generations"] - client.stats()["generations"],
+		"reused": len(reused),
+		"wrong_group": wrong,
+		"fingerprint_p50": fingerprint.get("p50"),
+		"similarity": index.stats(),
+	}
+
+def run_cancel_scenario(folder, args):
+	"""
+	Cancela el envío de un video en cada etapa y mide el tiempo hasta que el hilo del envío queda libre.
+	Después espera a que terminen las llamadas abandonadas y cuenta los archivos que quedaron en el servicio.
+	"""
+	path = os.path.join(folder, "video.mp4")
+	write_sparse(path, 50 * 1024 * 1024)
+	# Cada etapa empieza con el primer aviso de progreso que alcanza este valor
+	stages = {"upload": 10, "processing": 40, "generation": 75}
+	# La subida dura 5 segundos, el procesamiento 4 y la generación 3
+	config = FakeConfig(bandwidth=10 * 1024 * 1024, processing_seconds=4.0, generation_latency=3.0, generation_jitter=0.0, seed=7)
+
+	latencies = {stage: [] for stage in stages}
+	errors = 0
+	leftover = 0
+	cleanup = []
+	for repeat in range(args.cancel_repeat):
+		for stage, value in stages.items():
+			client = FakeClient(config)
+			lifecycle = FileLifecycle(client)
+			engine = build_engine(client, workers=1, lifecycle=lifecycle)
+			token = CancelToken()
+			reached = threading.Event()
+			finished = {}
+
+			def progress(percent, message, value=value, reached=reached):
+				if percent >= value:
+					reached.set()
+
+			def send(token=token, engine=engine, progress=progress, finished=finished):
+				try:
+					engine.describe(path, progress=progress, on_chunk=lambda text: None, cancel=token)
+					finished["outcome"] = "completed"
+				except JobCancelled:
+					finished["outcome"] = "cancelled"
+				except Exception as e:
+					finished["outcome"] = str(e)
+				finished["at"] = time.perf_counter()
+
+			thread = threading.Thread(target=send)
+			thread.start()
+			reached.wait(30)
+			# Dejamos avanzar la etapa un poco antes de cancelar
+			time.sleep(0.3)
+			token.cancel()
+			thread.join()
+			if finished.get("outcome") != "cancelled":
+				errors += 1
+				continue
+			latencies[stage].append(finished["at"] - token.requested)
+
+			# Esperamos a que las llamadas abandonadas terminen y se borre lo que crearon
+			start = time.perf_counter()
+			while (client.service.files or any(thread.name == "gemini-call" for thread in threading.enumerate())) and time.perf_counter() - start < 15:
+				time.sleep(0.05)
+			cleanup.append(time.perf_counter() - start)
+			leftover += len(client.service.files)
+			lifecycle.close()
+			engine.poller.stop()
+
+	values = sorted(value for stage in latencies.values() for value in stage)
+	return {
+		"files": len(values),
+		"errors": errors,
+		"wall_clock": round(sum(values), 3),
+		"throughput": None,
+		"latency": {
+			"p50": round(percentile(values, 0.5), 4),
+			"p95": round(percentile(values, 0.95), 4),
+			"p99": round(percentile(values, 0.99), 4),
+		},
+		"peak_rss_mb": peak_rss_mb(),
+		"cancel_to_idle": {stage: round(max(values), 4) if values else None for stage, values in latencies.items()},
+		"remote_cleanup_seconds": round(max(cleanup), 3) if cleanup else None,
+		"remote_files_left": leftover,
+	}
+
+def describe_stream(engine, path):
+	"""
+	Describe el archivo en modo de transmisión, como la interfaz gráfica, sin lanzar excepciones
+	"""
+	try:
+		return engine.describe(path, on_chunk=lambda text: None)
+	except Exception as e:
+		return DescriptionResult(path, None, engine.model, error=str(e))
+
+def run_child(name, args):
+	"""
+	Ejecuta un escenario en un proceso nuevo y devuelve su resultado
+	"""
+	command = [sys.executable, os.path.abspath(__file__), "--child", name,
+		"--workers", str(args.workers), "--repeat", str(args.repeat), "--images", str(args.images), "--group-size", str(args.group_size),
+		"--video-mb", str(args.video_mb), "--bandwidth-mb", str(args.bandwidth_mb),
+		"--rpm", str(args.rpm), "--rate-limited-images", str(args.rate_limited_images), "--questions", str(args.questions),
+		"--think-seconds", str(args.think_seconds), "--prefetch-repeat", str(args.prefetch_repeat), "--cancel-repeat", str(args.cancel_repeat), "--routing-images", str(args.routing_images), "--dedup-groups", str(args.dedup_groups)]
+	process = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+	if process.returncode != 0:
+		return {"error": process.stderr.strip().splitlines()[-1] if process.stderr.strip() else f"código {process.returncode}"}
+	return json.loads(process.stdout)
+
+def compare(report, previous):
+	"""
+	Devuelve líneas de texto con la variación de las métricas principales respecto a una ejecución anterior
+	"""
+	lines = []
+	for name, current in report["scenarios"].items():
+		before = previous.get("scenarios", {}).get(name)
+		if not before or "error" in current or "error" in before:
+			continue
+		for label, now, then in (
+			("throughput", current["throughput"], before["throughput"]),
+			("p50", current["latency"]["p50"], before["latency"]["p50"]),
+			("p95", current["latency"]["p95"], before["latency"]["p95"]),
+			("peak_rss_mb", current["peak_rss_mb"], before["peak_rss_mb"]),
+		):
+			if now is None or not then:
+				continue
+			lines.append(f"{name} {label}: {then} -> {now} ({(now - then) / then:+.1%})")
+	return lines
+
+def main(argv=None):
+	"""
+	Punto de entrada del benchmark
+	"""
+	parser = argparse.ArgumentParser(description="Mide el motor de descripción contra un servicio de Gemini falso.")
+	parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Escenario a ejecutar. Se puede repetir; por defecto se ejecutan todos.")
+	parser.add_argument("--workers", type=int, default=8, help="Archivos que se procesan a la vez en los lotes.")
+	parser.add_argument("--repeat", type=int, default=20, help="Repeticiones del escenario single_image.")
+	parser.add_argument("--images", type=int, default=1000, help="Imágenes del escenario batch_images.")
+	parser.add_argument("--group-size", type=int, default=10, help="Imágenes por solicitud del escenario grouped_images.")
+	parser.add_argument("--video-mb", type=float, default=200, help="Tamaño en MB del video de large_video.")
+	parser.add_argument("--bandwidth-mb", type=float, default=50, help="Ancho de banda de subida simulado, en MB por segundo.")
+	parser.add_argument("--rpm", type=int, default=3000, help="Límite de solicitudes por minuto del escenario rate_limited.")
+	parser.add_argument("--rate-limited-images", type=int, default=500, help="Imágenes del escenario rate_limited.")
+	parser.add_argument("--questions", type=int, default=5, help="Preguntas sobre el mismo video del escenario follow_up_questions.")
+	parser.add_argument("--think-seconds", type=float, default=3.0, help="Segundos entre la selección del archivo y el envío en speculative_upload.")
+	parser.add_argument("--prefetch-repeat", type=int, default=3, help="Repeticiones del escenario speculative_upload.")
+	parser.add_argument("--routing-images", type=int, default=300, help="Imágenes del escenario model_routing.")
+	parser.add_argument("--dedup-groups", type=int, default=100, help="Grupos de cuatro imágenes casi iguales del escenario near_duplicates.")
+	parser.add_argument("--cancel-repeat", type=int, default=3, help="Repeticiones de cada etapa del escenario cancellation.")
+	parser.add_argument("--compare", default=None, help="JSON de una ejecución anterior con el que comparar.")
+	parser.add_argument("--output", default=None, help="Archivo JSON de salida. Si no se indica, se escribe en la salida estándar.")
+	parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	# En el proceso hijo ejecutamos un solo escenario y devolvemos su resultado
+	if args.child:
+		folder = tempfile.mkdtemp(prefix="gemini-bench-")
+		try:
+			print(json.dumps(run_scenario(args.child, folder, args)))
+		finally:
+			shutil.rmtree(folder, ignore_errors=True)
+		return 0
+
+	report = {"python": sys.version.split()[0], "platform": sys.platform, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "scenarios": {}}
+	for name in args.scenario or SCENARIOS:
+		print(f"Ejecutando {name}...", file=sys.stderr)
+		report["scenarios"][name] = run_child(name, args)
+
+	text = json.dumps(report, indent=2)
+	if args.output:
+		with open(args.output, 'w', encoding='utf-8') as file:
+			file.write(text)
+	else:
+		print(text)
+
+	if args.compare:
+		with open(args.compare, 'r', encoding='utf-8') as file:
+			previous = json.load(file)
+		for line in compare(report, previous):
+			print(line, file=sys.stderr)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+Interfaz de línea de comandos de Gemini descriptor.
+Permite describir una carpeta completa o una lista de archivos sin abrir la interfaz gráfica, procesando varios archivos a la vez y escribiendo un resultado JSON por línea a medida que termina cada uno.
+Ejemplo:
+	python cli.py carpeta_de_videos --workers 8 --output descripciones.jsonl
+Con --watch se vigilan las carpetas y se describe cada archivo nuevo en cuanto termina de copiarse:
+	python cli.py carpeta_compartida --watch --sidecar
+Con --ask se hacen varias preguntas sobre un mismo archivo, que se sube una sola vez:
+	python cli.py video.mp4 --ask "¿Quién aparece?" --ask "¿Dónde ocurre?"
+"""
+
+# Importaciones
+
+import sys
+import logging
+import argparse
+
+from engine.api_key import ApiKeyManager
+from engine.cache import ResponseCache
+from engine.history import HistoryStore
+from engine.metrics import Metrics
+from engine.registry import UploadRegistry
+from engine.inline import INLINE_MAX_BYTES
+from engine.batching import ImageBatcher, BATCH_MAX_TOKENS
+from engine.probe import MediaProbe
+from engine.scheduler import RequestScheduler, MAX_RETRIES
+from engine.session import FileSession, SESSION_TTL
+from engine.lifecycle import FileLifecycle, STORAGE_BUDGET, ORPHAN_AGE
+from engine.cancel import CancelToken
+from engine.routing import ModelRouter, FALLBACK_MODELS, LIGHT_MODEL, POLICIES, DEFAULT_POLICY
+from engine.similarity import SimilarityIndex, MAX_DISTANCE
+from engine.segments import VideoSegmenter, SEGMENT_SECONDS, MIN_DURATION, SEGMENT_WORKERS
+from engine.upload import ResumableUploader
+from engine.watcher import FolderWatcher, SidecarSink, JsonlSink, SETTLE_SECONDS, POLL_INTERVAL, MAX_QUEUED, watch
+from engine.preprocess import VideoCompressor, TARGET_HEIGHT, TARGET_FPS, MIN_BYTES
+from engine.describer import DescriptionEngine, DescriptionResult, DEFAULT_MODEL, create_client, write_jsonl
+
+def build_parser():
+	"""
+	Crea el analizador de argumentos
+	"""
+	parser = argparse.ArgumentParser(description="Describe archivos de video o imagen con Gemini y escribe los resultados en formato JSONL.")
+	parser.add_argument("paths", nargs="*", help="Archivos o carpetas a describir. Las carpetas se recorren de forma recursiva.")
+	parser.add_argument("-p", "--prompt", default=None, help="Instrucciones para Gemini. Si no se indica, se usa el prompt por defecto.")
+	parser.add_argument("--prompt-file", default=None, help="Archivo de texto del que leer las instrucciones.")
+	parser.add_argument("-m", "--model", default=DEFAULT_MODEL, help="Modelo de Gemini a utilizar.")
+	parser.add_argument("--fallback-models", default=",".join(FALLBACK_MODELS), help="Modelos de respaldo, separados por comas, que se prueban en orden si el principal falla o está saturado. Con una cadena vacía no se usan.")
+	parser.add_argument("--light-model", default=LIGHT_MODEL, help="Modelo ligero para las imágenes pequeñas con la política balanced. Con una cadena vacía no se usa.")
+	parser.add_argument("--route-policy", choices=POLICIES, default=DEFAULT_POLICY, help="Elección del modelo: quality (por defecto) usa siempre el principal, balanced el ligero para las imágenes pequeñas y latency el de menor latencia medida.")
+	parser.add_argument("--hedge", action="store_true", help="Repetir la solicitud que tarda más que el p95 de su modelo y usar la primera respuesta. Reduce la cola de latencia a costa de algunas solicitudes de más.")
+	parser.add_argument("-w", "--workers", type=int, default=4, help="Cantidad de archivos a procesar a la vez.")
+	parser.add_argument("--no-cache", action="store_true", help="No usar la caché de respuestas.")
+	parser.add_argument("--cache-ttl", type=float, default=None, help="Tiempo de vida en segundos de las respuestas en caché.")
+	parser.add_argument("--near-duplicates", action="store_true", help="Reutilizar la descripción de una imagen o un video casi igual a otro ya descrito con el mismo prompt, en lugar de llamar a la API. Requiere NumPy y OpenCV.")
+	parser.add_argument("--near-distance", type=int, default=MAX_DISTANCE, help="Bits distintos, de 64, que admiten dos hashes perceptuales para considerar casi iguales los archivos.")
+	parser.add_argument("--inline-max-mb", type=float, default=INLINE_MAX_BYTES / (1024 * 1024), help="Tamaño máximo en MB de las imágenes enviadas dentro de la solicitud. Con 0 se usa siempre la API de archivos.")
+	parser.add_argument("--resumable", action="store_true", help="Subir por bloques con el protocolo reanudable en lugar de con la biblioteca de Gemini, como la casilla de la interfaz. Una subida interrumpida continúa en la siguiente ejecución.")
+	parser.add_argument("--batch-images", type=int, default=0, help="Agrupar hasta esta cantidad de imágenes en cada solicitud. Con 0 o 1 cada imagen va en su propia solicitud.")
+	parser.add_argument("--batch-max-tokens", type=int, default=BATCH_MAX_TOKENS, help="Tokens estimados máximos de las imágenes de un mismo lote.")
+	parser.add_argument("--compress", action="store_true", help="Comprimir los videos antes de subirlos. El video comprimido no conserva el audio.")
+	parser.add_argument("--compress-height", type=int, default=TARGET_HEIGHT, help="Altura máxima en píxeles del video comprimido.")
+	parser.add_argument("--compress-fps", type=float, default=TARGET_FPS, help="Cuadros por segundo del video comprimido.")
+	parser.add_argument("--compress-min-mb", type=float, default=MIN_BYTES / (1024 * 1024), help="Tamaño mínimo en MB a partir del cual se comprimen los videos.")
+	parser.add_argument("--segments", action="store_true", help="Describir los videos largos por fragmentos en paralelo y unir el resultado.")
+	parser.add_argument("--segment-seconds", type=float, default=SEGMENT_SECONDS, help="Duración en segundos de cada fragmento.")
+	parser.add_argument("--segment-min-duration", type=float, default=MIN_DURATION, help="Duración mínima en segundos de los videos que se dividen.")
+	parser.add_argument("--segment-workers", type=int, default=SEGMENT_WORKERS, help="Cantidad de fragmentos de un mismo video que se describen a la vez.")
+	parser.add_argument("--ask", action="append", default=None, help="Pregunta sobre el archivo indicado. Se puede repetir: el archivo se sube una vez y queda en una caché de contexto de Gemini para las preguntas siguientes.")
+	parser.add_argument("--session-ttl", type=float, default=SESSION_TTL, help="Tiempo de vida en segundos de la caché de contexto de --ask. Se extiende mientras se hacen preguntas.")
+	parser.add_argument("--keep-uploads", action="store_true", help="No borrar del servidor los archivos subidos al terminar cada uno, para reutilizarlos en otra ejecución.")
+	parser.add_argument("--storage-budget-gb", type=float, default=STORAGE_BUDGET / (1024 ** 3), help="Espacio máximo en GB de los archivos subidos. Al superarlo se borran los más antiguos que no estén en uso.")
+	parser.add_argument("--orphan-hours", type=float, default=None, help="Borrar los archivos subidos por este programa que nadie usa tras estas horas, incluidos los de otras ejecuciones que el registro ya no puede reutilizar. Sin indicarlo, no se borran.")
+	parser.add_argument("--clean-remote", action="store_true", help=f"Borrar los archivos subidos por este programa que son huérfanos (más de --orphan-hours, o {ORPHAN_AGE // 3600} horas) o exceden el espacio máximo, y terminar.")
+	parser.add_argument("--rpm", type=float, default=None, help="Cuota de solicitudes por minuto. Si no se indica, no se limita.")
+	parser.add_argument("--tpm", type=float, default=None, help="Cuota de tokens de entrada por minuto, según la estimación de cada archivo. Si no se indica, no se limita.")
+	parser.add_argument("--max-retries", type=int, default=MAX_RETRIES, help="Reintentos ante límites de solicitudes (429) y errores temporales del servidor (5xx).")
+	parser.add_argument("--watch", action="store_true", help="Vigilar las carpetas y describir los archivos nuevos a medida que aparecen, hasta pulsar Ctrl+C.")
+	parser.add_argument("--include-existing", action="store_true", help="En modo de vigilancia, describir también los archivos que ya estaban en las carpetas.")
+	parser.add_argument("--sidecar", action="store_true", help="En modo de vigilancia, escribir el resultado de cada archivo en un JSON junto a él. Al reiniciar se describen los archivos que todavía no tienen su resultado.")
+	parser.add_argument("--settle-seconds", type=float, default=SETTLE_SECONDS, help="Segundos sin cambios tras los cuales un archivo se considera terminado de copiar.")
+	parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL, help="Intervalo en segundos del recorrido de las carpetas cuando no hay eventos del sistema.")
+	parser.add_argument("--max-queued", type=int, default=MAX_QUEUED, help="Archivos terminados que pueden esperar su turno en la cola de vigilancia.")
+	parser.add_argument("--no-history", action="store_true", help="No guardar los resultados en el historial.")
+	parser.add_argument("--search", default=None, help="Buscar en el historial de descripciones en lugar de describir archivos.")
+	parser.add_argument("--export", default=None, help="Exportar el historial a un archivo CSV (extensión .csv) o JSONL. Con --search sólo se exportan las coincidencias.")
+	parser.add_argument("--limit", type=int, default=20, help="Cantidad máxima de resultados de --search.")
+	parser.add_argument("--metrics", default=None, help="Archivo donde escribir al terminar la duración de cada etapa (p50, p95, p99) y los contadores: formato de Prometheus si la extensión es .prom, JSON en otro caso.")
+	parser.add_argument("--log-jobs", action="store_true", help="Escribir en la salida de errores una línea por archivo con la duración de cada etapa y los tokens usados.")
+	parser.add_argument("-o", "--output", default=None, help="Archivo JSONL de salida. Si no se indica, se escribe en la salida estándar.")
+	return parser
+
+def track_latency(results, latencies):
+	"""
+	Deja pasar los resultados y acumula la latencia de los correctos según la vía de envío: dentro de la solicitud o mediante la API de archivos
+	"""
+	for result in results:
+		if result.ok and not result.cached:
+			latencies.setdefault(result.extra.get("transport", "files_api"), []).append(result.elapsed)
+		yield result
+
+def watch_folders(engine, args, prompt, history=None):
+	"""
+	Modo de vigilancia: describe los archivos nuevos de las carpetas hasta que se pulsa Ctrl+C
+	"""
+	watcher = FolderWatcher(args.paths, args.settle_seconds, args.poll_interval, max_queued=args.max_queued, include_existing=args.include_existing or args.sidecar)
+	stream = None
+	if args.sidecar:
+		sink = SidecarSink()
+	elif args.output:
+		stream = open(args.output, 'a', encoding='utf-8')
+		sink = JsonlSink(stream)
+	else:
+		sink = JsonlSink(sys.stdout)
+
+	try:
+		print("Vigilando las carpetas. Pulse Ctrl+C para terminar.", file=sys.stderr)
+		return watch(engine, watcher, sink, prompt, history=history)
+	finally:
+		if stream is not None:
+			stream.close()
+
+def ask_questions(engine, args, cancel=None):
+	"""
+	Hace todas las preguntas de --ask sobre el archivo en una sesión y genera cada resultado
+	"""
+	session = FileSession(engine, args.paths[0], ttl=args.session_ttl)
+	try:
+		for question in args.ask:
+			try:
+				yield session.ask(question, cancel=cancel)
+			except Exception as e:
+				yield DescriptionResult(args.paths[0], question, engine.model, error=str(e))
+	finally:
+		session.close()
+		stats = session.stats()
+		if stats["context_cache"]:
+			print(f"Sesión: preparación en {stats['setup_seconds']:.2f} segundos, {stats['cached_tokens']} tokens leídos de la caché de contexto.", file=sys.stderr)
+		else:
+			print(f"Sesión sin caché de contexto ({stats['cache_error']}); se reutilizó el archivo subido.", file=sys.stderr)
+		if stats["follow_up_latency"] is not None:
+			print(f"Primera pregunta: {stats['first_latency']:.2f} segundos. Siguientes: {stats['follow_up_latency']:.2f} segundos y {stats['follow_up_billed_input_tokens']} tokens de entrada a precio completo de media.", file=sys.stderr)
+
+def query_history(args):
+	"""
+	Busca en el historial o lo exporta
+	"""
+	history = HistoryStore()
+	try:
+		if args.export:
+			exported = history.export(args.export, args.search)
+			print(f"Descripciones exportadas: {exported}.", file=sys.stderr)
+			return 0
+		for entry in history.search(args.search, args.limit):
+			print(f"{entry['path']} ({entry['model']})\n\t{entry['snippet'] or entry['error']}")
+		return 0
+	finally:
+		history.close()
+
+def main(argv=None):
+	"""
+	Punto de entrada de la línea de comandos
+	"""
+	parser = build_parser()
+	args = parser.parse_args(argv)
+
+	# Las consultas al historial no necesitan la API
+	if args.search is not None or args.export:
+		return query_history(args)
+	if not args.paths and not args.clean_remote:
+		parser.error("Debe indicar al menos un archivo o carpeta.")
+	if args.ask and (len(args.paths) != 1 or args.watch):
+		parser.error("--ask necesita un solo archivo.")
+
+	# Obtenemos la API key igual que la interfaz gráfica
+	api_key = ApiKeyManager.get_api_key()
+	if not api_key:
+		print("API Key no configurada. Defina la variable de entorno API_GEMINI o el archivo api.json.", file=sys.stderr)
+		return 2
+
+	prompt = args.prompt
+	if args.prompt_file:
+		with open(args.prompt_file, 'r', encoding='utf-8') as file:
+			prompt = file.read()
+
+	client = create_client(api_key)
+	registry = UploadRegistry()
+	orphan_age = args.orphan_hours * 3600 if args.orphan_hours is not None else None
+	lifecycle = FileLifecycle(client, registry, int(args.storage_budget_gb * 1024 ** 3), orphan_age, keep=args.keep_uploads)
+	if args.clean_remote:
+		deleted = lifecycle.reap(orphan_age if orphan_age is not None else ORPHAN_AGE)
+		lifecycle.close()
+		registry.close()
+		stats = lifecycle.stats()
+		print(f"Archivos remotos borrados: {deleted}, {stats['bytes_freed'] / (1024 * 1024):.1f} MB. Fallidos: {stats['failed']}.", file=sys.stderr)
+		return 1 if stats["failed"] else 0
+	# El recolector quita los archivos huérfanos mientras se describen los nuevos
+	lifecycle.start()
+
+	cache = None if args.no_cache else ResponseCache(ttl=args.cache_ttl)
+	similar = SimilarityIndex(max_distance=args.near_distance) if args.near_duplicates else None
+	preprocessor = None
+	if args.compress:
+		preprocessor = VideoCompressor(args.compress_height, args.compress_fps, int(args.compress_min_mb * 1024 * 1024))
+	# El divisor y el planificador comparten los metadatos ya leídos
+	probe = MediaProbe()
+	segmenter = None
+	if args.segments:
+		segmenter = VideoSegmenter(args.segment_seconds, args.segment_min_duration, args.segment_workers, probe=probe)
+	uploader = ResumableUploader(api_key) if args.resumable else None
+	batcher = ImageBatcher(args.batch_images, args.batch_max_tokens) if args.batch_images > 1 else None
+	# Las métricas sólo se miden si se piden
+	metrics = Metrics(enabled=bool(args.metrics or args.log_jobs), log_jobs=args.log_jobs)
+	if args.log_jobs:
+		logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+	scheduler = RequestScheduler(rpm=args.rpm, tpm=args.tpm, max_retries=args.max_retries)
+	chain = [args.model] + [model.strip() for model in args.fallback_models.split(",") if model.strip() and model.strip() != args.model]
+	router = ModelRouter(chain, light_model=args.light_model or None, policy=args.route_policy, hedge=args.hedge, metrics=metrics)
+	engine = DescriptionEngine(client, model=args.model, router=router, similar=similar, workers=args.workers, cache=cache, registry=registry, preprocessor=preprocessor, inline_max_bytes=int(args.inline_max_mb * 1024 * 1024), segmenter=segmenter, uploader=uploader, scheduler=scheduler, probe=probe, metrics=metrics, batcher=batcher, lifecycle=lifecycle)
+	history = None if args.no_history else HistoryStore()
+	latencies = {}
+	# Ctrl+C cancela los archivos en curso, y lo que hayan subido se borra antes de salir.
+	# Las llamadas no se abandonan en otro hilo: se detienen en el siguiente punto de control, así ninguna subida termina después del borrado.
+	cancel = CancelToken(abandon=False)
+	if args.watch:
+		written, errors = watch_folders(engine, args, prompt, history)
+	else:
+		if args.ask:
+			results = ask_questions(engine, args, cancel)
+		else:
+			results = track_latency(engine.run(args.paths, prompt, cancel=cancel), latencies)
+		if history is not None:
+			results = history.record(results)
+
+		try:
+			if args.output:
+				with open(args.output, 'a', encoding='utf-8') as stream:
+					written, errors = write_jsonl(results, stream)
+			else:
+				written, errors = write_jsonl(results, sys.stdout)
+		except KeyboardInterrupt:
+			cancel.cancel()
+			written = errors = None
+
+	if cancel.cancelled:
+		print("Cancelado. Borrando los archivos subidos...", file=sys.stderr)
+	else:
+		print(f"Archivos procesados: {written}. Errores: {errors}.", file=sys.stderr)
+	if history is not None:
+		history.close()
+	lifecycle.close()
+	# Los borrados del ciclo de vida también cambian el registro, que se escribe al final
+	registry.close()
+	stats = lifecycle.stats()
+	print(f"Archivos remotos borrados: {stats['deleted']}, {stats['bytes_freed'] / (1024 * 1024):.1f} MB. Fallidos: {stats['failed']}.", file=sys.stderr)
+	if similar is not None:
+		stats = similar.stats()
+		print(f"Archivos casi iguales: {stats['calls_avoided']} descripciones reutilizadas, llamadas a la API evitadas. Huellas guardadas: {stats['entries']}.", file=sys.stderr)
+		similar.close()
+	if cache is not None:
+		stats = cache.stats()
+		print(f"Caché: {stats['hits']} aciertos, {stats['misses']} fallos.", file=sys.stderr)
+	stats = scheduler.stats()
+	print(f"Solicitudes: {stats['calls']}, reintentos: {stats['retries']}. Espera en cola: {stats['queue_wait_total']:.2f} segundos en total, p95 {stats['queue_wait_p95']:.2f} segundos.", file=sys.stderr)
+	if batcher is not None:
+		stats = batcher.stats()
+		print(f"Lotes: {stats['batches']} con {stats['batched_images']} imágenes. Imágenes descritas por separado: {stats['fallbacks']}.", file=sys.stderr)
+	for model, stats in router.stats().items():
+		if stats["calls"]:
+			p95 = f"{stats['latency_p95']:.2f}" if stats["latency_p95"] is not None else "-"
+			print(f"Modelo {model}: {stats['calls']} solicitudes, {stats['errors']} errores, {stats['fallbacks']} pasadas al respaldo, {stats['hedges']} repetidas. Latencia p95: {p95} segundos.", file=sys.stderr)
+	if args.metrics:
+		metrics.dump(args.metrics)
+	# Comparamos la latencia media de cada vía de envío
+	for transport, values in sorted(latencies.items()):
+		print(f"Latencia media ({transport}): {sum(values) / len(values):.2f} segundos en {len(values)} archivos.", file=sys.stderr)
+	if cancel.cancelled:
+		return 130
+	return 1 if errors else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
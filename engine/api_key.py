@@ -0,0 +1,53 @@
+"""
+Gestión de la API Key de Gemini, compartida por la interfaz gráfica y la línea de comandos.
+"""
+
+import os
+import json
+
+class ApiKeyManager:
+	"""
+	Clase para gestionar la API Key de Gemini
+	"""
+	# Archivo de la api_key en json.
+	API_FILE = "api.json"
+	
+	@staticmethod
+	def get_api_key():
+		"""
+		Obtiene la API key desde variables de entorno, si está configurada. si no, obtiene desde el archivo.
+		"""
+		# Intentamos obtener desde variable de entorno
+		api_key = os.getenv("API_GEMINI")
+		
+		# Si no existe en variables de entorno, intentar cargar desde archivo
+		if not api_key:
+			try:
+				# Verificamos existencia del archivo.
+				if os.path.exists(ApiKeyManager.API_FILE):
+					# Abrimos el archivo en modo lectura.
+					with open(ApiKeyManager.API_FILE, 'r') as f:
+						# Obtenemos el contenido con formato json.
+						api_data = json.load(f)
+						# Buscamos y obtenemos la api key
+						api_key = api_data.get('api_key')
+			except Exception as e:
+				print(f"Error al cargar API key desde archivo: {e}")
+		
+		return api_key
+	
+	@staticmethod
+	def save_api_key(api_key):
+		"""
+		Guarda la API key en un archivo
+		"""
+		try:
+			# Abrimos el archivo en modo escritura
+			with open(ApiKeyManager.API_FILE, 'w') as f:
+				# Escribimos el contenido con formato json.
+				json.dump({'api_key': api_key}, f)
+			# Retornamos True si todo salió bien.
+			return True
+		except Exception as e:
+			print(f"Error al guardar API key: {e}")
+			return False
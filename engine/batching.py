@@ -0,0 +1,285 @@
+"""
+Modo por lotes para imágenes: agrupa varias imágenes en una sola llamada a generate_content.
+Describir 200 fotos una por una son 200 solicitudes; agrupadas de a 10 son 20, con el mismo texto de instrucciones para todas.
+Cada lote respeta un presupuesto de imágenes, de tokens estimados y de bytes, y se pide a Gemini una respuesta JSON con una descripción por imagen.
+Si la respuesta no se puede interpretar, o falta la descripción de alguna imagen, esas imágenes se describen por separado.
+"""
+
+# Importaciones
+
+import re
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+
+from engine.hashing import file_sha256
+from engine.inline import load_inline_image
+from engine.describer import DescriptionResult, normalize_prompt
+
+# Presupuesto por defecto de cada lote
+BATCH_MAX_IMAGES = 10
+BATCH_MAX_TOKENS = 60000
+# Las solicitudes con datos incluidos no pueden superar 20 MB en total
+BATCH_MAX_BYTES = 16 * 1024 * 1024
+
+BATCH_PROMPT = (
+	"A continuación se envían {count} imágenes, cada una precedida por su número. "
+	"Describe cada imagen por separado siguiendo estas instrucciones:\n{prompt}\n\n"
+	"Responde únicamente con un arreglo JSON con un objeto por imagen, en el mismo orden, con la forma "
+	'[{{"index": 1, "description": "..."}}, ...]. No omitas ninguna imagen.'
+)
+
+def parse_batch_reply(text, count):
+	"""
+	Interpreta la respuesta JSON de un lote. Devuelve un diccionario {índice: descripción} con los índices de 1 a count que se pudieron leer.
+	"""
+	if not text:
+		return {}
+	# Quitamos el bloque de código que a veces rodea al JSON
+	text = text.strip()
+	match = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+	if match:
+		text = match.group(1).strip()
+	try:
+		data = json.loads(text)
+	except ValueError:
+		return {}
+	if isinstance(data, dict):
+		# Aceptamos también {"images": [...]} o {"1": "...", "2": "..."}
+		items = next((value for value in data.values() if isinstance(value, list)), None)
+		if items is None:
+			items = [{"index": key, "description": value} for key, value in data.items()]
+		data = items
+	if not isinstance(data, list):
+		return {}
+
+	descriptions = {}
+	for position, item in enumerate(data, 1):
+		if isinstance(item, str):
+			index, description = position, item
+		elif isinstance(item, dict):
+			try:
+				index = int(item.get("index", position))
+			except (TypeError, ValueError):
+				continue
+			description = item.get("description")
+		else:
+			continue
+		if 1 <= index <= count and isinstance(description, str) and description.strip():
+			descriptions[index] = description.strip()
+	return descriptions
+
+class _Item:
+	"""
+	Imagen dentro de un lote
+	"""
+
+	def __init__(self, path, data, mime_type, tokens, file_hash, fingerprint=None):
+		self.path = path
+		self.data = data
+		self.mime_type = mime_type
+		self.tokens = tokens
+		self.file_hash = file_hash
+		# Huella perceptual, para el índice de casi iguales
+		self.fingerprint = fingerprint
+
+class ImageBatcher:
+	"""
+	Agrupa imágenes en lotes dentro de un presupuesto y las describe con una llamada por lote
+	"""
+
+	def __init__(self, max_images=BATCH_MAX_IMAGES, max_tokens=BATCH_MAX_TOKENS, max_bytes=BATCH_MAX_BYTES):
+		"""
+		Inicialización del agrupador. Un lote se cierra al llegar a cualquiera de los tres límites.
+		"""
+		self.max_images = max(1, max_images)
+		self.max_tokens = max_tokens
+		self.max_bytes = max_bytes
+		# Contadores
+		self.lock = threading.Lock()
+		self.batches = 0
+		self.batched_images = 0
+		self.fallbacks = 0
+
+	def _prepare(self, engine, path, prompt):
+		"""
+		Lee la imagen y su estimación de tokens. Devuelve (item, None), (None, resultado_de_caché) o (None, None) si la imagen no cabe en un lote.
+		Una imagen casi igual a otra ya descrita devuelve también un resultado de caché, con la descripción de la otra.
+		"""
+		file_hash = None
+		# Los lotes se envían al modelo que elija el enrutador para imágenes, y con ese modelo se consulta la caché
+		model = engine.route_model("image")
+		if engine.cache is not None:
+			file_hash = file_sha256(path)
+			text = engine.cache.get(file_hash, prompt, model)
+			if text is not None:
+				return None, DescriptionResult(path, prompt, model, text=text, file_hash=file_hash, cached=True)
+
+		# En los lotes no se espera a las imágenes casi iguales que están en curso: podrían ir en el mismo lote
+		fingerprint = None
+		similar = engine.similar
+		if similar is not None:
+			fingerprint = similar.fingerprint(path)
+			match = similar.find(fingerprint, prompt, [model]) if fingerprint is not None else None
+			if match is not None:
+				engine.metrics.increment("calls_avoided")
+				return None, DescriptionResult(path, prompt, match.model, text=match.text, file_hash=file_hash, cached=True, extra={"near_duplicate": match.to_dict()})
+
+		inline = load_inline_image(path, min(engine.inline_max_bytes or self.max_bytes, self.max_bytes))
+		if inline is None:
+			return None, None
+		try:
+			tokens = engine.probe.probe(path).tokens or 0
+		except Exception:
+			tokens = 0
+		return _Item(path, inline[0], inline[1], tokens, file_hash, fingerprint), None
+
+	def pack(self, items):
+		"""
+		Reparte los elementos en lotes que respetan los tres límites, en el orden recibido
+		"""
+		batch = []
+		tokens = 0
+		size = 0
+		for item in items:
+			if batch and (len(batch) >= self.max_images or tokens + item.tokens > self.max_tokens or size + len(item.data) > self.max_bytes):
+				yield batch
+				batch, tokens, size = [], 0, 0
+			batch.append(item)
+			tokens += item.tokens
+			size += len(item.data)
+		if batch:
+			yield batch
+
+	def _describe_batch(self, engine, batch, prompt, cancel=None):
+		"""
+		Describe un lote con una sola llamada. Devuelve los resultados de las imágenes descritas y la lista de las que hay que describir por separado.
+		"""
+		start = time.perf_counter()
+		contents = [BATCH_PROMPT.format(count=len(batch), prompt=prompt)]
+		for index, item in enumerate(batch, 1):
+			contents.append(f"Imagen {index}:")
+			contents.append(engine.make_part(item.data, item.mime_type))
+
+		extra = {}
+		timings = {}
+		tokens = sum(item.tokens for item in batch) + len(contents[0]) // 4
+		usage = None
+		try:
+			# El lote pasa por el enrutador: si el modelo falla o está saturado, se prueba el siguiente
+			with engine.metrics.span("generate", timings):
+				text, _, usage = engine.generate(contents, config={"response_mime_type": "application/json"}, tokens=tokens, record=extra, cancel=cancel, models=engine.route_models("image", tokens))
+			descriptions = parse_batch_reply(text, len(batch))
+		except Exception as e:
+			# Un lote cancelado no se vuelve a enviar por separado: sus imágenes terminan con el error de cancelación
+			if cancel is not None and cancel.cancelled:
+				return [DescriptionResult(item.path, prompt, engine.model, error=str(e), elapsed=time.perf_counter() - start, file_hash=item.file_hash) for item in batch], []
+			descriptions = {}
+		elapsed = time.perf_counter() - start
+		if timings:
+			extra["timings"] = timings
+		model = extra["routing"]["model"] if "routing" in extra else engine.model
+
+		results = []
+		missing = []
+		similar = engine.similar
+		for index, item in enumerate(batch, 1):
+			text = descriptions.get(index)
+			if text is None:
+				missing.append(item.path)
+				continue
+			item_extra = dict(extra, transport="batch", batch_size=len(batch), batch_index=index)
+			if usage is not None:
+				item_extra["batch_usage"] = usage
+			results.append(DescriptionResult(item.path, prompt, model, text=text, elapsed=elapsed, file_hash=item.file_hash, extra=item_extra))
+			if engine.cache is not None and item.file_hash:
+				engine.cache.put(item.file_hash, prompt, model, text)
+			if similar is not None and item.fingerprint is not None:
+				similar.add(item.fingerprint, prompt, model, text, item.path)
+		with self.lock:
+			self.batches += 1
+			self.batched_images += len(results)
+		return results, missing
+
+	def run(self, engine, paths, prompt=None, cancel=None):
+		"""
+		Describe las imágenes de paths por lotes, con engine.workers lotes a la vez, y genera cada resultado.
+		Las imágenes que no caben en un lote o cuya descripción no se pudo separar se describen una por una.
+		Como mucho hay dos lotes por hilo leídos en memoria, para que miles de fotos no se carguen todas a la vez.
+		cancel es un CancelToken opcional: al cancelarlo no se envían más lotes ni imágenes sueltas, y cada imagen sin enviar termina con el error de cancelación.
+		"""
+		prompt = normalize_prompt(prompt)
+		singles = []
+		ready = []
+		# Imágenes que se quedaron sin enviar al cancelar
+		unsent = []
+
+		def cancelled():
+			return cancel is not None and cancel.cancelled
+
+		def items():
+			for path in paths:
+				# Después de cancelar ya no se leen más imágenes
+				if cancelled():
+					unsent.append(path)
+					continue
+				try:
+					item, cached = self._prepare(engine, path, prompt)
+				except Exception as e:
+					ready.append(DescriptionResult(path, prompt, engine.model, error=str(e)))
+					continue
+				if cached is not None:
+					ready.append(cached)
+				elif item is None:
+					singles.append(path)
+				else:
+					yield item
+
+		def drain():
+			# Entregamos los resultados de caché y los errores acumulados
+			while ready:
+				result = ready.pop(0)
+				engine.metrics.job_done(result)
+				yield result
+
+		def collect(future):
+			results, missing = future.result()
+			singles.extend(missing)
+			for result in results:
+				engine.metrics.job_done(result)
+				yield result
+
+		with ThreadPoolExecutor(max_workers=engine.workers) as executor:
+			futures = set()
+			for batch in self.pack(items()):
+				# Seguimos recorriendo los lotes sin enviarlos, para dar un resultado a cada imagen
+				if cancelled():
+					unsent.extend(item.path for item in batch)
+					continue
+				futures.add(executor.submit(self._describe_batch, engine, batch, prompt, cancel))
+				yield from drain()
+				while len(futures) >= engine.workers * 2:
+					done, futures = wait(futures, return_when=FIRST_COMPLETED)
+					for future in done:
+						yield from collect(future)
+			yield from drain()
+			for future in as_completed(futures):
+				yield from collect(future)
+
+		for path in unsent:
+			yield engine.cancelled_result(path, prompt, cancel)
+		# Lo que no se pudo agrupar va por el camino normal, una solicitud por imagen. Si se canceló, engine.run las entrega con el error de cancelación.
+		self.fallbacks += len(singles)
+		if singles:
+			yield from engine.run(singles, prompt, batch=False, cancel=cancel)
+
+	def stats(self):
+		"""
+		Devuelve un diccionario con los lotes enviados y las imágenes descritas por separado
+		"""
+		return {
+			"batches": self.batches,
+			"batched_images": self.batched_images,
+			"fallbacks": self.fallbacks,
+		}
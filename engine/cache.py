@@ -0,0 +1,165 @@
+"""
+Caché en disco de las respuestas de Gemini.
+Cada respuesta se identifica por el hash del contenido del archivo, el prompt normalizado y el modelo, así que repetir una misma consulta no vuelve a subir el archivo ni a llamar a la API.
+"""
+
+# Importaciones
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Carpeta y archivo por defecto de la caché
+CACHE_DIR = "cache"
+CACHE_FILE = "responses.sqlite3"
+
+# Tamaño máximo por defecto: 64 MB de respuestas
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+def normalize_cache_prompt(prompt):
+	"""
+	Normaliza el prompt para la clave de la caché: sin espacios sobrantes y sin distinguir mayúsculas
+	"""
+	return " ".join((prompt or "").split()).lower()
+
+def cache_key(file_hash, prompt, model):
+	"""
+	Construye la clave de la caché a partir del hash del archivo, el prompt y el modelo
+	"""
+	raw = "\0".join((file_hash, normalize_cache_prompt(prompt), model))
+	return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+	"""
+	Caché de respuestas respaldada por SQLite, con límite de tamaño, expiración opcional y contadores de aciertos y fallos.
+	Cuando se supera el límite se eliminan primero las respuestas usadas hace más tiempo.
+	"""
+
+	def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES, ttl=None):
+		"""
+		Inicialización de la caché. ttl es el tiempo de vida en segundos, o None para que las respuestas no expiren.
+		"""
+		if path is None:
+			path = os.path.join(CACHE_DIR, CACHE_FILE)
+		# Creamos la carpeta si no existe
+		folder = os.path.dirname(path)
+		if folder:
+			os.makedirs(folder, exist_ok=True)
+
+		self.path = path
+		self.max_bytes = max_bytes
+		self.ttl = ttl
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+		# La conexión se comparte entre hilos, protegida por un candado.
+		self.lock = threading.Lock()
+		self.connection = sqlite3.connect(path, check_same_thread=False)
+		self.connection.execute(
+			"CREATE TABLE IF NOT EXISTS responses ("
+			"key TEXT PRIMARY KEY, "
+			"response TEXT NOT NULL, "
+			"size INTEGER NOT NULL, "
+			"created REAL NOT NULL, "
+			"accessed REAL NOT NULL)"
+		)
+		self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+		self.connection.commit()
+
+	def get(self, file_hash, prompt, model):
+		"""
+		Devuelve la respuesta guardada, o None si no existe o ya expiró
+		"""
+		key = cache_key(file_hash, prompt, model)
+		now = time.time()
+		with self.lock:
+			row = self.connection.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+			if row is None:
+				self.misses += 1
+				return None
+
+			response, created = row
+			# Si la respuesta expiró, la eliminamos y la contamos como fallo.
+			if self.ttl is not None and now - created > self.ttl:
+				self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+				self.connection.commit()
+				self.misses += 1
+				return None
+
+			# Actualizamos la fecha de último uso para el orden LRU
+			self.connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+			self.connection.commit()
+			self.hits += 1
+			return response
+
+	def put(self, file_hash, prompt, model, response):
+		"""
+		Guarda una respuesta y elimina las menos usadas si se supera el tamaño máximo
+		"""
+		key = cache_key(file_hash, prompt, model)
+		size = len(response.encode('utf-8'))
+		now = time.time()
+		with self.lock:
+			self.connection.execute(
+				"INSERT OR REPLACE INTO responses (key, response, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+				(key, response, size, now, now)
+			)
+			self._evict()
+			self.connection.commit()
+
+	def _evict(self):
+		"""
+		Elimina respuestas expiradas y, después, las menos usadas hasta quedar dentro del límite
+		"""
+		if self.ttl is not None:
+			cursor = self.connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+			self.evictions += cursor.rowcount
+
+		total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+		if total <= self.max_bytes:
+			return
+
+		# Recorremos de la menos usada a la más usada hasta liberar lo necesario
+		to_delete = []
+		for key, size in self.connection.execute("SELECT key, size FROM responses ORDER BY accessed"):
+			if total <= self.max_bytes:
+				break
+			to_delete.append((key,))
+			total -= size
+		self.connection.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+		self.evictions += len(to_delete)
+
+	def clear(self):
+		"""
+		Elimina todas las respuestas guardadas
+		"""
+		with self.lock:
+			self.connection.execute("DELETE FROM responses")
+			self.connection.commit()
+
+	def stats(self):
+		"""
+		Devuelve un diccionario con los contadores y el tamaño actual de la caché
+		"""
+		with self.lock:
+			entries, size = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+		lookups = self.hits + self.misses
+		return {
+			"entries": entries,
+			"bytes": size,
+			"max_bytes": self.max_bytes,
+			"hits": self.hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"hit_rate": self.hits / lookups if lookups else 0.0,
+		}
+
+	def close(self):
+		"""
+		Cierra la conexión con la base de datos
+		"""
+		with self.lock:
+			self.connection.close()
@@ -0,0 +1,158 @@
+"""
+Cancelación de trabajos en curso.
+Un CancelToken se crea por envío y se pasa al motor. Al cancelarlo, el trabajo deja de esperar en cuanto llega a un punto de control: entre dos bloques de la subida, en la espera del procesamiento o en la generación.
+Las llamadas a Gemini que no se pueden interrumpir, como una subida de la biblioteca o una generación, se abandonan: siguen en un hilo aparte hasta terminar, su resultado se descarta y, si crearon un archivo remoto, se borra.
+Así el hilo del trabajo queda libre en un tiempo acotado, sin esperar a que termine la llamada abandonada.
+Un token con abandon=False no abandona las llamadas: las ejecuta en el mismo hilo y sólo se detiene en los puntos de control. Es el que usa el motor cuando nadie de fuera puede cancelar, para no crear un hilo por llamada.
+"""
+
+# Importaciones
+
+import time
+import threading
+from concurrent.futures import Future, CancelledError
+
+from engine.describer import DescriptionError
+
+class JobCancelled(DescriptionError):
+	"""
+	El trabajo se canceló antes de terminar
+	"""
+
+class CancelToken:
+	"""
+	Señal de cancelación compartida entre quien pide el trabajo y las etapas del motor
+	"""
+
+	def __init__(self, abandon=True):
+		"""
+		Inicialización del token. Con abandon=False, run ejecuta las llamadas en el hilo de quien llama en lugar de abandonarlas al cancelar.
+		"""
+		self.abandon = abandon
+		self.event = threading.Event()
+		self.lock = threading.Lock()
+		self.callbacks = {}
+		self.counter = 0
+		# Momento en que se pidió la cancelación, para medir cuánto tarda el trabajo en quedar libre
+		self.requested = None
+
+	@property
+	def cancelled(self):
+		"""
+		Indica si se pidió la cancelación
+		"""
+		return self.event.is_set()
+
+	def cancel(self):
+		"""
+		Pide la cancelación y avisa a quienes esperan. Se puede llamar desde cualquier hilo, también desde la interfaz.
+		"""
+		with self.lock:
+			if self.event.is_set():
+				return
+			self.requested = time.perf_counter()
+			self.event.set()
+			callbacks = list(self.callbacks.values())
+			self.callbacks = {}
+		for callback in callbacks:
+			try:
+				callback()
+			except Exception:
+				pass
+
+	def check(self):
+		"""
+		Lanza JobCancelled si se pidió la cancelación
+		"""
+		if self.event.is_set():
+			raise JobCancelled("Envío cancelado.")
+
+	def sleep(self, seconds):
+		"""
+		Espera los segundos indicados, o menos si se cancela; en ese caso lanza JobCancelled
+		"""
+		if self.event.wait(seconds):
+			self.check()
+
+	def on_cancel(self, callback):
+		"""
+		Registra callback para llamarlo al cancelar, o lo llama ya si se canceló. Devuelve una clave para quitarlo con remove.
+		"""
+		with self.lock:
+			if not self.event.is_set():
+				self.counter += 1
+				self.callbacks[self.counter] = callback
+				return self.counter
+		callback()
+		return None
+
+	def remove(self, key):
+		"""
+		Quita un callback registrado con on_cancel
+		"""
+		if key is not None:
+			with self.lock:
+				self.callbacks.pop(key, None)
+
+	def result(self, future):
+		"""
+		Espera el resultado de future. Si se cancela antes, cancela future, si todavía no empezó, y lanza JobCancelled.
+		"""
+		done = threading.Event()
+		future.add_done_callback(lambda finished: done.set())
+		key = self.on_cancel(done.set)
+		try:
+			done.wait()
+		finally:
+			self.remove(key)
+		if self.event.is_set():
+			future.cancel()
+			self.check()
+		try:
+			return future.result()
+		except CancelledError:
+			raise JobCancelled("Envío cancelado.")
+
+	def run(self, func, *args, cleanup=None, **kwargs):
+		"""
+		Ejecuta func(*args, **kwargs) en un hilo aparte y espera su resultado, salvo que se cancele antes.
+		Al cancelar se abandona la llamada: termina en segundo plano y, si tiene éxito, su resultado se pasa a cleanup para deshacer lo que haya creado.
+		Con abandon=False la llamada se ejecuta en este hilo hasta el final, y la cancelación se nota al volver.
+		"""
+		self.check()
+		if not self.abandon:
+			value = func(*args, **kwargs)
+			if self.event.is_set() and cleanup is not None:
+				future = Future()
+				future.set_result(value)
+				_cleanup(future, cleanup)
+			self.check()
+			return value
+		future = Future()
+
+		def target():
+			if not future.set_running_or_notify_cancel():
+				return
+			try:
+				future.set_result(func(*args, **kwargs))
+			except BaseException as e:
+				future.set_exception(e)
+
+		threading.Thread(target=target, name="gemini-call", daemon=True).start()
+		try:
+			return self.result(future)
+		except JobCancelled:
+			if cleanup is not None:
+				future.add_done_callback(lambda done: _cleanup(done, cleanup))
+			raise
+
+def _cleanup(future, cleanup):
+	"""
+	Pasa a cleanup el resultado de una llamada abandonada, si terminó bien
+	"""
+	if future.cancelled() or future.exception() is not None:
+		return
+	try:
+		cleanup(future.result())
+	except Exception:
+		pass
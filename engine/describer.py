@@ -0,0 +1,892 @@
+"""
+Motor sin interfaz gráfica para describir archivos con Gemini.
+Contiene el flujo de subida, espera del procesamiento y generación de contenido que antes vivía en la interfaz, para poder usarlo desde la GUI, la línea de comandos o como biblioteca.
+El cliente se recibe desde fuera, de modo que puede sustituirse por uno falso para pruebas.
+"""
+
+# Importaciones
+
+import os
+import time
+import json
+import queue
+import threading
+import itertools
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from engine.hashing import file_sha256
+from engine.poller import ProcessingPoller
+from engine.inline import INLINE_MAX_BYTES, load_inline_image, make_inline_part
+from engine.probe import MediaProbe
+from engine.metrics import Metrics
+from engine.upload import upload_display_name
+
+# Extensiones admitidas por el programa
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi")
+IMAGE_EXTENSIONS = (".png", ".jpg")
+MEDIA_EXTENSIONS = VIDEO_EXTENSIONS + IMAGE_EXTENSIONS
+
+# Valores por defecto
+DEFAULT_PROMPT = "Describe en detalle lo que se muestra en este archivo en español."
+DEFAULT_MODEL = "gemini-2.0-flash-exp"
+
+class DescriptionError(Exception):
+	"""
+	Error controlado durante la descripción de un archivo
+	"""
+
+def create_client(api_key):
+	"""
+	Crea un cliente de Gemini con la API key indicada
+	"""
+	# Importamos aquí para no cargar la biblioteca hasta que realmente se necesite.
+	from google import genai
+	return genai.Client(api_key=api_key)
+
+def usage_counts(usage_metadata):
+	"""
+	Devuelve los tokens de entrada, de salida y totales de una respuesta como diccionario, o None si la respuesta no los incluye
+	"""
+	if usage_metadata is None:
+		return None
+	return {
+		"prompt_tokens": getattr(usage_metadata, "prompt_token_count", None),
+		"output_tokens": getattr(usage_metadata, "candidates_token_count", None),
+		"total_tokens": getattr(usage_metadata, "total_token_count", None),
+		# Tokens leídos de una caché de contexto, facturados a menor precio
+		"cached_tokens": getattr(usage_metadata, "cached_content_token_count", None),
+	}
+
+def normalize_prompt(prompt):
+	"""
+	Devuelve el prompt sin espacios sobrantes, o el prompt por defecto si está vacío
+	"""
+	prompt = (prompt or "").strip()
+	return prompt if prompt else DEFAULT_PROMPT
+
+def is_media_file(path):
+	"""
+	Indica si la ruta tiene una extensión admitida
+	"""
+	return os.path.splitext(path)[1].lower() in MEDIA_EXTENSIONS
+
+def media_kind(path):
+	"""
+	Devuelve "image" o "video" según la extensión del archivo
+	"""
+	return "image" if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS else "video"
+
+def collect_media_files(sources):
+	"""
+	Genera las rutas de los archivos multimedia a partir de una carpeta, un archivo o una lista de ambos.
+	Las carpetas se recorren de forma recursiva y en orden alfabético.
+	"""
+	# Permitimos recibir una sola ruta
+	if isinstance(sources, (str, os.PathLike)):
+		sources = [sources]
+
+	for source in sources:
+		source = os.fspath(source)
+		if os.path.isdir(source):
+			for root, dirs, files in os.walk(source):
+				# Ordenamos para que el recorrido sea reproducible
+				dirs.sort()
+				for name in sorted(files):
+					if is_media_file(name):
+						yield os.path.join(root, name)
+		elif is_media_file(source):
+			yield source
+
+class DescriptionResult:
+	"""
+	Resultado de la descripción de un archivo
+	"""
+
+	def __init__(self, path, prompt, model, text=None, error=None, elapsed=0.0, file_hash=None, cached=False, ttft=None, extra=None):
+		self.path = path
+		self.prompt = prompt
+		self.model = model
+		self.text = text
+		self.error = error
+		self.elapsed = elapsed
+		self.file_hash = file_hash
+		self.cached = cached
+		# Tiempo hasta el primer fragmento de la respuesta, sólo en modo de transmisión
+		self.ttft = ttft
+		# Datos adicionales de las etapas opcionales, por ejemplo la compresión
+		self.extra = extra or {}
+
+	@property
+	def ok(self):
+		"""
+		Indica si la descripción terminó sin errores
+		"""
+		return self.error is None
+
+	def to_dict(self):
+		"""
+		Devuelve el resultado como diccionario
+		"""
+		data = {
+			"path": self.path,
+			"status": "ok" if self.ok else "error",
+			"model": self.model,
+			"prompt": self.prompt,
+			"text": self.text,
+			"error": self.error,
+			"elapsed": round(self.elapsed, 3),
+			"sha256": self.file_hash,
+			"cached": self.cached,
+			"ttft": round(self.ttft, 3) if self.ttft is not None else None,
+		}
+		data.update(self.extra)
+		return data
+
+	def to_json(self):
+		"""
+		Devuelve el resultado como una línea JSON
+		"""
+		return json.dumps(self.to_dict(), ensure_ascii=False)
+
+class _Job:
+	"""
+	Estado de un archivo mientras atraviesa las etapas del motor
+	"""
+
+	def __init__(self, path, prompt, progress=None, on_chunk=None, prefetched=None, cancel=None):
+		self.path = path
+		self.prompt = normalize_prompt(prompt)
+		# Si no se indica una función de progreso, usamos una que no hace nada.
+		report = progress or (lambda value, message: None)
+		# CancelToken del trabajo, si se puede cancelar
+		self.cancel = cancel
+		if cancel is not None:
+			def checked(value, message):
+				# Cada aviso de progreso es también un punto de control de la cancelación
+				cancel.check()
+				report(value, message)
+			self.report = checked
+		else:
+			self.report = report
+		self.on_chunk = on_chunk
+		# Subida anticipada del archivo a la que se engancha el trabajo, si la hay
+		self.prefetched = prefetched
+		self.start = time.perf_counter()
+		self.file_hash = None
+		self.media_file = None
+		# Nombre del archivo remoto que el trabajo tiene en uso en el ciclo de vida
+		self.remote_name = None
+		# Si el archivo remoto lo subió este trabajo, o su subida anticipada: al cancelar se borra
+		self.uploaded = False
+		# Modelos a probar en orden, elegidos por el enrutador, y modelo que respondió o del que vino la respuesta en caché
+		self.models = None
+		self.model = None
+		# Índice de casi iguales con el que empezó el trabajo, huella perceptual del archivo y si el trabajo la tiene reservada en el índice
+		self.similar = None
+		self.fingerprint = None
+		self.reserved = False
+		# Future de otro trabajo que describe un archivo casi igual, a cuyo final hay que esperar
+		self.leader = None
+		self.inline_part = None
+		self.extra = {}
+		# Duración de cada etapa, sólo con las métricas activadas
+		self.timings = {}
+
+	def result(self, model, **kwargs):
+		"""
+		Crea el DescriptionResult del trabajo
+		"""
+		if self.timings:
+			self.extra["timings"] = self.timings
+		return DescriptionResult(self.path, self.prompt, self.model or model, elapsed=time.perf_counter() - self.start, file_hash=self.file_hash, extra=self.extra, **kwargs)
+
+class DescriptionEngine:
+	"""
+	Motor que sube archivos a Gemini, espera a que estén procesados y genera su descripción.
+	Puede procesar un archivo a la vez o muchos en paralelo con un número limitado de hilos.
+	"""
+
+	def __init__(self, client, model=DEFAULT_MODEL, workers=4, cache=None, registry=None, poller=None, max_in_flight=None, preprocessor=None, inline_max_bytes=INLINE_MAX_BYTES, segmenter=None, uploader=None, scheduler=None, probe=None, metrics=None, batcher=None, lifecycle=None, router=None, similar=None):
+		"""
+		Inicialización del motor.
+		cache es una ResponseCache opcional para no repetir consultas ya respondidas, y registry un UploadRegistry opcional para reutilizar archivos ya subidos.
+		preprocessor es un VideoCompressor opcional que reduce los videos antes de subirlos.
+		Las imágenes de hasta inline_max_bytes, una vez reducidas, se envían dentro de la solicitud en lugar de subirse. Con 0 se usa siempre la API de archivos.
+		uploader es un ResumableUploader opcional que sube por bloques, reanuda subidas interrumpidas e informa del progreso en bytes.
+		segmenter es un VideoSegmenter opcional que describe los videos largos por fragmentos en paralelo.
+		scheduler es un RequestScheduler opcional que mantiene las subidas y las generaciones dentro de las cuotas de solicitudes y tokens por minuto, y reintenta los errores temporales.
+		probe es el MediaProbe con el que se estiman los tokens de cada archivo para el planificador.
+		batcher es un ImageBatcher opcional: en los lotes, las imágenes se agrupan de a varias por solicitud.
+		lifecycle es un FileLifecycle opcional que borra del servidor los archivos subidos cuando su trabajo termina, salvo los fijados.
+		router es un ModelRouter opcional que elige el modelo de cada archivo, pasa a otro si falla y duplica las solicitudes lentas. Sin él se usa siempre model.
+		similar es un SimilarityIndex opcional: los archivos casi iguales a uno ya descrito con el mismo prompt reutilizan su descripción sin llamar a la API.
+		Se puede cambiar o quitar con el motor en uso: cada trabajo sigue con el índice que tenía al empezar.
+		metrics es un Metrics opcional que mide la duración de cada etapa y cuenta trabajos, errores y tokens.
+		max_in_flight limita los archivos en curso a la vez, incluidos los que esperan a que Gemini termine de procesarlos.
+		"""
+		self.client = client
+		self.model = model
+		self.workers = max(1, int(workers))
+		self.cache = cache
+		self.registry = registry
+		self.preprocessor = preprocessor
+		self.inline_max_bytes = inline_max_bytes
+		self.segmenter = segmenter
+		self.uploader = uploader
+		self.scheduler = scheduler
+		self.probe = probe or MediaProbe()
+		self.metrics = metrics or Metrics(enabled=False)
+		self.batcher = batcher
+		self.lifecycle = lifecycle
+		self.router = router
+		self.similar = similar
+		# Función que convierte los bytes de una imagen en una parte de contenido
+		self.make_part = make_inline_part
+		# Un solo poller sigue el procesamiento de todos los archivos pendientes
+		# Las consultas del procesamiento reintentan los errores temporales igual que el planificador, o ninguno sin planificador
+		self.poller = poller if poller is not None else ProcessingPoller(client, metrics=self.metrics, max_retries=scheduler.max_retries if scheduler is not None else 0)
+		self.max_in_flight = max_in_flight or self.workers * 4
+
+	def describe(self, path, prompt=None, progress=None, on_chunk=None, split=True, prefetched=None, cancel=None):
+		"""
+		Describe un archivo y devuelve un DescriptionResult.
+		progress, si se indica, recibe (valor, mensaje) en cada etapa. Los errores se lanzan como excepciones.
+		on_chunk, si se indica, activa el modo de transmisión y recibe cada fragmento de texto en cuanto llega.
+		Con split=False no se divide el video aunque sea largo; lo usa el propio divisor para describir cada fragmento.
+		prefetched es un PrefetchedFile opcional: si corresponde al mismo archivo y a la misma compresión, se usa su subida en lugar de subir de nuevo.
+		cancel es un CancelToken opcional. Al cancelarlo, describe lanza JobCancelled en cuanto el trabajo llega a un punto de control y borra el archivo que haya subido.
+		"""
+		if prefetched is not None and not prefetched.usable(path, self.preprocessor):
+			prefetched = None
+		job = _Job(path, prompt, progress, on_chunk, prefetched, cancel)
+		try:
+			result = self._describe(job, split)
+		except Exception as e:
+			self._observe_cancel(job)
+			self.metrics.job_done(job.result(self.model, error=str(e)))
+			raise
+		finally:
+			self._release(job)
+		self.metrics.job_done(result)
+		return result
+
+	def _describe(self, job, split):
+		"""
+		Recorre todas las etapas de un trabajo en el hilo actual
+		"""
+		if split and self._should_split(job):
+			return self._describe_segments(job)
+
+		result = self._prepare(job)
+		while job.leader is not None:
+			# Otro trabajo describe un archivo casi igual: esperamos a que termine y volvemos a buscar
+			leader, job.leader = job.leader, None
+			self._wait(job, leader)
+			result = self._prepare(job)
+		if result is not None:
+			return result
+
+		# Esperamos a que Gemini termine de procesar el archivo
+		if self._is_processing(job):
+			job.media_file = self._wait(job, self._watch(job))
+
+		return self._finish(job)
+
+	def _should_split(self, job):
+		"""
+		Indica si el trabajo es un video largo que se debe describir por fragmentos
+		"""
+		return self.segmenter is not None and self.segmenter.should_split(job.path)
+
+	def _describe_segments(self, job):
+		"""
+		Describe un video largo por fragmentos. La respuesta se guarda en caché aparte de la de una sola llamada.
+		"""
+		job.file_hash = file_sha256(job.path)
+		cache_model = self.segmenter.cache_model(self.model)
+		if self.cache is not None:
+			text = self.cache.get(job.file_hash, job.prompt, cache_model)
+			if text is not None:
+				job.report(100, "Respuesta obtenida de la caché.")
+				return job.result(self.model, text=text, cached=True)
+
+		text, extra = self.segmenter.describe(self, job.path, job.prompt, job.report, job.file_hash, job.cancel)
+		job.extra.update(extra)
+
+		if self.cache is not None and text:
+			self.cache.put(job.file_hash, job.prompt, cache_model, text)
+
+		job.report(100, "Respuesta generada correctamente.")
+		return job.result(self.model, text=text)
+
+	def _prepare(self, job):
+		"""
+		Primera etapa: calcula el hash, consulta la caché y sube el archivo.
+		Devuelve el resultado si la caché ya tenía la respuesta, o None si hay que seguir con las demás etapas.
+		"""
+		# El hash del contenido identifica el archivo en la caché, en el registro de subidas y en la compresión
+		if job.prefetched is not None:
+			# La subida anticipada ya calculó el hash, o lo está terminando
+			job.file_hash = job.prefetched.wait_hash()
+		if job.file_hash is None and (self.cache is not None or self.registry is not None or self.preprocessor is not None):
+			with self.metrics.span("hash", job.timings):
+				job.file_hash = file_sha256(job.path)
+
+		# Consultamos la caché antes de tocar la red, una sola vez y con el modelo que elige el enrutador para este archivo
+		job.models = self._route(job)
+		model = job.models[0] if job.models else self.model
+		if self.cache is not None:
+			job.report(5, "Buscando respuesta en caché...")
+			with self.metrics.span("cache", job.timings):
+				text = self.cache.get(job.file_hash, job.prompt, model)
+			if text is not None:
+				job.model = model
+				job.report(100, "Respuesta obtenida de la caché.")
+				return job.result(self.model, text=text, cached=True)
+
+		# Un archivo casi igual a otro ya descrito reutiliza su descripción
+		job.similar = self.similar
+		if job.similar is not None:
+			result = self._near_duplicate(job)
+			if result is not None or job.leader is not None:
+				return result
+
+		# Las imágenes pequeñas van dentro de la solicitud, sin subida ni procesamiento
+		if self.inline_max_bytes and os.path.splitext(job.path)[1].lower() in IMAGE_EXTENSIONS:
+			with self.metrics.span("inline", job.timings):
+				inline = load_inline_image(job.path, self.inline_max_bytes)
+			if inline is not None:
+				job.inline_part = self.make_part(*inline)
+				job.extra["transport"] = "inline"
+				return None
+
+		job.extra["transport"] = "files_api"
+		job.media_file = self._upload(job)
+		return None
+
+	def _near_duplicate(self, job):
+		"""
+		Busca en el índice de casi iguales. Devuelve el resultado si hay una descripción reutilizable.
+		Si otro trabajo está describiendo un archivo casi igual, deja su Future en job.leader y devuelve None; si no, el trabajo reserva su huella y sigue.
+		"""
+		job.report(6, "Buscando archivos casi iguales...")
+		if job.fingerprint is None:
+			with self.metrics.span("fingerprint", job.timings):
+				job.fingerprint = job.similar.fingerprint(job.path)
+			if job.fingerprint is None:
+				return None
+		match, job.leader = job.similar.reserve(job.fingerprint, job.prompt, [job.models[0] if job.models else self.model])
+		if match is None:
+			job.reserved = job.leader is None
+			return None
+		self.metrics.increment("calls_avoided")
+		job.model = match.model
+		job.extra["near_duplicate"] = match.to_dict()
+		job.report(100, "Descripción reutilizada de un archivo casi igual.")
+		return job.result(self.model, text=match.text, cached=True)
+
+	def _is_processing(self, job):
+		"""
+		Indica si el archivo del trabajo sigue en procesamiento en Gemini
+		"""
+		return job.media_file is not None and job.media_file.state.name == "PROCESSING"
+
+	def _watch(self, job):
+		"""
+		Segunda etapa: entrega el archivo al poller y devuelve un Future con su estado final
+		"""
+		def on_update(attempts, media_file):
+			# Incrementamos progreso de 40% a 70% durante el procesamiento
+			job.report(min(40 + attempts * 5, 70), "Procesando archivo en Gemini...")
+
+		size_bytes = getattr(job.media_file, "size_bytes", None)
+		future = self.poller.watch(job.media_file, size_bytes=size_bytes, on_update=on_update, record=job.timings)
+		if self.metrics.enabled:
+			# Medimos la espera completa del procesamiento, además de cada consulta
+			start = time.perf_counter()
+			future.add_done_callback(lambda done: self.metrics.observe("processing", time.perf_counter() - start, job.timings))
+		return future
+
+	def _wait(self, job, future):
+		"""
+		Espera el final del procesamiento. Si el trabajo se cancela, el archivo deja de consultarse y se lanza JobCancelled.
+		"""
+		if job.cancel is None:
+			return future.result()
+		return job.cancel.result(future)
+
+	def _finish(self, job):
+		"""
+		Última etapa: comprueba el estado final del archivo, genera la respuesta y la guarda en caché
+		"""
+		media_file = job.media_file
+		if media_file is not None:
+			# Si el procesamiento del archivo falló, lo indicamos con un error.
+			if media_file.state.name == "FAILED":
+				if self.registry is not None and job.file_hash:
+					self.registry.forget(job.file_hash)
+				raise DescriptionError("Error al procesar el archivo en Gemini.")
+
+			# Guardamos el estado final para reutilizar el archivo en próximas consultas
+			if self.registry is not None and job.file_hash:
+				self.registry.record(job.file_hash, media_file)
+
+			# Actualizamos progreso: 70%
+			job.report(70, "Archivo procesado. Generando respuesta...")
+			contents = [media_file, job.prompt]
+		else:
+			job.report(70, "Imagen enviada directamente. Generando respuesta...")
+			contents = [job.inline_part, job.prompt]
+
+		# Creamos la solicitud a Gemini, con el modelo que elija el enrutador si lo hay
+		tokens = self._estimate_tokens(job)
+		with self.metrics.span("generate", job.timings):
+			text, ttft, usage = self.generate(contents, job.on_chunk, tokens=tokens, record=job.extra, progress=job.report, cancel=job.cancel, models=job.models)
+		if usage is not None:
+			job.extra["usage"] = usage
+		if "routing" in job.extra:
+			job.model = job.extra["routing"]["model"]
+
+		# Guardamos la respuesta para próximas consultas
+		if self.cache is not None and text:
+			self.cache.put(job.file_hash, job.prompt, job.model or self.model, text)
+		if job.reserved and text:
+			job.reserved = False
+			job.similar.add(job.fingerprint, job.prompt, job.model or self.model, text, job.path)
+
+		# Actualizamos progreso: 100%
+		job.report(100, "Respuesta generada correctamente.")
+		return job.result(self.model, text=text, ttft=ttft)
+
+	def generate(self, contents, on_chunk=None, config=None, tokens=0, record=None, progress=None, cancel=None, models=None):
+		"""
+		Genera la respuesta a contents. Devuelve el texto, el tiempo hasta el primer fragmento (sólo en modo de transmisión) y el uso de tokens.
+		on_chunk, si se indica, activa el modo de transmisión y recibe cada fragmento de texto en cuanto llega.
+		config se pasa tal cual a Gemini, por ejemplo para usar una caché de contexto.
+		cancel es un CancelToken opcional: al cancelarlo, la generación se abandona y no se entregan más fragmentos.
+		models es la lista de modelos a probar en orden, elegida por el enrutador; sin ella se usa el modelo del motor. El modelo que respondió queda en record["routing"].
+		"""
+		if on_chunk is None:
+			def attempt(model, retries):
+				return self.request(self.client.models.generate_content, model=model, contents=contents, config=config, tokens=tokens, record=record, cancel=cancel, retries=retries)
+			response = self._call_models(models, attempt, False, cancel, record)
+			return response.text, None, usage_counts(getattr(response, "usage_metadata", None))
+		if cancel is not None:
+			# La transmisión se lee en un hilo aparte, que deja de leerla en el próximo fragmento si se cancela
+			return cancel.run(self._generate_stream, contents, on_chunk, config, tokens, record, progress, cancel, models)
+		return self._generate_stream(contents, on_chunk, config, tokens, record, progress, None, models)
+
+	def _call_models(self, models, attempt, streaming, cancel, record):
+		"""
+		Llama a attempt(modelo, reintentos) con el modelo del motor o, con un enrutador, con los modelos indicados hasta que uno responda
+		"""
+		if self.router is None or not models:
+			return attempt(self.model, None)
+		return self.router.call(models, attempt, streaming, cancel, record)[1]
+
+	def _generate_stream(self, contents, on_chunk, config, tokens, record, progress, cancel=None, models=None):
+		"""
+		Genera la respuesta en modo de transmisión y entrega cada fragmento a on_chunk
+		"""
+		pieces = []
+		ttft = None
+		start = time.perf_counter()
+
+		def attempt(model, retries):
+			# La solicitud se envía al pedir el primer fragmento, no al crear la transmisión: el planificador debe cubrir esa lectura para reintentar los 429 y 5xx
+			return self.request(self._open_stream, model, contents, config, tokens=tokens, record=record, cancel=cancel, retries=retries)
+
+		# Hasta el primer fragmento con texto puede reintentarse, pasarse a otro modelo o duplicarse la solicitud; un corte a mitad de la respuesta no se reintenta
+		stream, usage = self._call_models(models, attempt, True, cancel, record)
+		for chunk in stream:
+			if cancel is not None:
+				cancel.check()
+			# El uso de tokens llega con los fragmentos; el último tiene los totales
+			usage = usage_counts(getattr(chunk, "usage_metadata", None)) or usage
+			piece = chunk.text
+			if not piece:
+				continue
+			if ttft is None:
+				ttft = time.perf_counter() - start
+				if progress is not None:
+					progress(75, f"Recibiendo respuesta. Primer fragmento en {ttft:.2f} segundos.")
+			pieces.append(piece)
+			on_chunk(piece)
+		return "".join(pieces), ttft, usage
+
+	def _open_stream(self, model, contents, config):
+		"""
+		Abre la transmisión y lee hasta el primer fragmento con texto. Devuelve la transmisión completa, con ese fragmento al principio, y el uso de tokens leído hasta ahí.
+		"""
+		stream = iter(self.client.models.generate_content_stream(model=model, contents=contents, config=config))
+		usage = None
+		read = []
+		for chunk in stream:
+			usage = usage_counts(getattr(chunk, "usage_metadata", None)) or usage
+			read.append(chunk)
+			if chunk.text:
+				break
+		return itertools.chain(read, stream), usage
+
+	def remote_file(self, path, progress=None, file_hash=None, cancel=None):
+		"""
+		Sube el archivo, o reutiliza el ya subido, y espera a que Gemini termine de procesarlo.
+		Devuelve el archivo remoto listo para usar y el hash del contenido, si se calculó.
+		Con un ciclo de vida, el archivo queda en uso hasta que quien lo pidió llame a lifecycle.release con su nombre.
+		file_hash, si se indica, evita volver a calcular el hash. cancel es un CancelToken opcional.
+		"""
+		job = _Job(path, None, progress, cancel=cancel)
+		job.file_hash = file_hash
+		if job.file_hash is None and (self.cache is not None or self.registry is not None or self.preprocessor is not None):
+			with self.metrics.span("hash", job.timings):
+				job.file_hash = file_sha256(path)
+		try:
+			job.media_file = self._upload(job)
+			if self._is_processing(job):
+				job.media_file = self._wait(job, self._watch(job))
+			if job.media_file.state.name == "FAILED":
+				if self.registry is not None and job.file_hash:
+					self.registry.forget(job.file_hash)
+				raise DescriptionError("Error al procesar el archivo en Gemini.")
+		except Exception:
+			self._release(job)
+			raise
+		if self.registry is not None and job.file_hash:
+			self.registry.record(job.file_hash, job.media_file)
+		return job.media_file, job.file_hash
+
+	def _upload(self, job):
+		"""
+		Devuelve el archivo remoto del trabajo, reutilizando la subida anticipada o uno ya subido si el registro lo conoce y sigue siendo válido
+		"""
+		if job.prefetched is not None:
+			try:
+				with self.metrics.span("prefetch_wait", job.timings):
+					media_file = job.prefetched.claim(job.report, job.cancel)
+			except Exception:
+				# Si la subida anticipada falló, subimos por el camino normal, salvo que se haya cancelado el envío
+				if job.cancel is not None:
+					job.cancel.check()
+				media_file = None
+			job.extra["prefetch"] = job.prefetched.stats()
+			if media_file is not None:
+				# El trabajo se queda con la referencia del ciclo de vida que tenía la subida anticipada
+				job.uploaded = True
+				if self.lifecycle is not None:
+					job.remote_name = media_file.name
+				job.report(40, "Archivo subido al seleccionarlo. Procesando...")
+				return media_file
+
+		if self.registry is not None and job.file_hash:
+			with self.metrics.span("registry", job.timings):
+				media_file = self.registry.resolve(self.client, job.file_hash, partial(self.request, self.client.files.get, record=job.extra, cancel=job.cancel))
+			# Un archivo que el ciclo de vida está borrando no se reutiliza
+			if media_file is not None and self._track(job, media_file):
+				job.report(40, "Reutilizando archivo ya subido...")
+				return media_file
+
+		# Comprimimos el video si corresponde, y subimos el resultado en lugar del original
+		upload_path = job.path
+		if self.preprocessor is not None:
+			job.report(8, "Comprimiendo video...")
+			with self.metrics.span("preprocess", job.timings):
+				prepared = self.preprocessor.prepare(job.path, job.file_hash)
+			job.extra["preprocess"] = prepared.to_dict()
+			upload_path = prepared.path
+
+		# Actualizamos progreso: 10%
+		job.report(10, "Subiendo archivo...")
+
+		# Subimos el archivo
+		def on_bytes(sent, total):
+			# El progreso de 10% a 40% corresponde a los bytes realmente enviados
+			percent = sent / total if total else 1
+			job.report(10 + int(percent * 30), f"Subiendo archivo... {percent:.0%}")
+
+		# Si se cancela, la subida se corta en el próximo bloque o, con la biblioteca de Gemini, se abandona; el archivo que llegue a crearse se borra
+		with self.metrics.span("upload", job.timings):
+			if self.uploader is not None:
+				resource = self.request(self.uploader.upload, upload_path, display_name=upload_display_name(job.path), progress=on_bytes, record=job.extra, cancel=job.cancel, cleanup=lambda created: self._discard_remote(created["name"]))
+				media_file = self.client.files.get(name=resource["name"])
+			else:
+				media_file = self.request(self.client.files.upload, file=upload_path, config={"display_name": upload_display_name(job.path)}, record=job.extra, cancel=job.cancel, cleanup=lambda created: self._discard_remote(created.name))
+		job.uploaded = True
+		self._track(job, media_file)
+		if self.registry is not None and job.file_hash:
+			self.registry.record(job.file_hash, media_file)
+
+		# Actualizamos progreso: 40%
+		job.report(40, "Archivo subido. Procesando...")
+		return media_file
+
+	def _track(self, job, media_file):
+		"""
+		Registra en el ciclo de vida que el trabajo usa el archivo remoto. Devuelve False si el archivo se está borrando.
+		"""
+		if self.lifecycle is not None:
+			if not self.lifecycle.track(media_file, job.file_hash, job.path):
+				return False
+			job.remote_name = media_file.name
+		return True
+
+	def _release(self, job):
+		"""
+		Indica al ciclo de vida que el trabajo terminó con su archivo remoto, para que se borre si nadie más lo usa.
+		Si el trabajo se canceló, el archivo que subió se borra aunque esté fijado.
+		También libera la reserva de su huella si no llegó a guardar una descripción, para que los casi iguales que esperaban sigan por su cuenta.
+		"""
+		if job.reserved:
+			job.reserved = False
+			job.similar.abandon(job.fingerprint)
+		cancelled = job.cancel is not None and job.cancel.cancelled and job.uploaded
+		if job.remote_name is not None:
+			name, job.remote_name = job.remote_name, None
+			if cancelled:
+				self.lifecycle.discard(name)
+			else:
+				self.lifecycle.release(name)
+		elif cancelled and self.lifecycle is None and job.media_file is not None:
+			self._discard_remote(job.media_file.name)
+
+	def _discard_remote(self, name):
+		"""
+		Borra en segundo plano un archivo remoto que subió un trabajo cancelado
+		"""
+		if self.lifecycle is not None:
+			self.lifecycle.delete([name])
+			return
+		if self.registry is not None:
+			self.registry.forget_name(name)
+		# Sin ciclo de vida lo borramos en un hilo aparte, para no retrasar el final del trabajo
+		threading.Thread(target=self._delete_quietly, args=(name,), name="gemini-delete", daemon=True).start()
+
+	def _delete_quietly(self, name):
+		try:
+			self.request(self.client.files.delete, name=name)
+		except Exception:
+			# Si no se pudo borrar, Gemini lo elimina a las 48 horas
+			pass
+
+	def _observe_cancel(self, job):
+		"""
+		Si el trabajo se canceló, mide el tiempo desde la cancelación hasta que el trabajo quedó libre
+		"""
+		if job.cancel is not None and job.cancel.requested is not None:
+			self.metrics.observe("cancel_to_idle", time.perf_counter() - job.cancel.requested, job.timings)
+			self.metrics.increment("cancelled")
+
+	def request(self, func, *args, tokens=0, record=None, cancel=None, cleanup=None, retries=None, **kwargs):
+		"""
+		Ejecuta una llamada a Gemini a través del planificador, si lo hay.
+		cancel es un CancelToken opcional: al cancelarlo se deja de esperar turno y la llamada en curso se abandona.
+		cleanup, si se indica, recibe el resultado de la llamada abandonada si termina bien, para borrar lo que haya creado.
+		retries, si se indica, limita los reintentos del planificador en esta llamada.
+		"""
+		if self.scheduler is None:
+			call = partial(func, *args, **kwargs)
+		else:
+			call = partial(self.scheduler.call, func, *args, tokens=tokens, record=record, cancel=cancel, retries=retries, **kwargs)
+		if cancel is None:
+			return call()
+		return cancel.run(call, cleanup=cleanup)
+
+	def _route(self, job):
+		"""
+		Devuelve los modelos a probar para el trabajo según su tipo y sus tokens estimados, o None sin enrutador
+		"""
+		if self.router is None:
+			return None
+		try:
+			tokens = self.probe.probe(job.path).tokens
+		except Exception:
+			tokens = None
+		return self.route_models(media_kind(job.path), tokens, job.on_chunk is not None)
+
+	def route_models(self, kind, tokens=None, streaming=False):
+		"""
+		Devuelve los modelos a probar en orden para una solicitud de tipo kind ("image", "video" o "text"), o None sin enrutador.
+		Lo usan también los lotes, las sesiones y la unión de fragmentos, para pasar por el mismo enrutador que las descripciones sueltas.
+		"""
+		if self.router is None:
+			return None
+		return self.router.route(kind, tokens, streaming)
+
+	def route_model(self, kind, tokens=None):
+		"""
+		Devuelve el primer modelo que elegiría el enrutador, o el del motor sin enrutador: es el modelo con que se consulta la caché
+		"""
+		models = self.route_models(kind, tokens)
+		return models[0] if models else self.model
+
+	def _estimate_tokens(self, job):
+		"""
+		Estima los tokens de entrada de la generación del trabajo: los del archivo más unos 4 caracteres por token del prompt
+		"""
+		if self.scheduler is None or self.scheduler.tokens is None:
+			return 0
+		try:
+			with self.metrics.span("probe", job.timings):
+				tokens = self.probe.probe(job.path).tokens or 0
+		except Exception:
+			tokens = 0
+		return tokens + len(job.prompt) // 4
+
+	def describe_result(self, path, prompt=None):
+		"""
+		Describe un archivo y devuelve un DescriptionResult, sin lanzar excepciones
+		"""
+		prompt = normalize_prompt(prompt)
+		start = time.perf_counter()
+		try:
+			return self.describe(path, prompt)
+		except Exception as e:
+			return DescriptionResult(path, prompt, self.model, error=str(e), elapsed=time.perf_counter() - start)
+
+	def cancelled_result(self, path, prompt, cancel):
+		"""
+		Devuelve el resultado de un archivo que no llegó a empezar porque se canceló el lote, con el error de cancelación de cancel
+		"""
+		try:
+			cancel.check()
+		except Exception as e:
+			error = str(e)
+		else:
+			error = "Envío cancelado."
+		result = DescriptionResult(path, normalize_prompt(prompt), self.model, error=error)
+		self.metrics.job_done(result)
+		return result
+
+	def run(self, sources, prompt=None, batch=True, cancel=None):
+		"""
+		Describe todos los archivos de sources en paralelo y genera cada resultado en cuanto termina.
+		Los hilos sólo se ocupan durante la subida y la generación: mientras Gemini procesa un archivo, lo sigue el poller y el hilo queda libre para otro.
+		Como mucho hay max_in_flight archivos en curso, para que carpetas con miles de archivos no ocupen memoria de más.
+		Con un batcher, las imágenes se describen primero agrupadas en lotes y después el resto de archivos. Con batch=False se describen una por una.
+		cancel es un CancelToken opcional para cancelar todo el lote: no se empiezan más archivos, y tanto estos como los que estaban en curso terminan con un error de cancelación.
+		Si se deja de leer el generador antes del final, o se interrumpe con Ctrl+C, el lote se cancela del mismo modo.
+		Sin cancel, las llamadas en curso no se abandonan: se ejecutan en el hilo del trabajo, sin un hilo aparte por llamada, y el lote termina cuando acaban.
+		"""
+		if cancel is None:
+			# Importación diferida: engine.cancel depende de este módulo
+			from engine.cancel import CancelToken
+			cancel = CancelToken(abandon=False)
+		try:
+			yield from self._run(sources, prompt, batch, cancel)
+		except BaseException:
+			cancel.cancel()
+			raise
+
+	def _run(self, sources, prompt, batch, cancel):
+		"""
+		Cuerpo de run
+		"""
+		if batch and self.batcher is not None:
+			paths = list(collect_media_files(sources))
+			images = [path for path in paths if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS]
+			yield from self.batcher.run(self, images, prompt, cancel)
+			sources = [path for path in paths if os.path.splitext(path)[1].lower() not in IMAGE_EXTENSIONS]
+
+		results = queue.Queue()
+		in_flight = 0
+
+		def deliver(result):
+			self.metrics.job_done(result)
+			results.put(result)
+
+		with ThreadPoolExecutor(max_workers=self.workers) as executor:
+			try:
+				for path in collect_media_files(sources):
+					if cancel.cancelled:
+						# Los archivos que no llegaron a empezar también entregan su resultado
+						yield self.cancelled_result(path, prompt, cancel)
+						continue
+					# Si se alcanzó el límite, esperamos a que termine algún archivo
+					while in_flight >= self.max_in_flight:
+						yield results.get()
+						in_flight -= 1
+					executor.submit(self._run_job, executor, _Job(path, prompt, cancel=cancel), deliver)
+					in_flight += 1
+
+				# Entregamos los resultados restantes
+				while in_flight:
+					yield results.get()
+					in_flight -= 1
+			except BaseException:
+				# Cancelamos antes de cerrar la cola de hilos, para que los archivos en procesamiento todavía puedan liberarse
+				cancel.cancel()
+				raise
+
+	def _run_job(self, executor, job, deliver):
+		"""
+		Ejecuta la primera etapa de un trabajo en lote y encadena las siguientes sin bloquear el hilo durante el procesamiento
+		"""
+		try:
+			# Los videos largos ocupan este hilo mientras sus fragmentos se describen en paralelo
+			if self._should_split(job):
+				deliver(self._describe_segments(job))
+				return
+
+			result = self._prepare(job)
+			if job.leader is not None:
+				# Otro trabajo describe un archivo casi igual: al terminar, este vuelve a la cola de hilos sin haberla ocupado mientras tanto
+				leader, job.leader = job.leader, None
+				leader.add_done_callback(lambda done: self._submit(executor, self._run_job, executor, job, deliver))
+				return
+			if result is not None:
+				self._release(job)
+				deliver(result)
+				return
+
+			if self._is_processing(job):
+				# Al terminar el procesamiento, la generación vuelve a la cola de hilos. Si se cancela el lote, el archivo deja de consultarse.
+				future = self._watch(job)
+				key = job.cancel.on_cancel(future.cancel)
+				future.add_done_callback(lambda done: job.cancel.remove(key))
+				future.add_done_callback(lambda done: self._submit(executor, self._finish_job, job, done, deliver))
+				return
+
+			self._finish_job(job, None, deliver)
+		except Exception as e:
+			self._observe_cancel(job)
+			self._release(job)
+			deliver(job.result(self.model, error=str(e)))
+
+	def _submit(self, executor, stage, *args):
+		"""
+		Pasa la siguiente etapa de un trabajo en lote a la cola de hilos.
+		Si la cola ya se cerró, porque el lote se canceló o se dejó de leer, la etapa se ejecuta en este mismo hilo: así el trabajo igual se libera y entrega su resultado.
+		"""
+		try:
+			executor.submit(stage, *args)
+		except RuntimeError:
+			stage(*args)
+
+	def _finish_job(self, job, future, deliver):
+		"""
+		Completa un trabajo en lote después del procesamiento y entrega su resultado
+		"""
+		try:
+			if future is not None:
+				job.media_file = self._wait(job, future)
+			result = self._finish(job)
+		except Exception as e:
+			self._observe_cancel(job)
+			result = job.result(self.model, error=str(e))
+		self._release(job)
+		deliver(result)
+
+def write_jsonl(results, stream, flush=True):
+	"""
+	Escribe cada resultado como una línea JSON en stream a medida que llegan. Devuelve la cantidad de resultados escritos y de errores.
+	"""
+	written = 0
+	errors = 0
+	for result in results:
+		stream.write(result.to_json() + "\n")
+		if flush:
+			stream.flush()
+		written += 1
+		if not result.ok:
+			errors += 1
+	return written, errors
@@ -0,0 +1,25 @@
+"""
+Funciones para calcular el hash del contenido de los archivos.
+Los archivos se leen por bloques, de modo que un video de varios gigabytes no se carga completo en memoria.
+"""
+
+import hashlib
+
+# Tamaño de cada bloque de lectura: 1 MB
+CHUNK_SIZE = 1024 * 1024
+
+def file_sha256(path, chunk_size=CHUNK_SIZE):
+	"""
+	Devuelve el SHA-256 en hexadecimal del contenido del archivo
+	"""
+	digest = hashlib.sha256()
+	# Reutilizamos el mismo búfer para cada bloque en lugar de crear uno nuevo en cada lectura.
+	buffer = bytearray(chunk_size)
+	view = memoryview(buffer)
+	with open(path, 'rb', buffering=0) as file:
+		while True:
+			read = file.readinto(buffer)
+			if not read:
+				break
+			digest.update(view[:read])
+	return digest.hexdigest()
@@ -0,0 +1,371 @@
+"""
+Historial persistente de las descripciones generadas, con búsqueda de texto completo.
+Cada resultado se guarda en SQLite con el hash del archivo, la ruta, el prompt, el modelo, los tiempos, el uso de tokens y la respuesta.
+Un índice FTS5 permite buscar en todo el historial en menos de un segundo aunque tenga cientos de miles de descripciones.
+Las escrituras se agrupan en lotes desde un hilo propio, para que guardar el historial no frene a los trabajos en curso.
+"""
+
+# Importaciones
+
+import os
+import csv
+import json
+import time
+import sqlite3
+import threading
+
+from engine.cache import CACHE_DIR
+
+# Archivo por defecto del historial
+HISTORY_FILE = "history.sqlite3"
+
+# Tamaño de los lotes de escritura y espera máxima antes de escribir un lote incompleto, en segundos
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 1.0
+
+# Columnas de la tabla, en el orden en que se exportan
+COLUMNS = (
+	"id", "created", "path", "file_hash", "prompt", "model", "status", "text", "error",
+	"elapsed", "ttft", "cached", "prompt_tokens", "output_tokens", "total_tokens", "extra",
+)
+
+# Campos del resultado que tienen columna propia; el resto se guarda en extra como JSON
+_RESULT_FIELDS = ("path", "status", "model", "prompt", "text", "error", "elapsed", "sha256", "cached", "ttft", "usage")
+
+def fts_query(text):
+	"""
+	Convierte el texto buscado en una consulta FTS5: todas las palabras deben aparecer, y la última puede estar incompleta
+	"""
+	terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+	if not terms:
+		return None
+	terms[-1] += "*"
+	return " ".join(terms)
+
+class HistoryStore:
+	"""
+	Historial de descripciones respaldado por SQLite, con índice de texto completo y escritura por lotes
+	"""
+
+	def __init__(self, path=None, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+		"""
+		Inicialización del historial
+		"""
+		if path is None:
+			path = os.path.join(CACHE_DIR, HISTORY_FILE)
+		# Creamos la carpeta si no existe
+		folder = os.path.dirname(path)
+		if folder:
+			os.makedirs(folder, exist_ok=True)
+
+		self.path = path
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+
+		# Resultados pendientes de escribir
+		self.pending = []
+		self.writing = False
+		# Se activa al pedir flush, para escribir sin esperar a completar el lote
+		self.urgent = False
+		self.condition = threading.Condition()
+		self.thread = None
+		self.closed = False
+		# Contadores
+		self.written = 0
+		self.failed = 0
+		self.batches = 0
+
+		# La conexión de escritura sólo la usa el hilo del historial, salvo al crear las tablas.
+		# El modo WAL permite buscar y exportar desde otras conexiones mientras se escribe.
+		self.connection = sqlite3.connect(path, check_same_thread=False)
+		self.connection.execute("PRAGMA journal_mode=WAL")
+		self.connection.execute("PRAGMA synchronous=NORMAL")
+		self.connection.execute(
+			"CREATE TABLE IF NOT EXISTS descriptions ("
+			"id INTEGER PRIMARY KEY, "
+			"created REAL NOT NULL, "
+			"path TEXT, "
+			"file_hash TEXT, "
+			"prompt TEXT, "
+			"model TEXT, "
+			"status TEXT, "
+			"text TEXT, "
+			"error TEXT, "
+			"elapsed REAL, "
+			"ttft REAL, "
+			"cached INTEGER, "
+			"prompt_tokens INTEGER, "
+			"output_tokens INTEGER, "
+			"total_tokens INTEGER, "
+			"extra TEXT)"
+		)
+		self.connection.execute("CREATE INDEX IF NOT EXISTS descriptions_hash ON descriptions (file_hash)")
+		self.connection.execute("CREATE INDEX IF NOT EXISTS descriptions_created ON descriptions (created)")
+		self.fts = self._create_fts()
+		self.connection.commit()
+
+	def _create_fts(self):
+		"""
+		Crea el índice de texto completo y los disparadores que lo mantienen. Devuelve False si SQLite no incluye FTS5.
+		"""
+		try:
+			self.connection.execute(
+				"CREATE VIRTUAL TABLE IF NOT EXISTS descriptions_fts USING fts5("
+				"text, prompt, path, content='descriptions', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+			)
+		except sqlite3.OperationalError:
+			return False
+		self.connection.execute(
+			"CREATE TRIGGER IF NOT EXISTS descriptions_ai AFTER INSERT ON descriptions BEGIN "
+			"INSERT INTO descriptions_fts (rowid, text, prompt, path) VALUES (new.id, new.text, new.prompt, new.path); END"
+		)
+		self.connection.execute(
+			"CREATE TRIGGER IF NOT EXISTS descriptions_ad AFTER DELETE ON descriptions BEGIN "
+			"INSERT INTO descriptions_fts (descriptions_fts, rowid, text, prompt, path) VALUES ('delete', old.id, old.text, old.prompt, old.path); END"
+		)
+		return True
+
+	def _row(self, result):
+		"""
+		Convierte un DescriptionResult en la fila que se guarda
+		"""
+		data = result.to_dict()
+		usage = data.get("usage") or {}
+		extra = {key: value for key, value in data.items() if key not in _RESULT_FIELDS}
+		return (
+			time.time(), data["path"], data["sha256"], data["prompt"], data["model"], data["status"], data["text"], data["error"],
+			data["elapsed"], data["ttft"], int(bool(data["cached"])),
+			usage.get("prompt_tokens"), usage.get("output_tokens"), usage.get("total_tokens"),
+			json.dumps(extra, ensure_ascii=False) if extra else None,
+		)
+
+	def add(self, result):
+		"""
+		Añade un resultado al historial. No espera a que se escriba: se escribirá en el próximo lote.
+		"""
+		row = self._row(result)
+		with self.condition:
+			if self.closed:
+				raise ValueError("El historial está cerrado.")
+			self.pending.append(row)
+			if self.thread is None:
+				self.thread = threading.Thread(target=self._loop, name="history-writer", daemon=True)
+				self.thread.start()
+			if len(self.pending) >= self.batch_size:
+				self.condition.notify_all()
+
+	def record(self, results):
+		"""
+		Deja pasar los resultados y añade cada uno al historial
+		"""
+		for result in results:
+			self.add(result)
+			yield result
+
+	def _loop(self):
+		"""
+		Hilo de escritura: guarda los resultados pendientes en lotes, en una sola transacción por lote
+		"""
+		while True:
+			with self.condition:
+				# Esperamos a completar un lote, o como mucho flush_interval
+				deadline = time.monotonic() + self.flush_interval
+				while len(self.pending) < self.batch_size and not self.closed and not self.urgent:
+					remaining = deadline - time.monotonic()
+					if remaining <= 0:
+						break
+					self.condition.wait(remaining)
+				if not self.pending:
+					if self.closed:
+						return
+					continue
+				batch = self.pending[:self.batch_size]
+				del self.pending[:self.batch_size]
+				if not self.pending:
+					self.urgent = False
+				self.writing = True
+
+			try:
+				with self.connection:
+					self.connection.executemany(
+						"INSERT INTO descriptions (created, path, file_hash, prompt, model, status, text, error, elapsed, ttft, cached, "
+						"prompt_tokens, output_tokens, total_tokens, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+						batch
+					)
+				written, failed = len(batch), 0
+			except sqlite3.Error:
+				# Un error de escritura no debe detener el hilo; contamos el lote perdido
+				written, failed = 0, len(batch)
+			with self.condition:
+				self.writing = False
+				self.written += written
+				self.failed += failed
+				self.batches += 1
+				self.condition.notify_all()
+
+	def flush(self, timeout=None):
+		"""
+		Espera a que se escriban todos los resultados pendientes. Devuelve False si se agotó el tiempo.
+		"""
+		deadline = None if timeout is None else time.monotonic() + timeout
+		with self.condition:
+			# Despertamos al hilo de escritura para que no espere a completar el lote
+			if self.pending:
+				self.urgent = True
+				self.condition.notify_all()
+			while self.pending or self.writing:
+				remaining = None if deadline is None else deadline - time.monotonic()
+				if remaining is not None and remaining <= 0:
+					return False
+				self.condition.wait(remaining)
+		return True
+
+	def _reader(self):
+		"""
+		Abre una conexión de sólo lectura, para buscar y exportar sin bloquear las escrituras
+		"""
+		connection = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True)
+		connection.row_factory = sqlite3.Row
+		return connection
+
+	def search(self, text, limit=50):
+		"""
+		Busca text en las respuestas, los prompts y las rutas. Devuelve una lista de diccionarios, de la coincidencia más relevante a la menos.
+		Cada diccionario incluye un fragmento de la respuesta con las palabras encontradas entre corchetes.
+		"""
+		query = fts_query(text)
+		if query is None:
+			return self.recent(limit)
+		connection = self._reader()
+		try:
+			if self.fts:
+				rows = connection.execute(
+					"SELECT d.*, snippet(descriptions_fts, 0, '[', ']', '…', 16) AS snippet "
+					"FROM descriptions_fts JOIN descriptions d ON d.id = descriptions_fts.rowid "
+					"WHERE descriptions_fts MATCH ? ORDER BY rank LIMIT ?",
+					(query, limit)
+				).fetchall()
+			else:
+				# Sin FTS5 recorremos la tabla, lo que es mucho más lento con historiales grandes
+				pattern = f"%{text.strip()}%"
+				rows = connection.execute(
+					"SELECT d.*, substr(d.text, 1, 200) AS snippet FROM descriptions d "
+					"WHERE d.text LIKE ? OR d.prompt LIKE ? OR d.path LIKE ? ORDER BY d.id DESC LIMIT ?",
+					(pattern, pattern, pattern, limit)
+				).fetchall()
+			return [dict(row) for row in rows]
+		finally:
+			connection.close()
+
+	def recent(self, limit=50):
+		"""
+		Devuelve las últimas descripciones guardadas, de la más reciente a la más antigua
+		"""
+		connection = self._reader()
+		try:
+			rows = connection.execute("SELECT d.*, substr(d.text, 1, 200) AS snippet FROM descriptions d ORDER BY d.id DESC LIMIT ?", (limit,)).fetchall()
+			return [dict(row) for row in rows]
+		finally:
+			connection.close()
+
+	def count(self):
+		"""
+		Devuelve la cantidad de descripciones guardadas
+		"""
+		connection = self._reader()
+		try:
+			return connection.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
+		finally:
+			connection.close()
+
+	def _export_rows(self, text=None):
+		"""
+		Genera las filas a exportar, todas o sólo las que coinciden con text, sin cargarlas todas en memoria
+		"""
+		query = fts_query(text) if text else None
+		connection = self._reader()
+		try:
+			if query is not None and self.fts:
+				cursor = connection.execute(
+					"SELECT d.* FROM descriptions_fts JOIN descriptions d ON d.id = descriptions_fts.rowid "
+					"WHERE descriptions_fts MATCH ? ORDER BY d.id",
+					(query,)
+				)
+			elif query is not None:
+				pattern = f"%{text.strip()}%"
+				cursor = connection.execute(
+					"SELECT d.* FROM descriptions d WHERE d.text LIKE ? OR d.prompt LIKE ? OR d.path LIKE ? ORDER BY d.id",
+					(pattern, pattern, pattern)
+				)
+			else:
+				cursor = connection.execute("SELECT d.* FROM descriptions d ORDER BY d.id")
+			while True:
+				rows = cursor.fetchmany(1000)
+				if not rows:
+					break
+				for row in rows:
+					yield row
+		finally:
+			connection.close()
+
+	def export_jsonl(self, stream, text=None):
+		"""
+		Escribe el historial, o las coincidencias con text, como una línea JSON por descripción. Devuelve la cantidad exportada.
+		"""
+		exported = 0
+		for row in self._export_rows(text):
+			data = dict(row)
+			data["cached"] = bool(data["cached"])
+			data["extra"] = json.loads(data["extra"]) if data["extra"] else None
+			stream.write(json.dumps(data, ensure_ascii=False) + "\n")
+			exported += 1
+		return exported
+
+	def export_csv(self, stream, text=None):
+		"""
+		Escribe el historial, o las coincidencias con text, en formato CSV con encabezado. Devuelve la cantidad exportada.
+		"""
+		writer = csv.writer(stream)
+		writer.writerow(COLUMNS)
+		exported = 0
+		for row in self._export_rows(text):
+			writer.writerow([row[column] for column in COLUMNS])
+			exported += 1
+		return exported
+
+	def export(self, path, text=None):
+		"""
+		Exporta a path en CSV si la extensión es .csv, o en JSONL en otro caso. Devuelve la cantidad exportada.
+		"""
+		self.flush()
+		if path.lower().endswith(".csv"):
+			# utf-8-sig para que las hojas de cálculo reconozcan los acentos
+			with open(path, 'w', encoding='utf-8-sig', newline='') as stream:
+				return self.export_csv(stream, text)
+		with open(path, 'w', encoding='utf-8') as stream:
+			return self.export_jsonl(stream, text)
+
+	def stats(self):
+		"""
+		Devuelve un diccionario con los contadores de escritura
+		"""
+		with self.condition:
+			return {
+				"written": self.written,
+				"failed": self.failed,
+				"batches": self.batches,
+				"pending": len(self.pending),
+				"fts": self.fts,
+			}
+
+	def close(self):
+		"""
+		Escribe lo pendiente y cierra la conexión
+		"""
+		with self.condition:
+			self.closed = True
+			self.condition.notify_all()
+			thread = self.thread
+		if thread is not None:
+			thread.join()
+		self.connection.close()
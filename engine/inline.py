@@ -0,0 +1,61 @@
+"""
+Envío directo de imágenes dentro de la solicitud, sin pasar por la API de archivos.
+Una imagen de unos cientos de KB no necesita subirse ni esperar a que Gemini la procese: basta con incluir sus bytes en contents.
+Las imágenes grandes se reducen y se vuelven a codificar en memoria con OpenCV; si aun así superan el límite, se usa la API de archivos.
+"""
+
+# Importaciones
+
+import os
+
+# Tamaño máximo de una imagen enviada directamente: 4 MB
+INLINE_MAX_BYTES = 4 * 1024 * 1024
+# Lado mayor, en píxeles, de las imágenes que se reducen
+MAX_DIMENSION = 2048
+# Calidad JPEG al volver a codificar
+JPEG_QUALITY = 85
+
+MIME_TYPES = {
+	".png": "image/png",
+	".jpg": "image/jpeg",
+	".jpeg": "image/jpeg",
+}
+
+def load_inline_image(path, max_bytes=INLINE_MAX_BYTES, max_dimension=MAX_DIMENSION):
+	"""
+	Devuelve (datos, tipo_mime) para enviar la imagen directamente, o None si no es una imagen o no cabe en el límite
+	"""
+	mime_type = MIME_TYPES.get(os.path.splitext(path)[1].lower())
+	if mime_type is None:
+		return None
+
+	# Si la imagen ya es pequeña, la enviamos tal cual
+	if os.path.getsize(path) <= max_bytes:
+		with open(path, 'rb') as file:
+			return file.read(), mime_type
+
+	# Importamos aquí para no cargar OpenCV hasta que se necesite.
+	import cv2
+
+	image = cv2.imread(path, cv2.IMREAD_COLOR)
+	if image is None:
+		return None
+
+	# Reducimos la imagen manteniendo la proporción
+	height, width = image.shape[:2]
+	scale = max_dimension / max(height, width)
+	if scale < 1:
+		image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+	ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+	if not ok or len(encoded) > max_bytes:
+		return None
+	return encoded.tobytes(), "image/jpeg"
+
+def make_inline_part(data, mime_type):
+	"""
+	Crea la parte de contenido de Gemini con los bytes de la imagen
+	"""
+	# Importamos aquí para no cargar la biblioteca hasta que realmente se necesite.
+	from google.genai import types
+	return types.Part.from_bytes(data=data, mime_type=mime_type)
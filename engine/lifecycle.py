@@ -0,0 +1,329 @@
+"""
+Ciclo de vida de los archivos subidos a Gemini.
+Cada archivo que sube el motor queda registrado con la cantidad de trabajos que lo usan. Cuando el último termina, se borra del servidor, salvo que esté fijado para reutilizarlo.
+Un recolector en segundo plano lista los archivos remotos y borra, si se pide, los huérfanos, los que nadie usa y superan una antigüedad, y después los más antiguos hasta volver a un presupuesto de bytes.
+El recolector sólo toca los archivos que subió este programa, por el prefijo de su nombre visible o porque los sigue este proceso, y nunca los que el registro de subidas todavía puede reutilizar.
+Los archivos de otros programas o de otras instancias con la misma API key no se tocan.
+Los borrados se hacen en paralelo, con un límite de solicitudes por minuto y reintentos ante errores temporales.
+"""
+
+# Importaciones
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from engine.scheduler import RequestScheduler, error_code
+from engine.upload import DISPLAY_PREFIX
+
+# Gemini admite 20 GB por proyecto; dejamos margen para otros programas con la misma API key
+STORAGE_BUDGET = 16 * 1024 * 1024 * 1024
+# Antigüedad sugerida a partir de la cual un archivo que nadie usa se considera huérfano. Sin indicarla, los huérfanos no se borran.
+ORPHAN_AGE = 2 * 60 * 60
+# Intervalo entre dos pasadas del recolector
+REAP_INTERVAL = 10 * 60
+# Borrados a la vez y por minuto
+DELETE_WORKERS = 4
+DELETE_RPM = 600
+# Archivos por página al listar los archivos remotos
+LIST_PAGE_SIZE = 100
+
+def _created_timestamp(remote_file):
+	"""
+	Devuelve la fecha de creación del archivo remoto como marca de tiempo, o None si no se conoce
+	"""
+	created = getattr(remote_file, "create_time", None)
+	if created is None:
+		return None
+	if hasattr(created, "timestamp"):
+		return created.timestamp()
+	return float(created)
+
+class _Tracked:
+	"""
+	Archivo remoto subido o reutilizado por este proceso
+	"""
+
+	def __init__(self, name, size, file_hash, path):
+		self.name = name
+		self.size = size or 0
+		self.file_hash = file_hash
+		self.path = path
+		self.users = 0
+		self.pinned = False
+		self.created = time.time()
+
+class FileLifecycle:
+	"""
+	Seguimiento y limpieza de los archivos remotos
+	"""
+
+	def __init__(self, client, registry=None, max_bytes=STORAGE_BUDGET, orphan_age=None, workers=DELETE_WORKERS, rpm=DELETE_RPM, keep=False):
+		"""
+		Inicialización del ciclo de vida. registry es el UploadRegistry del que se quitan los archivos borrados, y cuyos archivos vigentes el recolector no borra.
+		orphan_age es la antigüedad en segundos a partir de la cual el recolector borra los archivos de este programa que nadie usa; con None sólo se borran para volver al presupuesto.
+		Con keep=True todos los archivos quedan fijados: no se borran al terminar su trabajo y sólo los quita el recolector.
+		"""
+		self.client = client
+		self.registry = registry
+		self.max_bytes = max_bytes
+		self.orphan_age = orphan_age
+		self.keep = keep
+		# Los borrados tienen su propio límite de solicitudes y reintentos, aparte de las generaciones
+		self.scheduler = RequestScheduler(rpm=rpm, burst=1 / 60)
+		self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini-delete")
+		self.lock = threading.Lock()
+		self.files = {}
+		self.pinned_paths = set()
+		self.deleting = set()
+		# Recolector en segundo plano
+		self.reaper = None
+		self.wake = threading.Event()
+		self.stopping = threading.Event()
+		# Contadores
+		self.deleted = 0
+		self.bytes_freed = 0
+		self.failed = 0
+		self.reaped = 0
+
+	def track(self, remote_file, file_hash=None, path=None):
+		"""
+		Registra que un trabajo empieza a usar el archivo remoto.
+		Devuelve False, sin registrarlo, si el archivo ya se está borrando: el trabajo debe subirlo de nuevo.
+		"""
+		with self.lock:
+			if remote_file.name in self.deleting:
+				return False
+			tracked = self.files.get(remote_file.name)
+			if tracked is None:
+				tracked = self.files[remote_file.name] = _Tracked(remote_file.name, getattr(remote_file, "size_bytes", None), file_hash, path)
+			tracked.users += 1
+			over_budget = sum(entry.size for entry in self.files.values()) > self.max_bytes
+		# Si lo subido supera el presupuesto, el recolector no espera a su próxima pasada
+		if over_budget:
+			self.wake.set()
+		return True
+
+	def release(self, name):
+		"""
+		Registra que un trabajo dejó de usar el archivo remoto y lo borra si nadie más lo usa y no está fijado
+		"""
+		with self.lock:
+			tracked = self.files.get(name)
+			if tracked is None:
+				return
+			tracked.users = max(0, tracked.users - 1)
+			if not self._disposable(tracked):
+				return
+		self.delete([name])
+
+	def discard(self, name):
+		"""
+		Registra que un trabajo cancelado dejó de usar el archivo remoto que subió, y lo borra aunque esté fijado si nadie más lo usa
+		"""
+		with self.lock:
+			tracked = self.files.get(name)
+			if tracked is not None:
+				tracked.users = max(0, tracked.users - 1)
+				if tracked.users:
+					return
+		self.delete([name])
+
+	def _disposable(self, tracked):
+		"""
+		Indica si el archivo se puede borrar ya. Debe llamarse con el candado adquirido.
+		"""
+		return tracked.users == 0 and not tracked.pinned and not self.keep and tracked.path not in self.pinned_paths
+
+	def pin(self, name):
+		"""
+		Fija el archivo remoto para que no se borre al terminar sus trabajos
+		"""
+		with self.lock:
+			tracked = self.files.get(name)
+			if tracked is not None:
+				tracked.pinned = True
+
+	def unpin(self, name):
+		"""
+		Quita la fijación del archivo remoto y lo borra si nadie lo usa
+		"""
+		with self.lock:
+			tracked = self.files.get(name)
+			if tracked is None:
+				return
+			tracked.pinned = False
+			if not self._disposable(tracked):
+				return
+		self.delete([name])
+
+	def pin_path(self, path):
+		"""
+		Fija los archivos remotos subidos desde la ruta local path, incluidos los que se suban más adelante
+		"""
+		with self.lock:
+			self.pinned_paths.add(path)
+
+	def unpin_path(self, path):
+		"""
+		Quita la fijación de la ruta local path y borra sus archivos remotos que nadie usa
+		"""
+		with self.lock:
+			self.pinned_paths.discard(path)
+			names = [tracked.name for tracked in self.files.values() if tracked.path == path and self._disposable(tracked)]
+		if names:
+			self.delete(names)
+
+	def delete(self, names, sizes=None):
+		"""
+		Programa el borrado de los archivos remotos indicados. Los borrados se hacen en paralelo en segundo plano.
+		sizes, si se indica, da el tamaño de los archivos que este proceso no subió. Devuelve la lista de Futures de los borrados programados.
+		"""
+		sizes = sizes or {}
+		futures = []
+		for name in names:
+			with self.lock:
+				if name in self.deleting:
+					continue
+				# Mientras está en deleting, track no deja que un trabajo nuevo lo reutilice desde el registro
+				self.deleting.add(name)
+			try:
+				futures.append(self.executor.submit(self._delete, name, sizes.get(name, 0)))
+			except RuntimeError:
+				# Ya se cerró: el archivo lo quitará el recolector de una próxima ejecución
+				with self.lock:
+					self.deleting.discard(name)
+		return futures
+
+	def _delete(self, name, size=0):
+		"""
+		Borra un archivo remoto dentro del límite de solicitudes. Devuelve True si se borró o ya no existía.
+		"""
+		try:
+			with self.lock:
+				tracked = self.files.get(name)
+				# Un trabajo pudo reutilizarlo mientras esperaba su turno
+				if tracked is not None and tracked.users:
+					return False
+			try:
+				self.scheduler.call(self.client.files.delete, name=name)
+			except Exception as e:
+				if error_code(e) != 404:
+					with self.lock:
+						self.failed += 1
+					return False
+			# Sólo se quita del registro cuando ya no existe: si el borrado no se hizo, el registro lo sigue reutilizando
+			if self.registry is not None:
+				self.registry.forget_name(name)
+			with self.lock:
+				tracked = self.files.pop(name, None)
+				self.deleted += 1
+				self.bytes_freed += tracked.size if tracked is not None else size
+			return True
+		finally:
+			with self.lock:
+				self.deleting.discard(name)
+
+	def _owned(self, remote_file):
+		"""
+		Indica si el archivo remoto lo subió este programa. Debe llamarse con el candado adquirido.
+		"""
+		if remote_file.name in self.files:
+			return True
+		return (getattr(remote_file, "display_name", None) or "").startswith(DISPLAY_PREFIX)
+
+	def reap(self, orphan_age=None):
+		"""
+		Lista los archivos remotos de este programa y borra los huérfanos, si se indicó una antigüedad, y, si hace falta, los más antiguos hasta volver al presupuesto de bytes.
+		orphan_age sustituye a la antigüedad del ciclo de vida en esta pasada, por ejemplo para una limpieza pedida a mano.
+		Los archivos en uso nunca se borran, ni los que el registro todavía puede reutilizar; los fijados sólo si el presupuesto lo exige. Devuelve la cantidad de archivos borrados.
+		"""
+		orphan_age = self.orphan_age if orphan_age is None else orphan_age
+		now = time.time()
+		# Los archivos vigentes del registro se reutilizan en próximas ejecuciones, también con --keep-uploads
+		live = self.registry.live_names() if self.registry is not None else set()
+		candidates = []
+		total = 0
+		for remote_file in self.client.files.list(config={"page_size": LIST_PAGE_SIZE}):
+			with self.lock:
+				if not self._owned(remote_file):
+					continue
+				size = getattr(remote_file, "size_bytes", None) or 0
+				total += size
+				tracked = self.files.get(remote_file.name)
+				if (tracked is not None and tracked.users) or remote_file.name in live:
+					continue
+				pinned = tracked is not None and not self._disposable(tracked)
+			created = _created_timestamp(remote_file)
+			if created is None and tracked is not None:
+				created = tracked.created
+			candidates.append((pinned, created if created is not None else now, remote_file.name, size))
+
+		# Primero los huérfanos: sin fijar y con más antigüedad que el límite
+		doomed = set()
+		if orphan_age is not None:
+			doomed = {name for pinned, created, name, size in candidates if not pinned and now - created >= orphan_age}
+		total -= sum(size for pinned, created, name, size in candidates if name in doomed)
+		# Después, hasta volver al presupuesto, los más antiguos, dejando para el final los fijados
+		if total > self.max_bytes:
+			for pinned, created, name, size in sorted(candidates):
+				if total <= self.max_bytes:
+					break
+				if name not in doomed:
+					doomed.add(name)
+					total -= size
+
+		sizes = {name: size for pinned, created, name, size in candidates if name in doomed}
+		deleted = sum(1 for future in self.delete(doomed, sizes) if future.result())
+		with self.lock:
+			self.reaped += deleted
+		return deleted
+
+	def start(self, interval=REAP_INTERVAL):
+		"""
+		Inicia el recolector en segundo plano: una pasada al empezar y otra cada interval segundos, o antes si se supera el presupuesto
+		"""
+		if self.reaper is not None:
+			return
+		self.stopping.clear()
+		self.reaper = threading.Thread(target=self._loop, args=(interval,), name="gemini-reaper", daemon=True)
+		self.reaper.start()
+
+	def _loop(self, interval):
+		"""
+		Bucle del recolector
+		"""
+		while not self.stopping.is_set():
+			try:
+				self.reap()
+			except Exception:
+				# Un fallo al listar no debe detener el recolector; lo intentamos en la próxima pasada
+				pass
+			self.wake.wait(interval)
+			self.wake.clear()
+
+	def close(self, wait=True):
+		"""
+		Detiene el recolector y espera a que terminen los borrados programados
+		"""
+		self.stopping.set()
+		self.wake.set()
+		if self.reaper is not None:
+			self.reaper.join(timeout=5)
+			self.reaper = None
+		self.executor.shutdown(wait=wait)
+
+	def stats(self):
+		"""
+		Devuelve un diccionario con los archivos seguidos y los borrados
+		"""
+		with self.lock:
+			return {
+				"tracked": len(self.files),
+				"in_use": sum(1 for tracked in self.files.values() if tracked.users),
+				"tracked_bytes": sum(tracked.size for tracked in self.files.values()),
+				"deleted": self.deleted,
+				"reaped": self.reaped,
+				"bytes_freed": self.bytes_freed,
+				"failed": self.failed,
+			}
@@ -0,0 +1,206 @@
+"""
+Medición del tiempo de cada etapa de la descripción y exportación de las métricas.
+Cada etapa (lectura de metadatos, hash, subida, cada consulta del procesamiento, generación, actualización de la interfaz) se mide con un intervalo de tiempo.
+Las duraciones forman histogramas con percentiles p50, p95 y p99, y junto con los contadores se pueden volcar como JSON o en el formato de texto de Prometheus.
+Con las métricas desactivadas, cada intervalo es un objeto vacío compartido, así que el costo es despreciable.
+"""
+
+# Importaciones
+
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Prefijo de las métricas en el formato de Prometheus
+PROMETHEUS_PREFIX = "gemini_descriptor"
+# Mediciones que se conservan por etapa para calcular los percentiles
+RESERVOIR_SIZE = 10000
+QUANTILES = (0.5, 0.95, 0.99)
+
+def percentile(ordered, fraction):
+	"""
+	Devuelve el percentil indicado (entre 0 y 1) de una lista ya ordenada
+	"""
+	if not ordered:
+		return 0.0
+	index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+	return ordered[index]
+
+class _NullSpan:
+	"""
+	Intervalo que no mide nada, usado cuando las métricas están desactivadas
+	"""
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+	"""
+	Intervalo de tiempo de una etapa
+	"""
+
+	def __init__(self, metrics, name, record):
+		self.metrics = metrics
+		self.name = name
+		self.record = record
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		self.metrics.observe(self.name, time.perf_counter() - self.start, self.record)
+		return False
+
+class _Histogram:
+	"""
+	Duraciones de una etapa: cantidad, suma y las últimas mediciones para los percentiles
+	"""
+
+	def __init__(self, size):
+		self.count = 0
+		self.total = 0.0
+		self.values = deque(maxlen=size)
+
+	def summary(self):
+		ordered = sorted(self.values)
+		data = {"count": self.count, "sum": round(self.total, 6)}
+		for quantile in QUANTILES:
+			data[f"p{int(quantile * 100)}"] = round(percentile(ordered, quantile), 6)
+		data["max"] = round(ordered[-1], 6) if ordered else 0.0
+		return data
+
+class Metrics:
+	"""
+	Histogramas de latencia por etapa y contadores, compartidos por todos los trabajos
+	"""
+
+	def __init__(self, enabled=True, log_jobs=False, reservoir_size=RESERVOIR_SIZE):
+		"""
+		Inicialización de las métricas. Con log_jobs=True se escribe una línea de registro por cada trabajo terminado.
+		"""
+		self.enabled = enabled
+		self.log_jobs = log_jobs
+		self.reservoir_size = reservoir_size
+		self.lock = threading.Lock()
+		self.histograms = {}
+		self.counters = {}
+
+	def span(self, name, record=None):
+		"""
+		Devuelve un intervalo para usar con with que mide la etapa name.
+		record, si se indica, es un diccionario del trabajo donde se acumula la duración de la etapa.
+		"""
+		if not self.enabled:
+			return _NULL_SPAN
+		return _Span(self, name, record)
+
+	def observe(self, name, seconds, record=None):
+		"""
+		Registra una duración de la etapa name
+		"""
+		if not self.enabled:
+			return
+		with self.lock:
+			histogram = self.histograms.get(name)
+			if histogram is None:
+				histogram = self.histograms[name] = _Histogram(self.reservoir_size)
+			histogram.count += 1
+			histogram.total += seconds
+			histogram.values.append(seconds)
+		if record is not None:
+			record[name] = round(record.get(name, 0.0) + seconds, 4)
+
+	def increment(self, name, value=1):
+		"""
+		Suma value al contador name
+		"""
+		if not self.enabled or not value:
+			return
+		with self.lock:
+			self.counters[name] = self.counters.get(name, 0) + value
+
+	def job_done(self, result):
+		"""
+		Registra un trabajo terminado: contadores, tokens usados y, si se pidió, una línea de registro
+		"""
+		if not self.enabled:
+			return
+		self.increment("jobs")
+		if not result.ok:
+			self.increment("errors")
+		if result.cached:
+			self.increment("cache_hits")
+		usage = result.extra.get("usage") or {}
+		self.increment("prompt_tokens", usage.get("prompt_tokens") or 0)
+		self.increment("output_tokens", usage.get("output_tokens") or 0)
+		self.observe("total", result.elapsed)
+		if result.ttft is not None:
+			self.observe("ttft", result.ttft)
+		if self.log_jobs:
+			logger.info(self.job_line(result))
+
+	def job_line(self, result):
+		"""
+		Devuelve la línea de registro de un trabajo, en JSON
+		"""
+		return json.dumps({
+			"path": result.path,
+			"status": "ok" if result.ok else "error",
+			"elapsed": round(result.elapsed, 3),
+			"cached": result.cached,
+			"ttft": round(result.ttft, 3) if result.ttft is not None else None,
+			"timings": result.extra.get("timings"),
+			"usage": result.extra.get("usage"),
+		}, ensure_ascii=False)
+
+	def to_dict(self):
+		"""
+		Devuelve los histogramas y los contadores como diccionario
+		"""
+		with self.lock:
+			return {
+				"stages": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+				"counters": dict(sorted(self.counters.items())),
+			}
+
+	def to_json(self):
+		"""
+		Devuelve las métricas en JSON
+		"""
+		return json.dumps(self.to_dict(), indent=2)
+
+	def to_prometheus(self):
+		"""
+		Devuelve las métricas en el formato de texto de Prometheus: un resumen por etapa y un contador por cada contador
+		"""
+		data = self.to_dict()
+		name = f"{PROMETHEUS_PREFIX}_stage_seconds"
+		lines = [f"# HELP {name} Duración de cada etapa de la descripción.", f"# TYPE {name} summary"]
+		for stage, summary in data["stages"].items():
+			for quantile in QUANTILES:
+				lines.append(f'{name}{{stage="{stage}",quantile="{quantile}"}} {summary[f"p{int(quantile * 100)}"]}')
+			lines.append(f'{name}_sum{{stage="{stage}"}} {summary["sum"]}')
+			lines.append(f'{name}_count{{stage="{stage}"}} {summary["count"]}')
+		for counter, value in data["counters"].items():
+			counter_name = f"{PROMETHEUS_PREFIX}_{counter}_total"
+			lines.append(f"# TYPE {counter_name} counter")
+			lines.append(f"{counter_name} {value}")
+		return "\n".join(lines) + "\n"
+
+	def dump(self, path):
+		"""
+		Escribe las métricas en path, en formato de Prometheus si la extensión es .prom y en JSON en otro caso
+		"""
+		text = self.to_prometheus() if path.lower().endswith(".prom") else self.to_json()
+		with open(path, 'w', encoding='utf-8') as file:
+			file.write(text)
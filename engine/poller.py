@@ -0,0 +1,224 @@
+"""
+Seguimiento del estado de procesamiento de los archivos subidos a Gemini.
+Un único hilo controla todos los archivos pendientes y consulta cada uno con espera exponencial y variación aleatoria, en lugar de dedicar un hilo dormido a cada archivo.
+Una consulta que falla por límite de solicitudes o por un error temporal del servidor se vuelve a programar con la misma espera creciente, sin ocupar un hilo mientras tanto.
+"""
+
+# Importaciones
+
+import time
+import heapq
+import random
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, InvalidStateError
+
+from engine.metrics import Metrics
+from engine.scheduler import is_retryable, MAX_RETRIES
+
+# Valores por defecto de la espera, en segundos
+MIN_DELAY = 0.5
+MAX_DELAY = 15.0
+BACKOFF_FACTOR = 1.6
+JITTER = 0.2
+
+def initial_delay(size_bytes=None, duration=None, min_delay=MIN_DELAY, max_delay=MAX_DELAY):
+	"""
+	Calcula la espera antes de la primera consulta según el tamaño o la duración del archivo.
+	Un archivo pequeño se consulta casi de inmediato y un video largo espera más, ya que Gemini tarda más en procesarlo.
+	"""
+	delay = min_delay
+	if size_bytes:
+		# Aproximadamente un segundo por cada 50 MB
+		delay += size_bytes / (50 * 1024 * 1024)
+	if duration:
+		# Aproximadamente un segundo por cada 30 segundos de video
+		delay += duration / 30
+	return min(delay, max_delay)
+
+class _PendingFile:
+	"""
+	Archivo pendiente dentro del poller
+	"""
+
+	def __init__(self, remote_file, delay, on_update, record=None):
+		self.remote_file = remote_file
+		self.delay = delay
+		self.on_update = on_update
+		self.record = record
+		self.attempts = 0
+		# Errores temporales seguidos en las consultas
+		self.errors = 0
+		self.future = Future()
+
+class ProcessingPoller:
+	"""
+	Controla en un solo hilo el estado PROCESSING de muchos archivos remotos a la vez.
+	Cada llamada a watch devuelve un Future que se completa con el archivo remoto cuando deja de estar en procesamiento.
+	Si quien espera cancela el Future, el archivo deja de consultarse.
+	"""
+
+	def __init__(self, client, min_delay=MIN_DELAY, max_delay=MAX_DELAY, factor=BACKOFF_FACTOR, jitter=JITTER, max_concurrent=4, metrics=None, max_retries=MAX_RETRIES):
+		"""
+		Inicialización del poller. max_concurrent limita las consultas files.get simultáneas.
+		max_retries es la cantidad de errores temporales seguidos que se toleran en las consultas de un archivo antes de fallar.
+		metrics, si se indica, mide la duración de cada consulta.
+		"""
+		self.client = client
+		self.min_delay = min_delay
+		self.max_delay = max_delay
+		self.factor = factor
+		self.jitter = jitter
+		self.max_concurrent = max_concurrent
+		self.max_retries = max_retries
+		self.metrics = metrics or Metrics(enabled=False)
+
+		# Cola ordenada por el momento de la próxima consulta
+		self.heap = []
+		self.counter = itertools.count()
+		self.condition = threading.Condition()
+		self.thread = None
+		self.executor = None
+		self.stopped = False
+		self.polls = 0
+		self.retries = 0
+
+	def _start(self):
+		"""
+		Inicia el hilo del poller si todavía no está en marcha
+		"""
+		if self.thread is None:
+			self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="poller-get")
+			self.thread = threading.Thread(target=self._loop, name="processing-poller", daemon=True)
+			self.thread.start()
+
+	def _with_jitter(self, delay):
+		"""
+		Aplica una variación aleatoria a la espera para que las consultas no se sincronicen
+		"""
+		return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+	def watch(self, remote_file, size_bytes=None, duration=None, on_update=None, record=None):
+		"""
+		Añade un archivo remoto al seguimiento y devuelve un Future con su estado final.
+		on_update, si se indica, recibe (intentos, archivo) después de cada consulta.
+		record, si se indica, es el diccionario de tiempos del trabajo donde se acumula la duración de las consultas.
+		"""
+		delay = initial_delay(size_bytes, duration, self.min_delay, self.max_delay)
+		pending = _PendingFile(remote_file, delay, on_update, record)
+		with self.condition:
+			if self.stopped:
+				raise RuntimeError("El poller está detenido.")
+			self._start()
+			self._schedule(pending, delay)
+			self.condition.notify()
+		return pending.future
+
+	def _schedule(self, pending, delay):
+		"""
+		Programa la próxima consulta del archivo pendiente. Debe llamarse con la condición adquirida.
+		"""
+		due = time.monotonic() + self._with_jitter(delay)
+		heapq.heappush(self.heap, (due, next(self.counter), pending))
+
+	def _loop(self):
+		"""
+		Bucle principal: espera a la próxima consulta y despacha las que ya vencieron
+		"""
+		while True:
+			with self.condition:
+				while not self.stopped and (not self.heap or self.heap[0][0] > time.monotonic()):
+					timeout = self.heap[0][0] - time.monotonic() if self.heap else None
+					self.condition.wait(timeout)
+				if self.stopped:
+					return
+				# Tomamos todas las consultas que ya vencieron
+				now = time.monotonic()
+				due = []
+				while self.heap and self.heap[0][0] <= now:
+					due.append(heapq.heappop(self.heap)[2])
+
+			for pending in due:
+				if pending.future.cancelled():
+					continue
+				self.executor.submit(self._poll, pending)
+
+	def _poll(self, pending):
+		"""
+		Consulta el estado de un archivo y lo vuelve a programar o completa su Future
+		"""
+		try:
+			with self.metrics.span("poll", pending.record):
+				remote_file = self.client.files.get(name=pending.remote_file.name)
+		except Exception as e:
+			# Un error temporal no hace fallar el trabajo: la consulta se repite más tarde, hasta max_retries veces seguidas
+			if is_retryable(e) and pending.errors < self.max_retries and not pending.future.cancelled():
+				pending.errors += 1
+				self.retries += 1
+				self._reschedule(pending)
+			else:
+				self._complete(pending, exception=e)
+			return
+		# El trabajo se canceló mientras se consultaba: no volvemos a programarlo
+		if pending.future.cancelled():
+			return
+
+		pending.errors = 0
+		pending.remote_file = remote_file
+		pending.attempts += 1
+		self.polls += 1
+		if pending.on_update is not None:
+			try:
+				pending.on_update(pending.attempts, remote_file)
+			except Exception:
+				pass
+
+		if remote_file.state.name == "PROCESSING":
+			self._reschedule(pending)
+		else:
+			self._complete(pending, result=remote_file)
+
+	def _reschedule(self, pending):
+		"""
+		Vuelve a programar la consulta del archivo, cada vez un poco más tarde
+		"""
+		pending.delay = min(pending.delay * self.factor, self.max_delay)
+		with self.condition:
+			if self.stopped:
+				pending.future.cancel()
+				return
+			self._schedule(pending, pending.delay)
+			self.condition.notify()
+
+	def _complete(self, pending, result=None, exception=None):
+		"""
+		Completa el Future del archivo pendiente, salvo que se haya cancelado entretanto
+		"""
+		try:
+			if exception is not None:
+				pending.future.set_exception(exception)
+			else:
+				pending.future.set_result(result)
+		except InvalidStateError:
+			pass
+
+	def pending_count(self):
+		"""
+		Devuelve la cantidad de archivos en seguimiento
+		"""
+		with self.condition:
+			return len(self.heap)
+
+	def stop(self):
+		"""
+		Detiene el poller y cancela los archivos pendientes
+		"""
+		with self.condition:
+			self.stopped = True
+			pending = [item[2] for item in self.heap]
+			self.heap.clear()
+			self.condition.notify_all()
+		for item in pending:
+			item.future.cancel()
+		if self.executor is not None:
+			self.executor.shutdown(wait=False)
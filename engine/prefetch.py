@@ -0,0 +1,166 @@
+"""
+Subida anticipada del archivo seleccionado.
+En cuanto se elige un archivo, se sube y Gemini empieza a procesarlo en segundo plano, mientras se escribe el prompt.
+Al enviar, el trabajo se engancha a esa subida, esté en curso o terminada, en lugar de empezar desde cero.
+Si se elige otro archivo, la subida se cancela entre dos bloques; si ya terminó, el archivo se libera en el ciclo de vida.
+"""
+
+# Importaciones
+
+import os
+import time
+import threading
+
+from engine.hashing import file_sha256
+from engine.cancel import CancelToken
+from engine.describer import DescriptionError, IMAGE_EXTENSIONS
+
+class PrefetchCancelled(DescriptionError):
+	"""
+	La subida anticipada se canceló porque se eligió otro archivo
+	"""
+
+class PrefetchedFile:
+	"""
+	Subida y procesamiento de un archivo iniciados antes de enviarlo
+	"""
+
+	def __init__(self, engine, path):
+		"""
+		Inicialización y arranque de la subida en un hilo aparte
+		"""
+		self.engine = engine
+		self.path = path
+		# La subida sólo sirve si al enviar se usa la misma compresión
+		self.preprocessor = engine.preprocessor
+		self.lock = threading.Lock()
+		self.cancelled = threading.Event()
+		# Al cancelar, la subida se abandona y el archivo que llegue a crearse se borra, aunque su ruta esté fijada
+		self.token = CancelToken()
+		self.hashed = threading.Event()
+		self.done = threading.Event()
+		self.file_hash = None
+		self.media_file = None
+		self.error = None
+		self.claimed = False
+		self.released = False
+		# Si la subida ya había terminado cuando se engancharon a ella
+		self.ready_at_claim = None
+		# Función de progreso del envío que se enganchó a la subida
+		self.progress = None
+		self.started = time.perf_counter()
+		self.finished = None
+		self.thread = threading.Thread(target=self._run, name="gemini-prefetch", daemon=True)
+		self.thread.start()
+
+	@staticmethod
+	def wanted(engine, path):
+		"""
+		Indica si conviene subir el archivo por adelantado: las imágenes que van dentro de la solicitud no se suben
+		"""
+		return not (engine.inline_max_bytes and os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS)
+
+	def _run(self):
+		"""
+		Calcula el hash, sube el archivo y espera su procesamiento
+		"""
+		engine = self.engine
+		try:
+			if engine.cache is not None or engine.registry is not None or engine.preprocessor is not None:
+				self.file_hash = file_sha256(self.path)
+			self.hashed.set()
+			self.media_file, self.file_hash = engine.remote_file(self.path, self._report, self.file_hash, self.token)
+		except Exception as e:
+			self.error = e
+		finally:
+			self.hashed.set()
+			self.finished = time.perf_counter()
+			self.done.set()
+		if self.cancelled.is_set():
+			self._discard()
+
+	def _report(self, value, message):
+		"""
+		Recibe el progreso de la subida: lo reenvía al envío enganchado y corta la subida si se canceló
+		"""
+		if self.cancelled.is_set():
+			raise PrefetchCancelled("Subida anticipada cancelada.")
+		progress = self.progress
+		if progress is not None:
+			progress(value, message)
+
+	@property
+	def ready(self):
+		"""
+		Indica si el archivo ya está subido y procesado
+		"""
+		return self.done.is_set() and self.error is None
+
+	def usable(self, path, preprocessor):
+		"""
+		Indica si un envío del archivo path con la compresión indicada puede engancharse a esta subida
+		"""
+		with self.lock:
+			return path == self.path and preprocessor is self.preprocessor and not self.cancelled.is_set() and not self.claimed
+
+	def wait_hash(self):
+		"""
+		Espera el hash del contenido, que se calcula antes de la subida, y lo devuelve
+		"""
+		self.hashed.wait()
+		return self.file_hash
+
+	def claim(self, progress=None, cancel=None):
+		"""
+		Engancha un envío a la subida: espera a que termine y devuelve el archivo remoto.
+		El envío pasa a ser el dueño del archivo en el ciclo de vida y debe liberarlo al terminar.
+		cancel es el CancelToken del envío: al cancelarlo se cancela también la subida anticipada.
+		"""
+		self.progress = progress
+		self.ready_at_claim = self.done.is_set()
+		if progress is not None and not self.ready_at_claim:
+			progress(10, "Esperando la subida iniciada al seleccionar el archivo...")
+		if cancel is not None:
+			# La subida es del envío: si se cancela el envío, también se corta la subida
+			key = cancel.on_cancel(self.cancel)
+			try:
+				cancel.run(self.done.wait)
+			finally:
+				cancel.remove(key)
+		self.done.wait()
+		if self.error is not None:
+			raise self.error
+		with self.lock:
+			if self.released:
+				raise PrefetchCancelled("Subida anticipada cancelada.")
+			self.claimed = True
+		return self.media_file
+
+	def cancel(self):
+		"""
+		Cancela la subida. Si ya terminó y ningún envío la usó, libera el archivo remoto.
+		"""
+		self.cancelled.set()
+		self.token.cancel()
+		if self.done.is_set():
+			self._discard()
+
+	def _discard(self):
+		"""
+		Borra el archivo remoto, aunque su ruta esté fijada, una sola vez y sólo si ningún envío lo reclamó
+		"""
+		with self.lock:
+			if self.claimed or self.released or self.media_file is None:
+				return
+			self.released = True
+		if self.engine.lifecycle is not None:
+			self.engine.lifecycle.discard(self.media_file.name)
+
+	def stats(self):
+		"""
+		Devuelve un diccionario con el estado de la subida anticipada al momento de engancharse
+		"""
+		return {
+			"ready_at_send": self.ready_at_claim,
+			"upload_seconds": round(self.finished - self.started, 3) if self.finished is not None else None,
+		}
@@ -0,0 +1,223 @@
+"""
+Compresión local de videos antes de subirlos a Gemini.
+El modelo toma aproximadamente un cuadro por segundo a baja resolución, así que reducir la resolución y los cuadros por segundo antes de subir el archivo ahorra la mayor parte de los bytes sin cambiar el resultado.
+Los videos comprimidos se guardan en caché según el hash del contenido original. Si la compresión no sirvió, se guarda una marca vacía para no volver a intentarlo con el mismo video.
+** Nota **
+OpenCV sólo escribe la imagen: el video comprimido no conserva la pista de audio, por eso esta etapa es opcional.
+"""
+
+# Importaciones
+
+import os
+import time
+import tempfile
+import threading
+
+from engine.cache import CACHE_DIR
+from engine.hashing import file_sha256
+
+# Carpeta por defecto de los videos comprimidos
+COMPRESSED_DIR = os.path.join(CACHE_DIR, "compressed")
+
+# Valores por defecto de la compresión
+TARGET_HEIGHT = 480
+TARGET_FPS = 2.0
+# Los videos de menos de 20 MB se suben tal cual
+MIN_BYTES = 20 * 1024 * 1024
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi")
+
+class PreprocessResult:
+	"""
+	Resultado de la etapa de compresión de un archivo
+	"""
+
+	def __init__(self, path, original_bytes, output_bytes=None, elapsed=0.0, skipped=None, cached=False):
+		# Ruta del archivo que se debe subir: la original si se omitió la compresión
+		self.path = path
+		self.original_bytes = original_bytes
+		self.output_bytes = output_bytes if output_bytes is not None else original_bytes
+		self.elapsed = elapsed
+		# Motivo por el que se omitió la compresión, o None si se comprimió
+		self.skipped = skipped
+		self.cached = cached
+
+	@property
+	def bytes_saved(self):
+		"""
+		Bytes que se dejan de subir gracias a la compresión
+		"""
+		return self.original_bytes - self.output_bytes
+
+	def to_dict(self):
+		"""
+		Devuelve el resultado como diccionario
+		"""
+		return {
+			"original_bytes": self.original_bytes,
+			"output_bytes": self.output_bytes,
+			"bytes_saved": self.bytes_saved,
+			"elapsed": round(self.elapsed, 3),
+			"skipped": self.skipped,
+			"cached": self.cached,
+		}
+
+class VideoCompressor:
+	"""
+	Reduce la resolución y los cuadros por segundo de los videos con OpenCV antes de subirlos
+	"""
+
+	def __init__(self, target_height=TARGET_HEIGHT, target_fps=TARGET_FPS, min_bytes=MIN_BYTES, output_dir=COMPRESSED_DIR):
+		"""
+		Inicialización del compresor
+		"""
+		self.target_height = target_height
+		self.target_fps = target_fps
+		self.min_bytes = min_bytes
+		self.output_dir = output_dir
+		# Un candado por hash: si dos trabajos preparan el mismo video a la vez, el segundo espera y reutiliza el resultado del primero
+		self.lock = threading.Lock()
+		self.hash_locks = {}
+
+	def _name(self, file_hash):
+		"""
+		Devuelve el nombre base de los archivos del hash con la configuración actual
+		"""
+		return os.path.join(self.output_dir, f"{file_hash}_{self.target_height}p_{self.target_fps:g}fps")
+
+	def output_path(self, file_hash):
+		"""
+		Devuelve la ruta del video comprimido para el hash y la configuración actual
+		"""
+		return self._name(file_hash) + ".mp4"
+
+	def skip_path(self, file_hash):
+		"""
+		Devuelve la ruta de la marca que indica que comprimir el video no sirvió con la configuración actual
+		"""
+		return self._name(file_hash) + ".skip"
+
+	def _hash_lock(self, file_hash):
+		"""
+		Devuelve el candado del hash y cuenta un usuario más; se libera con _release_lock
+		"""
+		with self.lock:
+			entry = self.hash_locks.get(file_hash)
+			if entry is None:
+				entry = self.hash_locks[file_hash] = [threading.Lock(), 0]
+			entry[1] += 1
+			return entry[0]
+
+	def _release_lock(self, file_hash):
+		"""
+		Cuenta un usuario menos del candado del hash y lo quita cuando nadie más lo usa
+		"""
+		with self.lock:
+			entry = self.hash_locks[file_hash]
+			entry[1] -= 1
+			if not entry[1]:
+				del self.hash_locks[file_hash]
+
+	def prepare(self, path, file_hash=None):
+		"""
+		Devuelve un PreprocessResult con la ruta que se debe subir: el video comprimido, o el original si no vale la pena comprimirlo
+		"""
+		start = time.perf_counter()
+		original_bytes = os.path.getsize(path)
+
+		if os.path.splitext(path)[1].lower() not in VIDEO_EXTENSIONS:
+			return PreprocessResult(path, original_bytes, skipped="not_video")
+		if original_bytes < self.min_bytes:
+			return PreprocessResult(path, original_bytes, skipped="small")
+
+		if file_hash is None:
+			file_hash = file_sha256(path)
+		lock = self._hash_lock(file_hash)
+		try:
+			with lock:
+				return self._prepare(path, file_hash, original_bytes, start)
+		finally:
+			self._release_lock(file_hash)
+
+	def _prepare(self, path, file_hash, original_bytes, start):
+		"""
+		Cuerpo de prepare, con el candado del hash adquirido
+		"""
+		# Si ya se comprimió antes con la misma configuración, reutilizamos el resultado, también si no sirvió
+		output = self.output_path(file_hash)
+		if os.path.exists(output):
+			return PreprocessResult(output, original_bytes, os.path.getsize(output), time.perf_counter() - start, cached=True)
+		skip = self.skip_path(file_hash)
+		if os.path.exists(skip):
+			return PreprocessResult(path, original_bytes, elapsed=time.perf_counter() - start, skipped="not_smaller", cached=True)
+
+		# Cada codificación escribe en su propio temporal, también entre procesos distintos
+		os.makedirs(self.output_dir, exist_ok=True)
+		descriptor, temp_output = tempfile.mkstemp(suffix=".tmp.mp4", prefix=os.path.basename(output) + ".", dir=self.output_dir)
+		os.close(descriptor)
+		try:
+			written = self._encode(path, temp_output)
+			# Si no se pudo leer ningún cuadro, o el resultado no es más pequeño, subimos el original y lo recordamos
+			output_bytes = os.path.getsize(temp_output) if written else 0
+			if not written or output_bytes >= original_bytes:
+				open(skip, 'wb').close()
+				return PreprocessResult(path, original_bytes, elapsed=time.perf_counter() - start, skipped="not_smaller")
+			os.replace(temp_output, output)
+		finally:
+			if os.path.exists(temp_output):
+				os.remove(temp_output)
+		return PreprocessResult(output, original_bytes, output_bytes, time.perf_counter() - start)
+
+	def _encode(self, source, destination):
+		"""
+		Vuelve a codificar source en destination con la resolución y los cuadros por segundo configurados. Devuelve la cantidad de cuadros escritos.
+		"""
+		# Importamos aquí para no cargar OpenCV hasta que se necesite.
+		import cv2
+
+		capture = cv2.VideoCapture(source)
+		try:
+			source_fps = capture.get(cv2.CAP_PROP_FPS) or self.target_fps
+			width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+			height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+			if width <= 0 or height <= 0:
+				return 0
+
+			# Calculamos el tamaño de salida manteniendo la proporción, sin ampliar videos pequeños
+			if height > self.target_height:
+				out_height = self.target_height
+				out_width = int(round(width * self.target_height / height))
+			else:
+				out_height, out_width = height, width
+			# Los códecs necesitan dimensiones pares
+			out_width -= out_width % 2
+			out_height -= out_height % 2
+
+			out_fps = min(self.target_fps, source_fps)
+			# Cada cuántos cuadros de origen se escribe uno
+			step = source_fps / out_fps
+
+			writer = cv2.VideoWriter(destination, cv2.VideoWriter_fourcc(*"mp4v"), out_fps, (out_width, out_height))
+			written = 0
+			index = 0
+			next_frame = 0.0
+			try:
+				while True:
+					# grab avanza sin convertir el cuadro; sólo recuperamos los que vamos a escribir
+					if not capture.grab():
+						break
+					if index >= next_frame:
+						ok, frame = capture.retrieve()
+						if not ok:
+							break
+						if (out_width, out_height) != (width, height):
+							frame = cv2.resize(frame, (out_width, out_height), interpolation=cv2.INTER_AREA)
+						writer.write(frame)
+						written += 1
+						next_frame += step
+					index += 1
+			finally:
+				writer.release()
+			return written
+		finally:
+			capture.release()
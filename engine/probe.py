@@ -0,0 +1,374 @@
+"""
+Lectura rápida de los metadatos de los archivos multimedia y estimación de tokens.
+Siempre que es posible se leen sólo las cabeceras del contenedor (MP4/MOV, AVI, PNG y JPEG) en lugar de abrir el video completo con OpenCV, lo que evita bloqueos en carpetas de red.
+Los resultados se guardan en memoria según la ruta, el tamaño y la fecha de modificación del archivo.
+"""
+
+# Importaciones
+
+import os
+import math
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Tokens por imagen o cuadro de video, y tamaño de los mosaicos en que Gemini divide las imágenes grandes
+TOKENS_PER_TILE = 258
+TILE_SIZE = 768
+SMALL_IMAGE_SIZE = 384
+# Gemini toma un cuadro por segundo del video, más 32 tokens por segundo de audio
+TOKENS_PER_VIDEO_SECOND = 258
+TOKENS_PER_AUDIO_SECOND = 32
+
+# Límite de lectura de la caja moov, para no cargar cabeceras anómalas en memoria
+MAX_MOOV_BYTES = 64 * 1024 * 1024
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+class MediaInfo:
+	"""
+	Metadatos de un archivo multimedia
+	"""
+
+	def __init__(self, path, kind, size, duration=None, width=None, height=None, fps=None, has_audio=None, source="header"):
+		self.path = path
+		# "video" o "image"
+		self.kind = kind
+		self.size = size
+		self.duration = duration
+		self.width = width
+		self.height = height
+		self.fps = fps
+		self.has_audio = has_audio
+		# Cómo se obtuvieron los datos: "header" o "cv2"
+		self.source = source
+
+	@property
+	def tokens(self):
+		"""
+		Estimación de tokens del archivo
+		"""
+		return estimate_tokens(self)
+
+	def to_dict(self):
+		"""
+		Devuelve los metadatos como diccionario
+		"""
+		return {
+			"path": self.path,
+			"kind": self.kind,
+			"size": self.size,
+			"duration": self.duration,
+			"width": self.width,
+			"height": self.height,
+			"fps": self.fps,
+			"has_audio": self.has_audio,
+			"tokens": self.tokens,
+			"source": self.source,
+		}
+
+def estimate_tokens(info):
+	"""
+	Estima los tokens que consumirá el archivo según su tipo, resolución, duración y pista de audio
+	"""
+	if info.kind == "image":
+		# Las imágenes pequeñas cuentan como un solo mosaico; las grandes se dividen en mosaicos de 768 píxeles
+		if not info.width or not info.height or (info.width <= SMALL_IMAGE_SIZE and info.height <= SMALL_IMAGE_SIZE):
+			return TOKENS_PER_TILE
+		tiles = math.ceil(info.width / TILE_SIZE) * math.ceil(info.height / TILE_SIZE)
+		return tiles * TOKENS_PER_TILE
+
+	if not info.duration:
+		return 0
+	per_second = TOKENS_PER_VIDEO_SECOND
+	# Si no sabemos si hay audio, suponemos que sí para no quedarnos cortos
+	if info.has_audio is not False:
+		per_second += TOKENS_PER_AUDIO_SECOND
+	return int(math.ceil(info.duration * per_second))
+
+# Lectura de cabeceras MP4/MOV
+
+def _iter_boxes(data, start=0, end=None):
+	"""
+	Recorre las cajas de un bloque MP4 en memoria y genera (tipo, inicio_del_contenido, fin)
+	"""
+	end = len(data) if end is None else end
+	offset = start
+	while offset + 8 <= end:
+		size, box_type = struct.unpack_from(">I4s", data, offset)
+		header = 8
+		if size == 1:
+			size = struct.unpack_from(">Q", data, offset + 8)[0]
+			header = 16
+		elif size == 0:
+			size = end - offset
+		if size < header:
+			return
+		yield box_type, offset + header, min(offset + size, end)
+		offset += size
+
+def _find_box(data, path, start=0, end=None):
+	"""
+	Busca una caja anidada siguiendo la lista de tipos indicada y devuelve (inicio, fin) de su contenido
+	"""
+	for box_type, body, box_end in _iter_boxes(data, start, end):
+		if box_type == path[0]:
+			if len(path) == 1:
+				return body, box_end
+			return _find_box(data, path[1:], body, box_end)
+	return None
+
+def _read_moov(file, file_size):
+	"""
+	Localiza la caja moov saltando entre cabeceras, sin leer los datos del video, y devuelve su contenido
+	"""
+	offset = 0
+	while offset + 8 <= file_size:
+		file.seek(offset)
+		header = file.read(16)
+		if len(header) < 8:
+			return None
+		size, box_type = struct.unpack_from(">I4s", header)
+		header_size = 8
+		if size == 1:
+			size = struct.unpack_from(">Q", header, 8)[0]
+			header_size = 16
+		elif size == 0:
+			size = file_size - offset
+		if size < header_size:
+			return None
+		if box_type == b"moov":
+			if size > MAX_MOOV_BYTES:
+				return None
+			file.seek(offset + header_size)
+			return file.read(size - header_size)
+		offset += size
+	return None
+
+def _probe_mp4(path, size):
+	"""
+	Lee duración, resolución, cuadros por segundo y presencia de audio de un MP4/MOV
+	"""
+	with open(path, 'rb') as file:
+		moov = _read_moov(file, size)
+	if not moov:
+		return None
+
+	# Duración total desde mvhd
+	mvhd = _find_box(moov, [b"mvhd"])
+	if mvhd is None:
+		return None
+	version = moov[mvhd[0]]
+	if version == 1:
+		timescale, duration = struct.unpack_from(">IQ", moov, mvhd[0] + 20)
+	else:
+		timescale, duration = struct.unpack_from(">II", moov, mvhd[0] + 12)
+	if not timescale:
+		return None
+
+	info = MediaInfo(path, "video", size, duration=duration / timescale, has_audio=False)
+
+	for box_type, body, box_end in _iter_boxes(moov):
+		if box_type != b"trak":
+			continue
+		hdlr = _find_box(moov, [b"mdia", b"hdlr"], body, box_end)
+		if hdlr is None:
+			continue
+		handler = moov[hdlr[0] + 8:hdlr[0] + 12]
+		if handler == b"soun":
+			info.has_audio = True
+		elif handler == b"vide" and info.width is None:
+			# Ancho y alto están al final de tkhd, en formato de punto fijo 16.16
+			tkhd = _find_box(moov, [b"tkhd"], body, box_end)
+			if tkhd is not None:
+				width, height = struct.unpack_from(">II", moov, tkhd[1] - 8)
+				info.width, info.height = width >> 16, height >> 16
+			# Cuadros por segundo: muestras de stts entre la duración de la pista
+			mdhd = _find_box(moov, [b"mdia", b"mdhd"], body, box_end)
+			stts = _find_box(moov, [b"mdia", b"minf", b"stbl", b"stts"], body, box_end)
+			if mdhd is not None and stts is not None:
+				if moov[mdhd[0]] == 1:
+					track_scale, track_duration = struct.unpack_from(">IQ", moov, mdhd[0] + 20)
+				else:
+					track_scale, track_duration = struct.unpack_from(">II", moov, mdhd[0] + 12)
+				entries = struct.unpack_from(">I", moov, stts[0] + 4)[0]
+				frames = sum(struct.unpack_from(">I", moov, stts[0] + 8 + index * 8)[0] for index in range(entries))
+				if track_scale and track_duration:
+					info.fps = frames / (track_duration / track_scale)
+	return info
+
+def _probe_avi(path, size):
+	"""
+	Lee la cabecera principal de un AVI (avih) para obtener cuadros, resolución y presencia de audio
+	"""
+	with open(path, 'rb') as file:
+		header = file.read(64 * 1024)
+	if header[:4] != b"RIFF" or header[8:12] != b"AVI ":
+		return None
+	index = header.find(b"avih")
+	if index < 0:
+		return None
+	micro_per_frame, = struct.unpack_from("<I", header, index + 8)
+	total_frames, = struct.unpack_from("<I", header, index + 8 + 16)
+	width, height = struct.unpack_from("<II", header, index + 8 + 32)
+	if not micro_per_frame:
+		return None
+	fps = 1_000_000 / micro_per_frame
+	return MediaInfo(path, "video", size, duration=total_frames / fps, width=width, height=height, fps=fps, has_audio=b"auds" in header)
+
+def _probe_png(path, size):
+	"""
+	Lee el ancho y el alto de la cabecera IHDR de un PNG
+	"""
+	with open(path, 'rb') as file:
+		header = file.read(24)
+	if header[:8] != b"\x89PNG\r\n\x1a\n" or header[12:16] != b"IHDR":
+		return None
+	width, height = struct.unpack_from(">II", header, 16)
+	return MediaInfo(path, "image", size, width=width, height=height)
+
+def _probe_jpeg(path, size):
+	"""
+	Recorre los marcadores de un JPEG hasta el SOF, que contiene el ancho y el alto
+	"""
+	with open(path, 'rb') as file:
+		if file.read(2) != b"\xff\xd8":
+			return None
+		while True:
+			marker = file.read(2)
+			if len(marker) < 2 or marker[0] != 0xFF:
+				return None
+			code = marker[1]
+			# Marcadores sin longitud
+			if code == 0xFF:
+				file.seek(-1, os.SEEK_CUR)
+				continue
+			if code in (0x01,) or 0xD0 <= code <= 0xD7:
+				continue
+			length_bytes = file.read(2)
+			if len(length_bytes) < 2:
+				return None
+			length, = struct.unpack(">H", length_bytes)
+			# SOF0 a SOF15, excepto DHT (C4), JPG (C8) y DAC (CC)
+			if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+				data = file.read(5)
+				height, width = struct.unpack_from(">HH", data, 1)
+				return MediaInfo(path, "image", size, width=width, height=height)
+			file.seek(length - 2, os.SEEK_CUR)
+
+def _probe_cv2(path, size, kind):
+	"""
+	Obtiene los metadatos con OpenCV cuando no se pueden leer las cabeceras
+	"""
+	# Importamos aquí para no cargar OpenCV hasta que se necesite.
+	import cv2
+
+	if kind == "image":
+		image = cv2.imread(path)
+		if image is None:
+			return MediaInfo(path, kind, size, source="cv2")
+		height, width = image.shape[:2]
+		return MediaInfo(path, kind, size, width=width, height=height, source="cv2")
+
+	capture = cv2.VideoCapture(path)
+	try:
+		fps = capture.get(cv2.CAP_PROP_FPS)
+		frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+		width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)) or None
+		height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)) or None
+	finally:
+		capture.release()
+	duration = frame_count / fps if fps > 0 else None
+	return MediaInfo(path, kind, size, duration=duration, width=width, height=height, fps=fps or None, source="cv2")
+
+def probe_file(path):
+	"""
+	Obtiene los metadatos de un archivo sin usar caché
+	"""
+	size = os.path.getsize(path)
+	extension = os.path.splitext(path)[1].lower()
+	if extension in VIDEO_EXTENSIONS:
+		kind = "video"
+		reader = _probe_avi if extension == ".avi" else _probe_mp4
+	elif extension in IMAGE_EXTENSIONS:
+		kind = "image"
+		reader = _probe_png if extension == ".png" else _probe_jpeg
+	else:
+		raise ValueError("Formato de archivo no compatible.")
+
+	try:
+		info = reader(path, size)
+	except (struct.error, IndexError, OSError):
+		info = None
+	if info is None:
+		info = _probe_cv2(path, size, kind)
+	return info
+
+def estimate_report(probe, path):
+	"""
+	Lee los metadatos de path con probe y devuelve (info, mensaje, error): el mensaje con la estimación de tokens, o el error si no se pudieron leer.
+	No lanza excepciones, para usarla desde un hilo secundario de la interfaz.
+	"""
+	try:
+		info = probe.probe(path)
+	except ValueError:
+		return None, None, "Formato de archivo no compatible."
+	except Exception as e:
+		return None, None, f"No se pudieron leer los datos del archivo: {str(e)}"
+	if info.kind == "video":
+		if not info.duration:
+			return info, None, "No se pudo obtener la duración del video."
+		audio = "con audio" if info.has_audio else "sin audio"
+		return info, f"Duración: {info.duration:.2f} segundos, {audio}. Estimación de tokens: {info.tokens}.", None
+	return info, f"El archivo es una imagen de {info.width} por {info.height} píxeles. Estimación de tokens: {info.tokens}.", None
+
+class MediaProbe:
+	"""
+	Lector de metadatos con caché en memoria según (ruta, tamaño, fecha de modificación)
+	"""
+
+	def __init__(self, max_entries=10000):
+		"""
+		Inicialización del lector
+		"""
+		self.max_entries = max_entries
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+
+	def probe(self, path):
+		"""
+		Devuelve los MediaInfo del archivo, reutilizando el resultado si el archivo no cambió
+		"""
+		stat = os.stat(path)
+		key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+		with self.lock:
+			info = self.entries.get(key)
+			if info is not None:
+				self.entries.move_to_end(key)
+				return info
+
+		info = probe_file(path)
+
+		with self.lock:
+			self.entries[key] = info
+			# Eliminamos los más antiguos si se supera el límite
+			while len(self.entries) > self.max_entries:
+				self.entries.popitem(last=False)
+		return info
+
+	def probe_many(self, paths, workers=8):
+		"""
+		Obtiene los metadatos de varios archivos en paralelo, por ejemplo los de collect_media_files(carpeta). Genera (ruta, MediaInfo o excepción) en el orden recibido.
+		"""
+		paths = list(paths)
+		def safe_probe(path):
+			try:
+				return self.probe(path)
+			except Exception as e:
+				return e
+
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			for path, info in zip(paths, executor.map(safe_probe, paths)):
+				yield path, info
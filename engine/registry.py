@@ -0,0 +1,217 @@
+"""
+Registro local de los archivos ya subidos a Gemini.
+Relaciona el hash del contenido de cada archivo con el nombre del archivo remoto, su fecha de expiración y su estado, para poder reutilizarlo en lugar de subirlo de nuevo.
+Los cambios se escriben en disco agrupados, como mucho una vez cada SAVE_DELAY segundos, en lugar de reescribir el archivo en cada subida.
+"""
+
+# Importaciones
+
+import os
+import time
+import json
+import atexit
+import threading
+
+from engine.cache import CACHE_DIR
+from engine.scheduler import error_code
+
+# Archivo por defecto del registro
+REGISTRY_FILE = "uploads.json"
+
+# Gemini conserva los archivos 48 horas. Si el servidor no indica la expiración, usamos este valor.
+DEFAULT_LIFETIME = 48 * 60 * 60
+
+# Margen de seguridad en segundos: no reutilizamos archivos que estén a punto de expirar.
+EXPIRY_MARGIN = 10 * 60
+
+# Segundos que se esperan antes de escribir los cambios, para agrupar los de varias subidas seguidas
+SAVE_DELAY = 2.0
+
+# Códigos con los que Gemini indica que el archivo ya no existe: borrado, expirado o de otro proyecto
+GONE_CODES = (403, 404)
+GONE_STATUS = ("NOT_FOUND", "PERMISSION_DENIED")
+
+def _is_gone(error):
+	"""
+	Indica si el error de files.get significa que el archivo ya no está en el servidor, y no un fallo temporal
+	"""
+	return error_code(error) in GONE_CODES or getattr(error, "status", None) in GONE_STATUS
+
+def _expiry_timestamp(remote_file):
+	"""
+	Devuelve la expiración del archivo remoto como marca de tiempo
+	"""
+	expiration = getattr(remote_file, "expiration_time", None)
+	if expiration is None:
+		return time.time() + DEFAULT_LIFETIME
+	# El SDK devuelve un datetime, aunque aceptamos también números.
+	if hasattr(expiration, "timestamp"):
+		return expiration.timestamp()
+	return float(expiration)
+
+def _state_name(remote_file):
+	"""
+	Devuelve el nombre del estado del archivo remoto
+	"""
+	state = getattr(remote_file, "state", None)
+	return getattr(state, "name", None) or str(state)
+
+class UploadRegistry:
+	"""
+	Registro persistente hash → archivo remoto de Gemini
+	"""
+
+	def __init__(self, path=None, save_delay=SAVE_DELAY):
+		"""
+		Inicialización del registro, cargando las entradas guardadas si existen.
+		save_delay es la espera en segundos antes de escribir los cambios; con 0 se escriben en cada cambio.
+		"""
+		if path is None:
+			path = os.path.join(CACHE_DIR, REGISTRY_FILE)
+		self.path = path
+		self.save_delay = save_delay
+		self.lock = threading.Lock()
+		self.entries = {}
+		self.reused = 0
+		# Escritura programada, si hay cambios sin guardar
+		self.timer = None
+		self.load()
+		# Lo pendiente se escribe también si el programa termina sin llamar a close
+		atexit.register(self.flush)
+
+	def load(self):
+		"""
+		Carga las entradas desde el archivo
+		"""
+		try:
+			with open(self.path, 'r', encoding='utf-8') as file:
+				entries = json.load(file)
+		except (OSError, ValueError):
+			entries = {}
+		# Descartamos las entradas expiradas para que el registro no crezca sin límite
+		now = time.time()
+		self.entries = {key: entry for key, entry in entries.items() if entry.get("expires", 0) > now}
+
+	def _changed(self):
+		"""
+		Programa la escritura de los cambios. Debe llamarse con el candado adquirido.
+		"""
+		if not self.save_delay:
+			self.save()
+			return
+		if self.timer is None:
+			self.timer = threading.Timer(self.save_delay, self.flush)
+			self.timer.daemon = True
+			self.timer.start()
+
+	def flush(self):
+		"""
+		Escribe ya los cambios pendientes, si los hay
+		"""
+		with self.lock:
+			if self.timer is None:
+				return
+			self.timer.cancel()
+			self.timer = None
+			self.save()
+
+	def close(self):
+		"""
+		Escribe los cambios pendientes. El registro se puede seguir usando después.
+		"""
+		self.flush()
+
+	def save(self):
+		"""
+		Guarda las entradas en el archivo, sustituyéndolo de forma atómica. Debe llamarse con el candado adquirido.
+		"""
+		folder = os.path.dirname(self.path)
+		if folder:
+			os.makedirs(folder, exist_ok=True)
+		temp_path = self.path + ".tmp"
+		with open(temp_path, 'w', encoding='utf-8') as file:
+			json.dump(self.entries, file)
+		os.replace(temp_path, self.path)
+
+	def get(self, file_hash):
+		"""
+		Devuelve la entrada registrada para el hash, o None si no existe o ya expiró
+		"""
+		with self.lock:
+			entry = self.entries.get(file_hash)
+			if entry is None:
+				return None
+			if entry["expires"] - EXPIRY_MARGIN <= time.time():
+				# La entrada expiró, la quitamos del registro
+				del self.entries[file_hash]
+				self._changed()
+				return None
+			return dict(entry)
+
+	def record(self, file_hash, remote_file):
+		"""
+		Registra o actualiza el archivo remoto asociado al hash
+		"""
+		with self.lock:
+			self.entries[file_hash] = {
+				"name": remote_file.name,
+				"expires": _expiry_timestamp(remote_file),
+				"state": _state_name(remote_file),
+			}
+			self._changed()
+
+	def forget(self, file_hash):
+		"""
+		Elimina la entrada del hash indicado
+		"""
+		with self.lock:
+			if self.entries.pop(file_hash, None) is not None:
+				self._changed()
+
+	def forget_name(self, name):
+		"""
+		Elimina las entradas que apuntan al archivo remoto name, por ejemplo porque se borró
+		"""
+		with self.lock:
+			keys = [key for key, entry in self.entries.items() if entry.get("name") == name]
+			for key in keys:
+				del self.entries[key]
+			if keys:
+				self._changed()
+
+	def live_names(self):
+		"""
+		Devuelve los nombres de los archivos remotos registrados que todavía no expiraron
+		"""
+		now = time.time()
+		with self.lock:
+			return {entry["name"] for entry in self.entries.values() if entry.get("expires", 0) > now}
+
+	def resolve(self, client, file_hash, get=None):
+		"""
+		Devuelve el archivo remoto registrado para el hash si sigue siendo válido en el servidor, o None si hay que subirlo de nuevo.
+		get, si se indica, sustituye a client.files.get, por ejemplo para pasar la consulta por el planificador y reintentar los errores temporales.
+		Sólo se olvida la entrada si el servidor dice que el archivo ya no existe; cualquier otro error se lanza, para no volver a subir un archivo que sigue ahí.
+		"""
+		entry = self.get(file_hash)
+		if entry is None:
+			return None
+
+		# Comprobamos en el servidor que el archivo siga existiendo
+		try:
+			remote_file = (get or client.files.get)(name=entry["name"])
+		except Exception as e:
+			if not _is_gone(e):
+				raise
+			self.forget(file_hash)
+			return None
+
+		if _state_name(remote_file) == "FAILED":
+			self.forget(file_hash)
+			return None
+
+		# Actualizamos el estado y la expiración con lo que informa el servidor
+		self.record(file_hash, remote_file)
+		with self.lock:
+			self.reused += 1
+		return remote_file
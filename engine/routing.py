@@ -0,0 +1,264 @@
+"""
+Elección del modelo de cada solicitud, con modelos de respaldo y solicitudes duplicadas para la cola de latencia.
+El enrutador elige el modelo según el tipo de archivo, los tokens estimados y una política: "quality" usa siempre el modelo principal, "balanced" usa un modelo ligero para las imágenes pequeñas y "latency" el modelo con menor latencia medida.
+Si un modelo falla o está saturado, la solicitud pasa al siguiente de la cadena, y el modelo saturado queda al final de la cadena durante un rato.
+Con solicitudes duplicadas activadas, si la respuesta tarda más que el p95 de ese modelo, se envía la misma solicitud otra vez y se usa la primera respuesta que llegue.
+La latencia de cada modelo se mide en cada respuesta y alimenta tanto la política como el umbral de duplicación.
+"""
+
+# Importaciones
+
+import time
+import queue
+import threading
+from collections import deque
+
+from engine.scheduler import error_code, is_retryable, percentile
+from engine.describer import DEFAULT_MODEL
+
+# Cadena por defecto: el modelo principal y los de respaldo, en orden
+FALLBACK_MODELS = ("gemini-2.0-flash",)
+# Modelo ligero para las imágenes pequeñas
+LIGHT_MODEL = "gemini-2.0-flash-lite"
+# Tokens estimados hasta los que una imagen se considera pequeña: hasta cuatro recuadros de 768 píxeles
+LIGHT_MAX_TOKENS = 4 * 258
+POLICIES = ("quality", "balanced", "latency")
+# Política por defecto: el modelo ligero cambia la calidad de las descripciones, así que sólo se usa si se pide
+DEFAULT_POLICY = "quality"
+# Mediciones que se conservan por modelo, y mínimo para usarlas en la política y en la duplicación
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 10
+# Percentil de latencia a partir del cual se envía la solicitud duplicada
+HEDGE_PERCENTILE = 0.95
+# Segundos que un modelo saturado pasa al final de la cadena
+OVERLOAD_COOLDOWN = 60.0
+# Intentos con cada modelo antes de pasar al siguiente: un 429 o un 503 aislado se reintenta con el mismo modelo en lugar de darlo por saturado
+ATTEMPTS = 2
+# Códigos que no dependen del modelo: cambiar de modelo no los arregla
+FATAL_CODES = (401, 403)
+
+class _ModelStats:
+	"""
+	Latencias recientes y contadores de un modelo
+	"""
+
+	def __init__(self):
+		# Respuestas completas y tiempo hasta el primer fragmento, por separado
+		self.latency = deque(maxlen=LATENCY_WINDOW)
+		self.ttft = deque(maxlen=LATENCY_WINDOW)
+		self.calls = 0
+		self.errors = 0
+		self.fallbacks = 0
+		self.hedges = 0
+		self.hedge_wins = 0
+		self.overloaded_until = 0.0
+
+	def samples(self, streaming):
+		return self.ttft if streaming else self.latency
+
+class ModelRouter:
+	"""
+	Elige el modelo de cada solicitud, pasa al siguiente si falla y duplica las solicitudes lentas
+	"""
+
+	def __init__(self, chain=None, light_model=LIGHT_MODEL, light_max_tokens=LIGHT_MAX_TOKENS, policy=DEFAULT_POLICY, hedge=False, hedge_percentile=HEDGE_PERCENTILE, min_samples=MIN_SAMPLES, attempts=ATTEMPTS, metrics=None):
+		"""
+		Inicialización del enrutador. chain es la lista de modelos en orden de preferencia; el primero es el principal.
+		light_model es el modelo para las imágenes de hasta light_max_tokens tokens con la política "balanced"; con None no se usa.
+		Con hedge=True se duplica la solicitud que tarda más que el percentil hedge_percentile de su modelo, una vez que hay min_samples mediciones.
+		attempts es la cantidad de intentos con cada modelo antes de pasar al siguiente, sin superar los reintentos del planificador; el último modelo usa todos los del planificador.
+		"""
+		if policy not in POLICIES:
+			raise ValueError(f"Política de modelos desconocida: {policy}")
+		self.chain = list(chain or (DEFAULT_MODEL,) + FALLBACK_MODELS)
+		self.light_model = light_model
+		self.light_max_tokens = light_max_tokens
+		self.policy = policy
+		self.hedge = hedge
+		self.hedge_percentile = hedge_percentile
+		self.min_samples = min_samples
+		self.attempts = attempts
+		self.metrics = metrics
+		self.lock = threading.Lock()
+		self.models = {}
+
+	def _stats(self, model):
+		"""
+		Devuelve las estadísticas del modelo. Debe llamarse con el candado adquirido.
+		"""
+		stats = self.models.get(model)
+		if stats is None:
+			stats = self.models[model] = _ModelStats()
+		return stats
+
+	def _p(self, model, fraction, streaming=False):
+		"""
+		Devuelve el percentil de latencia del modelo, o None si todavía no hay suficientes mediciones. Debe llamarse con el candado adquirido.
+		"""
+		samples = self._stats(model).samples(streaming)
+		if len(samples) < self.min_samples:
+			return None
+		return percentile(list(samples), fraction)
+
+	def known_models(self):
+		"""
+		Devuelve todos los modelos que el enrutador puede usar, el principal primero
+		"""
+		models = list(self.chain)
+		if self.light_model and self.light_model not in models:
+			models.append(self.light_model)
+		return models
+
+	def route(self, kind, tokens=None, streaming=False):
+		"""
+		Devuelve la lista de modelos a probar, en orden, para un archivo de tipo kind ("image" o "video") con tokens estimados
+		"""
+		chain = list(self.chain)
+		now = time.monotonic()
+		with self.lock:
+			if self.policy == "balanced" and self.light_model and kind == "image" and tokens is not None and tokens <= self.light_max_tokens:
+				# El modelo ligero va primero, salvo que las mediciones digan que el principal responde antes
+				light = self._p(self.light_model, 0.5, streaming)
+				main = self._p(chain[0], 0.5, streaming)
+				if light is None or main is None or light <= main:
+					chain = [self.light_model] + [model for model in chain if model != self.light_model]
+			elif self.policy == "latency":
+				# Los modelos sin mediciones suficientes van primero, para medirlos; después, del más rápido al más lento
+				def key(model):
+					p50 = self._p(model, 0.5, streaming)
+					return 0.0 if p50 is None else p50
+				chain.sort(key=key)
+			# Los modelos saturados pasan al final mientras dure su espera
+			chain.sort(key=lambda model: self._stats(model).overloaded_until > now)
+		return chain
+
+	def should_fallback(self, error):
+		"""
+		Indica si el error justifica probar con el siguiente modelo. Los errores de autenticación fallan igual con cualquiera.
+		"""
+		return error_code(error) not in FATAL_CODES
+
+	def call(self, models, attempt, streaming=False, cancel=None, record=None):
+		"""
+		Llama a attempt(modelo, reintentos) con cada modelo de models hasta que uno responda, y devuelve (modelo, resultado).
+		reintentos es la cantidad de reintentos del planificador para ese intento, o None en el último modelo para usar los del planificador.
+		Con streaming=True, attempt debe volver en cuanto llega el primer fragmento, y se mide ese tiempo.
+		record, si se indica, recibe en "routing" el modelo que respondió, los modelos probados y si se duplicó la solicitud.
+		"""
+		tried = []
+		hedged = False
+		for index, model in enumerate(models):
+			last = index == len(models) - 1
+			retries = None if last else max(0, self.attempts - 1)
+			tried.append(model)
+			try:
+				value, hedged = self._hedged(model, lambda model=model, retries=retries: attempt(model, retries), streaming, cancel)
+			except Exception as e:
+				if cancel is not None:
+					cancel.check()
+				with self.lock:
+					stats = self._stats(model)
+					stats.errors += 1
+					if is_retryable(e):
+						# Saturado o con errores temporales: lo dejamos al final de la cadena un rato
+						stats.overloaded_until = time.monotonic() + OVERLOAD_COOLDOWN
+					if not last and self.should_fallback(e):
+						stats.fallbacks += 1
+				if last or not self.should_fallback(e):
+					raise
+				self._increment("fallbacks")
+				continue
+			if record is not None:
+				record["routing"] = {"model": model, "tried": tried, "hedged": hedged}
+			return model, value
+
+	def _hedged(self, model, call, streaming, cancel):
+		"""
+		Ejecuta call y, si tarda más que el percentil de duplicación del modelo, lanza una copia y devuelve la primera respuesta correcta.
+		Devuelve (resultado, duplicada).
+		"""
+		with self.lock:
+			self._stats(model).calls += 1
+			budget = self._p(model, self.hedge_percentile, streaming) if self.hedge else None
+		if budget is None:
+			start = time.perf_counter()
+			value = call()
+			self._observe(model, time.perf_counter() - start, streaming)
+			return value, False
+
+		answers = queue.Queue()
+
+		def launch(tag):
+			def target():
+				start = time.perf_counter()
+				try:
+					value = call()
+				except BaseException as e:
+					answers.put((tag, None, e))
+					return
+				self._observe(model, time.perf_counter() - start, streaming)
+				answers.put((tag, value, None))
+			threading.Thread(target=target, name="gemini-hedge", daemon=True).start()
+
+		key = cancel.on_cancel(lambda: answers.put(("cancel", None, None))) if cancel is not None else None
+		try:
+			launch("first")
+			try:
+				tag, value, error = answers.get(timeout=budget)
+			except queue.Empty:
+				# La respuesta tarda más de lo habitual: enviamos la copia y nos quedamos con la primera que llegue
+				with self.lock:
+					self._stats(model).hedges += 1
+				self._increment("hedges")
+				launch("hedge")
+				tag, value, error = answers.get()
+				if error is not None and tag != "cancel":
+					# Si una de las dos falló, esperamos a la otra
+					tag, value, error = answers.get()
+				if tag == "hedge" and error is None:
+					with self.lock:
+						self._stats(model).hedge_wins += 1
+					self._increment("hedge_wins")
+				if tag != "cancel" and error is None:
+					return value, True
+			if tag == "cancel":
+				cancel.check()
+			if error is not None:
+				raise error
+			return value, False
+		finally:
+			if cancel is not None:
+				cancel.remove(key)
+
+	def _observe(self, model, seconds, streaming):
+		"""
+		Registra la latencia de una respuesta correcta del modelo
+		"""
+		with self.lock:
+			self._stats(model).samples(streaming).append(seconds)
+
+	def _increment(self, name):
+		if self.metrics is not None:
+			self.metrics.increment(name)
+
+	def stats(self):
+		"""
+		Devuelve un diccionario por modelo con las llamadas, errores, solicitudes duplicadas y percentiles de latencia
+		"""
+		with self.lock:
+			data = {}
+			for model, stats in self.models.items():
+				latency = list(stats.latency)
+				ttft = list(stats.ttft)
+				data[model] = {
+					"calls": stats.calls,
+					"errors": stats.errors,
+					"fallbacks": stats.fallbacks,
+					"hedges": stats.hedges,
+					"hedge_wins": stats.hedge_wins,
+					"latency_p50": round(percentile(latency, 0.5), 3) if latency else None,
+					"latency_p95": round(percentile(latency, 0.95), 3) if latency else None,
+					"ttft_p50": round(percentile(ttft, 0.5), 3) if ttft else None,
+					"ttft_p95": round(percentile(ttft, 0.95), 3) if ttft else None,
+				}
+			return data
@@ -0,0 +1,195 @@
+"""
+Planificador de solicitudes que respeta las cuotas de Gemini.
+Usa un cubo de solicitudes por minuto (RPM) y otro de tokens por minuto (TPM), alimentado con la estimación de tokens de cada archivo.
+Los errores por límite de solicitudes (429) y los errores temporales del servidor (5xx) se reintentan con espera exponencial y variación aleatoria.
+"""
+
+# Importaciones
+
+import time
+import random
+import threading
+
+# Valores por defecto de los reintentos, en segundos
+MAX_RETRIES = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+# Códigos y estados que indican un error temporal
+RETRYABLE_CODES = (408, 429, 500, 502, 503, 504)
+RETRYABLE_STATUS = ("RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL")
+
+def error_code(error):
+	"""
+	Devuelve el código HTTP de un error de la biblioteca de Gemini o de urllib, o None si no tiene
+	"""
+	for attribute in ("code", "status_code"):
+		code = getattr(error, attribute, None)
+		if isinstance(code, int):
+			return code
+	return None
+
+def is_retryable(error):
+	"""
+	Indica si el error es por límite de solicitudes o un fallo temporal del servidor.
+	Sólo se miran el código y el estado del error: el texto puede contener rutas o cantidades que se parezcan a un código.
+	"""
+	if error_code(error) in RETRYABLE_CODES:
+		return True
+	status = getattr(error, "status", None)
+	return isinstance(status, str) and status in RETRYABLE_STATUS
+
+def percentile(values, fraction):
+	"""
+	Devuelve el percentil indicado (entre 0 y 1) de una lista de valores
+	"""
+	if not values:
+		return 0.0
+	ordered = sorted(values)
+	index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+	return ordered[index]
+
+class TokenBucket:
+	"""
+	Cubo de fichas que se rellena de forma continua a rate fichas por segundo, con capacidad máxima capacity
+	"""
+
+	def __init__(self, rate, capacity):
+		self.rate = rate
+		self.capacity = capacity
+		self.available = capacity
+		self.updated = time.monotonic()
+		self.lock = threading.Lock()
+
+	def _refill(self):
+		"""
+		Añade las fichas acumuladas desde la última actualización. Debe llamarse con el candado adquirido.
+		"""
+		now = time.monotonic()
+		self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+		self.updated = now
+
+	def acquire(self, amount=1, cancel=None):
+		"""
+		Toma amount fichas, esperando lo necesario. Devuelve los segundos esperados.
+		cancel, si se indica, es el CancelToken que corta la espera.
+		"""
+		# Una petición mayor que el cubo nunca cabría: la limitamos a su capacidad
+		amount = min(amount, self.capacity)
+		waited = 0.0
+		while True:
+			with self.lock:
+				self._refill()
+				if self.available >= amount:
+					self.available -= amount
+					return waited
+				delay = (amount - self.available) / self.rate
+			if cancel is not None:
+				cancel.sleep(delay)
+			else:
+				time.sleep(delay)
+			waited += delay
+
+	def refund(self, amount):
+		"""
+		Devuelve fichas al cubo, por ejemplo cuando la solicitud falló sin consumir cuota
+		"""
+		with self.lock:
+			self._refill()
+			self.available = min(self.capacity, self.available + amount)
+
+class RequestScheduler:
+	"""
+	Ejecuta las llamadas a Gemini dentro de las cuotas configuradas y reintenta los errores temporales
+	"""
+
+	def __init__(self, rpm=None, tpm=None, max_retries=MAX_RETRIES, base_delay=BASE_DELAY, max_delay=MAX_DELAY, burst=None):
+		"""
+		Inicialización del planificador. rpm y tpm son las cuotas por minuto; con None no se limitan.
+		burst es la fracción de minuto que se puede gastar de golpe: por defecto el minuto completo, y con valores menores el ritmo es más parejo.
+		"""
+		burst = burst or 1.0
+		self.requests = TokenBucket(rpm / 60, max(1, rpm * burst)) if rpm else None
+		self.tokens = TokenBucket(tpm / 60, max(1, tpm * burst)) if tpm else None
+		self.max_retries = max_retries
+		self.base_delay = base_delay
+		self.max_delay = max_delay
+
+		self.lock = threading.Lock()
+		self.calls = 0
+		self.retries = 0
+		self.failures = 0
+		self.queue_waits = []
+		self.backoff_total = 0.0
+
+	def backoff(self, attempt):
+		"""
+		Espera del reintento attempt: exponencial con variación aleatoria completa
+		"""
+		return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+	def call(self, func, *args, tokens=0, record=None, cancel=None, retries=None, **kwargs):
+		"""
+		Ejecuta func(*args, **kwargs) cuando lo permiten las cuotas. tokens es la estimación de tokens de entrada de la llamada.
+		record, si se indica, es un diccionario donde se acumulan la espera en cola ("queue_wait") y los reintentos ("retries") de esta llamada.
+		cancel, si se indica, es el CancelToken del trabajo: al cancelarlo se dejan de esperar turno y reintentos.
+		retries, si se indica, limita los reintentos de esta llamada sin superar max_retries; con 0 el primer error se lanza sin reintentar.
+		"""
+		max_retries = self.max_retries if retries is None else min(retries, self.max_retries)
+		attempt = 0
+		while True:
+			# Esperamos turno en los dos cubos
+			waited = 0.0
+			if cancel is not None:
+				cancel.check()
+			if self.requests is not None:
+				waited += self.requests.acquire(1, cancel)
+			if self.tokens is not None and tokens:
+				waited += self.tokens.acquire(tokens, cancel)
+			with self.lock:
+				self.calls += 1
+				self.queue_waits.append(waited)
+				# Conservamos sólo las últimas mediciones
+				if len(self.queue_waits) > 10000:
+					del self.queue_waits[:5000]
+			if record is not None:
+				record["queue_wait"] = round(record.get("queue_wait", 0.0) + waited, 3)
+
+			try:
+				return func(*args, **kwargs)
+			except Exception as e:
+				# Una llamada fallida no gastó los tokens estimados: los devolvemos, y el reintento los vuelve a tomar
+				if self.tokens is not None and tokens:
+					self.tokens.refund(tokens)
+				if not is_retryable(e) or attempt >= max_retries:
+					with self.lock:
+						self.failures += 1
+					raise
+				delay = self.backoff(attempt)
+				attempt += 1
+				with self.lock:
+					self.retries += 1
+					self.backoff_total += delay
+				if record is not None:
+					record["retries"] = record.get("retries", 0) + 1
+				if cancel is not None:
+					cancel.sleep(delay)
+				else:
+					time.sleep(delay)
+
+	def stats(self):
+		"""
+		Devuelve un diccionario con las llamadas, reintentos y tiempos de espera en cola
+		"""
+		with self.lock:
+			waits = list(self.queue_waits)
+			return {
+				"calls": self.calls,
+				"retries": self.retries,
+				"failures": self.failures,
+				"queue_wait_total": round(sum(waits), 3),
+				"queue_wait_p50": round(percentile(waits, 0.5), 3),
+				"queue_wait_p95": round(percentile(waits, 0.95), 3),
+				"queue_wait_max": round(max(waits), 3) if waits else 0.0,
+				"backoff_total": round(self.backoff_total, 3),
+			}
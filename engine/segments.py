@@ -0,0 +1,203 @@
+"""
+Modo para videos largos: divide el video en fragmentos de tiempo, describe los fragmentos en paralelo y une las descripciones en una sola con marcas de tiempo.
+Cada fragmento es más rápido de subir y de procesar, y la llamada final sólo recibe texto, así que se evita una única llamada muy larga que además puede superar el contexto del modelo.
+** Nota **
+Los fragmentos se escriben con OpenCV, que no conserva la pista de audio.
+"""
+
+# Importaciones
+
+import os
+import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from engine.cache import CACHE_DIR
+from engine.hashing import file_sha256
+from engine.probe import MediaProbe
+
+# Carpeta por defecto de los fragmentos
+SEGMENTS_DIR = os.path.join(CACHE_DIR, "segments")
+
+# Valores por defecto: fragmentos de 5 minutos, y sólo para videos de más de 10 minutos
+SEGMENT_SECONDS = 300
+MIN_DURATION = 600
+SEGMENT_WORKERS = 4
+
+MERGE_PROMPT = (
+	"A continuación tienes las descripciones de fragmentos consecutivos de un mismo video, cada una con su intervalo de tiempo. "
+	"Redacta una única descripción completa y coherente del video, sin repetir información, "
+	"indicando las marcas de tiempo (mm:ss) de los momentos importantes respecto al video completo. "
+	"Sigue además estas instrucciones originales del usuario:\n{prompt}"
+)
+
+def format_timestamp(seconds):
+	"""
+	Devuelve los segundos con formato h:mm:ss o mm:ss
+	"""
+	seconds = int(seconds)
+	hours, rest = divmod(seconds, 3600)
+	minutes, seconds = divmod(rest, 60)
+	if hours:
+		return f"{hours}:{minutes:02d}:{seconds:02d}"
+	return f"{minutes:02d}:{seconds:02d}"
+
+def split_video(path, segment_seconds, output_dir):
+	"""
+	Divide el video en fragmentos de segment_seconds segundos dentro de output_dir.
+	Genera (inicio, fin, ruta) en cuanto se termina de escribir cada fragmento, para poder subirlo mientras se corta el siguiente.
+	Si el video ya se dividió antes, se reutilizan los fragmentos.
+	"""
+	# Si ya se dividió antes, reutilizamos el índice guardado
+	index_path = os.path.join(output_dir, "index.txt")
+	if os.path.exists(index_path):
+		segments = []
+		with open(index_path, 'r', encoding='utf-8') as file:
+			for line in file:
+				start, end, name = line.rstrip("\n").split("\t")
+				segments.append((float(start), float(end), os.path.join(output_dir, name)))
+		if all(os.path.exists(segment[2]) for segment in segments):
+			yield from segments
+			return
+
+	# Importamos aquí para no cargar OpenCV hasta que se necesite.
+	import cv2
+
+	os.makedirs(output_dir, exist_ok=True)
+	capture = cv2.VideoCapture(path)
+	segments = []
+	try:
+		fps = capture.get(cv2.CAP_PROP_FPS)
+		width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+		height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+		if fps <= 0 or width <= 0 or height <= 0:
+			raise ValueError("No se pudieron leer las propiedades del video.")
+
+		frames_per_segment = max(1, int(round(fps * segment_seconds)))
+		fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+		writer = None
+		frame_index = 0
+		while True:
+			ok, frame = capture.read()
+			if not ok:
+				break
+			# Al comenzar cada fragmento cerramos el anterior, lo entregamos y abrimos un archivo nuevo
+			if frame_index % frames_per_segment == 0:
+				if writer is not None:
+					writer.release()
+					yield segments[-1][0], segments[-1][1], os.path.join(output_dir, segments[-1][2])
+				name = f"segment_{len(segments):04d}.mp4"
+				writer = cv2.VideoWriter(os.path.join(output_dir, name), fourcc, fps, (width, height))
+				segments.append([frame_index / fps, frame_index / fps, name])
+			writer.write(frame)
+			frame_index += 1
+			segments[-1][1] = frame_index / fps
+		if writer is not None:
+			writer.release()
+			yield segments[-1][0], segments[-1][1], os.path.join(output_dir, segments[-1][2])
+	finally:
+		capture.release()
+
+	# Guardamos el índice al final, así un corte a medias no se reutiliza
+	with open(index_path, 'w', encoding='utf-8') as file:
+		for start, end, name in segments:
+			file.write(f"{start}\t{end}\t{name}\n")
+
+class VideoSegmenter:
+	"""
+	Describe videos largos por fragmentos en paralelo y une el resultado con una llamada final de resumen
+	"""
+
+	def __init__(self, segment_seconds=SEGMENT_SECONDS, min_duration=MIN_DURATION, workers=SEGMENT_WORKERS, output_dir=SEGMENTS_DIR, probe=None):
+		"""
+		Inicialización del divisor. Sólo se dividen los videos de más de min_duration segundos.
+		"""
+		self.segment_seconds = segment_seconds
+		# Un video apenas más largo que un fragmento no vale la pena dividirlo
+		self.min_duration = max(min_duration, segment_seconds * 1.5)
+		self.workers = workers
+		self.output_dir = output_dir
+		self.probe = probe or MediaProbe()
+
+	def should_split(self, path):
+		"""
+		Indica si el archivo es un video lo bastante largo para describirlo por fragmentos
+		"""
+		try:
+			info = self.probe.probe(path)
+		except Exception:
+			return False
+		return info.kind == "video" and bool(info.duration) and info.duration > self.min_duration
+
+	def cache_model(self, model):
+		"""
+		Nombre con el que se guardan en caché las respuestas por fragmentos, distinto del de una sola llamada
+		"""
+		return f"{model}+segments:{self.segment_seconds}"
+
+	def describe(self, engine, path, prompt, report, file_hash=None, cancel=None):
+		"""
+		Describe el video por fragmentos con engine y devuelve (texto, datos_adicionales)
+		cancel es el CancelToken opcional del trabajo, que se pasa a cada fragmento.
+		"""
+		if file_hash is None:
+			file_hash = file_sha256(path)
+
+		# Calculamos cuántos fragmentos habrá para informar del progreso
+		duration = self.probe.probe(path).duration or self.segment_seconds
+		expected = max(1, math.ceil(duration / self.segment_seconds))
+		output_dir = os.path.join(self.output_dir, f"{file_hash}_{self.segment_seconds}")
+
+		map_start = time.perf_counter()
+		done = [0]
+		lock = threading.Lock()
+
+		def describe_segment(segment):
+			start, end, segment_path = segment
+			segment_prompt = (
+				f"{prompt}\n\nEste fragmento corresponde al intervalo {format_timestamp(start)} a {format_timestamp(end)} del video completo. "
+				"Indica las marcas de tiempo respecto al video completo."
+			)
+			result = engine.describe(segment_path, segment_prompt, split=False, cancel=cancel)
+			with lock:
+				done[0] += 1
+				count = done[0]
+			report(10 + int(min(count / expected, 1) * 70), f"Fragmento {count} de {expected} descrito.")
+			return start, end, result
+
+		# Cortamos el video y describimos cada fragmento en cuanto está listo, mientras se corta el siguiente
+		report(5, f"Dividiendo el video en {expected} fragmentos...")
+		with ThreadPoolExecutor(max_workers=self.workers) as executor:
+			futures = []
+			for segment in split_video(path, self.segment_seconds, output_dir):
+				# Si se cancela, dejamos de cortar el video; los fragmentos en curso se cancelan solos
+				if cancel is not None:
+					cancel.check()
+				futures.append(executor.submit(describe_segment, segment))
+			split_elapsed = time.perf_counter() - map_start
+			described = [future.result() for future in futures]
+		map_elapsed = time.perf_counter() - map_start
+
+		# Unimos las descripciones con una llamada final que sólo recibe texto
+		report(85, "Uniendo las descripciones de los fragmentos...")
+		reduce_start = time.perf_counter()
+		parts = [f"[{format_timestamp(start)} - {format_timestamp(end)}]\n{result.text}" for start, end, result in described]
+		merge_prompt = MERGE_PROMPT.format(prompt=prompt)
+		merge_text = "\n\n".join(parts)
+		# La unión pasa por el enrutador como cualquier otra solicitud, con sus modelos de respaldo
+		record = {}
+		text, _, usage = engine.generate([merge_prompt, merge_text], tokens=(len(merge_prompt) + len(merge_text)) // 4, record=record, cancel=cancel, models=engine.route_models("text"))
+		reduce_elapsed = time.perf_counter() - reduce_start
+
+		extra = {
+			"mode": "segments",
+			"segments": len(described),
+			"segment_seconds": self.segment_seconds,
+			"split_elapsed": round(split_elapsed, 3),
+			"map_elapsed": round(map_elapsed, 3),
+			"reduce_elapsed": round(reduce_elapsed, 3),
+		}
+		if "routing" in record:
+			extra["merge_model"] = record["routing"]["model"]
+		return text, extra
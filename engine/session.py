@@ -0,0 +1,292 @@
+"""
+Sesiones de varias preguntas sobre un mismo archivo.
+Un video largo se sube y se procesa una sola vez, y su contenido queda en una caché de contexto de Gemini (client.caches).
+Cada pregunta siguiente envía sólo el prompt: los tokens del archivo se leen de la caché, se facturan a menor precio y la respuesta llega antes.
+La caché caduca sola al terminar su tiempo de vida; mientras la sesión se usa, se extiende antes de que caduque y se vuelve a crear si ya caducó.
+Si el modelo no admite la caché de contexto, o el archivo no alcanza el mínimo de tokens, la sesión sigue reutilizando el archivo ya subido.
+Con un enrutador, la caché se crea para el primer modelo que elige; la caché sólo sirve a ese modelo, así que si falla, la pregunta pasa a los de respaldo enviando el archivo ya subido.
+"""
+
+# Importaciones
+
+import os
+import time
+import threading
+
+from engine.scheduler import error_code
+from engine.describer import DescriptionResult, normalize_prompt, media_kind
+
+# Tiempo de vida de la caché de contexto en segundos. Se paga el almacenamiento mientras existe, así que es corto y se extiende con el uso.
+SESSION_TTL = 600
+# Si a la caché le quedan menos de estos segundos al hacer una pregunta, se extiende
+REFRESH_MARGIN = 120
+# Códigos con los que Gemini responde cuando la caché ya no existe
+MISSING_CACHE_CODES = (403, 404)
+
+class FileSession:
+	"""
+	Archivo subido una vez sobre el que se hacen varias preguntas seguidas
+	"""
+
+	def __init__(self, engine, path, ttl=SESSION_TTL, use_cache=True, prefetched=None):
+		"""
+		Inicialización de la sesión. engine es el DescriptionEngine con el que se sube el archivo y se generan las respuestas.
+		Con use_cache=False no se crea la caché de contexto y cada pregunta envía la referencia al archivo ya subido.
+		prefetched es un PrefetchedFile opcional con la subida anticipada del archivo.
+		"""
+		self.engine = engine
+		self.path = path
+		self.prefetched = prefetched
+		self.ttl = ttl
+		self.use_cache = use_cache
+		# Las preguntas de una sesión se responden de a una
+		self.lock = threading.Lock()
+		self.media_file = None
+		self.file_hash = None
+		# Modelos elegidos por el enrutador para la sesión, y el modelo de la caché de contexto
+		self.models = None
+		self.model = engine.model
+		self.cached_content = None
+		self.cached_tokens = 0
+		self.cache_error = None
+		self.expires = 0.0
+		self.setup_seconds = 0.0
+		self.closed = False
+		# Datos de cada pregunta respondida por Gemini, para el informe de ahorro
+		self.questions = []
+
+	def start(self, progress=None, cancel=None):
+		"""
+		Sube el archivo, espera su procesamiento y crea la caché de contexto. Si la sesión ya empezó, no hace nada.
+		cancel es un CancelToken opcional: si se cancela durante la subida, el archivo se borra y la sesión queda sin empezar.
+		"""
+		if self.media_file is not None:
+			return
+		start = time.perf_counter()
+		prefetched, self.prefetched = self.prefetched, None
+		if prefetched is not None and prefetched.usable(self.path, self.engine.preprocessor):
+			try:
+				self.media_file, self.file_hash = prefetched.claim(progress, cancel), prefetched.file_hash
+			except Exception:
+				# Si la subida anticipada falló, subimos por el camino normal, salvo que se haya cancelado
+				if cancel is not None:
+					cancel.check()
+				self.media_file = None
+		if self.media_file is None:
+			self.media_file, self.file_hash = self.engine.remote_file(self.path, progress, cancel=cancel)
+		try:
+			tokens = self.engine.probe.probe(self.path).tokens
+		except Exception:
+			tokens = None
+		self.models = self.engine.route_models(media_kind(self.path), tokens)
+		if self.models:
+			self.model = self.models[0]
+		if self.use_cache:
+			if progress is not None:
+				progress(72, "Guardando el archivo en la caché de contexto de Gemini...")
+			self._create_cache(cancel)
+		self.setup_seconds = time.perf_counter() - start
+
+	def _create_cache(self, cancel=None):
+		"""
+		Crea la caché de contexto con el archivo. Si Gemini no la admite, la sesión sigue sin ella.
+		"""
+		engine = self.engine
+		try:
+			with engine.metrics.span("context_cache"):
+				cached = engine.request(
+					engine.client.caches.create,
+					model=self.model,
+					config={
+						"contents": [self.media_file],
+						"display_name": os.path.basename(self.path)[:128],
+						"ttl": f"{int(self.ttl)}s",
+					},
+					cancel=cancel,
+					# Una caché que se termina de crear después de cancelar se borra
+					cleanup=lambda created: engine.request(engine.client.caches.delete, name=created.name)
+				)
+		except Exception as e:
+			if cancel is not None:
+				cancel.check()
+			self.cached_content = None
+			self.cache_error = str(e)
+			return
+		self.cached_content = cached
+		self.cache_error = None
+		self.expires = time.monotonic() + self.ttl
+		usage = getattr(cached, "usage_metadata", None)
+		self.cached_tokens = getattr(usage, "total_token_count", None) or 0
+
+	def _refresh(self):
+		"""
+		Extiende la caché de contexto si está por caducar, o la vuelve a crear si ya caducó
+		"""
+		# Sin caché, porque el modelo no la admite o no se pidió, se sigue enviando el archivo ya subido
+		if self.cached_content is None:
+			return
+		remaining = self.expires - time.monotonic()
+		if remaining > REFRESH_MARGIN:
+			return
+		if remaining > 0:
+			try:
+				self.engine.request(self.engine.client.caches.update, name=self.cached_content.name, config={"ttl": f"{int(self.ttl)}s"})
+				self.expires = time.monotonic() + self.ttl
+				return
+			except Exception:
+				pass
+		self._create_cache()
+
+	def ask(self, prompt=None, progress=None, on_chunk=None, cancel=None):
+		"""
+		Responde una pregunta sobre el archivo y devuelve un DescriptionResult. La primera pregunta también inicia la sesión.
+		En result.extra["session"] se indica el número de la pregunta, los tokens leídos de la caché y la diferencia de latencia con la primera.
+		cancel es un CancelToken opcional: al cancelarlo, la pregunta termina con JobCancelled y la sesión sigue disponible para otra.
+		"""
+		with self.lock:
+			if self.closed:
+				raise RuntimeError("La sesión ya está cerrada.")
+			try:
+				return self._ask(normalize_prompt(prompt), progress or (lambda value, message: None), on_chunk, cancel)
+			except Exception:
+				if cancel is not None and cancel.requested is not None:
+					self.engine.metrics.observe("cancel_to_idle", time.perf_counter() - cancel.requested)
+					self.engine.metrics.increment("cancelled")
+				raise
+
+	def _ask(self, prompt, progress, on_chunk, cancel=None):
+		"""
+		Responde una pregunta con el bloqueo de la sesión tomado
+		"""
+		engine = self.engine
+		start = time.perf_counter()
+		self.start(progress, cancel)
+
+		# Una pregunta ya respondida sobre el mismo archivo no necesita a Gemini
+		if engine.cache is not None and self.file_hash:
+			text = engine.cache.get(self.file_hash, prompt, self.model)
+			if text is not None:
+				progress(100, "Respuesta obtenida de la caché.")
+				return DescriptionResult(self.path, prompt, self.model, text=text, elapsed=time.perf_counter() - start, file_hash=self.file_hash, cached=True)
+
+		self._refresh()
+		progress(75, "Generando respuesta...")
+		extra = {}
+		timings = {}
+		try:
+			with engine.metrics.span("generate", timings):
+				text, ttft, usage = self._generate(prompt, on_chunk, extra, progress, cancel)
+		except Exception as e:
+			# La caché pudo caducar o borrarse fuera de la sesión: la creamos otra vez y repetimos la pregunta
+			if self.cached_content is None or error_code(e) not in MISSING_CACHE_CODES:
+				raise
+			self._create_cache(cancel)
+			with engine.metrics.span("generate", timings):
+				text, ttft, usage = self._generate(prompt, on_chunk, extra, progress, cancel)
+		elapsed = time.perf_counter() - start
+
+		if usage is not None:
+			extra["usage"] = usage
+		if timings:
+			extra["timings"] = timings
+		extra["transport"] = "session"
+		extra["session"] = self._record(elapsed, usage)
+		model = extra["routing"]["model"] if "routing" in extra else self.model
+		result = DescriptionResult(self.path, prompt, model, text=text, elapsed=elapsed, file_hash=self.file_hash, ttft=ttft, extra=extra)
+		engine.metrics.job_done(result)
+
+		if engine.cache is not None and self.file_hash and text:
+			engine.cache.put(self.file_hash, prompt, model, text)
+		progress(100, "Respuesta generada correctamente.")
+		return result
+
+	def _generate(self, prompt, on_chunk, extra, progress, cancel=None):
+		"""
+		Genera la respuesta leyendo el archivo de la caché de contexto, o enviando la referencia al archivo si no hay caché
+		"""
+		# Los tokens del archivo ya están en la caché; sólo el prompt cuenta para la cuota
+		tokens = len(prompt) // 4
+		if self.cached_content is not None:
+			try:
+				return self.engine.generate([prompt], on_chunk, config={"cached_content": self.cached_content.name}, tokens=tokens, record=extra, progress=progress, cancel=cancel, models=self.models[:1] if self.models else None)
+			except Exception as e:
+				# Sin otros modelos, o si la caché ya no existe, el error lo resuelve quien llama
+				router = self.engine.router
+				if cancel is not None:
+					cancel.check()
+				if not self.models or len(self.models) < 2 or error_code(e) in MISSING_CACHE_CODES or not router.should_fallback(e):
+					raise
+			return self._generate_file(prompt, on_chunk, extra, progress, cancel, self.models[1:])
+		return self._generate_file(prompt, on_chunk, extra, progress, cancel, self.models)
+
+	def _generate_file(self, prompt, on_chunk, extra, progress, cancel, models):
+		"""
+		Genera la respuesta enviando la referencia al archivo ya subido, con los modelos indicados
+		"""
+		tokens = len(prompt) // 4
+		if self.engine.scheduler is not None and self.engine.scheduler.tokens is not None:
+			try:
+				tokens += self.engine.probe.probe(self.path).tokens or 0
+			except Exception:
+				pass
+		return self.engine.generate([self.media_file, prompt], on_chunk, tokens=tokens, record=extra, progress=progress, cancel=cancel, models=models)
+
+	def _record(self, elapsed, usage):
+		"""
+		Guarda los datos de la pregunta y devuelve su informe: tokens facturados a precio completo, tokens leídos de la caché y latencia frente a la primera pregunta
+		"""
+		usage = usage or {}
+		input_tokens = usage.get("prompt_tokens") or 0
+		cached_tokens = usage.get("cached_tokens") or 0
+		first = self.questions[0]["latency"] if self.questions else elapsed
+		question = {
+			"question": len(self.questions) + 1,
+			"context_cache": self.cached_content is not None,
+			"input_tokens": input_tokens,
+			"cached_tokens": cached_tokens,
+			"billed_input_tokens": max(0, input_tokens - cached_tokens),
+			"latency": round(elapsed, 3),
+			"latency_saved": round(first - elapsed, 3),
+		}
+		self.questions.append(question)
+		return dict(question)
+
+	def stats(self):
+		"""
+		Devuelve un diccionario con el resumen de la sesión: preparación, preguntas, tokens y latencia media de las preguntas siguientes a la primera
+		"""
+		follow_ups = self.questions[1:]
+		data = {
+			"path": self.path,
+			"questions": len(self.questions),
+			"setup_seconds": round(self.setup_seconds, 3),
+			"context_cache": any(question["context_cache"] for question in self.questions) or self.cached_content is not None,
+			"cache_error": self.cache_error,
+			"cached_tokens": sum(question["cached_tokens"] for question in self.questions),
+			"billed_input_tokens": sum(question["billed_input_tokens"] for question in self.questions),
+			"first_latency": self.questions[0]["latency"] if self.questions else None,
+			"follow_up_latency": None,
+			"follow_up_billed_input_tokens": None,
+		}
+		if follow_ups:
+			data["follow_up_latency"] = round(sum(question["latency"] for question in follow_ups) / len(follow_ups), 3)
+			data["follow_up_billed_input_tokens"] = round(sum(question["billed_input_tokens"] for question in follow_ups) / len(follow_ups))
+		return data
+
+	def close(self):
+		"""
+		Borra la caché de contexto y libera el archivo subido. Sin ciclo de vida, el archivo queda en el registro para reutilizarlo más tarde.
+		"""
+		with self.lock:
+			self.closed = True
+			cached, self.cached_content = self.cached_content, None
+		# El archivo subido deja de estar en uso; si no está fijado, el ciclo de vida lo borra
+		if self.engine.lifecycle is not None and self.media_file is not None:
+			self.engine.lifecycle.release(self.media_file.name)
+		if cached is None:
+			return
+		try:
+			self.engine.request(self.engine.client.caches.delete, name=cached.name)
+		except Exception:
+			# Si no se pudo borrar, caduca sola al terminar su tiempo de vida
+			pass
@@ -0,0 +1,383 @@
+"""
+Detección de archivos casi iguales por hash perceptual, para reutilizar su descripción en lugar de volver a llamar a la API.
+Un mismo cuadro guardado otra vez como JPEG, o una foto casi idéntica a la anterior, tiene otro SHA-256 pero el mismo aspecto: la caché de respuestas no los reconoce y cada uno cuesta una subida y una generación.
+Cada imagen se resume en dos hashes de 64 bits (promedio y diferencia) calculados sobre una versión reducida en escala de grises, y cada video en la secuencia de hashes de diferencia de cuadros repartidos por todo el video.
+Dos archivos se consideran casi iguales si la distancia de Hamming entre sus hashes no supera un umbral.
+El índice guarda los hashes en SQLite y los mantiene en memoria en tablas por bandas: si la distancia no supera d, al menos una de d + 1 bandas coincide exactamente, así que sólo se comparan los archivos que comparten alguna banda, aunque el índice tenga millones.
+Las descripciones sólo se reutilizan entre consultas con el mismo prompt y el mismo modelo.
+"""
+
+# Importaciones
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from concurrent.futures import Future
+
+from engine.cache import CACHE_DIR, normalize_cache_prompt
+from engine.describer import IMAGE_EXTENSIONS, VIDEO_EXTENSIONS
+
+# Archivo por defecto del índice
+SIMILARITY_FILE = "similar.sqlite3"
+
+# Lado de la imagen reducida: 8x8 da hashes de 64 bits
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+# Distancia de Hamming máxima, en bits de 64, entre dos archivos casi iguales
+MAX_DISTANCE = 4
+# Cuadros de cada video que se comparan
+KEYFRAMES = 8
+# A partir de este tamaño las imágenes se decodifican ya reducidas, que es mucho más rápido y no cambia el hash
+REDUCED_READ_BYTES = 1024 * 1024
+
+def hamming(a, b):
+	"""
+	Devuelve la cantidad de bits distintos entre dos hashes
+	"""
+	return bin(a ^ b).count("1")
+
+def _pack(bits):
+	"""
+	Convierte una matriz de booleanos en un entero, el primer bit como el más significativo
+	"""
+	import numpy
+	return int.from_bytes(numpy.packbits(bits.ravel()).tobytes(), "big")
+
+def average_hash(gray, size=HASH_SIZE):
+	"""
+	Hash de promedio de una imagen en escala de grises: cada bit indica si ese punto de la imagen reducida es más claro que la media
+	"""
+	# Importamos aquí para no cargar OpenCV hasta que se necesite.
+	import cv2
+	small = cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA)
+	return _pack(small > small.mean())
+
+def difference_hash(gray, size=HASH_SIZE):
+	"""
+	Hash de diferencia de una imagen en escala de grises: cada bit indica si un punto de la imagen reducida es más claro que el de su izquierda
+	"""
+	import cv2
+	small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+	return _pack(small[:, 1:] > small[:, :-1])
+
+class Fingerprint:
+	"""
+	Huella perceptual de un archivo. hash es el valor por el que se busca en el índice: el hash de diferencia de la imagen, o el del cuadro central del video.
+	"""
+
+	def __init__(self, kind, hash, ahash=None, sequence=None):
+		self.kind = kind
+		self.hash = hash
+		# Hash de promedio, sólo en las imágenes
+		self.ahash = ahash
+		# Hashes de diferencia de los cuadros, sólo en los videos
+		self.sequence = sequence
+
+	def distance(self, other):
+		"""
+		Devuelve la distancia con otra huella: la mayor de las distancias de sus hashes, o None si no se pueden comparar
+		"""
+		if self.kind != other.kind:
+			return None
+		if self.kind == "image":
+			return max(hamming(self.hash, other.hash), hamming(self.ahash or 0, other.ahash or 0))
+		# Videos de distinta duración no tienen los cuadros en las mismas posiciones
+		if not self.sequence or not other.sequence or len(self.sequence) != len(other.sequence):
+			return None
+		return max(hamming(a, b) for a, b in zip(self.sequence, other.sequence))
+
+def image_fingerprint(path, size=HASH_SIZE):
+	"""
+	Calcula la huella de una imagen, o devuelve None si no se puede leer
+	"""
+	import cv2
+	flags = cv2.IMREAD_REDUCED_GRAYSCALE_4 if os.path.getsize(path) > REDUCED_READ_BYTES else cv2.IMREAD_GRAYSCALE
+	gray = cv2.imread(path, flags)
+	if gray is None:
+		return None
+	return Fingerprint("image", difference_hash(gray, size), average_hash(gray, size))
+
+def video_fingerprint(path, keyframes=KEYFRAMES, size=HASH_SIZE):
+	"""
+	Calcula la huella de un video con keyframes cuadros repartidos por todo el video, o devuelve None si no se puede leer
+	"""
+	import cv2
+	capture = cv2.VideoCapture(path)
+	try:
+		count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+		if count <= 0:
+			return None
+		sequence = []
+		for index in range(keyframes):
+			# Tomamos el centro de cada tramo, para no caer en el primer ni en el último cuadro, que suelen ser negros
+			capture.set(cv2.CAP_PROP_POS_FRAMES, int((index + 0.5) * count / keyframes))
+			ok, frame = capture.read()
+			if not ok:
+				return None
+			sequence.append(difference_hash(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), size))
+	finally:
+		capture.release()
+	return Fingerprint("video", sequence[len(sequence) // 2], sequence=sequence)
+
+def fingerprint(path, keyframes=KEYFRAMES):
+	"""
+	Calcula la huella de una imagen o un video según su extensión, o devuelve None si no es ninguno de los dos o no se puede leer
+	"""
+	extension = os.path.splitext(path)[1].lower()
+	if extension in IMAGE_EXTENSIONS:
+		return image_fingerprint(path)
+	if extension in VIDEO_EXTENSIONS:
+		return video_fingerprint(path, keyframes)
+	return None
+
+def _scope(kind, prompt, model):
+	"""
+	Identifica el grupo de archivos cuyas descripciones son intercambiables: mismo tipo, mismo prompt y mismo modelo
+	"""
+	raw = "\0".join((kind, normalize_cache_prompt(prompt), model))
+	return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+def _signed(value):
+	"""
+	SQLite guarda enteros de 64 bits con signo
+	"""
+	return value - (1 << 64) if value >= 1 << 63 else value
+
+def _unsigned(value):
+	return value + (1 << 64) if value < 0 else value
+
+class Match:
+	"""
+	Descripción reutilizable de un archivo casi igual
+	"""
+
+	def __init__(self, text, path, model, distance):
+		self.text = text
+		self.path = path
+		self.model = model
+		self.distance = distance
+
+	def to_dict(self):
+		return {"path": self.path, "distance": self.distance}
+
+class SimilarityIndex:
+	"""
+	Índice de huellas perceptuales con búsqueda por distancia de Hamming, respaldado por SQLite.
+	Además de los archivos ya descritos, conoce los que se están describiendo: un archivo casi igual a uno en curso espera a su descripción en lugar de pedir otra.
+	"""
+
+	def __init__(self, path=None, max_distance=MAX_DISTANCE, keyframes=KEYFRAMES):
+		"""
+		Inicialización del índice. max_distance es la distancia de Hamming máxima entre dos archivos casi iguales, entre 0 y 15.
+		keyframes es la cantidad de cuadros de cada video que se comparan.
+		"""
+		if not 0 <= max_distance < 16:
+			raise ValueError("La distancia máxima debe estar entre 0 y 15.")
+		if path is None:
+			path = os.path.join(CACHE_DIR, SIMILARITY_FILE)
+		folder = os.path.dirname(path)
+		if folder:
+			os.makedirs(folder, exist_ok=True)
+
+		self.path = path
+		self.max_distance = max_distance
+		self.keyframes = keyframes
+		# Límites de las max_distance + 1 bandas en que se parte cada hash
+		bands = max_distance + 1
+		self.bands = [(HASH_BITS * index // bands, HASH_BITS * (index + 1) // bands) for index in range(bands)]
+
+		# En memoria sólo se guarda lo necesario para comparar: el identificador de la fila y los hashes, en arreglos compactos
+		self.ids = array('q')
+		self.hashes = array('Q')
+		self.ahashes = array('Q')
+		# (grupo, banda, valor) -> posiciones en los arreglos
+		self.buckets = {}
+		# Grupo -> número pequeño, para que las claves de las bandas ocupen poco
+		self.scopes = {}
+		# Archivos que se están describiendo: huella -> (prompt, Future que se completa al terminar)
+		self.pending = {}
+
+		self.lookups = 0
+		self.hits = 0
+		self.coalesced = 0
+
+		self.lock = threading.Lock()
+		self.connection = sqlite3.connect(path, check_same_thread=False)
+		self.connection.execute(
+			"CREATE TABLE IF NOT EXISTS fingerprints ("
+			"id INTEGER PRIMARY KEY, "
+			"scope TEXT NOT NULL, "
+			"hash INTEGER NOT NULL, "
+			"ahash INTEGER, "
+			"sequence TEXT, "
+			"model TEXT NOT NULL, "
+			"path TEXT NOT NULL, "
+			"response TEXT NOT NULL, "
+			"created REAL NOT NULL)"
+		)
+		self.connection.commit()
+		self._load()
+
+	def _load(self):
+		"""
+		Carga en memoria los hashes guardados
+		"""
+		with self.lock:
+			for row_id, scope, hash, ahash in self.connection.execute("SELECT id, scope, hash, ahash FROM fingerprints ORDER BY id"):
+				self._insert(row_id, scope, _unsigned(hash), _unsigned(ahash or 0))
+
+	def _scope_id(self, scope):
+		scope_id = self.scopes.get(scope)
+		if scope_id is None:
+			scope_id = self.scopes[scope] = len(self.scopes)
+		return scope_id
+
+	def _keys(self, scope_id, hash):
+		"""
+		Devuelve las claves de las bandas de un hash
+		"""
+		return [(scope_id, index, (hash >> start) & ((1 << (end - start)) - 1)) for index, (start, end) in enumerate(self.bands)]
+
+	def _insert(self, row_id, scope, hash, ahash):
+		"""
+		Añade un hash a las tablas en memoria. Debe llamarse con el candado adquirido.
+		"""
+		position = len(self.ids)
+		self.ids.append(row_id)
+		self.hashes.append(hash)
+		self.ahashes.append(ahash)
+		for key in self._keys(self._scope_id(scope), hash):
+			bucket = self.buckets.get(key)
+			if bucket is None:
+				bucket = self.buckets[key] = array('I')
+			bucket.append(position)
+
+	def fingerprint(self, path):
+		"""
+		Calcula la huella del archivo, o devuelve None si no es una imagen o un video legible
+		"""
+		try:
+			return fingerprint(path, self.keyframes)
+		except Exception:
+			return None
+
+	def find(self, fingerprint, prompt, models):
+		"""
+		Devuelve la Match del archivo ya descrito más parecido, con el prompt y alguno de los modelos, o None si ninguno está dentro de la distancia máxima
+		"""
+		with self.lock:
+			self.lookups += 1
+			match = self._find(fingerprint, prompt, models)
+			if match is not None:
+				self.hits += 1
+			return match
+
+	def _find(self, fingerprint, prompt, models):
+		"""
+		Cuerpo de find. Debe llamarse con el candado adquirido.
+		"""
+		best = None
+		for model in models:
+			scope_id = self.scopes.get(_scope(fingerprint.kind, prompt, model))
+			if scope_id is None:
+				continue
+			# Candidatos: los que comparten al menos una banda; después se comprueba la distancia completa
+			seen = set()
+			for key in self._keys(scope_id, fingerprint.hash):
+				for position in self.buckets.get(key, ()):
+					if position in seen:
+						continue
+					seen.add(position)
+					if hamming(fingerprint.hash, self.hashes[position]) > self.max_distance:
+						continue
+					candidate = self._candidate(position, fingerprint)
+					if candidate is None:
+						continue
+					distance = fingerprint.distance(candidate)
+					if distance is not None and distance <= self.max_distance and (best is None or distance < best[0]):
+						best = (distance, position)
+		if best is None:
+			return None
+		distance, position = best
+		model, path, response = self.connection.execute("SELECT model, path, response FROM fingerprints WHERE id = ?", (self.ids[position],)).fetchone()
+		return Match(response, path, model, distance)
+
+	def _candidate(self, position, fingerprint):
+		"""
+		Devuelve la huella guardada en position. La secuencia de los videos se lee de la base de datos sólo si hace falta compararla.
+		"""
+		if fingerprint.kind == "image":
+			return Fingerprint("image", self.hashes[position], self.ahashes[position])
+		row = self.connection.execute("SELECT sequence FROM fingerprints WHERE id = ?", (self.ids[position],)).fetchone()
+		if row is None or not row[0]:
+			return None
+		return Fingerprint("video", self.hashes[position], sequence=[int(value, 16) for value in row[0].split()])
+
+	def reserve(self, fingerprint, prompt, models):
+		"""
+		Busca una descripción reutilizable para la huella. Devuelve (coincidencia, espera):
+		(Match, None) si ya hay un archivo casi igual descrito; (None, Future) si otro trabajo está describiendo uno casi igual, y el Future se completa cuando termina;
+		(None, None) si no hay ninguno: el archivo queda reservado y los casi iguales que lleguen después esperan hasta que se llame a add o a abandon con esta misma huella.
+		"""
+		with self.lock:
+			self.lookups += 1
+			match = self._find(fingerprint, prompt, models)
+			if match is not None:
+				self.hits += 1
+				return match, None
+			for other, (other_prompt, future) in self.pending.items():
+				if other_prompt != normalize_cache_prompt(prompt):
+					continue
+				distance = fingerprint.distance(other)
+				if distance is not None and distance <= self.max_distance:
+					self.coalesced += 1
+					return None, future
+			self.pending[fingerprint] = (normalize_cache_prompt(prompt), Future())
+			return None, None
+
+	def add(self, fingerprint, prompt, model, text, path):
+		"""
+		Guarda la descripción de un archivo y libera su reserva, si la tenía
+		"""
+		scope = _scope(fingerprint.kind, prompt, model)
+		sequence = " ".join(f"{value:016x}" for value in fingerprint.sequence) if fingerprint.sequence else None
+		with self.lock:
+			cursor = self.connection.execute(
+				"INSERT INTO fingerprints (scope, hash, ahash, sequence, model, path, response, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+				(scope, _signed(fingerprint.hash), _signed(fingerprint.ahash) if fingerprint.ahash is not None else None, sequence, model, path, text, time.time())
+			)
+			self.connection.commit()
+			self._insert(cursor.lastrowid, scope, fingerprint.hash, fingerprint.ahash or 0)
+		self.abandon(fingerprint)
+
+	def abandon(self, fingerprint):
+		"""
+		Libera la reserva de una huella sin guardar descripción, por ejemplo si su trabajo falló. Los que esperaban vuelven a buscar.
+		"""
+		with self.lock:
+			entry = self.pending.pop(fingerprint, None)
+		if entry is not None:
+			entry[1].set_result(None)
+
+	def stats(self):
+		"""
+		Devuelve un diccionario con las huellas guardadas, las búsquedas y las llamadas evitadas
+		"""
+		with self.lock:
+			return {
+				"entries": len(self.ids),
+				"lookups": self.lookups,
+				"calls_avoided": self.hits,
+				"coalesced": self.coalesced,
+				"pending": len(self.pending),
+			}
+
+	def close(self):
+		"""
+		Cierra la conexión con la base de datos
+		"""
+		with self.lock:
+			self.connection.close()
@@ -0,0 +1,263 @@
+"""
+Subida reanudable por bloques a la API de archivos de Gemini.
+El archivo se lee del disco bloque a bloque, sin cargarlo completo en memoria, y la sesión de subida se guarda en disco: si la transferencia se interrumpe, la siguiente vez continúa desde el último byte confirmado por el servidor.
+Cada bloque enviado informa del progreso real en bytes.
+La dirección del servicio es configurable, así que puede probarse contra un servidor local falso.
+"""
+
+# Importaciones
+
+import os
+import time
+import json
+import hashlib
+import mimetypes
+import threading
+import urllib.error
+import urllib.request
+
+from engine.cache import CACHE_DIR
+
+# Dirección del servicio de Gemini
+BASE_URL = "https://generativelanguage.googleapis.com"
+UPLOAD_PATH = "/upload/v1beta/files"
+
+# Prefijo del nombre visible de los archivos que sube este programa: el recolector sólo borra los que lo llevan
+DISPLAY_PREFIX = "gemini-descriptor/"
+
+# Carpeta donde se guardan las sesiones de subida pendientes
+SESSIONS_DIR = os.path.join(CACHE_DIR, "upload_sessions")
+
+# El servidor exige bloques múltiplos de 256 KB, salvo el último
+CHUNK_GRANULARITY = 256 * 1024
+CHUNK_SIZE = 32 * CHUNK_GRANULARITY
+# Las sesiones de subida caducan en el servidor; no reutilizamos las de más de un día
+SESSION_LIFETIME = 24 * 60 * 60
+# Reintentos de un mismo bloque ante errores de red
+MAX_RETRIES = 5
+
+class UploadError(Exception):
+	"""
+	Error en la subida reanudable
+	"""
+
+def upload_display_name(path):
+	"""
+	Devuelve el nombre visible con que se sube el archivo local path
+	"""
+	return DISPLAY_PREFIX + os.path.basename(path)
+
+class ResumableUploader:
+	"""
+	Sube archivos a Gemini con el protocolo de subida reanudable
+	"""
+
+	def __init__(self, api_key, base_url=BASE_URL, chunk_size=CHUNK_SIZE, sessions_dir=SESSIONS_DIR, timeout=120, max_retries=MAX_RETRIES):
+		"""
+		Inicialización del cargador. chunk_size se redondea a un múltiplo de 256 KB.
+		"""
+		self.api_key = api_key
+		self.base_url = base_url.rstrip("/")
+		self.chunk_size = max(CHUNK_GRANULARITY, chunk_size - chunk_size % CHUNK_GRANULARITY)
+		self.sessions_dir = sessions_dir
+		self.timeout = timeout
+		self.max_retries = max_retries
+		self.lock = threading.Lock()
+		# Bytes enviados por la red y bytes que no hubo que reenviar gracias a la reanudación
+		self.bytes_sent = 0
+		self.bytes_resumed = 0
+
+	def _request(self, url, headers, data=None):
+		"""
+		Envía una petición POST y devuelve (cabeceras, cuerpo)
+		"""
+		headers = dict(headers)
+		headers["x-goog-api-key"] = self.api_key
+		request = urllib.request.Request(url, data=data if data is not None else b"", headers=headers, method="POST")
+		with urllib.request.urlopen(request, timeout=self.timeout) as response:
+			return response.headers, response.read()
+
+	def _session_path(self, path):
+		"""
+		Devuelve la ruta del archivo de sesión para path, según su ruta, tamaño y fecha de modificación
+		"""
+		stat = os.stat(path)
+		key = f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+		return os.path.join(self.sessions_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + ".json")
+
+	def _load_session(self, session_path):
+		"""
+		Carga la sesión guardada si existe y no ha caducado
+		"""
+		try:
+			with open(session_path, 'r', encoding='utf-8') as file:
+				session = json.load(file)
+		except (OSError, ValueError):
+			return None
+		if time.time() - session.get("created", 0) > SESSION_LIFETIME:
+			self._remove_session(session_path)
+			return None
+		return session
+
+	def _save_session(self, session_path, session):
+		"""
+		Guarda la sesión de forma atómica
+		"""
+		os.makedirs(self.sessions_dir, exist_ok=True)
+		temp_path = session_path + ".tmp"
+		with open(temp_path, 'w', encoding='utf-8') as file:
+			json.dump(session, file)
+		os.replace(temp_path, session_path)
+
+	def _remove_session(self, session_path):
+		"""
+		Elimina el archivo de sesión
+		"""
+		try:
+			os.remove(session_path)
+		except OSError:
+			pass
+
+	def start(self, size, mime_type, display_name):
+		"""
+		Inicia una sesión de subida y devuelve su dirección
+		"""
+		headers = {
+			"X-Goog-Upload-Protocol": "resumable",
+			"X-Goog-Upload-Command": "start",
+			"X-Goog-Upload-Header-Content-Length": str(size),
+			"X-Goog-Upload-Header-Content-Type": mime_type,
+			"Content-Type": "application/json",
+		}
+		body = json.dumps({"file": {"display_name": display_name}}).encode('utf-8')
+		response_headers, _ = self._request(self.base_url + UPLOAD_PATH, headers, body)
+		upload_url = response_headers.get("X-Goog-Upload-URL")
+		if not upload_url:
+			raise UploadError("El servidor no devolvió la dirección de subida.")
+		return upload_url
+
+	def _status(self, upload_url):
+		"""
+		Pregunta al servidor por la sesión. Devuelve (estado, bytes recibidos, cuerpo), o None si la sesión ya no es válida.
+		Si la sesión ya se finalizó, el estado es "final" y el cuerpo trae el recurso de archivo creado.
+		"""
+		try:
+			response_headers, body = self._request(upload_url, {"X-Goog-Upload-Command": "query"})
+		except urllib.error.HTTPError:
+			return None
+		status = response_headers.get("X-Goog-Upload-Status")
+		if status not in ("active", "final"):
+			return None
+		return status, int(response_headers.get("X-Goog-Upload-Size-Received", 0)), body
+
+	def query(self, upload_url):
+		"""
+		Pregunta al servidor cuántos bytes de la sesión ya recibió. Devuelve None si la sesión ya no es válida.
+		"""
+		status = self._status(upload_url)
+		return None if status is None else status[1]
+
+	def _resource(self, body):
+		"""
+		Devuelve el recurso de archivo de la respuesta que cierra la sesión
+		"""
+		try:
+			resource = json.loads(body.decode('utf-8'))
+		except ValueError:
+			raise UploadError("Respuesta no válida del servidor al finalizar la subida.")
+		return resource.get("file", resource)
+
+	def upload(self, path, mime_type=None, display_name=None, progress=None):
+		"""
+		Sube el archivo y devuelve el recurso de archivo creado (diccionario con name, uri, state...).
+		progress, si se indica, recibe (bytes_enviados, bytes_totales) después de cada bloque.
+		"""
+		size = os.path.getsize(path)
+		mime_type = mime_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+		display_name = display_name or upload_display_name(path)
+		report = progress or (lambda sent, total: None)
+		session_path = self._session_path(path)
+
+		# Intentamos reanudar una sesión anterior
+		offset = 0
+		session = self._load_session(session_path)
+		if session is not None:
+			status = self._status(session["upload_url"])
+			if status is None:
+				self._remove_session(session_path)
+				session = None
+			elif status[0] == "final":
+				# La ejecución anterior llegó a finalizar pero no a borrar la sesión: el archivo ya está creado
+				self._remove_session(session_path)
+				with self.lock:
+					self.bytes_resumed += size
+				report(size, size)
+				return self._resource(status[2])
+			else:
+				offset = status[1]
+				with self.lock:
+					self.bytes_resumed += offset
+
+		if session is None:
+			session = {"upload_url": self.start(size, mime_type, display_name), "created": time.time()}
+			self._save_session(session_path, session)
+
+		upload_url = session["upload_url"]
+		report(offset, size)
+		retries = 0
+		with open(path, 'rb') as file:
+			while True:
+				file.seek(offset)
+				chunk = file.read(self.chunk_size)
+				last = offset + len(chunk) >= size
+				# Si el servidor ya tiene todos los bytes sólo falta cerrar la sesión, sin enviar un bloque vacío
+				if last:
+					command = "upload, finalize" if chunk else "finalize"
+				else:
+					command = "upload"
+				headers = {
+					"X-Goog-Upload-Command": command,
+					"X-Goog-Upload-Offset": str(offset),
+					"Content-Length": str(len(chunk)),
+				}
+				try:
+					_, body = self._request(upload_url, headers, chunk)
+				except urllib.error.HTTPError as e:
+					# Los errores del cliente no se arreglan reintentando, salvo tiempo agotado o límite de solicitudes
+					if 400 <= e.code < 500 and e.code not in (408, 429):
+						raise UploadError(f"El servidor rechazó la subida: {e.code} {e.reason}") from e
+					error = e
+				except (urllib.error.URLError, OSError) as e:
+					error = e
+				else:
+					error = None
+
+				if error is not None:
+					# Ante un error, preguntamos al servidor dónde quedó y reintentamos desde ahí
+					retries += 1
+					if retries > self.max_retries:
+						raise UploadError(f"No se pudo completar la subida: {error}") from error
+					time.sleep(min(2 ** retries, 30))
+					status = self._status(upload_url)
+					if status is None:
+						self._remove_session(session_path)
+						raise UploadError("La sesión de subida ya no es válida.") from error
+					if status[0] == "final":
+						# El cierre llegó al servidor aunque se perdió su respuesta
+						body = status[2]
+						offset = size
+						report(offset, size)
+						break
+					offset = status[1]
+					continue
+
+				retries = 0
+				offset += len(chunk)
+				with self.lock:
+					self.bytes_sent += len(chunk)
+				report(offset, size)
+				if last:
+					break
+
+		self._remove_session(session_path)
+		return self._resource(body)
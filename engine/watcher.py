@@ -0,0 +1,351 @@
+"""
+Modo de vigilancia de carpetas: describe automáticamente los archivos multimedia que van apareciendo.
+Usa los eventos del sistema de archivos de watchdog si está instalado y, si no, recorre las carpetas periódicamente.
+Un archivo sólo se describe cuando su tamaño y su fecha de modificación no cambian durante unos segundos, para no enviar archivos que todavía se están copiando.
+Los archivos listos pasan por una cola limitada: si llegan miles de golpe, el vigilante espera a que se liberen puestos en lugar de acumularlos en memoria.
+"""
+
+# Importaciones
+
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from engine.describer import is_media_file
+
+logger = logging.getLogger(__name__)
+
+# Valores por defecto, en segundos
+SETTLE_SECONDS = 2.0
+POLL_INTERVAL = 1.0
+# Intervalo del recorrido completo cuando hay eventos, por si alguno se pierde
+RESCAN_INTERVAL = 60.0
+# Archivos listos que pueden esperar su turno en la cola
+MAX_QUEUED = 100
+
+# Extensión de los archivos de resultado que se escriben junto a cada archivo
+SIDECAR_EXTENSION = ".json"
+
+def sidecar_path(path):
+	"""
+	Devuelve la ruta del archivo de resultado que acompaña a path
+	"""
+	return path + SIDECAR_EXTENSION
+
+class _Candidate:
+	"""
+	Archivo visto que todavía no se considera terminado
+	"""
+
+	def __init__(self, signature, now):
+		self.signature = signature
+		self.changed = now
+
+class FolderWatcher:
+	"""
+	Vigila una o varias carpetas y entrega las rutas de los archivos multimedia nuevos cuando terminan de escribirse
+	"""
+
+	def __init__(self, folders, settle_seconds=SETTLE_SECONDS, poll_interval=POLL_INTERVAL, recursive=True, max_queued=MAX_QUEUED, include_existing=False, use_events=True):
+		"""
+		Inicialización del vigilante.
+		Con include_existing=True también se entregan los archivos que ya estaban en las carpetas al empezar.
+		Con use_events=False se recorre siempre la carpeta, aunque watchdog esté instalado.
+		"""
+		if isinstance(folders, (str, os.PathLike)):
+			folders = [folders]
+		self.folders = [os.path.abspath(os.fspath(folder)) for folder in folders]
+		self.settle_seconds = settle_seconds
+		self.poll_interval = poll_interval
+		self.recursive = recursive
+		self.include_existing = include_existing
+		self.use_events = use_events
+
+		# Cola limitada de rutas listas para describir
+		self.ready = queue.Queue(maxsize=max_queued)
+		# Firma (tamaño, fecha de modificación) de los archivos ya entregados o ya presentes. Los que desaparecen se quitan en cada recorrido.
+		self.seen = {}
+		# Archivos que cambiaron hace poco y esperan a estabilizarse
+		self.candidates = {}
+		self.lock = threading.Lock()
+		self.stopped = threading.Event()
+		self.thread = None
+		self.observer = None
+		self.mode = None
+		# Contadores
+		self.detected = 0
+		self.queued = 0
+
+	def _signature(self, path):
+		"""
+		Devuelve (tamaño, fecha de modificación) del archivo, o None si ya no existe
+		"""
+		try:
+			stat = os.stat(path)
+		except OSError:
+			return None
+		return stat.st_size, stat.st_mtime_ns
+
+	def _scan(self):
+		"""
+		Genera las rutas de los archivos multimedia de las carpetas vigiladas
+		"""
+		for folder in self.folders:
+			if self.recursive:
+				for root, dirs, files in os.walk(folder):
+					for name in files:
+						if is_media_file(name):
+							yield os.path.join(root, name)
+			else:
+				try:
+					entries = list(os.scandir(folder))
+				except OSError:
+					continue
+				for entry in entries:
+					if entry.is_file() and is_media_file(entry.name):
+						yield entry.path
+
+	def notify(self, path):
+		"""
+		Anota que path se creó o cambió. Lo llaman los eventos del sistema de archivos y el recorrido periódico.
+		"""
+		if not is_media_file(path):
+			return
+		signature = self._signature(path)
+		if signature is None:
+			return
+		with self.lock:
+			if self.seen.get(path) == signature:
+				return
+			candidate = self.candidates.get(path)
+			if candidate is None:
+				self.candidates[path] = _Candidate(signature, time.monotonic())
+				self.detected += 1
+			elif candidate.signature != signature:
+				# Sigue escribiéndose: reiniciamos la espera
+				candidate.signature = signature
+				candidate.changed = time.monotonic()
+
+	def _settled(self):
+		"""
+		Devuelve las rutas cuyo tamaño y fecha no cambiaron durante settle_seconds
+		"""
+		now = time.monotonic()
+		settled = []
+		with self.lock:
+			paths = list(self.candidates)
+		for path in paths:
+			signature = self._signature(path)
+			with self.lock:
+				candidate = self.candidates.get(path)
+				if candidate is None:
+					continue
+				if signature is None:
+					# El archivo se borró o se movió antes de terminar
+					del self.candidates[path]
+				elif signature != candidate.signature:
+					candidate.signature = signature
+					candidate.changed = now
+				elif signature[0] > 0 and now - candidate.changed >= self.settle_seconds:
+					del self.candidates[path]
+					self.seen[path] = signature
+					settled.append(path)
+		return settled
+
+	def forget(self, path):
+		"""
+		Olvida que path ya se entregó, para que se vuelva a entregar en el próximo recorrido. Se usa cuando no se pudo guardar su resultado.
+		"""
+		with self.lock:
+			self.seen.pop(path, None)
+
+	def _rescan(self):
+		"""
+		Recorre las carpetas, anota los archivos nuevos o cambiados y olvida los ya entregados que ya no existen
+		"""
+		present = set()
+		for path in self._scan():
+			present.add(path)
+			self.notify(path)
+		with self.lock:
+			gone = [path for path in self.seen if path not in present]
+		# Un recorrido puede saltarse una carpeta que no se pudo leer: sólo olvidamos lo que de verdad ya no está
+		gone = [path for path in gone if not os.path.exists(path)]
+		with self.lock:
+			for path in gone:
+				self.seen.pop(path, None)
+
+	def _start_events(self):
+		"""
+		Intenta vigilar las carpetas con watchdog. Devuelve False si no está instalado.
+		"""
+		try:
+			# Importamos aquí porque watchdog es opcional.
+			from watchdog.observers import Observer
+			from watchdog.events import FileSystemEventHandler
+		except ImportError:
+			return False
+
+		watcher = self
+
+		class Handler(FileSystemEventHandler):
+			def on_created(self, event):
+				if not event.is_directory:
+					watcher.notify(event.src_path)
+
+			def on_modified(self, event):
+				if not event.is_directory:
+					watcher.notify(event.src_path)
+
+			def on_moved(self, event):
+				if not event.is_directory:
+					watcher.notify(event.dest_path)
+
+		self.observer = Observer()
+		handler = Handler()
+		for folder in self.folders:
+			self.observer.schedule(handler, folder, recursive=self.recursive)
+		self.observer.daemon = True
+		self.observer.start()
+		return True
+
+	def start(self):
+		"""
+		Empieza a vigilar las carpetas
+		"""
+		if self.thread is not None:
+			return
+		# Anotamos lo que ya existe para no describirlo, salvo que se pida
+		for path in self._scan():
+			if self.include_existing:
+				self.notify(path)
+			else:
+				signature = self._signature(path)
+				if signature is not None:
+					self.seen[path] = signature
+
+		self.mode = "events" if self.use_events and self._start_events() else "polling"
+		self.thread = threading.Thread(target=self._loop, name="folder-watcher", daemon=True)
+		self.thread.start()
+
+	def _loop(self):
+		"""
+		Hilo del vigilante: recorre las carpetas si no hay eventos y pasa a la cola los archivos terminados
+		"""
+		rescan_interval = self.poll_interval if self.mode == "polling" else RESCAN_INTERVAL
+		last_scan = time.monotonic()
+		while not self.stopped.is_set():
+			if time.monotonic() - last_scan >= rescan_interval:
+				last_scan = time.monotonic()
+				self._rescan()
+			for path in self._settled():
+				# Si la cola está llena esperamos: así se limita la memoria ante ráfagas de archivos
+				while not self.stopped.is_set():
+					try:
+						self.ready.put(path, timeout=self.poll_interval)
+						self.queued += 1
+						break
+					except queue.Full:
+						continue
+			self.stopped.wait(min(self.poll_interval, self.settle_seconds / 2 or self.poll_interval))
+
+	def paths(self):
+		"""
+		Genera las rutas listas para describir hasta que se detiene el vigilante
+		"""
+		while not self.stopped.is_set() or not self.ready.empty():
+			try:
+				yield self.ready.get(timeout=self.poll_interval)
+			except queue.Empty:
+				continue
+
+	def stop(self):
+		"""
+		Deja de vigilar las carpetas
+		"""
+		self.stopped.set()
+		if self.observer is not None:
+			self.observer.stop()
+			self.observer.join()
+			self.observer = None
+		if self.thread is not None:
+			self.thread.join()
+			self.thread = None
+
+class SidecarSink:
+	"""
+	Escribe el resultado de cada archivo en un JSON junto a él
+	"""
+
+	def write(self, result):
+		temp_path = sidecar_path(result.path) + ".tmp"
+		with open(temp_path, 'w', encoding='utf-8') as file:
+			json.dump(result.to_dict(), file, ensure_ascii=False, indent=2)
+		os.replace(temp_path, sidecar_path(result.path))
+
+class JsonlSink:
+	"""
+	Escribe cada resultado como una línea JSON en un flujo compartido
+	"""
+
+	def __init__(self, stream):
+		self.stream = stream
+		self.lock = threading.Lock()
+
+	def write(self, result):
+		with self.lock:
+			self.stream.write(result.to_json() + "\n")
+			self.stream.flush()
+
+def watch(engine, watcher, sink, prompt=None, skip_described=True, history=None):
+	"""
+	Describe con engine los archivos que entrega watcher y escribe cada resultado en sink, hasta que se detiene el vigilante.
+	Como mucho hay engine.workers archivos describiéndose a la vez; los demás esperan en la cola limitada del vigilante.
+	Con skip_described=True se omiten los archivos que ya tienen su resultado escrito al lado.
+	history, si se indica, es un HistoryStore donde también se guarda cada resultado.
+	Ctrl+C detiene la vigilancia; los archivos en curso terminan de describirse antes de volver.
+	Si no se puede guardar el resultado de un archivo, se cuenta como error y el vigilante lo vuelve a entregar en el próximo recorrido.
+	Devuelve la cantidad de archivos descritos y de errores.
+	"""
+	counts = {"written": 0, "errors": 0}
+	lock = threading.Lock()
+	slots = threading.BoundedSemaphore(engine.workers)
+
+	def describe(path):
+		try:
+			result = engine.describe_result(path, prompt)
+			sink.write(result)
+			if history is not None:
+				history.add(result)
+		except Exception:
+			# Disco lleno, historial cerrado, texto que no se puede escribir...: el archivo queda pendiente
+			logger.exception("No se pudo guardar el resultado de %s", path)
+			watcher.forget(path)
+			with lock:
+				counts["errors"] += 1
+			return
+		finally:
+			slots.release()
+		with lock:
+			counts["written"] += 1
+			if not result.ok:
+				counts["errors"] += 1
+
+	watcher.start()
+	with ThreadPoolExecutor(max_workers=engine.workers, thread_name_prefix="watch") as executor:
+		try:
+			for path in watcher.paths():
+				if skip_described and os.path.exists(sidecar_path(path)):
+					continue
+				# No sacamos otro archivo de la cola hasta que haya un hilo libre
+				slots.acquire()
+				executor.submit(describe, path)
+		except KeyboardInterrupt:
+			pass
+		finally:
+			watcher.stop()
+	return counts["written"], counts["errors"]
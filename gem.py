@@ -1,703 +1,1129 @@
-"""
-Gemini descriptor te permite enviar un archivo, ya sea de video o imágen a google gemini para obtener una descripción del contenido del mismo
-Tiene opciones para ingresar un prompt personalizado, adjuntar el archivo, enviar el contenido junto con el prompt, copiar, guardar y eliminar la respuesta generada.
-** Nota **
-En muchas ocasiones hago referencia a la barra de estado, refiriéndome al texto estático que se muestra en el programa, no es una barra de estado tal cual.
-"""
-
-# Importaciones
-
-import os
-import time
-import json
-import threading
-
-import wx
-import cv2
-import pyperclip
-from google import genai
-
-from audio.speaker import alert
-
-class ApiKeyManager:
-	"""
-	Clase para gestionar la API Key de Gemini
-	"""
-	# Archivo de la api_key en json.
-	API_FILE = "api.json"
-	
-	@staticmethod
-	def get_api_key():
-		"""
-		Obtiene la API key desde variables de entorno, si está configurada. si no, obtiene desde el archivo.
-		"""
-		# Intentamos obtener desde variable de entorno
-		api_key = os.getenv("API_GEMINI")
-		
-		# Si no existe en variables de entorno, intentar cargar desde archivo
-		if not api_key:
-			try:
-				# Verificamos existencia del archivo.
-				if os.path.exists(ApiKeyManager.API_FILE):
-					# Abrimos el archivo en modo lectura.
-					with open(ApiKeyManager.API_FILE, 'r') as f:
-						# Obtenemos el contenido con formato json.
-						api_data = json.load(f)
-						# Buscamos y obtenemos la api key
-						api_key = api_data.get('api_key')
-			except Exception as e:
-				print(f"Error al cargar API key desde archivo: {e}")
-		
-		return api_key
-	
-	@staticmethod
-	def save_api_key(api_key):
-		"""
-		Guarda la API key en un archivo
-		"""
-		try:
-			# Abrimos el archivo en modo escritura
-			with open(ApiKeyManager.API_FILE, 'w') as f:
-				# Escribimos el contenido con formato json.
-				json.dump({'api_key': api_key}, f)
-			# Retornamos True si todo salió bien.
-			return True
-		except Exception as e:
-			print(f"Error al guardar API key: {e}")
-			return False
-
-class GeminiUploaderApp(wx.Frame):
-	"""
-	Clase que contiene los controles para la interfaz junto con los métodos para interactuar con el modelo de gemini.
-	"""
-	# Archivo para el prompt
-	PROMPT_FILE = "prompt.txt"
-
-	def __init__(self):
-		"""
-		Inicialización de la interfaz
-		"""
-		# Llamamos al constructor.
-		super().__init__(None, title="Carga de videos e imágenes con Gemini", size=(700, 600))
-		
-		# obtenemos la api key
-		self.initialize_api_key()
-		
-		# Configuración visual.
-		# Establecer color de fondo en gris.
-		self.SetBackgroundColour(wx.Colour(240, 240, 240))
-		
-		# Panel principal
-		panel = wx.Panel(self)
-		main_sizer = wx.BoxSizer(wx.VERTICAL)
-		
-		
-		# Botón para configurar API Key
-		api_button = wx.Button(panel, label="Configurar API Key")
-		api_button.Bind(wx.EVT_BUTTON, self.configure_api_key)
-		main_sizer.Add(api_button, flag=wx.ALIGN_RIGHT | wx.RIGHT, border=20)
-		
-		# Botón para salir de la aplicación
-		exit_button = wx.Button(panel, label="Salir")
-		exit_button.Bind(wx.EVT_BUTTON, self.on_exit)
-		main_sizer.Add(exit_button, flag=wx.ALIGN_RIGHT | wx.RIGHT, border=20)
-		
-		# Sección de prompt
-		prompt_box = wx.StaticBox(panel, label="Instrucciones para Gemini. Presiona tecla aplicaciones o f10 para mostrar opciones adicionales.")
-		prompt_sizer = wx.StaticBoxSizer(prompt_box, wx.VERTICAL)
-		# Creamos un cuadro de texto multilínea con un ancho que se ajusta automáticamente en base al panel, y una altura de 80 px.
-		self.prompt_input = wx.TextCtrl(panel, style=wx.TE_MULTILINE, size=(-1, 80))
-		# Cargamos el prompt desde el archivo txt.
-		self.load_prompt()
-		# Evento para menú contextual en el cuadro de texto.
-		self.prompt_input.Bind(wx.EVT_CONTEXT_MENU, self.on_context_menu)
-		# Manejador de teclas en el cuadro.
-		self.prompt_input.Bind(wx.EVT_KEY_DOWN, self.on_key_down)
-		prompt_sizer.Add(self.prompt_input, flag=wx.EXPAND | wx.ALL, border=10)
-		
-		main_sizer.Add(prompt_sizer, flag=wx.EXPAND | wx.ALL, border=10)
-		
-		# Sección de controles de archivo
-		file_box = wx.StaticBox(panel, label="Selección de Archivo")
-		file_sizer = wx.StaticBoxSizer(file_box, wx.VERTICAL)
-		
-		file_controls = wx.BoxSizer(wx.HORIZONTAL)
-		# Cuadro de texto donde se mostrará la ruta del archivo seleccionado.
-		self.file_path_text = wx.TextCtrl(panel, style=wx.TE_READONLY)
-		file_controls.Add(self.file_path_text, proportion=1, flag=wx.EXPAND | wx.RIGHT, border=10)
-		# Botón para seleccionar archivos.
-		self.attach_button = wx.Button(panel, label="&Seleccionar archivo")
-		self.attach_button.Bind(wx.EVT_BUTTON, self.attach_file)
-		file_controls.Add(self.attach_button, flag=wx.ALIGN_CENTER_VERTICAL)
-		
-		file_sizer.Add(file_controls, flag=wx.EXPAND | wx.ALL, border=10)
-		
-		main_sizer.Add(file_sizer, flag=wx.EXPAND | wx.ALL, border=10)
-		
-		button_sizer = wx.BoxSizer(wx.HORIZONTAL)
-		# Botón para enviar el archivo seleccionado
-		self.send_button = wx.Button(panel, label="&Enviar archivo a Gemini")
-		self.send_button.Bind(wx.EVT_BUTTON, self.send_file)
-		# Deshabilitar hasta que el archivo esté seleccionado.
-		self.send_button.Disable()
-		# Establece el tamaño mínimo del botón send_button, con un ancho de 200 píxeles y altura ajustable automáticamente.
-		self.send_button.SetMinSize((200, -1))
-		button_sizer.Add(self.send_button, flag=wx.ALL, border=5)
-		
-		main_sizer.Add(button_sizer, flag=wx.ALIGN_CENTER | wx.ALL, border=10)
-		
-		# Barra de progreso
-		self.progress_gauge = wx.Gauge(panel, range=100, size=(-1, 20))
-		# Ocultamos la barra de progreso.
-		self.progress_gauge.Hide()
-		main_sizer.Add(self.progress_gauge, flag=wx.EXPAND | wx.LEFT | wx.RIGHT, border=20)
-		
-		# Campo de estado
-		self.status_text = wx.StaticText(panel, label="")
-		main_sizer.Add(self.status_text, flag=wx.ALL | wx.ALIGN_CENTER, border=5)
-		
-		# Sección de respuesta
-		response_box = wx.StaticBox(panel, label="&Respuesta de Gemini")
-		response_sizer = wx.StaticBoxSizer(response_box, wx.VERTICAL)
-		
-		self.response_text = wx.TextCtrl(panel, style=wx.TE_MULTILINE | wx.TE_READONLY | wx.TE_WORDWRAP, size=(-1, 200))
-		response_sizer.Add(self.response_text, flag=wx.EXPAND | wx.ALL, border=10)
-		
-		main_sizer.Add(response_sizer, flag=wx.EXPAND | wx.ALL, border=10)
-		
-		# Botones de acción para la respuesta
-		action_sizer = wx.BoxSizer(wx.HORIZONTAL)
-		# Botón para copiar la respuesta generada
-		self.copy_button = wx.Button(panel, label="&Copiar respuesta")
-		self.copy_button.Bind(wx.EVT_BUTTON, self.copy_to_clipboard)
-		# Ocultamos hasta que se proporcione respuesta.
-		self.copy_button.Hide()
-		action_sizer.Add(self.copy_button, flag=wx.RIGHT, border=10)
-		# Botón para eliminar la respuesta del cuadro de texto.
-		self.clear_button = wx.Button(panel, label="&Limpiar campo de respuesta")
-		self.clear_button.Bind(wx.EVT_BUTTON, self.clear_description)
-		self.clear_button.Hide()
-		action_sizer.Add(self.clear_button)
-		# Botón para guardar la respuesta en un archivo
-		self.save_button = wx.Button(panel, label="&Guardar respuesta")
-		self.save_button.Bind(wx.EVT_BUTTON, self.save_response)
-		self.save_button.Hide()
-		action_sizer.Add(self.save_button, flag=wx.LEFT, border=10)
-		
-		main_sizer.Add(action_sizer, flag=wx.ALIGN_CENTER | wx.ALL, border=10)
-		
-		panel.SetSizer(main_sizer)
-		
-		# Barra de estado
-		self.CreateStatusBar()
-		# Configuramos el texto de la barra de estado con un texto que indica al usuario que el programa está listo para recivir archivos.
-		self.SetStatusText("Listo para procesar archivos.")
-		
-		# Variables para controlar el proceso
-		self.selected_file = None
-		self.processing = False
-		
-		# Centrar en pantalla
-		self.Centre()
-		
-		# Verificamos si tenemos una API key válida
-		self.check_api_key_validity()
-
-	def initialize_api_key(self):
-		"""
-		Inicializa la API key al iniciar la aplicación
-		"""
-		# Intentamos obtener la api key
-		self.api_key = ApiKeyManager.get_api_key()
-		
-		# Si no hay API key disponible, la solicitamos al usuario
-		if not self.api_key:
-			self.request_api_key()
-
-		# Inicializar cliente de Gemini con la API key obtenida
-		if self.api_key:
-			self.initialize_gemini_client()
-
-	def initialize_gemini_client(self):
-		"""
-		Inicializa el cliente de Gemini con la API key actual
-		"""
-		
-		try:
-			self.client = genai.Client(api_key=self.api_key)
-			return True
-		except Exception as e:
-			self.show_error(f"Error al inicializar cliente Gemini: {str(e)}")
-			return False
-
-	def request_api_key(self):
-		"""
-		Solicita la API key al usuario mediante un diálogo
-		"""
-		
-		dlg = wx.TextEntryDialog(
-			self, 
-			"No se encontró API Key de Gemini. Por favor, introduce tu API Key:",
-			"Configuración de API Key"
-		)
-		
-		if dlg.ShowModal() == wx.ID_OK:
-			# Obtenemos la API key del diálogo
-			self.api_key = dlg.GetValue().strip()
-			if self.api_key:
-				# Guardamos la API key en el archivo
-				if ApiKeyManager.save_api_key(self.api_key):
-					self.update_status("API Key guardada correctamente.")
-					alert("API Key guardada correctamente")
-					# Inicializar cliente de Gemini
-					self.initialize_gemini_client()
-				else:
-					self.show_error("No se pudo guardar la API Key.")
-			else:
-				self.show_error("La API Key no puede estar vacía.")
-		
-		dlg.Destroy()
-
-	def configure_api_key(self, event):
-		"""
-		Permite al usuario configurar manualmente la API Key
-		"""
-		# Obtenemos la API key. si no hay configurada, se inicializa la variable sin contenido.
-		current_key = self.api_key if self.api_key else ""
-		
-		dlg = wx.TextEntryDialog(
-			self, 
-			"Introduce tu API Key de Gemini:",
-			"Configuración de API Key",
-			value=current_key
-		)
-		
-		if dlg.ShowModal() == wx.ID_OK:
-			# Obtenemos la API key del diálogo
-			new_key = dlg.GetValue().strip()
-			# Si la API key ingresada es distinta a la configurada, actualizamos y recargamos el cliente de genai
-			if new_key and new_key != self.api_key:
-				self.api_key = new_key
-				if ApiKeyManager.save_api_key(self.api_key):
-					self.update_status("API Key actualizada correctamente.")
-					alert("API Key actualizada correctamente")
-					self.initialize_gemini_client()
-				else:
-					self.show_error("No se pudo guardar la API Key.")
-		
-		dlg.Destroy()
-
-	def check_api_key_validity(self):
-		"""
-		Verifica si la API key actual es válida
-		"""
-		# Si no tenemos una API key, actualizamos el texto de la barra de estado indicando que no hay API key configurada.
-		if not self.api_key:
-			self.update_status("API Key no configurada. Configure su API Key para usar la aplicación.")
-			alert("API Key no configurada")
-			return False
-		
-		# Aquí se podría añadir una llamada a la API para verificar que sea válida. Por ahora, se dejará así
-		return True
-
-	def attach_file(self, event):
-		"""
-		Método para seleccionar un archivo
-		"""
-		# Verificamos primero si tenemos una API key válida
-		if not self.check_api_key_validity():
-			self.show_error("Debe configurar una API Key válida antes de usar la aplicación.")
-			return
-			
-		wildcard = "Archivos multimedia (*.mp4;*.mov;*.avi;*.png;*.jpg)|*.mp4;*.mov;*.avi;*.png;*.jpg"
-		# Iniciamos el diálogo para la carga de archivos
-		with wx.FileDialog(self, "Selecciona un archivo", wildcard=wildcard, style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST) as dialog:
-			if dialog.ShowModal() == wx.ID_OK:
-				# Obtenemos la ruta seleccionada
-				self.selected_file = dialog.GetPath()
-				# Configuramos el texto en el cuadro para la ruta.
-				self.file_path_text.SetValue(self.selected_file)
-				# Habilitamos el botón para enviar
-				self.send_button.Enable()
-				# Actualizamos el texto de la barra de estado
-				self.update_status(f"Archivo seleccionado: {os.path.basename(self.selected_file)}")
-				self.get_tockens()
-				alert(f"Archivo seleccionado: {os.path.basename(self.selected_file)}")
-				
-				# Limpiar respuestas anteriores
-				self.response_text.SetValue("")
-				self.hide_result_buttons()
-
-	def get_tockens(self):
-		"""
-		Método que calcula los tokens estimados según el tipo de archivo seleccionado.
-		"""
-		
-		if not hasattr(self, 'selected_file') or not self.selected_file:
-			self.show_error("No se ha seleccionado ningún archivo.")
-			return
-
-		file_extension = os.path.splitext(self.selected_file)[1].lower()
-		
-		if file_extension in [".mp4", ".mov", ".avi"]:
-			# Calculamos tokens para video
-			cap = cv2.VideoCapture(self.selected_file)
-			fps = cap.get(cv2.CAP_PROP_FPS)
-			frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-			duration = frame_count / fps if fps > 0 else 0
-			cap.release()
-			
-			if duration <= 0:
-				self.show_error("No se pudo obtener la duración del video.")
-				return
-			
-			tokens = int(duration * 300)  # 300 tokens por segundo
-			mensaje = f"Duración: {duration:.2f} segundos. Estimación de tokens: {tokens}."
-			
-		elif file_extension in [".png", ".jpg"]:
-			# Calculamos tokens para imagen
-			tokens = 258  # Cada imagen es 258 tokens
-			mensaje = f"El archivo es una imagen. Estimación de tokens: {tokens}."
-		
-		else:
-			self.show_error("Formato de archivo no compatible.")
-			return
-
-		self.update_status(mensaje)
-		alert(mensaje)
-
-	def send_file(self, event):
-		"""
-		Método para enviar el archivo
-		"""
-		
-		# Verificamos primero si tenemos una API key válida
-		if not self.check_api_key_validity():
-			self.show_error("Debe configurar una API Key válida antes de usar la aplicación.")
-			return
-			
-		# Si no se seleccionó una ruta, le indicamos al usuario que lo haga antes de continuar
-		if not self.selected_file:
-			self.show_error("Por favor, selecciona un archivo primero.")
-			return
-		# Si self.processing es True, no se permiten más cargas y se le indica al usuario que ya hay un proceso activo.
-		if self.processing:
-			self.show_error("Ya hay un proceso en curso. Por favor espera.")
-			return
-		
-		# Deshabilitamos controles durante el procesamiento
-		# Modificamos self.PROCESSING a True, y deshabilitamos los botones para seleccionar archivo y para enviar
-		self.processing = True
-		self.send_button.Disable()
-		self.attach_button.Disable()
-		self.response_text.SetValue("")
-		# Actualizamos la barra de estado.
-		self.update_status("Iniciando procesamiento del archivo...")
-		alert("Iniciando procesamiento del archivo")
-		
-		# Mostramos indicador de progreso
-		self.progress_gauge.SetValue(0)
-		self.progress_gauge.Show()
-		
-		# Ejecutamos la solicitud en un hilo separado para evitar bloquear la interfaz
-		threading.Thread(target=self.process_file).start()
-
-	def process_file(self):
-		"""
-		Método para procesar el archivo enviado
-		"""
-		try:
-			# Actualizamos progreso: 10%
-			wx.CallAfter(self.update_progress, 10, "Subiendo archivo...")
-			
-			# Subimos el archivo
-			video_file = self.client.files.upload(file=self.selected_file)
-			
-			# Actualizamos progreso: 40%
-			wx.CallAfter(self.update_progress, 40, "Archivo subido. Procesando...")
-			
-			# Verificamos estado del archivo
-			processing_iterations = 0
-			while video_file.state.name == "PROCESSING":
-				# Mientras el archivo esté en procesamiento, esperamos 2 segundos antes de añadir una iteración a la variable y validar si seguimos en el proceso del video
-				time.sleep(2)
-				processing_iterations += 1
-				video_file = self.client.files.get(name=video_file.name)
-				
-				# Incrementamos progreso de 40% a 70% durante el procesamiento
-				progress = min(40 + processing_iterations * 2, 70)
-				wx.CallAfter(self.update_progress, progress, "Procesando archivo en Gemini...")
-			# Si el procesamiento del archivo falló, mostramos el error.
-			if video_file.state.name == "FAILED":
-				wx.CallAfter(self.show_error, "Error al procesar el archivo en Gemini.")
-				return
-			
-			# Actualizamos progreso: 70%
-			wx.CallAfter(self.update_progress, 70, "Archivo procesado. Generando respuesta...")
-			
-			# Obtenemos el contenido del prompt
-			prompt = self.prompt_input.GetValue().strip()
-			if not prompt:
-				# Si no se ingresa uno, se utiliza uno por defecto.
-				prompt = "Describe en detalle lo que se muestra en este archivo en español."
-			
-			# Creamos la solicitud a Gemini
-			response = self.client.models.generate_content(
-				model="gemini-2.0-flash-exp",
-				contents=[video_file, prompt]
-			)
-			
-			# Actualizamos progreso: 100%
-			wx.CallAfter(self.update_progress, 100, "Respuesta generada correctamente.")
-			
-			# Mostramos la respuesta en el cuadro de texto
-			wx.CallAfter(self.update_response, response.text)
-			
-		except Exception as e:
-			error_message = f"Error: {str(e)}"
-			wx.CallAfter(self.show_error, error_message)
-		
-		finally:
-			# Restauramos controles cuando se completa el proceso
-			wx.CallAfter(self.complete_processing)
-
-	def update_progress(self, value, status_message):
-		"""
-		Método que actualiza la barra de estado y de progreso
-		"""
-		# Configuramos los valores de la barra de progreso, de estado y notificamos con el método alert los textos de la barra de estado.
-		self.progress_gauge.SetValue(value)
-		self.update_status(status_message)
-		alert(status_message)
-
-	def update_response(self, response_text):
-		"""
-		Método para actualizar la respuesta en el campo de texto
-		"""
-		
-		# Mostramos la respuesta generada en el cuadro de texto
-		self.response_text.SetValue(response_text)
-		
-		message = "Respuesta de Gemini generada correctamente."
-		self.update_status(message)
-		alert(message)
-		
-		# Mostramos botones de acción
-		self.show_result_buttons()
-
-	def complete_processing(self):
-		"""
-		Método que devuelve los controles a como estaban originalmente, manteniendo los botones de acción para la respuesta vicibles, indicando que la respuesta fue resivida por el usuario
-		"""
-		
-		# Ocultamos la barra de progreso
-		self.progress_gauge.Hide()
-		
-		# Habilitamos controles
-		self.send_button.Enable()
-		self.attach_button.Enable()
-		# Devolvemos PROCESSING a False
-		self.processing = False
-		
-		# Actualizamos la disposición
-		self.Layout()
-
-	def copy_to_clipboard(self, event):
-		"""
-		Método para copiar la respuesta generada al portapapeles
-		"""
-		# Obtenemos el texto desde el cuadro para la respuesta.
-		text = self.response_text.GetValue()
-		if text:
-			# Si hay texto, se copia y se actualiza la barra de estado.
-			pyperclip.copy(text)
-			self.update_status("Respuesta copiada al portapapeles.")
-			alert("Respuesta copiada al portapapeles")
-		else:
-			self.update_status("No hay respuesta para copiar.")
-			alert("No hay respuesta para copiar")
-
-	def clear_description(self, event):
-		"""
-		Método para eliminar la respuesta generada del cuadro de texto
-		"""
-		
-		self.response_text.SetValue("")
-		# Ocultamos los botones de acción y actualizamos la barra de estado
-		self.hide_result_buttons()
-		self.update_status("Respuesta borrada.")
-		alert("Respuesta borrada")
-
-	def save_response(self, event):
-		"""
-		Método para guardar la respuesta generada en un archivo de texto (*.txt)
-		"""
-		# Obtenemos el contenido del cuadro de respuesta
-		text = self.response_text.GetValue()
-		if not text:
-			# Si no hay texto actualizamos la barra de estado
-			self.update_status("No hay respuesta para guardar.")
-			alert("No hay respuesta para guardar")
-			return
-			
-		# Iniciamos el diálogo para guardar el archivo
-		with wx.FileDialog(self, "Guardar respuesta", 
-						  wildcard="Archivos de texto (*.txt)|*.txt",
-						  style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT) as fileDialog:
-			
-			if fileDialog.ShowModal() == wx.ID_CANCEL:
-				# Si se cancela el diálogo, retornamos.
-				return
-				
-			# Obtenemos el nombre ingresado en el diálogo
-			pathname = fileDialog.GetPath()
-			try:
-				# Intentamos guardar el archivo, escribiendo la respuesta
-				with open(pathname, 'w', encoding='utf-8') as file:
-					file.write(text)
-				# Actualizamos la barra de estado.
-				self.update_status(f"Respuesta guardada en {pathname}")
-				alert("Respuesta guardada correctamente")
-			except IOError:
-				self.show_error(f"No se pudo guardar en {pathname}")
-
-	def show_error(self, message):
-		"""
-		Método para mostrar los errores que ocurran dentro del programa
-		"""
-		
-		wx.MessageBox(message, "Error", wx.ICON_ERROR)
-		self.update_status(f"ERROR: {message}")
-		alert(f"Error: {message}")
-		
-		# Restauramos los controles
-		self.send_button.Enable()
-		self.attach_button.Enable()
-		self.progress_gauge.Hide()
-		self.processing = False
-		self.Layout()
-
-	def update_status(self, message):
-		"""
-		Método para actualizar el StaticText
-		"""
-		
-		self.status_text.SetLabel(message)
-		self.SetStatusText(message)
-		self.Layout()
-
-	def show_result_buttons(self):
-		"""
-		Método para mostrar los botones de acción para la Respuesta
-		"""
-		
-		self.copy_button.Show()
-		self.clear_button.Show()
-		self.save_button.Show()
-		self.Layout()
-
-	def hide_result_buttons(self):
-		"""
-		Método para ocultar los botones de acción cuando se elimina la respuesta del cuadro de texto
-		"""
-		
-		self.copy_button.Hide()
-		self.clear_button.Hide()
-		self.save_button.Hide()
-		self.Layout()
-
-	def on_exit(self, event):
-		"""
-		Método para salir del programa
-		"""
-		
-		self.Close()
-
-	def on_context_menu(self, event):
-		"""
-		Método para crear el menú contextual
-		"""
-		
-		menu = wx.Menu()
-		# Items, guardar prompt
-		save_item = menu.Append(wx.ID_ANY, "Guardar prompt")
-		# Items, copiar prompt al portapapeles
-		copy_item = menu.Append(wx.ID_ANY, "Copiar al portapapeles")
-		
-		self.Bind(wx.EVT_MENU, self.save_prompt_to_file, save_item)
-		self.Bind(wx.EVT_MENU, self.copy_prompt_to_clipboard, copy_item)
-		
-		self.PopupMenu(menu)
-		menu.Destroy()
-
-	def on_key_down(self, event):
-		"""
-		Método para el manejo de teclas y mostrar el menú contextual al presionar f10 o tecla aplicaciones
-		"""
-		
-		if event.GetKeyCode() in [wx.WXK_F10, wx.WXK_WINDOWS_MENU]:
-			self.on_context_menu(event)
-		event.Skip()
-
-	def save_prompt_to_file(self, event):
-		"""
-		Método para guardar el prompt en un archivo de texto (*.txt)
-		"""
-		# Obtenemos el texto del prompt desde el cuadro de texto
-		prompt_text = self.prompt_input.GetValue()
-		if not prompt_text:
-			# Si no hay prompt, se muestra mensaje de error
-			self.update_status("No hay prompt para guardar.")
-			alert("No hay prompt para guardar")
-			return
-		
-		try:
-			# Intentamos guardar el archivo escribiendo el prompt obtenido
-			with open(self.PROMPT_FILE, 'w', encoding='utf-8') as file:
-				file.write(prompt_text)
-			# Actualizamos estado
-			self.update_status(f"Prompt guardado en {self.PROMPT_FILE}")
-			alert("Prompt guardado correctamente")
-		except IOError:
-			self.show_error(f"No se pudo guardar en {self.PROMPT_FILE}")
-
-	def copy_prompt_to_clipboard(self, event):
-		"""
-		método para copiar el prompt al portapapeles
-		"""
-		# Obtenemos el prompt del cuadro de texto
-		prompt_text = self.prompt_input.GetValue()
-		if prompt_text:
-			# Si hay texto, se copia al portapapeles y se actualiza el estado
-			pyperclip.copy(prompt_text)
-			self.update_status("Prompt copiado al portapapeles.")
-			alert("Prompt copiado al portapapeles")
-		else:
-			self.update_status("No hay prompt para copiar.")
-			alert("No hay prompt para copiar")
-
-	def load_prompt(self):
-		"""
-		Método para cargar el prompt desde el archivo de texto
-		"""
-		
-		try:
-			# Verificamos la existencia del archivo
-			if os.path.exists(self.PROMPT_FILE):
-				# Si existe, lo abrimos en modo lectura y obtenemos el texto ingresado
-				with open(self.PROMPT_FILE, 'r', encoding='utf-8') as file:
-					prompt_text = file.read()
-				# Lo configuramos en el cuadro de texto
-				self.prompt_input.SetValue(prompt_text)
-			else:
-				# Valor predeterminado si no existe el archivo
-				self.prompt_input.SetValue("Describe en detalle lo que se muestra en este archivo en español.")
-		except IOError:
-			self.update_status(f"Error al cargar el prompt desde {self.PROMPT_FILE}")
-			alert(f"Error al cargar el prompt desde {self.PROMPT_FILE}")
-
-if __name__ == "__main__":
-	app = wx.App(False)
-	frame = GeminiUploaderApp()
-	frame.Show()
-	app.MainLoop()
+"""
+Gemini descriptor te permite enviar un archivo, ya sea de video o imágen a google gemini para obtener una descripción del contenido del mismo
+Tiene opciones para ingresar un prompt personalizado, adjuntar el archivo, enviar el contenido junto con el prompt, copiar, guardar y eliminar la respuesta generada.
+** Nota **
+En muchas ocasiones hago referencia a la barra de estado, refiriéndome al texto estático que se muestra en el programa, no es una barra de estado tal cual.
+"""
+
+# Importaciones
+
+import os
+import time
+import threading
+
+import wx
+
+from audio.speaker import alert, SentenceSpeaker
+from ui.dispatcher import UIDispatcher
+from engine.api_key import ApiKeyManager
+from engine.cache import ResponseCache
+from engine.history import HistoryStore
+from engine.metrics import Metrics
+from engine.registry import UploadRegistry
+from engine.preprocess import VideoCompressor
+from engine.probe import MediaProbe, estimate_report
+from engine.segments import VideoSegmenter
+from engine.upload import ResumableUploader
+from engine.scheduler import RequestScheduler
+from engine.session import FileSession
+from engine.lifecycle import FileLifecycle
+from engine.prefetch import PrefetchedFile
+from engine.cancel import CancelToken, JobCancelled
+from engine.routing import ModelRouter
+from engine.similarity import SimilarityIndex
+from engine.describer import DescriptionEngine, DescriptionError, create_client, normalize_prompt
+
+class GeminiUploaderApp(wx.Frame):
+	"""
+	Clase que contiene los controles para la interfaz junto con los métodos para interactuar con el modelo de gemini.
+	"""
+	# Archivo para el prompt
+	PROMPT_FILE = "prompt.txt"
+	# Intervalo en milisegundos entre dos actualizaciones de la interfaz: los mensajes de progreso y los fragmentos de la respuesta se agrupan a este ritmo
+	UI_FRAME_MS = 150
+
+	def __init__(self):
+		"""
+		Inicialización de la interfaz
+		"""
+		# Llamamos al constructor.
+		super().__init__(None, title="Carga de videos e imágenes con Gemini", size=(700, 600))
+		
+		# El cliente de Gemini se crea en segundo plano; este evento indica cuándo está listo
+		self.client = None
+		self.engine = None
+		self.lifecycle = None
+		self.resumable_uploader = None
+		self.client_error = None
+		self.client_ready = threading.Event()
+		
+		# Caché en disco de las respuestas generadas e historial de todas las descripciones, con búsqueda de texto completo.
+		# Abrir las bases de datos tarda, así que se abren en segundo plano; quien las necesite antes espera a que terminen.
+		self.stores_lock = threading.Lock()
+		self.response_cache = None
+		self.history = None
+		threading.Thread(target=self.open_stores, daemon=True).start()
+		# Índice de huellas perceptuales: una imagen o un video casi igual a otro ya descrito reutiliza su descripción.
+		# Cargar todas las huellas tarda, así que el índice se crea en segundo plano la primera vez que se marca su casilla.
+		self.similar_index = None
+		self.similar_loading = False
+		# Registro de archivos ya subidos, para no volver a subirlos al hacer otra pregunta sobre el mismo archivo
+		self.upload_registry = UploadRegistry()
+		# Compresor de videos, usado sólo si se marca la casilla correspondiente
+		self.video_compressor = VideoCompressor()
+		# Lector de metadatos con caché, para estimar los tokens sin abrir el video completo
+		self.media_probe = MediaProbe()
+		# Divisor de videos largos, usado sólo si se marca la casilla correspondiente
+		self.video_segmenter = VideoSegmenter(probe=self.media_probe)
+		# Duración de cada etapa. Sólo se mide si la variable de entorno GEMINI_METRICS indica el archivo donde guardarla al salir.
+		self.metrics_file = os.environ.get("GEMINI_METRICS")
+		self.metrics = Metrics(enabled=bool(self.metrics_file))
+		# Sesión de preguntas sobre el archivo seleccionado, creada al enviar con la casilla de preguntas seguidas marcada
+		self.session = None
+		# Las actualizaciones que llegan desde los hilos de trabajo se fusionan y se aplican como mucho una vez por cuadro
+		self.dispatcher = UIDispatcher(self.UI_FRAME_MS, metrics=self.metrics)
+		# Subida anticipada del archivo seleccionado, que empieza mientras se escribe el prompt
+		self.prefetched = None
+		# Momento en que se pulsó enviar, para medir la espera hasta la respuesta
+		self.send_started = None
+		# Señal para cancelar el envío en curso
+		self.cancel_token = None
+		
+		# obtenemos la api key
+		self.initialize_api_key()
+		
+		# Configuración visual.
+		# Establecer color de fondo en gris.
+		self.SetBackgroundColour(wx.Colour(240, 240, 240))
+		
+		# Panel principal
+		panel = wx.Panel(self)
+		main_sizer = wx.BoxSizer(wx.VERTICAL)
+		
+		
+		# Botón para configurar API Key
+		api_button = wx.Button(panel, label="Configurar API Key")
+		api_button.Bind(wx.EVT_BUTTON, self.configure_api_key)
+		main_sizer.Add(api_button, flag=wx.ALIGN_RIGHT | wx.RIGHT, border=20)
+		
+		# Botón para salir de la aplicación
+		exit_button = wx.Button(panel, label="Salir")
+		exit_button.Bind(wx.EVT_BUTTON, self.on_exit)
+		main_sizer.Add(exit_button, flag=wx.ALIGN_RIGHT | wx.RIGHT, border=20)
+		
+		# Botones para buscar en el historial de descripciones y exportarlo
+		history_button = wx.Button(panel, label="&Buscar en el historial")
+		history_button.Bind(wx.EVT_BUTTON, self.search_history)
+		main_sizer.Add(history_button, flag=wx.ALIGN_RIGHT | wx.RIGHT, border=20)
+		export_button = wx.Button(panel, label="E&xportar historial")
+		export_button.Bind(wx.EVT_BUTTON, self.export_history)
+		main_sizer.Add(export_button, flag=wx.ALIGN_RIGHT | wx.RIGHT, border=20)
+		
+		# Sección de prompt
+		prompt_box = wx.StaticBox(panel, label="Instrucciones para Gemini. Presiona tecla aplicaciones o f10 para mostrar opciones adicionales.")
+		prompt_sizer = wx.StaticBoxSizer(prompt_box, wx.VERTICAL)
+		# Creamos un cuadro de texto multilínea con un ancho que se ajusta automáticamente en base al panel, y una altura de 80 px.
+		self.prompt_input = wx.TextCtrl(panel, style=wx.TE_MULTILINE, size=(-1, 80))
+		# Cargamos el prompt desde el archivo txt.
+		self.load_prompt()
+		# Evento para menú contextual en el cuadro de texto.
+		self.prompt_input.Bind(wx.EVT_CONTEXT_MENU, self.on_context_menu)
+		# Manejador de teclas en el cuadro.
+		self.prompt_input.Bind(wx.EVT_KEY_DOWN, self.on_key_down)
+		prompt_sizer.Add(self.prompt_input, flag=wx.EXPAND | wx.ALL, border=10)
+		
+		main_sizer.Add(prompt_sizer, flag=wx.EXPAND | wx.ALL, border=10)
+		
+		# Sección de controles de archivo
+		file_box = wx.StaticBox(panel, label="Selección de Archivo")
+		file_sizer = wx.StaticBoxSizer(file_box, wx.VERTICAL)
+		
+		file_controls = wx.BoxSizer(wx.HORIZONTAL)
+		# Cuadro de texto donde se mostrará la ruta del archivo seleccionado.
+		self.file_path_text = wx.TextCtrl(panel, style=wx.TE_READONLY)
+		file_controls.Add(self.file_path_text, proportion=1, flag=wx.EXPAND | wx.RIGHT, border=10)
+		# Botón para seleccionar archivos.
+		self.attach_button = wx.Button(panel, label="&Seleccionar archivo")
+		self.attach_button.Bind(wx.EVT_BUTTON, self.attach_file)
+		file_controls.Add(self.attach_button, flag=wx.ALIGN_CENTER_VERTICAL)
+		
+		file_sizer.Add(file_controls, flag=wx.EXPAND | wx.ALL, border=10)
+		
+		main_sizer.Add(file_sizer, flag=wx.EXPAND | wx.ALL, border=10)
+		
+		button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+		# Botón para enviar el archivo seleccionado
+		self.send_button = wx.Button(panel, label="&Enviar archivo a Gemini")
+		self.send_button.Bind(wx.EVT_BUTTON, self.send_file)
+		# Deshabilitar hasta que el archivo esté seleccionado.
+		self.send_button.Disable()
+		# Establece el tamaño mínimo del botón send_button, con un ancho de 200 píxeles y altura ajustable automáticamente.
+		self.send_button.SetMinSize((200, -1))
+		button_sizer.Add(self.send_button, flag=wx.ALL, border=5)
+		# Botón para cancelar el envío en curso. Sólo se muestra mientras se procesa un archivo.
+		self.cancel_button = wx.Button(panel, label="Ca&ncelar envío")
+		self.cancel_button.Bind(wx.EVT_BUTTON, self.cancel_processing)
+		self.cancel_button.Hide()
+		button_sizer.Add(self.cancel_button, flag=wx.ALL, border=5)
+		# Casilla para mostrar y leer la respuesta a medida que se genera
+		self.stream_checkbox = wx.CheckBox(panel, label="&Mostrar la respuesta mientras se genera")
+		self.stream_checkbox.SetValue(True)
+		button_sizer.Add(self.stream_checkbox, flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
+		# Casilla para comprimir los videos antes de subirlos
+		self.compress_checkbox = wx.CheckBox(panel, label="C&omprimir videos antes de subirlos (sin audio)")
+		self.compress_checkbox.Bind(wx.EVT_CHECKBOX, self.on_upload_option)
+		button_sizer.Add(self.compress_checkbox, flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
+		# Casilla para describir los videos largos por fragmentos en paralelo
+		self.segments_checkbox = wx.CheckBox(panel, label="&Dividir videos largos en fragmentos")
+		self.segments_checkbox.Bind(wx.EVT_CHECKBOX, self.on_upload_option)
+		button_sizer.Add(self.segments_checkbox, flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
+		# Casilla para hacer varias preguntas sobre el mismo archivo sin volver a enviarlo
+		self.session_checkbox = wx.CheckBox(panel, label="&Varias preguntas sobre el mismo archivo")
+		button_sizer.Add(self.session_checkbox, flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
+		# Casilla para subir el archivo en cuanto se selecciona, mientras se escribe el prompt
+		self.prefetch_checkbox = wx.CheckBox(panel, label="S&ubir el archivo al seleccionarlo")
+		self.prefetch_checkbox.SetValue(True)
+		self.prefetch_checkbox.Bind(wx.EVT_CHECKBOX, self.on_upload_option)
+		button_sizer.Add(self.prefetch_checkbox, flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
+		# Casilla para reutilizar la descripción de un archivo casi igual a otro ya descrito, desmarcada por defecto
+		self.similar_checkbox = wx.CheckBox(panel, label="Reu&tilizar la descripción de archivos casi iguales")
+		self.similar_checkbox.Bind(wx.EVT_CHECKBOX, self.on_similar_option)
+		button_sizer.Add(self.similar_checkbox, flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
+		# Casilla para subir por bloques con el protocolo reanudable en lugar de la subida de la biblioteca de Gemini, desmarcada por defecto
+		self.resumable_checkbox = wx.CheckBox(panel, label="Subidas reanudables por blo&ques")
+		self.resumable_checkbox.Bind(wx.EVT_CHECKBOX, self.on_resumable_option)
+		button_sizer.Add(self.resumable_checkbox, flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
+		
+		main_sizer.Add(button_sizer, flag=wx.ALIGN_CENTER | wx.ALL, border=10)
+		
+		# Barra de progreso
+		self.progress_gauge = wx.Gauge(panel, range=100, size=(-1, 20))
+		# Ocultamos la barra de progreso.
+		self.progress_gauge.Hide()
+		main_sizer.Add(self.progress_gauge, flag=wx.EXPAND | wx.LEFT | wx.RIGHT, border=20)
+		
+		# Campo de estado
+		self.status_text = wx.StaticText(panel, label="")
+		main_sizer.Add(self.status_text, flag=wx.ALL | wx.ALIGN_CENTER, border=5)
+		
+		# Sección de respuesta
+		response_box = wx.StaticBox(panel, label="&Respuesta de Gemini")
+		response_sizer = wx.StaticBoxSizer(response_box, wx.VERTICAL)
+		
+		self.response_text = wx.TextCtrl(panel, style=wx.TE_MULTILINE | wx.TE_READONLY | wx.TE_WORDWRAP, size=(-1, 200))
+		response_sizer.Add(self.response_text, flag=wx.EXPAND | wx.ALL, border=10)
+		
+		main_sizer.Add(response_sizer, flag=wx.EXPAND | wx.ALL, border=10)
+		
+		# Botones de acción para la respuesta
+		action_sizer = wx.BoxSizer(wx.HORIZONTAL)
+		# Botón para copiar la respuesta generada
+		self.copy_button = wx.Button(panel, label="&Copiar respuesta")
+		self.copy_button.Bind(wx.EVT_BUTTON, self.copy_to_clipboard)
+		# Ocultamos hasta que se proporcione respuesta.
+		self.copy_button.Hide()
+		action_sizer.Add(self.copy_button, flag=wx.RIGHT, border=10)
+		# Botón para eliminar la respuesta del cuadro de texto.
+		self.clear_button = wx.Button(panel, label="&Limpiar campo de respuesta")
+		self.clear_button.Bind(wx.EVT_BUTTON, self.clear_description)
+		self.clear_button.Hide()
+		action_sizer.Add(self.clear_button)
+		# Botón para guardar la respuesta en un archivo
+		self.save_button = wx.Button(panel, label="&Guardar respuesta")
+		self.save_button.Bind(wx.EVT_BUTTON, self.save_response)
+		self.save_button.Hide()
+		action_sizer.Add(self.save_button, flag=wx.LEFT, border=10)
+		
+		main_sizer.Add(action_sizer, flag=wx.ALIGN_CENTER | wx.ALL, border=10)
+		
+		panel.SetSizer(main_sizer)
+		
+		# Barra de estado
+		self.CreateStatusBar()
+		# Configuramos el texto de la barra de estado con un texto que indica al usuario que el programa está listo para recivir archivos.
+		self.SetStatusText("Listo para procesar archivos.")
+		
+		# Variables para controlar el proceso
+		self.selected_file = None
+		self.selected_info = None
+		self.processing = False
+		
+		# Variables para el modo de transmisión: los fragmentos se acumulan en el despachador y se muestran en grupos
+		self.streaming = False
+		self.sentence_speaker = SentenceSpeaker()
+		
+		# Con las métricas activadas medimos también el retraso del bucle principal cuando no hay actividad
+		if self.metrics.enabled:
+			self.dispatcher.start_probe()
+		
+		# Al cerrar la ventana escribimos lo pendiente del historial
+		self.Bind(wx.EVT_CLOSE, self.on_close)
+		
+		# Centrar en pantalla
+		self.Centre()
+		
+		# Verificamos si tenemos una API key válida
+		self.check_api_key_validity()
+
+	def initialize_api_key(self):
+		"""
+		Inicializa la API key al iniciar la aplicación
+		"""
+		# Intentamos obtener la api key
+		self.api_key = ApiKeyManager.get_api_key()
+		
+		# Si no hay API key disponible, la solicitamos al usuario; al guardarla, request_api_key ya inicializa el cliente
+		if not self.api_key:
+			self.request_api_key()
+		# Si no, inicializamos el cliente de Gemini con la API key guardada, una vez que la ventana ya se mostró
+		else:
+			wx.CallAfter(self.initialize_gemini_client)
+
+	def initialize_gemini_client(self):
+		"""
+		Inicializa el cliente de Gemini con la API key actual.
+		Cargar la biblioteca de Gemini tarda, así que se hace en un hilo aparte para no retrasar la ventana.
+		"""
+		
+		self.client_ready.clear()
+		threading.Thread(target=self.create_gemini_client, args=(self.api_key,), daemon=True).start()
+
+	def create_gemini_client(self, api_key):
+		"""
+		Método que crea el cliente y el motor de descripción desde un hilo secundario
+		"""
+		try:
+			self.client = create_client(api_key)
+			# Los archivos subidos se borran del servidor al terminar, salvo los del archivo seleccionado, que quedan para hacerle más preguntas.
+			# El recolector quita en segundo plano los archivos viejos que quedaron de otras ejecuciones.
+			if self.lifecycle is not None:
+				self.lifecycle.close(wait=False)
+			self.lifecycle = FileLifecycle(self.client, self.upload_registry)
+			if self.selected_file:
+				self.lifecycle.pin_path(self.selected_file)
+			self.lifecycle.start()
+			response_cache = self.get_response_cache()
+			# El motor contiene la lógica de subida y generación, la interfaz sólo muestra su progreso.
+			# Las respuestas se guardan en caché para no repetir consultas ya respondidas.
+			# Con la casilla de subidas reanudables, los archivos se suben por bloques: la barra de progreso refleja los bytes enviados y las subidas interrumpidas se reanudan.
+			# Si el modelo principal falla o está saturado, el enrutador pasa al de respaldo.
+			# Sin cuotas configuradas, el planificador sólo reintenta los límites de solicitudes (429) y los errores temporales del servidor.
+			self.engine = DescriptionEngine(self.client, cache=response_cache, registry=self.upload_registry, scheduler=RequestScheduler(), probe=self.media_probe, metrics=self.metrics, lifecycle=self.lifecycle, router=ModelRouter(metrics=self.metrics))
+			self.client_error = None
+			self.resumable_uploader = ResumableUploader(api_key)
+			# El índice de casi iguales y el cargador reanudable se conectan desde el hilo de la interfaz, según sus casillas
+			wx.CallAfter(self.apply_similar_index)
+			wx.CallAfter(self.apply_resumable_option)
+			# Si ya se había elegido un archivo, empezamos su subida anticipada
+			wx.CallAfter(self.start_prefetch)
+		except Exception as e:
+			self.client = None
+			self.engine = None
+			self.client_error = f"Error al inicializar cliente Gemini: {str(e)}"
+			wx.CallAfter(self.show_error, self.client_error)
+		finally:
+			self.client_ready.set()
+
+	def open_stores(self):
+		"""
+		Método que abre la caché de respuestas y el historial desde un hilo secundario.
+		Si alguno falla, se vuelve a intentar al usarlo, y el error se informa entonces.
+		"""
+		for get in (self.get_response_cache, self.get_history):
+			try:
+				get()
+			except Exception:
+				pass
+
+	def get_response_cache(self):
+		"""
+		Devuelve la caché de respuestas, abriéndola si todavía no se abrió
+		"""
+		with self.stores_lock:
+			if self.response_cache is None:
+				self.response_cache = ResponseCache()
+			return self.response_cache
+
+	def get_history(self):
+		"""
+		Devuelve el historial, abriéndolo si todavía no se abrió
+		"""
+		with self.stores_lock:
+			if self.history is None:
+				self.history = HistoryStore()
+			return self.history
+
+	def request_api_key(self):
+		"""
+		Solicita la API key al usuario mediante un diálogo
+		"""
+		
+		dlg = wx.TextEntryDialog(
+			self, 
+			"No se encontró API Key de Gemini. Por favor, introduce tu API Key:",
+			"Configuración de API Key"
+		)
+		
+		if dlg.ShowModal() == wx.ID_OK:
+			# Obtenemos la API key del diálogo
+			self.api_key = dlg.GetValue().strip()
+			if self.api_key:
+				# Guardamos la API key en el archivo
+				if ApiKeyManager.save_api_key(self.api_key):
+					self.update_status("API Key guardada correctamente.")
+					alert("API Key guardada correctamente")
+				else:
+					self.show_error("No se pudo guardar la API Key.")
+				# Inicializar cliente de Gemini: aunque no se haya podido guardar, la API key sirve para esta ejecución
+				self.initialize_gemini_client()
+			else:
+				self.show_error("La API Key no puede estar vacía.")
+		
+		dlg.Destroy()
+
+	def configure_api_key(self, event):
+		"""
+		Permite al usuario configurar manualmente la API Key
+		"""
+		# Obtenemos la API key. si no hay configurada, se inicializa la variable sin contenido.
+		current_key = self.api_key if self.api_key else ""
+		
+		dlg = wx.TextEntryDialog(
+			self, 
+			"Introduce tu API Key de Gemini:",
+			"Configuración de API Key",
+			value=current_key
+		)
+		
+		if dlg.ShowModal() == wx.ID_OK:
+			# Obtenemos la API key del diálogo
+			new_key = dlg.GetValue().strip()
+			# Si la API key ingresada es distinta a la configurada, actualizamos y recargamos el cliente de genai
+			if new_key and new_key != self.api_key:
+				self.api_key = new_key
+				if ApiKeyManager.save_api_key(self.api_key):
+					self.update_status("API Key actualizada correctamente.")
+					alert("API Key actualizada correctamente")
+					self.initialize_gemini_client()
+				else:
+					self.show_error("No se pudo guardar la API Key.")
+		
+		dlg.Destroy()
+
+	def check_api_key_validity(self):
+		"""
+		Verifica si la API key actual es válida
+		"""
+		# Si no tenemos una API key, actualizamos el texto de la barra de estado indicando que no hay API key configurada.
+		if not self.api_key:
+			self.update_status("API Key no configurada. Configure su API Key para usar la aplicación.")
+			alert("API Key no configurada")
+			return False
+		
+		# Aquí se podría añadir una llamada a la API para verificar que sea válida. Por ahora, se dejará así
+		return True
+
+	def attach_file(self, event):
+		"""
+		Método para seleccionar un archivo
+		"""
+		# Verificamos primero si tenemos una API key válida
+		if not self.check_api_key_validity():
+			self.show_error("Debe configurar una API Key válida antes de usar la aplicación.")
+			return
+			
+		wildcard = "Archivos multimedia (*.mp4;*.mov;*.avi;*.png;*.jpg)|*.mp4;*.mov;*.avi;*.png;*.jpg"
+		# Iniciamos el diálogo para la carga de archivos
+		with wx.FileDialog(self, "Selecciona un archivo", wildcard=wildcard, style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST) as dialog:
+			if dialog.ShowModal() == wx.ID_OK:
+				# Obtenemos la ruta seleccionada
+				previous_file = self.selected_file
+				self.selected_file = dialog.GetPath()
+				self.selected_info = None
+				# La sesión del archivo anterior ya no se usará
+				self.close_session()
+				# Los archivos subidos del anterior se pueden borrar; los del nuevo se conservan mientras esté seleccionado
+				if self.lifecycle is not None:
+					if previous_file and previous_file != self.selected_file:
+						self.lifecycle.unpin_path(previous_file)
+					self.lifecycle.pin_path(self.selected_file)
+				# Empezamos a subir el archivo mientras se escribe el prompt
+				self.start_prefetch()
+				# Configuramos el texto en el cuadro para la ruta.
+				self.file_path_text.SetValue(self.selected_file)
+				# Habilitamos el botón para enviar
+				self.send_button.Enable()
+				# Actualizamos el texto de la barra de estado
+				self.update_status(f"Archivo seleccionado: {os.path.basename(self.selected_file)}")
+				self.get_tockens()
+				alert(f"Archivo seleccionado: {os.path.basename(self.selected_file)}")
+				
+				# Limpiar respuestas anteriores
+				self.dispatcher.discard("response")
+				self.response_text.SetValue("")
+				self.hide_result_buttons()
+
+	def start_prefetch(self):
+		"""
+		Método que cancela la subida anticipada anterior y, si corresponde, empieza la del archivo seleccionado
+		"""
+		if self.prefetched is not None:
+			self.prefetched.cancel()
+			self.prefetched = None
+		# Sin el motor listo, con los videos divididos en fragmentos o con la casilla desmarcada, la subida se hace al enviar
+		if self.engine is None or not self.selected_file or self.processing:
+			return
+		if not self.prefetch_checkbox.GetValue() or self.segments_checkbox.GetValue():
+			return
+		# La compresión se aplica antes de subir, así que la subida anticipada usa la opción marcada ahora
+		self.engine.preprocessor = self.video_compressor if self.compress_checkbox.GetValue() else None
+		if PrefetchedFile.wanted(self.engine, self.selected_file):
+			self.prefetched = PrefetchedFile(self.engine, self.selected_file)
+
+	def on_upload_option(self, event):
+		"""
+		Método que vuelve a empezar la subida anticipada al cambiar una opción que afecta a lo que se sube
+		"""
+		self.start_prefetch()
+		event.Skip()
+
+	def on_similar_option(self, event):
+		"""
+		Método que activa o desactiva la reutilización de descripciones de archivos casi iguales.
+		La primera vez que se activa, el índice se carga en un hilo aparte y se conecta al motor al terminar.
+		"""
+		if self.similar_checkbox.GetValue() and self.similar_index is None:
+			if not self.similar_loading:
+				self.similar_loading = True
+				self.update_status("Cargando el índice de archivos casi iguales...")
+				threading.Thread(target=self.load_similar_index, daemon=True).start()
+		else:
+			self.apply_similar_index()
+		event.Skip()
+
+	def load_similar_index(self):
+		"""
+		Método que crea el índice de casi iguales desde un hilo secundario
+		"""
+		try:
+			index = SimilarityIndex()
+		except Exception as e:
+			wx.CallAfter(self.show_similar_error, f"No se pudo cargar el índice de archivos casi iguales: {str(e)}")
+			return
+		wx.CallAfter(self.set_similar_index, index)
+
+	def set_similar_index(self, index):
+		"""
+		Método que guarda el índice recién cargado y lo conecta al motor si la casilla sigue marcada
+		"""
+		self.similar_index = index
+		self.similar_loading = False
+		self.apply_similar_index()
+		self.update_status("Índice de archivos casi iguales cargado.")
+
+	def show_similar_error(self, message):
+		"""
+		Método que desmarca la casilla de casi iguales si su índice no se pudo cargar
+		"""
+		self.similar_loading = False
+		self.similar_checkbox.SetValue(False)
+		# No usamos show_error, que restaura los controles de un envío que puede seguir en curso
+		self.report_error(message)
+
+	def apply_similar_index(self):
+		"""
+		Método que conecta o desconecta el índice de casi iguales del motor según la casilla.
+		Se llama siempre desde el hilo de la interfaz; los trabajos en curso siguen con el índice con el que empezaron.
+		"""
+		if self.engine is not None:
+			self.engine.similar = self.similar_index if self.similar_checkbox.GetValue() else None
+
+	def on_resumable_option(self, event):
+		"""
+		Método que cambia entre la subida reanudable por bloques y la de la biblioteca de Gemini
+		"""
+		self.apply_resumable_option()
+		event.Skip()
+
+	def apply_resumable_option(self):
+		"""
+		Método que conecta o desconecta el cargador reanudable del motor según la casilla. Las subidas en curso siguen como empezaron.
+		"""
+		if self.engine is not None:
+			self.engine.uploader = self.resumable_uploader if self.resumable_checkbox.GetValue() else None
+
+	def get_tockens(self):
+		"""
+		Método que calcula los tokens estimados según el tipo de archivo seleccionado.
+		Los metadatos se leen en un hilo aparte para que la ventana no se bloquee con archivos en carpetas de red.
+		"""
+		
+		if not hasattr(self, 'selected_file') or not self.selected_file:
+			self.show_error("No se ha seleccionado ningún archivo.")
+			return
+
+		threading.Thread(target=self.probe_selected_file, args=(self.selected_file,), daemon=True).start()
+
+	def probe_selected_file(self, path):
+		"""
+		Método que lee los metadatos del archivo desde un hilo secundario
+		"""
+		with self.metrics.span("probe"):
+			info, message, error = estimate_report(self.media_probe, path)
+		wx.CallAfter(self.show_token_estimate, path, info, message, error)
+
+	def show_token_estimate(self, path, info, message, error):
+		"""
+		Método que muestra la estimación de tokens del archivo, o por qué no se pudo calcular
+		"""
+		# Si mientras tanto se seleccionó otro archivo, descartamos el resultado
+		if path != self.selected_file:
+			return
+		if info is not None:
+			self.selected_info = info
+		if error is not None:
+			# La lectura corre en segundo plano y puede terminar con un envío en curso: el error no restaura los controles
+			self.report_error(error)
+			return
+
+		self.update_status(message)
+		alert(message)
+
+	def send_file(self, event):
+		"""
+		Método para enviar el archivo
+		"""
+		
+		# Verificamos primero si tenemos una API key válida
+		if not self.check_api_key_validity():
+			self.show_error("Debe configurar una API Key válida antes de usar la aplicación.")
+			return
+			
+		# Si no se seleccionó una ruta, le indicamos al usuario que lo haga antes de continuar
+		if not self.selected_file:
+			self.show_error("Por favor, selecciona un archivo primero.")
+			return
+		# Si self.processing es True, no se permiten más cargas y se le indica al usuario que ya hay un proceso activo.
+		if self.processing:
+			self.show_error("Ya hay un proceso en curso. Por favor espera.")
+			return
+		
+		# Deshabilitamos controles durante el procesamiento
+		# Modificamos self.PROCESSING a True, y deshabilitamos los botones para seleccionar archivo y para enviar
+		self.processing = True
+		self.send_started = time.perf_counter()
+		self.cancel_token = CancelToken()
+		self.send_button.Disable()
+		self.attach_button.Disable()
+		self.cancel_button.Enable()
+		self.cancel_button.Show()
+		self.dispatcher.discard("response")
+		self.response_text.SetValue("")
+		# Actualizamos la barra de estado.
+		self.update_status("Iniciando procesamiento del archivo...")
+		alert("Iniciando procesamiento del archivo")
+		
+		# Mostramos indicador de progreso
+		self.progress_gauge.SetValue(0)
+		self.progress_gauge.Show()
+		
+		# Obtenemos el contenido del prompt. Si no se ingresa uno, se utiliza uno por defecto.
+		prompt = normalize_prompt(self.prompt_input.GetValue())
+		
+		# Activamos la compresión y la división de videos si están marcadas
+		compress = self.compress_checkbox.GetValue()
+		segments = self.segments_checkbox.GetValue()
+		session = self.session_checkbox.GetValue()
+		
+		# Preparamos el modo de transmisión si está activado
+		self.streaming = self.stream_checkbox.GetValue()
+		self.sentence_speaker = SentenceSpeaker()
+		
+		# Ejecutamos la solicitud en un hilo separado para evitar bloquear la interfaz
+		threading.Thread(target=self.process_file, args=(self.selected_file, prompt, self.streaming, compress, segments, session, self.prefetched, self.cancel_token)).start()
+
+	def cancel_processing(self, event):
+		"""
+		Método que cancela el envío en curso. El motor corta la subida, deja de esperar el procesamiento y abandona la generación, y borra el archivo que haya subido.
+		"""
+		
+		if self.cancel_token is None or self.cancel_token.cancelled:
+			return
+		self.cancel_token.cancel()
+		# La subida anticipada es la del archivo que se estaba enviando: también se corta
+		if self.prefetched is not None:
+			self.prefetched.cancel()
+			self.prefetched = None
+		self.cancel_button.Disable()
+		self.update_status("Cancelando el envío...")
+		alert("Cancelando el envío", interrupt=True)
+
+	def process_file(self, path, prompt, streaming=False, compress=False, segments=False, session=False, prefetched=None, cancel=None):
+		"""
+		Método para procesar el archivo enviado mediante el motor de descripción
+		"""
+		try:
+			# Si el cliente todavía se está creando en segundo plano, lo esperamos
+			self.client_ready.wait()
+			if self.engine is None:
+				raise DescriptionError(self.client_error or "El cliente de Gemini no está inicializado.")
+			self.engine.preprocessor = self.video_compressor if compress else None
+			self.engine.segmenter = self.video_segmenter if segments else None
+			
+			# El motor informa cada etapa, y la trasladamos al hilo de la interfaz. Si llegan varias en un mismo cuadro, sólo se muestra la última.
+			progress = lambda value, message: self.dispatcher.set("progress", self.update_progress, value, message)
+			on_chunk = self.on_stream_chunk if streaming else None
+			if session:
+				# En una sesión el archivo se sube una sola vez y las preguntas siguientes sólo envían el prompt
+				if self.session is None or self.session.path != path:
+					self.close_session()
+					self.session = FileSession(self.engine, path, prefetched=prefetched)
+				result = self.session.ask(prompt, progress=progress, on_chunk=on_chunk, cancel=cancel)
+			else:
+				result = self.engine.describe(path, prompt, progress=progress, on_chunk=on_chunk, prefetched=prefetched, cancel=cancel)
+			
+			# Mostramos la respuesta en el cuadro de texto, después de lo que quede pendiente del progreso
+			self.dispatcher.call(self.update_response, result)
+			
+		except JobCancelled:
+			# Medimos desde que se pulsó cancelar hasta que el hilo del envío quedó libre
+			self.dispatcher.discard("progress")
+			self.dispatcher.call(self.show_cancelled, time.perf_counter() - cancel.requested)
+		
+		except DescriptionError as e:
+			self.dispatcher.call(self.show_error, str(e))
+		
+		except Exception as e:
+			error_message = f"Error: {str(e)}"
+			self.dispatcher.call(self.show_error, error_message)
+		
+		finally:
+			# Restauramos controles cuando se completa el proceso
+			self.dispatcher.call(self.complete_processing)
+
+	def update_progress(self, value, status_message):
+		"""
+		Método que actualiza la barra de estado y de progreso
+		"""
+		# Configuramos los valores de la barra de progreso, de estado y notificamos con el método alert los textos de la barra de estado.
+		if self.progress_gauge.GetValue() != value:
+			self.progress_gauge.SetValue(value)
+		self.update_status(status_message)
+		# Los mensajes de progreso se sustituyen entre sí si todavía no se han leído
+		alert(status_message, category="progress")
+
+	def on_stream_chunk(self, text):
+		"""
+		Método que recibe desde el hilo de trabajo cada fragmento de la respuesta en modo de transmisión
+		"""
+		# El despachador junta los fragmentos que lleguen en el mismo cuadro y los añade de una vez
+		self.dispatcher.append("response", text, self.append_stream)
+
+	def append_stream(self, text):
+		"""
+		Método que añade al cuadro de respuesta los fragmentos acumulados y lee las oraciones completas
+		"""
+		if text:
+			with self.metrics.span("ui_update"):
+				self.response_text.AppendText(text)
+				self.sentence_speaker.feed(text)
+
+	def update_response(self, result):
+		"""
+		Método para actualizar la respuesta en el campo de texto
+		"""
+		
+		with self.metrics.span("ui_update"):
+			self.show_response(result)
+
+	def show_response(self, result):
+		"""
+		Método que muestra la respuesta, la guarda en el historial e informa el resultado
+		"""
+		
+		if self.streaming and result.ttft is not None:
+			# En modo de transmisión la respuesta ya está en el cuadro, porque el despachador aplicó lo pendiente antes; leemos lo que falte
+			self.sentence_speaker.flush()
+		else:
+			# Mostramos la respuesta generada en el cuadro de texto; si es muy larga, se añade por partes
+			self.show_text(result.text)
+		
+		# Guardamos la descripción en el historial; se escribe en segundo plano
+		self.get_history().add(result)
+		
+		message = "Respuesta de Gemini generada correctamente."
+		if result.ttft is not None:
+			message += f" Primer fragmento en {result.ttft:.2f} segundos."
+		# Medimos la espera percibida desde que se pulsó enviar, por separado si se usó la subida anticipada
+		if self.send_started is not None:
+			waited = time.perf_counter() - self.send_started
+			prefetch = result.extra.get("prefetch")
+			self.metrics.observe("send_to_answer_prefetched" if prefetch else "send_to_answer", waited)
+			message += f" Respuesta en {waited:.1f} segundos desde el envío"
+			message += ", con el archivo subido al seleccionarlo." if prefetch and prefetch["ready_at_send"] else "."
+		# Informamos cuánto se ahorró al comprimir el video
+		preprocess = result.extra.get("preprocess")
+		if preprocess and not preprocess["skipped"]:
+			saved_mb = preprocess["bytes_saved"] / (1024 * 1024)
+			message += f" Compresión: {saved_mb:.1f} MB menos en {preprocess['elapsed']:.1f} segundos."
+		# Informamos cuánto se ahorró en las preguntas siguientes de una sesión
+		session = result.extra.get("session")
+		if session and session["question"] > 1:
+			message += f" Pregunta {session['question']} sobre el mismo archivo: {session['cached_tokens']} tokens leídos de la caché, {session['latency_saved']:.1f} segundos menos que la primera."
+		self.update_status(message)
+		alert(message)
+		
+		# Mostramos botones de acción
+		self.show_result_buttons()
+
+	def show_text(self, text):
+		"""
+		Método que sustituye el contenido del cuadro de respuesta. Los textos muy largos se añaden por partes para no bloquear la ventana.
+		"""
+		
+		self.dispatcher.set_text("response", text or "", self.response_text.Clear, self.response_text.AppendText)
+
+	def show_cancelled(self, seconds):
+		"""
+		Método que informa que el envío se canceló y cuánto tardó en detenerse
+		"""
+		
+		# Lo que quedaba por leer de la respuesta ya no interesa
+		self.sentence_speaker = SentenceSpeaker()
+		self.update_status(f"Envío cancelado. Se detuvo en {seconds:.2f} segundos.")
+		alert("Envío cancelado", interrupt=True)
+
+	def complete_processing(self):
+		"""
+		Método que devuelve los controles a como estaban originalmente, manteniendo los botones de acción para la respuesta vicibles, indicando que la respuesta fue resivida por el usuario
+		"""
+		
+		# Ocultamos la barra de progreso y el botón de cancelar
+		self.progress_gauge.Hide()
+		self.cancel_button.Hide()
+		self.cancel_token = None
+		
+		# Habilitamos controles
+		self.send_button.Enable()
+		self.attach_button.Enable()
+		# Devolvemos PROCESSING a False
+		self.processing = False
+		
+		# Actualizamos la disposición
+		self.Layout()
+
+	def copy_to_clipboard(self, event):
+		"""
+		Método para copiar la respuesta generada al portapapeles
+		"""
+		# Obtenemos el texto desde el cuadro para la respuesta.
+		text = self.response_text.GetValue()
+		if text:
+			# Si hay texto, se copia y se actualiza la barra de estado.
+			# Importamos aquí para no retrasar el inicio del programa
+			import pyperclip
+			pyperclip.copy(text)
+			self.update_status("Respuesta copiada al portapapeles.")
+			alert("Respuesta copiada al portapapeles")
+		else:
+			self.update_status("No hay respuesta para copiar.")
+			alert("No hay respuesta para copiar")
+
+	def clear_description(self, event):
+		"""
+		Método para eliminar la respuesta generada del cuadro de texto
+		"""
+		
+		self.dispatcher.discard("response")
+		self.response_text.SetValue("")
+		# Ocultamos los botones de acción y actualizamos la barra de estado
+		self.hide_result_buttons()
+		self.update_status("Respuesta borrada.")
+		alert("Respuesta borrada")
+
+	def save_response(self, event):
+		"""
+		Método para guardar la respuesta generada en un archivo de texto (*.txt)
+		"""
+		# Obtenemos el contenido del cuadro de respuesta
+		text = self.response_text.GetValue()
+		if not text:
+			# Si no hay texto actualizamos la barra de estado
+			self.update_status("No hay respuesta para guardar.")
+			alert("No hay respuesta para guardar")
+			return
+			
+		# Iniciamos el diálogo para guardar el archivo
+		with wx.FileDialog(self, "Guardar respuesta", 
+						  wildcard="Archivos de texto (*.txt)|*.txt",
+						  style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT) as fileDialog:
+			
+			if fileDialog.ShowModal() == wx.ID_CANCEL:
+				# Si se cancela el diálogo, retornamos.
+				return
+				
+			# Obtenemos el nombre ingresado en el diálogo
+			pathname = fileDialog.GetPath()
+			try:
+				# Intentamos guardar el archivo, escribiendo la respuesta
+				with open(pathname, 'w', encoding='utf-8') as file:
+					file.write(text)
+				# Actualizamos la barra de estado.
+				self.update_status(f"Respuesta guardada en {pathname}")
+				alert("Respuesta guardada correctamente")
+			except IOError:
+				self.show_error(f"No se pudo guardar en {pathname}")
+
+	def search_history(self, event):
+		"""
+		Método para buscar una descripción anterior en el historial y mostrarla en el cuadro de respuesta
+		"""
+		with wx.TextEntryDialog(self, "Palabras a buscar en las descripciones, los prompts y las rutas. Déjalo vacío para ver las más recientes:", "Buscar en el historial") as dialog:
+			if dialog.ShowModal() != wx.ID_OK:
+				return
+			text = dialog.GetValue().strip()
+		
+		# Esperamos a que se escriba lo pendiente, para encontrar también las últimas descripciones
+		history = self.get_history()
+		history.flush(timeout=2)
+		entries = history.search(text)
+		if not entries:
+			self.update_status("No se encontraron descripciones.")
+			alert("No se encontraron descripciones")
+			return
+		
+		choices = [f"{os.path.basename(entry['path'] or '')}: {(entry['snippet'] or '').strip()}" for entry in entries]
+		with wx.SingleChoiceDialog(self, f"Se encontraron {len(entries)} descripciones.", "Resultados del historial", choices) as dialog:
+			if dialog.ShowModal() != wx.ID_OK:
+				return
+			entry = entries[dialog.GetSelection()]
+		
+		# Mostramos la descripción elegida como si fuera la respuesta actual
+		self.show_text(entry["text"] or entry["error"] or "")
+		self.show_result_buttons()
+		self.update_status(f"Descripción de {os.path.basename(entry['path'] or '')} cargada desde el historial.")
+		alert("Descripción cargada desde el historial")
+
+	def export_history(self, event):
+		"""
+		Método para exportar todo el historial a un archivo CSV o JSONL
+		"""
+		wildcard = "JSON por líneas (*.jsonl)|*.jsonl|CSV (*.csv)|*.csv"
+		with wx.FileDialog(self, "Exportar historial", wildcard=wildcard, style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT) as dialog:
+			if dialog.ShowModal() == wx.ID_CANCEL:
+				return
+			pathname = dialog.GetPath()
+		
+		# Con cientos de miles de descripciones la exportación tarda, así que la hacemos en segundo plano
+		self.update_status("Exportando historial...")
+		threading.Thread(target=self.run_history_export, args=(pathname,), daemon=True).start()
+
+	def run_history_export(self, pathname):
+		"""
+		Método que exporta el historial desde un hilo secundario
+		"""
+		try:
+			exported = self.get_history().export(pathname)
+		except (OSError, ValueError) as e:
+			# La exportación puede fallar con una descripción en curso: el error no restaura los controles del envío
+			wx.CallAfter(self.report_error, f"No se pudo exportar el historial: {str(e)}")
+			return
+		message = f"Historial exportado: {exported} descripciones en {pathname}"
+		wx.CallAfter(self.update_status, message)
+		wx.CallAfter(alert, "Historial exportado correctamente")
+
+	def report_error(self, message):
+		"""
+		Método que muestra un error sin tocar el estado del envío.
+		Lo usan las tareas en segundo plano que no son el envío, como la lectura de metadatos o la exportación del historial, que pueden fallar mientras una descripción sigue en curso.
+		"""
+		
+		wx.MessageBox(message, "Error", wx.ICON_ERROR)
+		self.update_status(f"ERROR: {message}")
+		alert(f"Error: {message}", interrupt=True)
+
+	def show_error(self, message):
+		"""
+		Método para mostrar los errores del envío y restaurar sus controles
+		"""
+		
+		self.report_error(message)
+		
+		# Restauramos los controles
+		self.send_button.Enable()
+		self.attach_button.Enable()
+		self.progress_gauge.Hide()
+		self.processing = False
+		self.Layout()
+
+	def update_status(self, message):
+		"""
+		Método para actualizar el StaticText. Sólo se recalcula la disposición si el texto cambió de tamaño.
+		"""
+		
+		if self.status_text.GetLabel() == message:
+			return
+		size = self.status_text.GetBestSize()
+		self.status_text.SetLabel(message)
+		self.SetStatusText(message)
+		if self.status_text.GetBestSize() != size:
+			self.Layout()
+
+	def show_result_buttons(self):
+		"""
+		Método para mostrar los botones de acción para la Respuesta
+		"""
+		
+		if self.copy_button.IsShown():
+			return
+		self.copy_button.Show()
+		self.clear_button.Show()
+		self.save_button.Show()
+		self.Layout()
+
+	def hide_result_buttons(self):
+		"""
+		Método para ocultar los botones de acción cuando se elimina la respuesta del cuadro de texto
+		"""
+		
+		if not self.copy_button.IsShown():
+			return
+		self.copy_button.Hide()
+		self.clear_button.Hide()
+		self.save_button.Hide()
+		self.Layout()
+
+	def on_exit(self, event):
+		"""
+		Método para salir del programa
+		"""
+		
+		self.Close()
+
+	def on_close(self, event):
+		"""
+		Método que escribe lo pendiente del historial antes de cerrar la ventana
+		"""
+		
+		self.dispatcher.stop()
+		# Un envío en curso se cancela, para que la ventana se cierre sin esperarlo y se borre lo que haya subido
+		if self.cancel_token is not None:
+			self.cancel_token.cancel()
+		self.close_session()
+		if self.prefetched is not None:
+			self.prefetched.cancel()
+		# Si el historial no llegó a abrirse, no hay nada que escribir
+		with self.stores_lock:
+			if self.history is not None:
+				self.history.close()
+		if self.lifecycle is not None:
+			# Esperamos los borrados pendientes; el archivo seleccionado queda para la próxima vez
+			self.lifecycle.close()
+		self.upload_registry.close()
+		if self.metrics_file:
+			try:
+				self.metrics.dump(self.metrics_file)
+			except OSError:
+				pass
+		event.Skip()
+
+	def close_session(self):
+		"""
+		Método que cierra la sesión de preguntas actual y borra su caché de contexto en segundo plano
+		"""
+		
+		session, self.session = self.session, None
+		if session is not None:
+			# El hilo no es de tipo daemon para que el borrado termine aunque se cierre la ventana
+			threading.Thread(target=session.close).start()
+
+	def on_context_menu(self, event):
+		"""
+		Método para crear el menú contextual
+		"""
+		
+		menu = wx.Menu()
+		# Items, guardar prompt
+		save_item = menu.Append(wx.ID_ANY, "Guardar prompt")
+		# Items, copiar prompt al portapapeles
+		copy_item = menu.Append(wx.ID_ANY, "Copiar al portapapeles")
+		
+		self.Bind(wx.EVT_MENU, self.save_prompt_to_file, save_item)
+		self.Bind(wx.EVT_MENU, self.copy_prompt_to_clipboard, copy_item)
+		
+		self.PopupMenu(menu)
+		menu.Destroy()
+
+	def on_key_down(self, event):
+		"""
+		Método para el manejo de teclas y mostrar el menú contextual al presionar f10 o tecla aplicaciones
+		"""
+		
+		if event.GetKeyCode() in [wx.WXK_F10, wx.WXK_WINDOWS_MENU]:
+			self.on_context_menu(event)
+		event.Skip()
+
+	def save_prompt_to_file(self, event):
+		"""
+		Método para guardar el prompt en un archivo de texto (*.txt)
+		"""
+		# Obtenemos el texto del prompt desde el cuadro de texto
+		prompt_text = self.prompt_input.GetValue()
+		if not prompt_text:
+			# Si no hay prompt, se muestra mensaje de error
+			self.update_status("No hay prompt para guardar.")
+			alert("No hay prompt para guardar")
+			return
+		
+		try:
+			# Intentamos guardar el archivo escribiendo el prompt obtenido
+			with open(self.PROMPT_FILE, 'w', encoding='utf-8') as file:
+				file.write(prompt_text)
+			# Actualizamos estado
+			self.update_status(f"Prompt guardado en {self.PROMPT_FILE}")
+			alert("Prompt guardado correctamente")
+		except IOError:
+			self.show_error(f"No se pudo guardar en {self.PROMPT_FILE}")
+
+	def copy_prompt_to_clipboard(self, event):
+		"""
+		método para copiar el prompt al portapapeles
+		"""
+		# Obtenemos el prompt del cuadro de texto
+		prompt_text = self.prompt_input.GetValue()
+		if prompt_text:
+			# Si hay texto, se copia al portapapeles y se actualiza el estado
+			# Importamos aquí para no retrasar el inicio del programa
+			import pyperclip
+			pyperclip.copy(prompt_text)
+			self.update_status("Prompt copiado al portapapeles.")
+			alert("Prompt copiado al portapapeles")
+		else:
+			self.update_status("No hay prompt para copiar.")
+			alert("No hay prompt para copiar")
+
+	def load_prompt(self):
+		"""
+		Método para cargar el prompt desde el archivo de texto
+		"""
+		
+		try:
+			# Verificamos la existencia del archivo
+			if os.path.exists(self.PROMPT_FILE):
+				# Si existe, lo abrimos en modo lectura y obtenemos el texto ingresado
+				with open(self.PROMPT_FILE, 'r', encoding='utf-8') as file:
+					prompt_text = file.read()
+				# Lo configuramos en el cuadro de texto
+				self.prompt_input.SetValue(prompt_text)
+			else:
+				# Valor predeterminado si no existe el archivo
+				self.prompt_input.SetValue("Describe en detalle lo que se muestra en este archivo en español.")
+		except IOError:
+			self.update_status(f"Error al cargar el prompt desde {self.PROMPT_FILE}")
+			alert(f"Error al cargar el prompt desde {self.PROMPT_FILE}")
+
+if __name__ == "__main__":
+	app = wx.App(False)
+	frame = GeminiUploaderApp()
+	frame.Show()
+	app.MainLoop()
@@ -1,44 +1,46 @@
-# -*- mode: python ; coding: utf-8 -*-
-
-
-a = Analysis(
-    ['gem.py'],
-    pathex=[],
-    binaries=[],
-    datas=[('lib', 'lib')],
-    hiddenimports=[],
-    hookspath=[],
-    hooksconfig={},
-    runtime_hooks=[],
-    excludes=[],
-    noarchive=False,
-    optimize=0,
-)
-pyz = PYZ(a.pure)
-
-exe = EXE(
-    pyz,
-    a.scripts,
-    [],
-    exclude_binaries=True,
-    name='gemini_descriptor',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    console=False,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
-coll = COLLECT(
-    exe,
-    a.binaries,
-    a.datas,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    name='gemini_descriptor',
-)
+# -*- mode: python ; coding: utf-8 -*-
+
+
+a = Analysis(
+    ['gem.py'],
+    pathex=[],
+    binaries=[],
+    datas=[('lib', 'lib')],
+    # Estos módulos se importan dentro de funciones para acelerar el inicio, así que los indicamos explícitamente
+    hiddenimports=['google.genai', 'google.genai.types', 'cv2', 'pyperclip'],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    # Módulos que ninguna parte del programa usa y que sólo agrandan el paquete
+    excludes=['tkinter', 'matplotlib', 'IPython', 'PyQt5', 'PySide2', 'PySide6', 'pytest', 'lib2to3'],
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='gemini_descriptor',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=True,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=True,
+    upx_exclude=[],
+    name='gemini_descriptor',
+)
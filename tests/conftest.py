@@ -0,0 +1,13 @@
+"""
+Configuración de las pruebas: el código del programa y los servicios falsos de los benchmarks se importan desde la raíz del repositorio
+"""
+
+# Importaciones
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in (ROOT, os.path.join(ROOT, "benchmarks")):
+	if folder not in sys.path:
+		sys.path.insert(0, folder)
@@ -0,0 +1,115 @@
+"""
+Pruebas de la cancelación de un lote contra el servicio falso de Gemini
+"""
+
+# Importaciones
+
+import os
+import time
+import threading
+
+from fake_gemini import FakeClient, FakeConfig
+from suite import build_engine, write_png, write_sparse
+from engine.batching import ImageBatcher
+from engine.cancel import CancelToken
+from engine.lifecycle import FileLifecycle
+
+# Tiempo máximo desde la cancelación hasta que el lote entrega todos sus resultados
+IDLE_BOUND = 2.0
+
+def call_threads():
+	return [thread for thread in threading.enumerate() if thread.name == "gemini-call"]
+
+def make_videos(folder, count, size=4 * 1024 * 1024):
+	paths = []
+	for index in range(count):
+		path = os.path.join(folder, f"video_{index}.mp4")
+		write_sparse(path, size)
+		paths.append(path)
+	return paths
+
+def test_cancelled_batch_goes_idle_and_deletes_uploads(tmp_path):
+	# Subidas de medio segundo por un enlace compartido, procesamiento de 2 segundos y generación de 3
+	client = FakeClient(FakeConfig(bandwidth=8 * 1024 * 1024, processing_seconds=2.0, generation_latency=3.0, generation_jitter=0.0, seed=3))
+	lifecycle = FileLifecycle(client)
+	engine = build_engine(client, workers=4, lifecycle=lifecycle)
+	paths = make_videos(str(tmp_path), 8)
+	token = CancelToken()
+	results = []
+	consumer = threading.Thread(target=lambda: results.extend(engine.run(paths, cancel=token)))
+	consumer.start()
+
+	# Cancelamos con archivos en subida, en procesamiento y esperando turno
+	start = time.perf_counter()
+	while client.stats()["uploads"] < 3 and time.perf_counter() - start < 10:
+		time.sleep(0.02)
+	token.cancel()
+	consumer.join(IDLE_BOUND)
+	try:
+		assert not consumer.is_alive()
+		assert time.perf_counter() - token.requested < IDLE_BOUND
+		assert len(results) == len(paths)
+		assert not any(result.ok for result in results)
+
+		# Las llamadas abandonadas terminan en segundo plano; lo que suban se borra
+		start = time.perf_counter()
+		while (call_threads() or client.service.files) and time.perf_counter() - start < 10:
+			time.sleep(0.05)
+		lifecycle.close()
+		stats = client.stats()
+		assert stats["uploads"] > 0
+		assert stats["deletes"] == stats["uploads"]
+		assert client.service.files == {}
+	finally:
+		token.cancel()
+		consumer.join()
+		engine.poller.stop()
+
+def test_run_without_token_does_not_spawn_call_threads(tmp_path):
+	client = FakeClient(FakeConfig(bandwidth=64 * 1024 * 1024, processing_seconds=0.2, generation_latency=0.3, generation_jitter=0.0, seed=3))
+	engine = build_engine(client, workers=4)
+	paths = make_videos(str(tmp_path), 6, size=1024 * 1024)
+	seen = []
+	done = threading.Event()
+
+	def sample():
+		while not done.is_set():
+			seen.extend(call_threads())
+			time.sleep(0.005)
+
+	sampler = threading.Thread(target=sample)
+	sampler.start()
+	try:
+		results = list(engine.run(paths))
+	finally:
+		done.set()
+		sampler.join()
+		engine.poller.stop()
+	assert all(result.ok for result in results)
+	assert len(results) == len(paths)
+	assert seen == []
+
+def test_cancelled_image_batches_give_a_result_per_image(tmp_path):
+	client = FakeClient(FakeConfig(bandwidth=64 * 1024 * 1024, processing_seconds=0.0, generation_latency=0.05, generation_jitter=0.0, seed=3))
+	batcher = ImageBatcher(max_images=2)
+	engine = build_engine(client, workers=1, batcher=batcher)
+	paths = []
+	for index in range(12):
+		paths.append(str(tmp_path / f"foto_{index:02}.png"))
+		write_png(paths[-1], 16, 16, seed=index)
+	token = CancelToken()
+
+	def unreadable_batch(engine, batch, prompt, cancel):
+		# Se cancela mientras se envía el lote, y su respuesta no se pudo separar: sus imágenes quedan para describirse por separado
+		token.cancel()
+		return [], [item.path for item in batch]
+
+	batcher._describe_batch = unreadable_batch
+	try:
+		results = list(engine.run(paths, cancel=token))
+	finally:
+		engine.poller.stop()
+	# Las imágenes sueltas y las que no llegaron a enviarse terminan también con el error de cancelación
+	assert sorted(result.path for result in results) == paths
+	assert {result.error for result in results} == {"Envío cancelado."}
+	assert client.stats()["generations"] == 0
@@ -0,0 +1,177 @@
+"""
+Pruebas del motor de descripción contra el servicio falso de Gemini de benchmarks/fake_gemini.py
+"""
+
+# Importaciones
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import engine.describer as describer
+from fake_gemini import FakeClient, FakeConfig
+from suite import build_engine, write_png, write_sparse
+from engine.cache import ResponseCache
+from engine.cancel import CancelToken
+from engine.lifecycle import FileLifecycle
+from engine.registry import UploadRegistry
+from engine.scheduler import RequestScheduler
+
+# Un servicio rápido: las pruebas miden el comportamiento, no los tiempos
+FAST = dict(bandwidth=256 * 1024 * 1024, processing_seconds=0.05, generation_latency=0.02, generation_jitter=0.0, seed=5)
+
+@pytest.fixture
+def engines():
+	# Los motores creados en una prueba se detienen al terminar
+	created = []
+
+	def make(config=None, **kwargs):
+		client = FakeClient(config or FakeConfig(**FAST))
+		engine = build_engine(client, **kwargs)
+		created.append(engine)
+		return engine
+
+	yield make
+	for engine in created:
+		engine.poller.stop()
+
+@pytest.fixture
+def image(tmp_path):
+	path = str(tmp_path / "foto.png")
+	write_png(path, 64, 48, seed=1)
+	return path
+
+@pytest.fixture
+def video(tmp_path):
+	path = str(tmp_path / "video.mp4")
+	write_sparse(path, 512 * 1024)
+	return path
+
+def test_describes_inline_image(engines, image):
+	engine = engines()
+	result = engine.describe(image)
+	assert result.text
+	assert result.extra["transport"] == "inline"
+	assert engine.client.stats()["uploads"] == 0
+	assert engine.client.stats()["generations"] == 1
+
+def test_describes_uploaded_video(engines, video):
+	engine = engines()
+	chunks = []
+	result = engine.describe(video, on_chunk=chunks.append)
+	assert result.text == "".join(chunks)
+	assert result.ttft is not None
+	assert result.extra["transport"] == "files_api"
+	assert engine.client.stats()["uploads"] == 1
+
+def test_errors_become_results(engines, image, video):
+	engine = engines(FakeConfig(error_rate=1.0, **FAST))
+	result = engine.describe_result(image)
+	assert not result.ok
+	assert "503" in result.error
+	results = list(engine.run([image, video]))
+	assert len(results) == 2
+	assert not any(result.ok for result in results)
+
+def test_scheduler_retries_until_limit(engines, image):
+	engine = engines(FakeConfig(error_rate=1.0, **FAST), scheduler=RequestScheduler(max_retries=2, base_delay=0.001))
+	result = engine.describe_result(image)
+	assert not result.ok
+	assert engine.client.stats()["errors"] == 3
+
+def test_cache_hit_skips_the_api(engines, image, video, tmp_path):
+	cache = ResponseCache(path=str(tmp_path / "responses.sqlite3"))
+	engine = engines(cache=cache)
+	first = [engine.describe(path) for path in (image, video)]
+	calls = engine.client.stats()
+	second = [engine.describe(path) for path in (image, video)]
+	assert [result.text for result in second] == [result.text for result in first]
+	assert all(result.cached for result in second)
+	assert engine.client.stats() == calls
+	# Otro prompt no comparte la respuesta
+	assert not engine.describe(image, "Otra pregunta").cached
+
+def test_max_in_flight_limits_open_files(engines, tmp_path):
+	engine = engines(FakeConfig(bandwidth=256 * 1024 * 1024, processing_seconds=0.2, generation_latency=0.1, generation_jitter=0.0, seed=5), workers=8, max_in_flight=2)
+	paths = []
+	for index in range(8):
+		paths.append(str(tmp_path / f"video_{index}.mp4"))
+		write_sparse(paths[-1], 256 * 1024)
+
+	# Un archivo está en curso desde que empieza su subida hasta que termina su generación
+	lock = threading.Lock()
+	open_files = [0, 0]
+	files, models = engine.client.files, engine.client.models
+	upload, generate = files.upload, models.generate_content
+
+	def counted_upload(*args, **kwargs):
+		with lock:
+			open_files[0] += 1
+			open_files[1] = max(open_files)
+		return upload(*args, **kwargs)
+
+	def counted_generate(*args, **kwargs):
+		try:
+			return generate(*args, **kwargs)
+		finally:
+			with lock:
+				open_files[0] -= 1
+
+	files.upload = counted_upload
+	models.generate_content = counted_generate
+	results = list(engine.run(paths))
+	assert all(result.ok for result in results)
+	assert open_files == [0, 2]
+
+def test_stream_errors_are_retried_by_the_scheduler(engines, image):
+	# La solicitud se envía al leer el primer fragmento: ese error también debe pasar por el planificador
+	engine = engines(FakeConfig(error_rate=0.4, **FAST), scheduler=RequestScheduler(max_retries=10, base_delay=0.001))
+	failures = []
+	for _ in range(20):
+		try:
+			engine.describe(image, on_chunk=lambda text: None)
+		except Exception as e:
+			failures.append(str(e))
+	assert failures == []
+	assert engine.client.stats()["errors"] > 0
+	assert engine.scheduler.retries == engine.client.stats()["errors"]
+
+def test_file_is_hashed_once(engines, video, tmp_path, monkeypatch):
+	hashed = []
+	monkeypatch.setattr(describer, "file_sha256", lambda path: hashed.append(path) or "hash-" + os.path.basename(path))
+	described = engines(cache=ResponseCache(path=str(tmp_path / "responses.sqlite3")), registry=UploadRegistry(path=str(tmp_path / "uploads.json"), save_delay=0))
+	described.describe(video)
+	assert hashed == [video]
+
+	# Con el hash ya calculado por quien llama, remote_file no lo vuelve a calcular
+	hashed.clear()
+	media_file, file_hash = described.remote_file(video, file_hash="conocido")
+	assert hashed == []
+	assert file_hash == "conocido"
+
+def test_job_finishes_after_the_thread_pool_closes(video):
+	# El procesamiento termina cuando la cola de hilos del lote ya se cerró
+	client = FakeClient(FakeConfig(bandwidth=256 * 1024 * 1024, processing_seconds=0.2, generation_latency=0.02, generation_jitter=0.0, seed=5))
+	lifecycle = FileLifecycle(client)
+	engine = build_engine(client, lifecycle=lifecycle)
+	executor = ThreadPoolExecutor(max_workers=1)
+	executor.shutdown()
+	results = []
+	delivered = threading.Event()
+
+	def deliver(result):
+		results.append(result)
+		delivered.set()
+
+	try:
+		engine._run_job(executor, describer._Job(video, None, cancel=CancelToken(abandon=False)), deliver)
+		# La etapa final se ejecuta igual: el trabajo entrega su resultado y libera el archivo subido
+		assert delivered.wait(5)
+		assert [result.ok for result in results] == [True]
+		lifecycle.close()
+		assert client.stats()["deletes"] == 1
+		assert client.service.files == {}
+	finally:
+		engine.poller.stop()
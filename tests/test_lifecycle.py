@@ -0,0 +1,75 @@
+"""
+Pruebas del borrado de archivos remotos y de su relación con el registro de subidas
+"""
+
+# Importaciones
+
+import threading
+
+import pytest
+
+from fake_gemini import FakeClient, FakeConfig, FakeAPIError
+from suite import build_engine, write_sparse
+from engine.lifecycle import FileLifecycle
+from engine.registry import UploadRegistry
+
+@pytest.fixture
+def setup(tmp_path):
+	client = FakeClient(FakeConfig(bandwidth=256 * 1024 * 1024, processing_seconds=0.0, generation_latency=0.01, generation_jitter=0.0, seed=2))
+	registry = UploadRegistry(path=str(tmp_path / "uploads.json"), save_delay=0)
+	lifecycle = FileLifecycle(client, registry)
+	path = str(tmp_path / "video.mp4")
+	write_sparse(path, 256 * 1024)
+	remote = client.files.upload(file=path, config={"display_name": "gemini-descriptor/video.mp4"})
+	registry.record("hash", remote)
+	yield client, registry, lifecycle, remote, path
+	lifecycle.close()
+
+def test_deleted_file_leaves_the_registry(setup):
+	client, registry, lifecycle, remote, path = setup
+	assert lifecycle.delete([remote.name])[0].result() is True
+	assert registry.get("hash") is None
+	assert client.service.files == {}
+
+def test_failed_delete_keeps_the_registry_entry(setup):
+	client, registry, lifecycle, remote, path = setup
+
+	def refuse(name, config=None):
+		raise FakeAPIError(400, "FAILED_PRECONDITION")
+
+	client.files.delete = refuse
+	assert lifecycle.delete([remote.name])[0].result() is False
+	# El archivo sigue en el servidor, y el registro lo sigue ofreciendo
+	assert registry.get("hash")["name"] == remote.name
+	assert remote.name in client.service.files
+
+def test_file_being_deleted_is_not_reused(setup, tmp_path):
+	client, registry, lifecycle, remote, path = setup
+	started, proceed = threading.Event(), threading.Event()
+	delete = client.files.delete
+
+	def slow_delete(name, config=None):
+		started.set()
+		proceed.wait(5)
+		delete(name=name)
+
+	client.files.delete = slow_delete
+	future = lifecycle.delete([remote.name])[0]
+	started.wait(5)
+	# Durante el borrado, la entrada sigue en el registro pero el ciclo de vida no deja usar el archivo
+	assert registry.get("hash") is not None
+	assert lifecycle.track(remote) is False
+
+	# Un trabajo que lo encuentra en el registro lo sube de nuevo
+	engine = build_engine(client, registry=registry, lifecycle=lifecycle)
+	try:
+		media_file, file_hash = engine.remote_file(path, file_hash="hash")
+	finally:
+		engine.poller.stop()
+	assert media_file.name != remote.name
+	assert client.stats()["uploads"] == 2
+
+	proceed.set()
+	assert future.result() is True
+	assert remote.name not in client.service.files
+	assert registry.get("hash")["name"] == media_file.name
@@ -0,0 +1,110 @@
+"""
+Pruebas de la compresión de videos: caché de resultados, marca de compresión inútil y trabajos simultáneos sobre el mismo video.
+La codificación con OpenCV se sustituye por una que escribe bytes, para no depender del códec instalado.
+"""
+
+# Importaciones
+
+import os
+import time
+import threading
+
+import pytest
+
+from suite import write_sparse
+from engine.preprocess import VideoCompressor
+
+SIZE = 64 * 1024
+
+class FakeEncoder:
+	"""
+	Sustituto de VideoCompressor._encode: escribe output_bytes bytes y devuelve frames cuadros
+	"""
+
+	def __init__(self, output_bytes, frames=10, delay=0.0):
+		self.output_bytes = output_bytes
+		self.frames = frames
+		self.delay = delay
+		self.destinations = []
+		self.lock = threading.Lock()
+
+	def __call__(self, source, destination):
+		with self.lock:
+			self.destinations.append(destination)
+		with open(destination, 'wb') as file:
+			file.write(b"\0" * self.output_bytes)
+		time.sleep(self.delay)
+		return self.frames
+
+@pytest.fixture
+def video(tmp_path):
+	path = str(tmp_path / "video.mp4")
+	write_sparse(path, SIZE)
+	return path
+
+def make_compressor(tmp_path, encoder):
+	compressor = VideoCompressor(min_bytes=0, output_dir=str(tmp_path / "compressed"))
+	compressor._encode = encoder
+	return compressor
+
+def test_compressed_video_is_reused(tmp_path, video):
+	encoder = FakeEncoder(SIZE // 4)
+	compressor = make_compressor(tmp_path, encoder)
+	first = compressor.prepare(video, "hash")
+	second = compressor.prepare(video, "hash")
+	assert first.path == second.path == compressor.output_path("hash")
+	assert (first.cached, second.cached) == (False, True)
+	assert second.bytes_saved == SIZE - SIZE // 4
+	assert len(encoder.destinations) == 1
+
+@pytest.mark.parametrize("encoder", [FakeEncoder(2 * SIZE), FakeEncoder(0, frames=0)], ids=["not_smaller", "no_frames"])
+def test_useless_compression_is_remembered(tmp_path, video, encoder):
+	compressor = make_compressor(tmp_path, encoder)
+	first = compressor.prepare(video, "hash")
+	second = compressor.prepare(video, "hash")
+	assert first.path == second.path == video
+	assert first.skipped == second.skipped == "not_smaller"
+	assert second.cached
+	assert len(encoder.destinations) == 1
+	assert os.listdir(compressor.output_dir) == [os.path.basename(compressor.skip_path("hash"))]
+
+def test_encoder_errors_are_not_remembered(tmp_path, video):
+	calls = []
+
+	def broken(source, destination):
+		calls.append(destination)
+		raise RuntimeError("códec no disponible")
+
+	compressor = make_compressor(tmp_path, broken)
+	for _ in range(2):
+		with pytest.raises(RuntimeError):
+			compressor.prepare(video, "hash")
+	assert len(calls) == 2
+	assert os.listdir(compressor.output_dir) == []
+
+def test_concurrent_prepares_of_the_same_video_encode_once(tmp_path, video):
+	encoder = FakeEncoder(SIZE // 4, delay=0.2)
+	compressor = make_compressor(tmp_path, encoder)
+	results = []
+	threads = [threading.Thread(target=lambda: results.append(compressor.prepare(video, "hash"))) for _ in range(4)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert len(encoder.destinations) == 1
+	assert {result.path for result in results} == {compressor.output_path("hash")}
+	assert sorted(result.cached for result in results) == [False, True, True, True]
+	# No quedan temporales ni candados
+	assert os.listdir(compressor.output_dir) == [os.path.basename(compressor.output_path("hash"))]
+	assert compressor.hash_locks == {}
+
+def test_different_videos_use_different_temporaries(tmp_path, video):
+	encoder = FakeEncoder(SIZE // 4, delay=0.1)
+	compressor = make_compressor(tmp_path, encoder)
+	threads = [threading.Thread(target=compressor.prepare, args=(video, f"hash{index}")) for index in range(3)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert len(set(encoder.destinations)) == 3
+	assert sorted(os.listdir(compressor.output_dir)) == sorted(os.path.basename(compressor.output_path(f"hash{index}")) for index in range(3))
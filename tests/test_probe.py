@@ -0,0 +1,55 @@
+"""
+Pruebas de la lectura de metadatos y del informe de la estimación de tokens que muestra la interfaz
+"""
+
+# Importaciones
+
+from suite import write_png
+from engine.probe import MediaProbe, MediaInfo, estimate_report
+
+class BrokenProbe:
+	"""
+	Lector que falla como lo haría con un archivo ilegible o una carpeta de red caída
+	"""
+
+	def probe(self, path):
+		raise OSError("Dispositivo no disponible")
+
+class FixedProbe:
+	"""
+	Lector que devuelve siempre los mismos metadatos
+	"""
+
+	def __init__(self, info):
+		self.info = info
+
+	def probe(self, path):
+		return self.info
+
+def test_reports_image_estimate(tmp_path):
+	path = str(tmp_path / "foto.png")
+	write_png(path, 1000, 800, seed=1)
+	info, message, error = estimate_report(MediaProbe(), path)
+	assert error is None
+	assert (info.width, info.height) == (1000, 800)
+	assert message == f"El archivo es una imagen de 1000 por 800 píxeles. Estimación de tokens: {info.tokens}."
+
+def test_reports_video_estimate():
+	info = MediaInfo("video.mp4", "video", 1024, duration=10.0, has_audio=False)
+	assert estimate_report(FixedProbe(info), "video.mp4") == (info, f"Duración: 10.00 segundos, sin audio. Estimación de tokens: {info.tokens}.", None)
+
+def test_unsupported_format_is_an_error(tmp_path):
+	path = tmp_path / "notas.txt"
+	path.write_text("hola")
+	assert estimate_report(MediaProbe(), str(path)) == (None, None, "Formato de archivo no compatible.")
+
+def test_unreadable_file_is_an_error_not_an_exception(tmp_path):
+	info, message, error = estimate_report(BrokenProbe(), str(tmp_path / "video.mp4"))
+	assert (info, message) == (None, None)
+	assert error == "No se pudieron leer los datos del archivo: Dispositivo no disponible"
+	# Un archivo que ya no existe tampoco lanza
+	assert estimate_report(MediaProbe(), str(tmp_path / "borrado.mp4"))[2].startswith("No se pudieron leer los datos del archivo")
+
+def test_video_without_duration_is_an_error():
+	info = MediaInfo("video.mp4", "video", 1024)
+	assert estimate_report(FixedProbe(info), "video.mp4") == (info, None, "No se pudo obtener la duración del video.")
@@ -0,0 +1,57 @@
+"""
+Pruebas del paso al modelo de respaldo y de los reintentos con el modelo principal
+"""
+
+# Importaciones
+
+from fake_gemini import FakeAPIError
+from engine.routing import ModelRouter
+from engine.scheduler import RequestScheduler
+
+CHAIN = ["principal", "respaldo"]
+
+class FlakyModels:
+	"""
+	Modelos que fallan con 503 las primeras veces indicadas para cada uno
+	"""
+
+	def __init__(self, scheduler, failures):
+		self.scheduler = scheduler
+		self.failures = dict(failures)
+		self.calls = []
+
+	def generate(self, model):
+		self.calls.append(model)
+		if self.failures.get(model, 0):
+			self.failures[model] -= 1
+			raise FakeAPIError(503, "UNAVAILABLE")
+		return f"respuesta de {model}"
+
+	def attempt(self, model, retries):
+		# Como DescriptionEngine.request: el enrutador limita los reintentos del planificador con cada modelo
+		return self.scheduler.call(self.generate, model, retries=retries)
+
+def test_transient_error_is_retried_with_the_primary_model():
+	router = ModelRouter(CHAIN, light_model=None)
+	models = FlakyModels(RequestScheduler(max_retries=3, base_delay=0.001), {"principal": 1})
+	record = {}
+	assert router.call(router.route("image"), models.attempt, record=record) == ("principal", "respuesta de principal")
+	assert models.calls == ["principal", "principal"]
+	assert record["routing"]["tried"] == ["principal"]
+	# Un error aislado no deja al principal al final de la cadena
+	assert router.stats()["principal"]["fallbacks"] == 0
+	assert router.route("image") == CHAIN
+
+def test_persistent_errors_fall_back_and_mark_the_model_overloaded():
+	router = ModelRouter(CHAIN, light_model=None)
+	models = FlakyModels(RequestScheduler(max_retries=3, base_delay=0.001), {"principal": 10})
+	assert router.call(router.route("image"), models.attempt) == ("respaldo", "respuesta de respaldo")
+	assert models.calls == ["principal", "principal", "respaldo"]
+	assert router.stats()["principal"]["fallbacks"] == 1
+	assert router.route("image") == ["respaldo", "principal"]
+
+def test_primary_attempts_do_not_exceed_the_scheduler_retries():
+	router = ModelRouter(CHAIN, light_model=None)
+	models = FlakyModels(RequestScheduler(max_retries=0), {"principal": 1})
+	assert router.call(router.route("image"), models.attempt) == ("respaldo", "respuesta de respaldo")
+	assert models.calls == ["principal", "respaldo"]
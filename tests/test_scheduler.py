@@ -0,0 +1,110 @@
+"""
+Pruebas del planificador de solicitudes y de los reintentos de las consultas del procesamiento
+"""
+
+# Importaciones
+
+import time
+
+import pytest
+
+from fake_gemini import FakeAPIError, FakeState
+from engine.poller import ProcessingPoller
+from engine.scheduler import RequestScheduler, is_retryable
+
+class StatusError(Exception):
+	"""
+	Error con estado pero sin código, como algunos de la biblioteca de Gemini
+	"""
+
+	def __init__(self, status):
+		super().__init__(status)
+		self.status = status
+
+def test_retryable_errors_by_code_and_status():
+	assert is_retryable(FakeAPIError(429, "RESOURCE_EXHAUSTED"))
+	assert is_retryable(FakeAPIError(503, "UNAVAILABLE"))
+	assert is_retryable(StatusError("DEADLINE_EXCEEDED"))
+	assert not is_retryable(FakeAPIError(400, "INVALID_ARGUMENT"))
+
+def test_message_text_is_not_a_status():
+	# Una ruta o una cantidad de tokens que contiene 429 no es un límite de solicitudes
+	assert not is_retryable(FakeAPIError(404, "NOT_FOUND", "files/video_429.mp4"))
+	assert not is_retryable(ValueError("El prompt tiene 4290 tokens"))
+	assert not is_retryable(ValueError("UNAVAILABLE en el texto, pero sin estado"))
+
+def test_failed_calls_refund_their_tokens():
+	# 60 tokens por minuto: un reintento que pagara dos veces los 50 tokens esperaría 40 segundos
+	scheduler = RequestScheduler(tpm=60, base_delay=0.001)
+	attempts = []
+
+	def flaky():
+		attempts.append(time.monotonic())
+		if len(attempts) == 1:
+			raise FakeAPIError(503, "UNAVAILABLE")
+		return "ok"
+
+	start = time.monotonic()
+	assert scheduler.call(flaky, tokens=50) == "ok"
+	assert time.monotonic() - start < 1
+	assert scheduler.retries == 1
+	assert scheduler.tokens.available == pytest.approx(10, abs=1)
+
+def test_final_failure_refunds_its_tokens():
+	scheduler = RequestScheduler(tpm=60, max_retries=0)
+
+	def broken():
+		raise FakeAPIError(400, "INVALID_ARGUMENT")
+
+	with pytest.raises(FakeAPIError):
+		scheduler.call(broken, tokens=50)
+	assert scheduler.tokens.available == pytest.approx(60, abs=1)
+
+class FlakyFile:
+	def __init__(self, name, state):
+		self.name = name
+		self.state = FakeState(state)
+
+class FlakyFiles:
+	"""
+	files.get que falla las primeras veces con el error indicado y después devuelve el archivo ya procesado
+	"""
+
+	def __init__(self, failures, error):
+		self.failures = failures
+		self.error = error
+		self.calls = 0
+
+	def get(self, name):
+		self.calls += 1
+		if self.calls <= self.failures:
+			raise self.error
+		return FlakyFile(name, "ACTIVE")
+
+class FlakyClient:
+	def __init__(self, failures, error=None):
+		self.files = FlakyFiles(failures, error or FakeAPIError(503, "UNAVAILABLE"))
+
+def watch(client, max_retries):
+	poller = ProcessingPoller(client, min_delay=0.01, max_delay=0.02, jitter=0.0, max_retries=max_retries)
+	try:
+		return poller.watch(FlakyFile("files/video", "PROCESSING")).result(timeout=5)
+	finally:
+		poller.stop()
+
+def test_poll_retries_transient_errors():
+	client = FlakyClient(failures=2)
+	assert watch(client, max_retries=2).state.name == "ACTIVE"
+	assert client.files.calls == 3
+
+def test_poll_gives_up_after_max_retries():
+	client = FlakyClient(failures=3)
+	with pytest.raises(FakeAPIError):
+		watch(client, max_retries=2)
+	assert client.files.calls == 3
+
+def test_poll_does_not_retry_permanent_errors():
+	client = FlakyClient(failures=1, error=FakeAPIError(404, "NOT_FOUND"))
+	with pytest.raises(FakeAPIError):
+		watch(client, max_retries=5)
+	assert client.files.calls == 1
@@ -0,0 +1,125 @@
+"""
+Pruebas de la subida reanudable contra el servidor falso de benchmarks/fake_upload.py
+"""
+
+# Importaciones
+
+import os
+
+import pytest
+
+import engine.upload
+from engine.upload import ResumableUploader, UploadError, CHUNK_GRANULARITY
+from fake_upload import FakeUploadServer
+
+# Archivo de seis bloques y algo más, con el corte en medio del tercero
+SIZE = 6 * CHUNK_GRANULARITY + 1000
+CUT = 2 * CHUNK_GRANULARITY + 75000
+
+@pytest.fixture
+def media(tmp_path):
+	path = tmp_path / "video.mp4"
+	path.write_bytes(os.urandom(SIZE))
+	return str(path)
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+	# Las esperas entre reintentos no cambian lo que se prueba
+	monkeypatch.setattr(engine.upload.time, "sleep", lambda seconds: None)
+
+def make_uploader(server, tmp_path, **kwargs):
+	return ResumableUploader(server.api_key, base_url=server.url, chunk_size=CHUNK_GRANULARITY, sessions_dir=str(tmp_path / "sessions"), timeout=10, **kwargs)
+
+def test_uploads_in_chunks_and_reports_progress(media, tmp_path):
+	sent = []
+	with FakeUploadServer() as server:
+		uploader = make_uploader(server, tmp_path)
+		resource = uploader.upload(media, display_name="gemini-descriptor/video.mp4", progress=lambda done, total: sent.append((done, total)))
+		assert server.received(resource["name"]) == open(media, "rb").read()
+	assert resource["display_name"] == "gemini-descriptor/video.mp4"
+	assert server.uploads() == [index * CHUNK_GRANULARITY for index in range(7)]
+	assert sent[0] == (0, SIZE) and sent[-1] == (SIZE, SIZE)
+	assert uploader.bytes_sent == SIZE
+	assert os.listdir(uploader.sessions_dir) == []
+
+def test_retries_from_offset_reported_by_server(media, tmp_path):
+	with FakeUploadServer(interrupt_at=[CUT]) as server:
+		uploader = make_uploader(server, tmp_path)
+		resource = uploader.upload(media)
+		assert server.received(resource["name"]) == open(media, "rb").read()
+	offsets = server.uploads()
+	# El bloque cortado no se reenvía entero: se sigue desde el byte que el servidor dice tener
+	assert offsets[:4] == [0, CHUNK_GRANULARITY, 2 * CHUNK_GRANULARITY, CUT]
+	assert offsets[4:] == list(range(CUT + CHUNK_GRANULARITY, SIZE, CHUNK_GRANULARITY))
+	assert server.starts == 1
+	assert uploader.bytes_sent == 2 * CHUNK_GRANULARITY + SIZE - CUT
+
+def test_resumes_saved_session_after_failed_run(media, tmp_path):
+	with FakeUploadServer(interrupt_at=[CUT]) as server:
+		with pytest.raises(UploadError):
+			make_uploader(server, tmp_path, max_retries=0).upload(media)
+		# La sesión queda guardada en disco para la próxima ejecución
+		assert len(os.listdir(tmp_path / "sessions")) == 1
+		first_run = len(server.uploads())
+
+		uploader = make_uploader(server, tmp_path)
+		resource = uploader.upload(media)
+		assert server.received(resource["name"]) == open(media, "rb").read()
+	assert server.starts == 1
+	assert server.uploads()[first_run] == CUT
+	assert uploader.bytes_resumed == CUT
+	assert uploader.bytes_sent == SIZE - CUT
+	assert os.listdir(tmp_path / "sessions") == []
+
+def test_expired_session_starts_over(media, tmp_path):
+	with FakeUploadServer(interrupt_at=[CUT]) as server:
+		with pytest.raises(UploadError):
+			make_uploader(server, tmp_path, max_retries=0).upload(media)
+		server.forget()
+		first_run = len(server.uploads())
+
+		uploader = make_uploader(server, tmp_path)
+		resource = uploader.upload(media)
+		assert server.received(resource["name"]) == open(media, "rb").read()
+	assert server.starts == 2
+	assert server.uploads()[first_run] == 0
+	assert uploader.bytes_resumed == 0
+
+def interrupted_session(server, tmp_path, media):
+	"""
+	Deja una sesión guardada a medias y devuelve la sesión del servidor
+	"""
+	with pytest.raises(UploadError):
+		make_uploader(server, tmp_path, max_retries=0).upload(media)
+	(session,) = server.sessions.values()
+	return session
+
+def test_session_finalized_by_previous_run_is_not_uploaded_again(media, tmp_path):
+	with FakeUploadServer(interrupt_at=[CUT]) as server:
+		session = interrupted_session(server, tmp_path, media)
+		# La ejecución anterior terminó la subida pero se cerró antes de borrar su sesión
+		session.data = bytearray(open(media, "rb").read())
+		session.final = True
+		requests = len(server.requests)
+
+		uploader = make_uploader(server, tmp_path)
+		resource = uploader.upload(media)
+		assert resource == session.resource()
+	assert [command for command, _, _, _ in server.requests[requests:]] == ["query"]
+	assert server.starts == 1
+	assert uploader.bytes_sent == 0
+	assert os.listdir(tmp_path / "sessions") == []
+
+def test_session_with_all_bytes_is_only_finalized(media, tmp_path):
+	with FakeUploadServer(interrupt_at=[CUT]) as server:
+		session = interrupted_session(server, tmp_path, media)
+		session.data = bytearray(open(media, "rb").read())
+		requests = len(server.requests)
+
+		uploader = make_uploader(server, tmp_path)
+		resource = uploader.upload(media)
+		assert server.received(resource["name"]) == open(media, "rb").read()
+	# Sólo se cierra la sesión, sin enviar un bloque vacío
+	assert [(command, offset, length) for command, _, offset, length in server.requests[requests:]] == [("query", None, 0), ("finalize", str(SIZE), 0)]
+	assert uploader.bytes_sent == 0
+	assert os.listdir(tmp_path / "sessions") == []
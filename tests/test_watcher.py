@@ -0,0 +1,91 @@
+"""
+Pruebas del modo de vigilancia: resultados que no se pudieron guardar y archivos que desaparecen
+"""
+
+# Importaciones
+
+import threading
+
+from suite import write_sparse
+from engine.describer import DescriptionResult
+from engine.watcher import FolderWatcher, watch
+
+class FakeEngine:
+	"""
+	Motor que describe al instante y cuenta las descripciones
+	"""
+
+	workers = 2
+
+	def __init__(self):
+		self.described = []
+
+	def describe_result(self, path, prompt=None):
+		self.described.append(path)
+		return DescriptionResult(path, prompt, "modelo", text="descripción")
+
+class FlakySink:
+	"""
+	Destino que falla en la primera escritura, como un disco lleno que después se libera
+	"""
+
+	def __init__(self, failures=1):
+		self.failures = failures
+		self.written = []
+		self.done = threading.Event()
+
+	def write(self, result):
+		if self.failures:
+			self.failures -= 1
+			raise OSError(28, "No queda espacio en el dispositivo")
+		self.written.append(result.path)
+		self.done.set()
+
+def make_watcher(folder):
+	return FolderWatcher(str(folder), settle_seconds=0.05, poll_interval=0.02, include_existing=True, use_events=False)
+
+def test_failed_write_is_counted_and_retried(tmp_path, caplog):
+	path = str(tmp_path / "video.mp4")
+	write_sparse(path, 1024)
+	engine, sink = FakeEngine(), FlakySink()
+	watcher = make_watcher(tmp_path)
+	outcome = []
+	thread = threading.Thread(target=lambda: outcome.append(watch(engine, watcher, sink)))
+	thread.start()
+	try:
+		assert sink.done.wait(5)
+	finally:
+		watcher.stop()
+		thread.join(5)
+	# El primer intento no se pierde en silencio: cuenta como error, queda en el registro y el archivo se vuelve a describir
+	assert outcome == [(1, 1)]
+	assert sink.written == [path]
+	assert engine.described == [path, path]
+	assert "No se pudo guardar el resultado" in caplog.text
+
+def test_rescan_forgets_deleted_files(tmp_path):
+	paths = [str(tmp_path / f"video_{index}.mp4") for index in range(3)]
+	for path in paths:
+		write_sparse(path, 1024)
+	watcher = FolderWatcher(str(tmp_path), use_events=False)
+	watcher.start()
+	try:
+		assert set(watcher.seen) == set(paths)
+		(tmp_path / "video_1.mp4").unlink()
+		watcher._rescan()
+		assert set(watcher.seen) == {paths[0], paths[2]}
+	finally:
+		watcher.stop()
+
+def test_rescan_keeps_files_of_unreadable_folders(tmp_path):
+	path = str(tmp_path / "video.mp4")
+	write_sparse(path, 1024)
+	watcher = FolderWatcher(str(tmp_path), use_events=False)
+	watcher.start()
+	try:
+		# Un recorrido que no encuentra nada, como con una carpeta de red caída, no olvida lo que sigue existiendo
+		watcher._scan = lambda: iter(())
+		watcher._rescan()
+		assert list(watcher.seen) == [path]
+	finally:
+		watcher.stop()
@@ -0,0 +1,195 @@
+"""
+Despachador de actualizaciones de la interfaz.
+Los hilos de trabajo no tocan los controles: piden actualizaciones al despachador, que las aplica en el hilo principal.
+Las actualizaciones pendientes de un mismo control se fusionan (sólo cuenta la última, o se concatena el texto añadido), y se aplican como mucho una vez por cuadro.
+Los textos muy largos se añaden por partes, un trozo por cuadro, para que la ventana siga respondiendo.
+Mide el retraso del bucle principal: el tiempo entre que se pide una actualización y el momento en que wx la ejecuta.
+"""
+
+# Importaciones
+
+import time
+import threading
+
+import wx
+
+# Duración de un cuadro en milisegundos: las actualizaciones se agrupan a este ritmo
+FRAME_MS = 100
+# Caracteres que se añaden por cuadro al mostrar un texto largo
+TEXT_CHUNK = 16 * 1024
+# Intervalo de la sonda que mide el retraso del bucle principal sin actividad
+PROBE_MS = 1000
+
+class UIDispatcher:
+	"""
+	Fusiona y limita las actualizaciones de la interfaz, y mide el retraso del bucle principal
+	"""
+
+	def __init__(self, frame_ms=FRAME_MS, metrics=None):
+		"""
+		Inicialización del despachador. metrics es el Metrics donde se registran el retraso y la duración de cada cuadro.
+		"""
+		self.frame = frame_ms / 1000
+		self.metrics = metrics
+		self.lock = threading.Lock()
+		# Actualizaciones pendientes por clave, en el orden en que se pidieron por primera vez
+		self.pending = {}
+		self.armed = False
+		self.last_flush = 0.0
+		# Textos largos que se están mostrando por partes
+		self.feeds = {}
+		self.probe = None
+		self.probe_due = None
+		self.merged = 0
+
+	def set(self, key, func, *args):
+		"""
+		Pide llamar a func(*args) en el hilo principal. Si ya había una actualización pendiente con la misma clave, se sustituye.
+		Se puede llamar desde cualquier hilo.
+		"""
+		with self.lock:
+			if key in self.pending:
+				self.merged += 1
+			self.pending[key] = (func, args)
+		self._arm()
+
+	def append(self, key, text, func):
+		"""
+		Pide llamar a func(texto) en el hilo principal con todo el texto añadido desde el último cuadro.
+		Se puede llamar desde cualquier hilo.
+		"""
+		with self.lock:
+			entry = self.pending.get(key)
+			if entry is not None and entry[0] is self._append:
+				entry[1][1].append(text)
+				self.merged += 1
+			else:
+				self.pending[key] = (self._append, (func, [text]))
+		self._arm()
+
+	@staticmethod
+	def _append(func, pieces):
+		func("".join(pieces))
+
+	def call(self, func, *args):
+		"""
+		Pide llamar a func(*args) en el hilo principal, sin fusionarla con otras, después de aplicar las actualizaciones pendientes.
+		Sirve para los eventos que no se pueden perder ni adelantar, como el resultado final.
+		"""
+		posted = time.perf_counter()
+		wx.CallAfter(self._call, posted, func, args)
+
+	def _call(self, posted, func, args):
+		self._observe("ui_lag", time.perf_counter() - posted)
+		self.flush()
+		func(*args)
+
+	def _arm(self):
+		"""
+		Programa la aplicación de las actualizaciones pendientes si todavía no está programada
+		"""
+		with self.lock:
+			if self.armed:
+				return
+			self.armed = True
+		posted = time.perf_counter()
+		wx.CallAfter(self._schedule, posted)
+
+	def _schedule(self, posted):
+		"""
+		En el hilo principal: aplica las actualizaciones ahora o al empezar el próximo cuadro
+		"""
+		now = time.perf_counter()
+		self._observe("ui_lag", now - posted)
+		wait = self.last_flush + self.frame - now
+		if wait <= 0:
+			self.flush()
+		else:
+			wx.CallLater(max(1, int(wait * 1000)), self.flush)
+
+	def flush(self):
+		"""
+		En el hilo principal: aplica todas las actualizaciones pendientes y el siguiente trozo de cada texto largo
+		"""
+		with self.lock:
+			pending = self.pending
+			self.pending = {}
+			self.armed = False
+			merged, self.merged = self.merged, 0
+		start = time.perf_counter()
+		self.last_flush = start
+		for func, args in pending.values():
+			func(*args)
+		self._feed()
+		if pending:
+			self._observe("ui_frame", time.perf_counter() - start)
+		if merged and self.metrics is not None:
+			self.metrics.increment("ui_updates_merged", merged)
+
+	def set_text(self, key, text, clear, append, chunk=TEXT_CHUNK):
+		"""
+		Muestra un texto que puede ser muy largo: llama a clear() y después a append(trozo) con un trozo por cuadro.
+		Debe llamarse desde el hilo principal. Un nuevo texto con la misma clave sustituye al que se estaba mostrando.
+		"""
+		clear()
+		if len(text) <= chunk:
+			self.feeds.pop(key, None)
+			if text:
+				append(text)
+			return
+		append(text[:chunk])
+		self.feeds[key] = (text, chunk, append, chunk)
+		self._arm()
+
+	def discard(self, key):
+		"""
+		Descarta las actualizaciones pendientes y el texto largo que se estaba mostrando con la clave indicada
+		"""
+		with self.lock:
+			self.pending.pop(key, None)
+		self.feeds.pop(key, None)
+
+	def _feed(self):
+		"""
+		Añade el siguiente trozo de cada texto largo y vuelve a programarse si queda texto
+		"""
+		for key, (text, offset, append, chunk) in list(self.feeds.items()):
+			append(text[offset:offset + chunk])
+			offset += chunk
+			if offset >= len(text):
+				del self.feeds[key]
+			else:
+				self.feeds[key] = (text, offset, append, chunk)
+		if self.feeds:
+			self._arm()
+
+	def start_probe(self, interval_ms=PROBE_MS):
+		"""
+		Inicia una sonda que mide el retraso del bucle principal aunque no haya actualizaciones: un temporizador que debería dispararse cada interval_ms
+		"""
+		if self.probe is not None:
+			return
+		self.probe = wx.Timer()
+		self.probe.Bind(wx.EVT_TIMER, lambda event: self._on_probe(interval_ms))
+		self.probe_due = time.perf_counter() + interval_ms / 1000
+		self.probe.Start(interval_ms)
+
+	def _on_probe(self, interval_ms):
+		now = time.perf_counter()
+		self._observe("ui_loop_lag", max(0.0, now - self.probe_due))
+		self.probe_due = now + interval_ms / 1000
+
+	def stop(self):
+		"""
+		Detiene la sonda y descarta lo pendiente
+		"""
+		if self.probe is not None:
+			self.probe.Stop()
+			self.probe = None
+		with self.lock:
+			self.pending = {}
+		self.feeds = {}
+
+	def _observe(self, name, seconds):
+		if self.metrics is not None:
+			self.metrics.observe(name, seconds)